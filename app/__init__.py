@@ -6,18 +6,6 @@ import os
 
 from .config import Config
 import sqlalchemy as sa
-from werkzeug import security as _wz_sec
-
-# Force pbkdf2 default for password hashing to avoid platforms without hashlib.scrypt
-_orig_generate_password_hash = _wz_sec.generate_password_hash
-
-def _generate_password_hash_compat(password, method=None, salt_length=16):
-    # If method not provided or set to scrypt, fallback to pbkdf2:sha256
-    if not method or method == 'scrypt':
-        method = 'pbkdf2:sha256'
-    return _orig_generate_password_hash(password, method=method, salt_length=salt_length)
-
-_wz_sec.generate_password_hash = _generate_password_hash_compat
 from .utils import make_response_payload
 
 # Initialize extensions
@@ -31,6 +19,25 @@ def create_app():
     # Initialize extensions
     db.init_app(app)
     migrate.init_app(app, db)
+
+    from . import (assets, compression, identity, jobs, live, metrics, passwords, querybudget, ratelimit, rowcache,
+                   serialization)
+    identity.init_app(app)
+    passwords.init_app(app)
+    serialization.init_app(app)
+    metrics.init_app(app)
+    querybudget.init_app(app)
+    rowcache.init_app(app)
+    ratelimit.init_app(app)
+    jobs.init_app(app)
+    live.init_app(app)
+    from .rooms import waitlist
+    waitlist.init_app(app)
+    from .customers import analytics
+    analytics.init_app(app)
+    # Registered before set_security_headers, so it runs after it (after_request hooks run in reverse)
+    compression.init_app(app)
+    assets.init_app(app)
     
     # Configure CORS for SaaS deployment (origins from env CORS_ORIGINS)
     cors_origins_env = os.environ.get("CORS_ORIGINS", "http://localhost:3000,https://*.pages.dev")
@@ -47,10 +54,16 @@ def create_app():
     from .auth.routes import auth_bp
     from .customers.routes import customers_bp
     from .tenants.routes import tenants_bp  # New tenant management
+    from .reports.routes import reports_bp
+    from .rooms.routes import rooms_bp
+    from .jobs.routes import jobs_bp
     from .ui.routes import ui_bp
     app.register_blueprint(auth_bp, url_prefix='/api')
     app.register_blueprint(customers_bp, url_prefix='/api/customers')
     app.register_blueprint(tenants_bp, url_prefix='/api/tenants')
+    app.register_blueprint(reports_bp, url_prefix='/api/reports')
+    app.register_blueprint(rooms_bp, url_prefix='/api/rooms')
+    app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
     app.register_blueprint(ui_bp)
 
     # Security headers
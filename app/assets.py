@@ -0,0 +1,120 @@
+# Fingerprinted, precompressed static assets
+"""
+Build step and serving for content-addressed static files.
+
+`flask assets-build` copies every file under app/static into app/static/dist
+with a content hash in its name (css/main.css -> dist/css/main.3f2a9c1b7d4e.css),
+writes .gz (and .br when brotli is installed) siblings for compressible
+files, and records the mapping in dist/manifest.json.
+
+When the manifest exists at startup, url_for('static', filename=...) points
+at the fingerprinted name. Those files are served with the best precompressed
+variant the client accepts and an immutable one-year Cache-Control, since a
+changed file gets a new name. Anything not in the manifest falls back to
+Flask's static view.
+"""
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+from flask import current_app, request, send_from_directory
+
+from .compression import COMPRESSIBLE_MIMETYPES, brotli, compress
+
+BUILD_DIR = 'dist'
+MANIFEST = 'manifest.json'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# File suffix of each precompressed variant
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def _mimetype(path):
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def build(static_folder, min_size=500):
+    """
+    Fingerprint and precompress the files under `static_folder`.
+    :return: the manifest ({"files": {logical: fingerprinted}, "encodings": {fingerprinted: [...]}})
+    """
+    out = os.path.join(static_folder, BUILD_DIR)
+    shutil.rmtree(out, ignore_errors=True)
+    levels = {'gzip': 9, 'br': 11}
+    manifest = {"files": {}, "encodings": {}}
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != out)
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            logical = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+            stem, ext = os.path.splitext(logical)
+            target = f'{BUILD_DIR}/{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+            path = os.path.join(static_folder, *target.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+            manifest["files"][logical] = target
+
+            if _mimetype(logical) not in COMPRESSIBLE_MIMETYPES or len(data) < min_size:
+                continue
+            encodings = []
+            for encoding in ('br', 'gzip'):
+                if encoding == 'br' and brotli is None:
+                    continue
+                packed = compress(data, encoding, levels)
+                # Keep a variant only when it actually saves bytes
+                if len(packed) < len(data):
+                    with open(path + SUFFIXES[encoding], 'wb') as f:
+                        f.write(packed)
+                    encodings.append(encoding)
+            if encodings:
+                manifest["encodings"][target] = encodings
+
+    with open(os.path.join(out, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, BUILD_DIR, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def init_app(app):
+    """Rewrite static URLs to fingerprinted files and serve them precompressed."""
+    manifest = load_manifest(app.static_folder) if app.config.get('STATIC_FINGERPRINTS', True) else None
+    if not manifest:
+        return
+    app.extensions['static_manifest'] = manifest
+    files = manifest["files"]
+    fingerprinted = set(files.values())
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in files:
+            values['filename'] = files[values['filename']]
+
+    default_view = app.view_functions['static']
+
+    def static(filename):
+        if filename not in fingerprinted:
+            return default_view(filename=filename)
+        offered = manifest["encodings"].get(filename, [])
+        encoding = request.accept_encodings.best_match(offered) if offered else None
+        response = send_from_directory(
+            current_app.static_folder, filename + SUFFIXES[encoding] if encoding else filename,
+            mimetype=_mimetype(filename), max_age=31536000, conditional=True)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if offered:
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = IMMUTABLE
+        return response
+
+    app.view_functions['static'] = static
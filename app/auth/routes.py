@@ -4,14 +4,20 @@ Routes for user registration, login, logout, session info, and field validations
 Updated for multi-tenant SaaS architecture.
 """
 
-from flask import Blueprint, request, session
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint, current_app, request, session
 from datetime import datetime, timedelta
+from sqlalchemy.orm import joinedload
 import re
 
 from .. import db
-from ..models import User, Tenant, Studio
-from ..utils import make_response_payload
+from ..models import User, Tenant, Studio, Room
+from ..utils import make_response_payload, get_current_user, parse_iso_datetime
+from ..identity import set_current_user
+from .. import rowcache
+from ..rowcache import first_cached, get_cached
+from ..ratelimit import check as rate_limit, client_ip, tenant_limit
+from ..passwords import HashingBusy, hash_password, verify_password, needs_rehash
+from ..rooms.conflicts import validate_slots
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -49,6 +55,11 @@ def register():
     tenant_name = data.get('tenant_name', '').strip()  # For new tenant creation
     tenant_id = data.get('tenant_id')  # For adding to existing tenant
 
+    limited = rate_limit(('register:ip', client_ip(), 'RATE_LIMIT_REGISTER_IP'),
+                         ('register:email', email, 'RATE_LIMIT_REGISTER_EMAIL'))
+    if limited:
+        return limited
+
     # Basic validation
     errors = {}
     if not name:
@@ -75,12 +86,19 @@ def register():
             errors.setdefault('tenant_name', []).append('Studio/Company name is required for new registration')
 
     if errors:
-        try:
-            print('register_validation_errors', errors)
-        except Exception:
-            pass
+        current_app.logger.info('register validation errors: %s', sorted(errors))
         return make_response_payload(False, errors=errors), 400
 
+    # Joining an existing tenant counts against that tenant's quota
+    if tenant_id and not tenant_name:
+        tenant = get_cached(Tenant, tenant_id)
+        limited = rate_limit(('tenant', tenant.id, tenant_limit(tenant))) if tenant else None
+        if limited:
+            return limited
+
+    # Hash outside the transaction so a saturated hashing pool answers 503
+    password_hash = hash_password(password)
+
     try:
         if tenant_name and not tenant_id:
             # Create new tenant (SaaS signup) inline to avoid cross-call coupling
@@ -99,7 +117,7 @@ def register():
                 studio_id=studio.id,
                 name=name,
                 email=email,
-                password_hash=generate_password_hash(password),
+                password_hash=password_hash,
                 role='Studio Manager',
                 permissions=[
                     'view_customers', 'create_customer', 'edit_customer', 'delete_customer',
@@ -117,19 +135,19 @@ def register():
             if not tenant_id:
                 return make_response_payload(False, message="Tenant ID required"), 400
                 
-            tenant = Tenant.query.get(tenant_id)
+            tenant = get_cached(Tenant, tenant_id)
             if not tenant or not tenant.is_active:
                 return make_response_payload(False, message="Invalid tenant"), 400
             
             # Get default studio for tenant
-            studio = Studio.query.filter_by(tenant_id=tenant_id).first()
+            studio = first_cached(Studio, tenant_id=tenant_id)
             
             user = User(
                 tenant_id=tenant_id,
                 studio_id=studio.id if studio else None,
                 name=name,
                 email=email,
-                password_hash=generate_password_hash(password),
+                password_hash=password_hash,
                 role='Receptionist',
                 permissions=['create_booking', 'edit_customer']
             )
@@ -168,10 +186,22 @@ def login():
     if not email or not password:
         return make_response_payload(False, message="Email and password are required"), 400
 
-    # Find user by email (could be in any tenant)
-    user = User.query.filter_by(email=email).first()
-    
-    if not user or not check_password_hash(user.password_hash, password):
+    # Throttle before the password hash is checked; that is the expensive part
+    limited = rate_limit(('login:ip', client_ip(), 'RATE_LIMIT_LOGIN_IP'),
+                         ('login:email', email, 'RATE_LIMIT_LOGIN_EMAIL'))
+    if limited:
+        return limited
+
+    # Find user by email (could be in any tenant). The tenant comes from the row cache
+    # when one is configured, otherwise from the same query
+    if rowcache.enabled():
+        user = User.query.filter_by(email=email).first()
+        tenant = get_cached(Tenant, user.tenant_id) if user and user.tenant_id else None
+    else:
+        user = User.query.options(joinedload(User.tenant)).filter_by(email=email).first()
+        tenant = user.tenant if user else None
+
+    if not user or not verify_password(user.password_hash, password):
         return make_response_payload(False, message="Invalid email or password"), 401
     
     # Check if user and tenant are active
@@ -179,15 +209,29 @@ def login():
         return make_response_payload(False, message="Account is deactivated"), 401
     
     if user.tenant_id:
-        from ..models import Tenant
-        tenant = Tenant.query.get(user.tenant_id)
         if not tenant or not tenant.is_active:
             return make_response_payload(False, message="Studio account is not active"), 401
 
+    # The tenant-wide quota only counts successful logins, so wrong passwords sent for
+    # one known email cannot lock everyone in the tenant out
+    if tenant is not None:
+        limited = rate_limit(('tenant', tenant.id, tenant_limit(tenant)))
+        if limited:
+            return limited
+
+    # Transparently upgrade hashes made with an older algorithm or cost
+    if needs_rehash(user.password_hash):
+        try:
+            user.password_hash = hash_password(password)
+            db.session.commit()
+        except HashingBusy:
+            pass  # the password is verified; the upgrade is retried on the next login
+
     # Establish session
     session.clear()
     session['user_id'] = user.id
     session.permanent = remember_me
+    set_current_user(user)
 
     payload = {
         "user": _format_user(user),
@@ -200,11 +244,7 @@ def session_info():
     """
     Return current user info and refreshed session_timeout.
     """
-    user_id = session.get('user_id')
-    if not user_id:
-        return make_response_payload(False, message="Unauthorized"), 401
-
-    user = User.query.get(user_id)
+    user = get_current_user()
     if not user:
         return make_response_payload(False, message="Unauthorized"), 401
 
@@ -228,6 +268,13 @@ def validate_email():
     Real-time check for email uniqueness.
     Returns 400 with field-specific error if taken.
     """
+    u = get_current_user()
+    limited = rate_limit(('validate:ip', client_ip(), 'RATE_LIMIT_VALIDATE_IP'),
+                         ('tenant', u.tenant_id if u and u.tenant else None,
+                          tenant_limit(u.tenant) if u and u.tenant else None))
+    if limited:
+        return limited
+
     data = request.get_json() or {}
     email = data.get('email')
     errors = {}
@@ -236,8 +283,6 @@ def validate_email():
         errors['email'] = ['Email is required']
     else:
         # If a user is logged in, check within their tenant; otherwise check globally
-        from ..utils import get_current_user
-        u = get_current_user()
         if u and u.tenant_id is not None:
             exists = User.query.filter_by(tenant_id=u.tenant_id, email=email).first()
         else:
@@ -253,7 +298,59 @@ def validate_email():
 @auth_bp.route('/validate/booking', methods=['POST'])
 def validate_booking():
     """
-    Stub for booking conflict validation.
-    Always returns no conflicts for now; real logic in Sprint 3.
+    Booking conflict validation.
+    Accepts a single slot { room_id, start_time, end_time, booking_id? }
+    or a batch { slots: [...], booking_id? } and checks them against
+    confirmed bookings (and each other) using the per-room interval index.
+    Returns 409 with the conflicting entries when any slot overlaps.
     """
+    user = get_current_user()
+    if not user:
+        return make_response_payload(False, message="Unauthorized"), 401
+
+    data = request.get_json() or {}
+    raw_slots = data.get('slots')
+    if raw_slots is None:
+        raw_slots = [data]
+    if not isinstance(raw_slots, list) or not raw_slots:
+        return make_response_payload(False, errors={'slots': ['At least one slot is required']}), 400
+
+    errors = {}
+    slots = []
+    for i, raw in enumerate(raw_slots):
+        prefix = f'slots[{i}].' if 'slots' in data else ''
+        raw = raw if isinstance(raw, dict) else {}
+        room_id = raw.get('room_id')
+        start = parse_iso_datetime(raw.get('start_time'))
+        end = parse_iso_datetime(raw.get('end_time'))
+        if not isinstance(room_id, int) or isinstance(room_id, bool):
+            errors.setdefault(prefix + 'room_id', []).append('Room is required')
+        if not start:
+            errors.setdefault(prefix + 'start_time', []).append('Valid start time is required')
+        if not end:
+            errors.setdefault(prefix + 'end_time', []).append('Valid end time is required')
+        elif start and end <= start:
+            errors.setdefault(prefix + 'end_time', []).append('End time must be after start time')
+        slots.append({'room_id': room_id, 'start_time': start, 'end_time': end})
+
+    if not errors:
+        # All rooms must exist and be visible to the caller's tenant
+        room_ids = {s['room_id'] for s in slots}
+        rq = db.session.query(Room.id).filter(Room.id.in_(room_ids))
+        if user.tenant_id:
+            rq = rq.filter(Room.tenant_id == user.tenant_id)
+        known = {row.id for row in rq}
+        for i, slot in enumerate(slots):
+            if slot['room_id'] not in known:
+                prefix = f'slots[{i}].' if 'slots' in data else ''
+                errors.setdefault(prefix + 'room_id', []).append('Room not found')
+
+    if errors:
+        return make_response_payload(False, errors=errors), 400
+
+    exclude = [data['booking_id']] if isinstance(data.get('booking_id'), int) else []
+    conflicts = validate_slots(slots, tenant_id=user.tenant_id, exclude_ids=exclude)
+    if conflicts:
+        return make_response_payload(False, message="Booking conflicts found", conflicts=conflicts), 409
+
     return make_response_payload(True, conflicts=[])
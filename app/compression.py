@@ -0,0 +1,107 @@
+# Response compression (negotiated gzip / brotli)
+"""
+Compress text responses for clients that accept it.
+
+Buffered bodies are compressed once when they are at least COMPRESS_MIN_SIZE
+bytes. Streamed bodies (exports, NDJSON) are compressed chunk by chunk with a
+sync flush after each chunk, so records still reach the client as they are
+produced. Brotli is used when the `brotli` package is installed and the
+client prefers it; gzip otherwise.
+
+A compressed body is a different representation, so a strong ETag is
+weakened (as nginx does). If-None-Match uses weak comparison, so 304s still
+work.
+"""
+import gzip
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = frozenset({
+    'application/json', 'application/x-ndjson', 'text/csv', 'text/html', 'text/plain',
+    'text/css', 'text/javascript', 'application/javascript', 'image/svg+xml', 'text/event-stream',
+})
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate(accept_encodings):
+    """Best supported content-coding the client accepts, or None."""
+    return accept_encodings.best_match(available_encodings())
+
+
+def compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level['br'])
+    return gzip.compress(data, compresslevel=level['gzip'], mtime=0)
+
+
+def _compressor(encoding, level):
+    """(compress(chunk), flush(), finish()) for incremental output."""
+    if encoding == 'br':
+        c = brotli.Compressor(quality=level['br'])
+        return c.process, c.flush, c.finish
+    # wbits 31: zlib stream with a gzip header and trailer
+    c = zlib.compressobj(level['gzip'], zlib.DEFLATED, 31)
+    return c.compress, lambda: c.flush(zlib.Z_SYNC_FLUSH), c.flush
+
+
+def compress_stream(chunks, encoding, level):
+    """Compress an iterable of chunks, flushing after each non-empty chunk."""
+    process, flush, finish = _compressor(encoding, level)
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            yield process(chunk) + flush()
+        yield finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def init_app(app):
+    """Compress responses in an after_request hook (runs after the security-headers hook)."""
+
+    @app.after_request
+    def compress_response(response):
+        config = app.config
+        if not config.get('COMPRESS_ENABLED', True):
+            return response
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return response
+        response.vary.add('Accept-Encoding')
+        if (response.status_code < 200 or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers or response.direct_passthrough
+                or request.method == 'HEAD'):
+            return response
+
+        encoding = negotiate(request.accept_encodings)
+        if encoding is None:
+            return response
+        level = {'gzip': config.get('COMPRESS_GZIP_LEVEL', 6), 'br': config.get('COMPRESS_BR_QUALITY', 4)}
+
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoding, level)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < config.get('COMPRESS_MIN_SIZE', 500):
+                return response
+            response.set_data(compress(data, encoding, level))
+
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,78 @@
+# Conditional GET helpers (ETag / Last-Modified validators)
+"""
+Answer repeat reads with 304 Not Modified before any serialization work.
+
+Routes build validators from what they can get cheaply: a single row's
+(id, updated_at), or for a list the `max(updated_at)` and `count(*)` of the
+rows it would return together with the query parameters. If the request's
+If-None-Match (or, for rows, If-Modified-Since) matches, `not_modified()`
+returns the 304 response; otherwise `apply()` stamps the full response so
+the client can revalidate next time.
+
+Lists only get an ETag: deleting a row lowers the count without moving
+max(updated_at), so a date alone cannot tell that a list changed.
+"""
+import hashlib
+from datetime import timezone
+
+from flask import current_app, request
+from sqlalchemy import func
+
+# Representations are per user, so shared caches must not reuse them and
+# browsers must revalidate every time
+CACHE_CONTROL = 'private, no-cache'
+
+
+class Validators:
+    """A strong ETag and an optional Last-Modified datetime (naive UTC)."""
+
+    def __init__(self, etag, last_modified=None):
+        self.etag = etag
+        self.last_modified = last_modified.replace(microsecond=0) if last_modified else None
+
+    def matches(self):
+        """True when the request's preconditions say the client copy is current."""
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        if request.if_none_match:
+            # Weak comparison (RFC 9110), so compressed variants with weakened tags still match
+            return request.if_none_match.contains_weak(self.etag)
+        since = request.if_modified_since
+        if since is not None and self.last_modified is not None:
+            return self.last_modified.replace(tzinfo=timezone.utc) <= since
+        return False
+
+    def apply(self, response):
+        response.set_etag(self.etag)
+        if self.last_modified is not None:
+            response.last_modified = self.last_modified.replace(tzinfo=timezone.utc)
+        response.headers['Cache-Control'] = CACHE_CONTROL
+        response.vary.add('Cookie')
+        return response
+
+    def not_modified(self):
+        return self.apply(current_app.response_class(status=304))
+
+
+def make_etag(*parts):
+    """Hash the parts that determine a representation into an opaque strong ETag."""
+    raw = '\x1f'.join('' if p is None else p.isoformat() if hasattr(p, 'isoformat') else str(p) for p in parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def row_validators(obj):
+    """Validators for a single row with an updated_at column."""
+    return Validators(make_etag(type(obj).__tablename__, obj.id, obj.updated_at), obj.updated_at)
+
+
+def list_validators(query, updated_col, *scope):
+    """
+    Validators for the rows matched by `query`, from one aggregate query.
+    :param scope: anything else the representation depends on (user scope, ...);
+                  the request's query string is always included
+    :return: (validators, row count) so callers can reuse the count
+    """
+    latest, count = query.with_entities(func.max(updated_col), func.count()).order_by(None).one()
+    args = sorted(request.args.items(multi=True))
+    return Validators(make_etag(updated_col.class_.__tablename__, latest, count, args, *scope)), count
+
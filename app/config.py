@@ -20,4 +20,116 @@ class Config:
     PERMANENT_SESSION_LIFETIME = int(os.environ.get('PERMANENT_SESSION_LIFETIME', '3600'))
     
     WTF_CSRF_SECRET_KEY = SECRET_KEY
-    WTF_CSRF_TIME_LIMIT = None
\ No newline at end of file
+    WTF_CSRF_TIME_LIMIT = None
+
+    # Cross-request cache of the logged-in user/tenant/studio (seconds; 0 disables)
+    CURRENT_USER_CACHE_TTL = int(os.environ.get('CURRENT_USER_CACHE_TTL', '0'))
+    CURRENT_USER_CACHE_SIZE = int(os.environ.get('CURRENT_USER_CACHE_SIZE', '1024'))
+
+    # Customer search backend: auto | trigram (PostgreSQL) | fts5 (SQLite) | ngram | ilike
+    CUSTOMER_SEARCH_BACKEND = os.environ.get('CUSTOMER_SEARCH_BACKEND', 'auto')
+    CUSTOMER_SEARCH_MAX_RESULTS = int(os.environ.get('CUSTOMER_SEARCH_MAX_RESULTS', '1000'))
+    NGRAM_INDEX_TTL = int(os.environ.get('NGRAM_INDEX_TTL', '300'))
+
+    # Bulk customer import/export
+    BULK_IMPORT_CHUNK_SIZE = int(os.environ.get('BULK_IMPORT_CHUNK_SIZE', '1000'))
+    BULK_EXPORT_BATCH_SIZE = int(os.environ.get('BULK_EXPORT_BATCH_SIZE', '1000'))
+
+    # Use orjson for JSON responses when it is installed
+    JSON_FAST_ENCODER = os.environ.get('JSON_FAST_ENCODER', 'true').lower() == 'true'
+
+    # Password hashing: 'pbkdf2:sha256' or 'bcrypt'; older hashes are upgraded on login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+    PASSWORD_PBKDF2_ITERATIONS = int(os.environ.get('PASSWORD_PBKDF2_ITERATIONS', '260000'))
+    PASSWORD_BCRYPT_ROUNDS = int(os.environ.get('PASSWORD_BCRYPT_ROUNDS', '12'))
+    # Process pool for hashing (0 runs inline) and the queue depth before answering 503
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '0'))
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', '32'))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', '10'))
+
+    # Reports: daily opening hours used as occupancy capacity, and the longest allowed range
+    REPORTS_OPEN_HOUR = int(os.environ.get('REPORTS_OPEN_HOUR', '0'))
+    REPORTS_CLOSE_HOUR = int(os.environ.get('REPORTS_CLOSE_HOUR', '24'))
+    REPORTS_MAX_RANGE_DAYS = int(os.environ.get('REPORTS_MAX_RANGE_DAYS', '731'))
+    # Read whole past days from booking_daily_rollups instead of raw bookings
+    REPORTS_USE_ROLLUPS = os.environ.get('REPORTS_USE_ROLLUPS', 'true').lower() == 'true'
+    # Demand forecast: days of history fitted by default, and the longest horizon
+    FORECAST_HISTORY_DAYS = int(os.environ.get('FORECAST_HISTORY_DAYS', '182'))
+    FORECAST_MAX_HORIZON_DAYS = int(os.environ.get('FORECAST_MAX_HORIZON_DAYS', '90'))
+
+    # Free-slot finder: longest searchable range and booking rows fetched per batch
+    ROOM_SLOTS_MAX_RANGE_DAYS = int(os.environ.get('ROOM_SLOTS_MAX_RANGE_DAYS', '366'))
+    ROOM_SLOTS_BATCH_SIZE = int(os.environ.get('ROOM_SLOTS_BATCH_SIZE', '5000'))
+
+    # Recurring bookings: Booking rows are created this far ahead, series may span
+    # at most BOOKING_SERIES_MAX_DAYS, and conflict responses list this many overlaps
+    BOOKING_SERIES_HORIZON_DAYS = int(os.environ.get('BOOKING_SERIES_HORIZON_DAYS', '90'))
+    BOOKING_SERIES_MAX_DAYS = int(os.environ.get('BOOKING_SERIES_MAX_DAYS', '3660'))
+    BOOKING_SERIES_CONFLICT_LIMIT = int(os.environ.get('BOOKING_SERIES_CONFLICT_LIMIT', '100'))
+
+    # Prometheus request metrics at /api/metrics; set METRICS_TOKEN to require a bearer token
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # Development aid: log statements repeated this many times in one request (0 disables)
+    QUERY_REPEAT_LOG_THRESHOLD = int(os.environ.get('QUERY_REPEAT_LOG_THRESHOLD', '0'))
+
+    # Response compression (gzip, or brotli when installed) for text bodies of at least COMPRESS_MIN_SIZE bytes
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'true').lower() == 'true'
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', '500'))
+    COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', '6'))
+    COMPRESS_BR_QUALITY = int(os.environ.get('COMPRESS_BR_QUALITY', '4'))
+    # Serve `flask assets-build` output (app/static/dist) when its manifest exists
+    STATIC_FINGERPRINTS = os.environ.get('STATIC_FINGERPRINTS', 'true').lower() == 'true'
+
+    # Read-through cache for Tenant/Studio/Room rows: none | memory (per process) | redis (shared)
+    ROW_CACHE_BACKEND = os.environ.get('ROW_CACHE_BACKEND', 'none')
+    ROW_CACHE_TTL = int(os.environ.get('ROW_CACHE_TTL', '60'))
+    ROW_CACHE_SIZE = int(os.environ.get('ROW_CACHE_SIZE', '4096'))
+    ROW_CACHE_REDIS_URL = os.environ.get('ROW_CACHE_REDIS_URL', os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+
+    # Rate limits ('count/seconds', sliding window) for login, registration and validation;
+    # the tenant quota is multiplied per plan. Backend: memory (one node) | redis (cluster)
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+    RATE_LIMIT_REDIS_URL = os.environ.get('RATE_LIMIT_REDIS_URL', os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+    RATE_LIMIT_LOGIN_IP = os.environ.get('RATE_LIMIT_LOGIN_IP', '30/60')
+    RATE_LIMIT_LOGIN_EMAIL = os.environ.get('RATE_LIMIT_LOGIN_EMAIL', '10/300')
+    RATE_LIMIT_REGISTER_IP = os.environ.get('RATE_LIMIT_REGISTER_IP', '20/3600')
+    RATE_LIMIT_REGISTER_EMAIL = os.environ.get('RATE_LIMIT_REGISTER_EMAIL', '10/300')
+    RATE_LIMIT_VALIDATE_IP = os.environ.get('RATE_LIMIT_VALIDATE_IP', '120/60')
+    RATE_LIMIT_TENANT = os.environ.get('RATE_LIMIT_TENANT', '300/60')
+    RATE_LIMIT_PLAN_MULTIPLIERS = os.environ.get('RATE_LIMIT_PLAN_MULTIPLIERS', 'free=1,basic=2,premium=5,enterprise=20')
+
+    # Background jobs: JOBS_EXECUTOR = thread (in-process pool) | celery (JOBS_BROKER_URL) | eager (inline).
+    # Results are kept in the jobs table and JOBS_RESULT_DIR (default: <instance>/jobs) for JOBS_RESULT_TTL seconds
+    JOBS_EXECUTOR = os.environ.get('JOBS_EXECUTOR', 'thread')
+    JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS', '2'))
+    JOBS_BROKER_URL = os.environ.get('JOBS_BROKER_URL', os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+    JOBS_RESULT_DIR = os.environ.get('JOBS_RESULT_DIR', '')
+    JOBS_RESULT_TTL = int(os.environ.get('JOBS_RESULT_TTL', str(7 * 24 * 3600)))
+    # Customer imports larger than this run as a background job
+    JOBS_IMPORT_ASYNC_BYTES = int(os.environ.get('JOBS_IMPORT_ASYNC_BYTES', str(1024 * 1024)))
+
+    # Live booking/customer events over SSE (/api/tenants/events): LIVE_BACKEND = memory (one process) |
+    # redis (pub/sub across workers) | none. Each client buffers LIVE_QUEUE_SIZE events before the oldest are dropped
+    LIVE_BACKEND = os.environ.get('LIVE_BACKEND', 'memory')
+    LIVE_REDIS_URL = os.environ.get('LIVE_REDIS_URL', os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+    LIVE_REDIS_CHANNEL = os.environ.get('LIVE_REDIS_CHANNEL', 'studio-manager:live')
+    # Publishing to Redis is opt-in: without it writes pay nothing for live events
+    LIVE_REDIS_PUBLISH = os.environ.get('LIVE_REDIS_PUBLISH', 'false').lower() == 'true'
+    LIVE_QUEUE_SIZE = int(os.environ.get('LIVE_QUEUE_SIZE', '256'))
+    LIVE_HEARTBEAT = int(os.environ.get('LIVE_HEARTBEAT', '15'))
+    LIVE_STREAM_MAX_SECONDS = int(os.environ.get('LIVE_STREAM_MAX_SECONDS', '300'))
+
+    # Book the next waitlisted customer when a confirmed booking is cancelled, moved or deleted
+    WAITLIST_AUTO_PROMOTE = os.environ.get('WAITLIST_AUTO_PROMOTE', 'true').lower() == 'true'
+
+    # Customer analytics (/api/customers/analytics): per-tenant stats cached per process for
+    # CUSTOMER_ANALYTICS_TTL seconds (0 disables the cache); churn after CUSTOMER_CHURN_DAYS without a
+    # booking, or CUSTOMER_CHURN_GAP_FACTOR x the customer's usual gap; value projected CUSTOMER_LTV_HORIZON_DAYS
+    CUSTOMER_ANALYTICS_TTL = int(os.environ.get('CUSTOMER_ANALYTICS_TTL', '300'))
+    CUSTOMER_ANALYTICS_CACHE_SIZE = int(os.environ.get('CUSTOMER_ANALYTICS_CACHE_SIZE', '256'))
+    CUSTOMER_CHURN_DAYS = int(os.environ.get('CUSTOMER_CHURN_DAYS', '90'))
+    CUSTOMER_CHURN_GAP_FACTOR = float(os.environ.get('CUSTOMER_CHURN_GAP_FACTOR', '3'))
+    CUSTOMER_LTV_HORIZON_DAYS = int(os.environ.get('CUSTOMER_LTV_HORIZON_DAYS', '365'))
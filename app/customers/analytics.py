@@ -0,0 +1,257 @@
+# Customer analytics (RFM segmentation, lifetime value, churn risk)
+"""
+Recency, frequency and monetary (RFM) scores, lifetime value and churn-risk
+flags for every customer of a tenant.
+
+Per-customer booking stats come from one grouped query: customers LEFT JOIN
+their reported (confirmed) bookings, GROUP BY customer. The stats are the
+booking count, the first and last booking start, and the spend. Spend is
+valued like the reports and the customers' total_spend
+(reports.rollups.booking_value): bookings without a total_amount count at
+the room's hourly_rate. Upcoming bookings count too, so a customer with a
+booking ahead has a recency of zero. Scores are computed from these stats
+with pandas:
+- r, f, m: quintiles (1-5, 5 best) of recency, booking count and spend over
+  the tenant's customers that have bookings. Ties share a score.
+- segment: a label derived from r and f (champions, loyal, ...).
+- churn_risk: no booking for CUSTOMER_CHURN_DAYS, or for
+  CUSTOMER_CHURN_GAP_FACTOR times the customer's usual gap between
+  bookings, whichever is longer.
+- predicted_value: spend per day of tenure over the next
+  CUSTOMER_LTV_HORIZON_DAYS, or zero at churn risk. lifetime_value is spend
+  plus predicted_value.
+
+The stats are cached per tenant and process. Session hooks record the
+customers whose bookings (or own rows) a transaction changed. After it
+commits, the next read re-runs the grouped query for those customers only
+and patches them into the cached frame. Room rate changes drop the tenant's
+stats. Writes made by other processes, and bulk statements, are picked up
+when the entry expires (CUSTOMER_ANALYTICS_TTL). Scores are kept with the
+stats frame they came from and recomputed when it changes, or after
+SCORE_TTL seconds so recency keeps up with the clock.
+"""
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .. import db
+from ..cache import LRUCache
+from ..history import previous
+from ..models import Booking, Customer, Room
+from ..reports.rollups import REPORTED_STATUSES, booking_value_expression
+
+STATS_COLUMNS = ['customer_id', 'studio_id', 'bookings', 'first_booking', 'last_booking', 'spend']
+SORT_KEYS = ('rfm', 'recency_days', 'bookings', 'spend', 'lifetime_value', 'predicted_value', 'last_booking',
+             'customer_id')
+NO_BOOKINGS = 'no_bookings'
+SEGMENTS = ('champions', 'loyal', 'potential_loyalists', 'new', 'at_risk', 'cant_lose', 'hibernating',
+            'needs_attention', NO_BOOKINGS)
+QUANTILES = 5
+# Seconds a tenant's scores are reused while its stats are unchanged (recency moves with the clock)
+SCORE_TTL = 60
+# Tenure below this many days is stretched to it, so one recent booking does not project a huge value
+MIN_TENURE_DAYS = 30
+
+_CHANGES_KEY = '_customer_analytics_changes'
+
+
+def _stats_query(tenant_id, customer_ids=None):
+    """(customer_id, studio_id, bookings, first_booking, last_booking, spend) per customer."""
+    stmt = sa.select(
+        Customer.id,
+        Customer.studio_id,
+        sa.func.count(Booking.id),
+        sa.func.min(Booking.start_time),
+        sa.func.max(Booking.start_time),
+        sa.func.coalesce(sa.func.sum(booking_value_expression()), 0),
+    ).select_from(Customer).outerjoin(Booking, sa.and_(
+        Booking.tenant_id == Customer.tenant_id,
+        Booking.customer_id == Customer.id,
+        Booking.status.in_(REPORTED_STATUSES),
+    )).outerjoin(Room, Room.id == Booking.room_id).where(
+        Customer.tenant_id == tenant_id,
+    ).group_by(Customer.id, Customer.studio_id)
+    if customer_ids is not None:
+        stmt = stmt.where(Customer.id.in_(customer_ids))
+    return stmt
+
+
+def load_stats(tenant_id, customer_ids=None):
+    """Run the grouped query; a DataFrame of STATS_COLUMNS indexed by customer_id."""
+    rows = db.session.execute(_stats_query(tenant_id, customer_ids)).all()
+    frame = pd.DataFrame(rows, columns=STATS_COLUMNS)
+    for col in ('first_booking', 'last_booking'):
+        frame[col] = pd.to_datetime(frame[col])
+    frame['bookings'] = frame['bookings'].astype(np.int64)
+    frame['spend'] = frame['spend'].astype(float)
+    return frame.set_index('customer_id')
+
+
+def _quantile_scores(values):
+    """1..QUANTILES by rank (higher values score higher, ties share a score)."""
+    return np.clip(np.ceil(values.rank(method='average', pct=True) * QUANTILES), 1, QUANTILES).astype(np.int64)
+
+
+def score(stats, now=None, churn_days=90, churn_gap_factor=3.0, horizon_days=365):
+    """
+    RFM scores, segment, churn risk and value for each row of `stats` (see load_stats).
+    :return: DataFrame indexed by customer_id
+    """
+    now = pd.Timestamp(now or datetime.utcnow())
+    frame = stats.copy()
+    active = frame['bookings'] > 0
+    day = pd.Timedelta(days=1)
+    recency = ((now - frame['last_booking']) / day).clip(lower=0)
+    frame['recency_days'] = recency
+    for col in ('r', 'f', 'm'):
+        frame[col] = 0
+    if active.any():
+        frame.loc[active, 'r'] = _quantile_scores(-recency[active])
+        frame.loc[active, 'f'] = _quantile_scores(frame.loc[active, 'bookings'])
+        frame.loc[active, 'm'] = _quantile_scores(frame.loc[active, 'spend'])
+    frame['rfm'] = frame['r'] * 100 + frame['f'] * 10 + frame['m']
+
+    r, f = frame['r'], frame['f']
+    frame['segment'] = np.select([
+        ~active,
+        (r >= 4) & (f >= 4),
+        (r >= 3) & (f >= 4),
+        (r >= 4) & (f >= 2),
+        r >= 4,
+        (r <= 2) & (f == 5),
+        (r <= 2) & (f >= 3),
+        r <= 2,
+    ], [NO_BOOKINGS, 'champions', 'loyal', 'potential_loyalists', 'new', 'cant_lose', 'at_risk', 'hibernating'],
+        default='needs_attention')
+
+    span = (frame['last_booking'] - frame['first_booking']) / day
+    usual_gap = span / (frame['bookings'] - 1).where(frame['bookings'] > 1)
+    threshold = np.fmax(churn_days, churn_gap_factor * usual_gap)
+    frame['churn_risk'] = active & (recency > threshold)
+
+    tenure = ((now - frame['first_booking']) / day).clip(lower=MIN_TENURE_DAYS)
+    predicted = (frame['spend'] / tenure * horizon_days).where(active & ~frame['churn_risk'], 0.0)
+    frame['predicted_value'] = predicted.fillna(0.0)
+    frame['lifetime_value'] = frame['spend'] + frame['predicted_value']
+    return frame
+
+
+class CustomerAnalytics:
+    """Per-tenant stats frames with incremental refresh of changed customers."""
+
+    def __init__(self, maxsize=256, ttl=300, score_ttl=SCORE_TTL):
+        self._frames = LRUCache(maxsize=maxsize, ttl=ttl)
+        # (stats frame, scores): reused while the stats are unchanged and recency has not drifted far
+        self._scores = LRUCache(maxsize=maxsize, ttl=score_ttl)
+        self._dirty = {}  # tenant_id -> customer ids changed since its frame was loaded
+        self._lock = threading.Lock()
+
+    def stats(self, tenant_id):
+        """The tenant's stats, loading them or refreshing changed customers as needed."""
+        frame = self._frames.get(tenant_id)
+        with self._lock:
+            # Reset before querying: commits made meanwhile stay recorded for the next read
+            changed = self._dirty.get(tenant_id)
+            self._dirty[tenant_id] = set()
+        if frame is None or changed is None:
+            frame = load_stats(tenant_id)
+        elif changed:
+            fresh = load_stats(tenant_id, sorted(changed))
+            frame = pd.concat([frame.drop(index=list(changed), errors='ignore'), fresh])
+        else:
+            return frame
+        self._frames.set(tenant_id, frame)
+        return frame
+
+    def scores(self, tenant_id, scorer):
+        """`scorer(stats)` for the tenant's current stats, computed once per stats frame."""
+        stats = self.stats(tenant_id)
+        cached = self._scores.get(tenant_id)
+        if cached is not None and cached[0] is stats:
+            return cached[1]
+        scored = scorer(stats)
+        self._scores.set(tenant_id, (stats, scored))
+        return scored
+
+    def invalidate(self, customers, tenants=()):
+        """Mark customers ((tenant_id, customer_id) pairs) changed and drop whole tenants."""
+        with self._lock:
+            for tenant_id, customer_id in customers:
+                changed = self._dirty.get(tenant_id)
+                if changed is not None:
+                    changed.add(customer_id)
+            for tenant_id in tenants:
+                self._dirty.pop(tenant_id, None)
+        for tenant_id in tenants:
+            self._frames.delete(tenant_id)
+
+
+def _current():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('customer_analytics')
+
+
+def customer_scores(tenant_id):
+    """Scored customers of the tenant (see score), from the cached stats."""
+    config = current_app.config
+
+    def scorer(stats):
+        return score(stats, churn_days=config.get('CUSTOMER_CHURN_DAYS', 90),
+                     churn_gap_factor=config.get('CUSTOMER_CHURN_GAP_FACTOR', 3.0),
+                     horizon_days=config.get('CUSTOMER_LTV_HORIZON_DAYS', 365))
+
+    analytics = _current()
+    if analytics is None:
+        return scorer(load_stats(tenant_id))
+    return analytics.scores(tenant_id, scorer)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    if _current() is None:
+        return
+    changes = None
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Booking):
+            old_customer = previous(obj, ('customer_id',))['customer_id']
+            keys = {(obj.tenant_id, obj.customer_id), (obj.tenant_id, old_customer)}
+        elif isinstance(obj, Customer):
+            keys = {(obj.tenant_id, obj.id)}
+        elif isinstance(obj, Room) and obj in session.dirty:
+            keys = {(obj.tenant_id, None)}
+        else:
+            continue
+        if changes is None:
+            changes = session.info.setdefault(_CHANGES_KEY, set())
+        changes.update(keys)
+
+
+@event.listens_for(Session, 'after_commit')
+def _refresh_committed(session):
+    changes = session.info.pop(_CHANGES_KEY, None)
+    analytics = _current()
+    if changes and analytics is not None:
+        analytics.invalidate([key for key in changes if key[1] is not None],
+                             tenants={tenant_id for tenant_id, customer_id in changes if customer_id is None})
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop(_CHANGES_KEY, None)
+
+
+def init_app(app):
+    """Build the per-tenant cache (CUSTOMER_ANALYTICS_TTL=0 reads the database every time)."""
+    ttl = app.config.get('CUSTOMER_ANALYTICS_TTL', 300)
+    if ttl <= 0:
+        app.extensions.pop('customer_analytics', None)
+        return
+    app.extensions['customer_analytics'] = CustomerAnalytics(
+        maxsize=app.config.get('CUSTOMER_ANALYTICS_CACHE_SIZE', 256), ttl=ttl)
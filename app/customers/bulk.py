@@ -0,0 +1,226 @@
+# Bulk customer import/export
+"""
+Streaming CSV/NDJSON import and export for customers.
+
+Imports are parsed incrementally from the request stream and processed in
+chunks: one `IN` query per chunk checks the tenant email constraint, rows are
+inserted with a single executemany, and each chunk commits on its own so a
+bad row never rolls back earlier work. Exports iterate a server-side cursor
+and yield encoded rows, so memory stays flat regardless of tenant size.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+import sqlalchemy as sa
+
+from .. import db
+from ..models import Customer
+from ..serialization import serializer_for
+from .search import get_search_backend
+
+IMPORT_FIELDS = ('name', 'email', 'phone', 'notes', 'studio_id')
+EXPORT_FIELDS = ('id', 'tenant_id', 'studio_id', 'name', 'email', 'phone', 'notes', 'created_at', 'updated_at')
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class ImportFormatError(ValueError):
+    """Raised when a record cannot be decoded at all (as opposed to failing validation)."""
+
+
+def detect_format(content_type, explicit=None):
+    if explicit in FORMATS:
+        return explicit
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in ('text/csv', 'application/csv'):
+        return 'csv'
+    if content_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonlines'):
+        return 'ndjson'
+    return None
+
+
+def iter_records(stream, fmt):
+    """Yield (line_number, dict) pairs from a binary stream without reading it all."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_number, ImportFormatError('Invalid JSON')
+            continue
+        yield line_number, record if isinstance(record, dict) else ImportFormatError('Expected a JSON object')
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _clean(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _is_unique_violation(exc):
+    """True when an IntegrityError comes from a unique constraint (PostgreSQL 23505, SQLite UNIQUE)."""
+    orig = exc.orig
+    code = getattr(orig, 'pgcode', None) or getattr(orig, 'sqlstate', None)
+    return code == '23505' or 'UNIQUE constraint failed' in str(orig)
+
+
+def import_customers(records, tenant_id, default_studio_id, allowed_studio_ids=None,
+                     chunk_size=1000, max_errors=1000):
+    """
+    Insert customers from (line_number, record) pairs in chunked transactions.
+    :param allowed_studio_ids: studio ids rows may target; None forces default_studio_id
+    :return: dict with created/failed counts and per-row errors
+    """
+    created = failed = 0
+    errors = []
+    backend = get_search_backend()
+
+    def reject(line_number, row_errors):
+        nonlocal failed
+        failed += 1
+        if len(errors) < max_errors:
+            errors.append({"row": line_number, "errors": row_errors})
+
+    for chunk in _chunks(records, chunk_size):
+        candidates = []
+        seen = set()
+        for line_number, record in chunk:
+            if isinstance(record, Exception):
+                reject(line_number, {"record": [str(record)]})
+                continue
+            row = {field: _clean(record.get(field)) for field in IMPORT_FIELDS}
+            row_errors = {}
+            if not row['name']:
+                row_errors.setdefault('name', []).append('Name is required')
+            if not row['email']:
+                row_errors.setdefault('email', []).append('Email is required')
+            elif row['email'] in seen:
+                row_errors.setdefault('email', []).append('Duplicate email in import')
+
+            studio_id = default_studio_id
+            if row['studio_id'] and allowed_studio_ids is not None:
+                try:
+                    studio_id = int(row['studio_id'])
+                except ValueError:
+                    studio_id = None
+                if studio_id not in allowed_studio_ids:
+                    row_errors.setdefault('studio_id', []).append('Invalid studio')
+            elif studio_id is None:
+                # Users without a studio (e.g. the tenant admin) must name one per row
+                row_errors.setdefault('studio_id', []).append('Studio is required')
+
+            if row_errors:
+                reject(line_number, row_errors)
+                continue
+            seen.add(row['email'])
+            candidates.append((line_number, {
+                'tenant_id': tenant_id,
+                'studio_id': studio_id,
+                'name': row['name'],
+                'email': row['email'],
+                'phone': row['phone'],
+                'notes': row['notes'],
+            }))
+
+        if not candidates:
+            continue
+
+        # One round-trip per chunk for the (tenant_id, email) unique constraint
+        existing = {
+            email for (email,) in db.session.execute(
+                sa.select(Customer.email).where(
+                    Customer.tenant_id == tenant_id,
+                    Customer.email.in_([values['email'] for _, values in candidates]),
+                )
+            )
+        }
+        accepted = []
+        for line_number, values in candidates:
+            if values['email'] in existing:
+                reject(line_number, {"email": ['Email already exists']})
+            else:
+                accepted.append((line_number, values))
+        if not accepted:
+            continue
+
+        now = datetime.utcnow()
+        rows = [values for _, values in accepted]
+        for values in rows:
+            values['created_at'] = values['updated_at'] = now
+        try:
+            inserted = db.session.execute(
+                sa.insert(Customer).returning(Customer.id, Customer.tenant_id, Customer.name, Customer.email),
+                rows,
+            ).all()
+            backend.index(inserted)
+            db.session.commit()
+        except sa.exc.IntegrityError as exc:
+            db.session.rollback()
+            if not _is_unique_violation(exc):
+                raise
+            # A concurrent writer claimed one of the emails; report the chunk for retry
+            for line_number, values in accepted:
+                reject(line_number, {"email": ['Could not be imported due to a concurrent change, please retry']})
+            continue
+        created += len(inserted)
+
+    return {"created": created, "failed": failed, "errors": errors}
+
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat() + 'Z'
+    return value
+
+
+def export_customers(query_filter, fmt, batch_size=1000):
+    """
+    Yield encoded customer rows (with a CSV header when fmt is 'csv').
+    :param query_filter: callable applying tenant/studio restrictions to a select()
+    """
+    serializer = serializer_for(Customer)
+    fields = EXPORT_FIELDS if fmt == 'csv' else serializer.fields
+    stmt = query_filter(sa.select(*[getattr(Customer, f) for f in fields])).order_by(Customer.id)
+    # yield_per streams results (server-side cursor on PostgreSQL) instead of buffering them
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+
+    if fmt == 'csv':
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(EXPORT_FIELDS)
+        for partition in result.partitions():
+            for row in partition:
+                writer.writerow([_export_value(v) for v in row])
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+        yield buf.getvalue()
+    else:
+        encode = serializer.encode_row
+        for partition in result.partitions():
+            yield b''.join(encode(row) + b'\n' for row in partition)
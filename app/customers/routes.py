@@ -1,19 +1,49 @@
-﻿from flask import Blueprint, request, session
-from sqlalchemy import or_
+﻿from flask import Blueprint, Response, current_app, request, stream_with_context
 from datetime import datetime
-
-from .. import db
-from ..models import Customer, User
-from ..utils import make_response_payload
+from decimal import Decimal
+import os
+import shutil
+import uuid
+
+import pandas as pd
+
+from .. import db, jobs
+from ..models import Customer, Studio
+from ..utils import make_response_payload, get_current_user, parse_iso_datetime
+from ..conditional import list_validators, row_validators
+from ..pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_page
+from ..serialization import serializer_for
+from .search import get_search_backend
+from . import analytics, bulk
 
 customers_bp = Blueprint('customers_bp', __name__)
 
-
-def get_current_user():
-    user_id = session.get('user_id')
-    if not user_id:
-        return None
-    return User.query.get(user_id)
+# Columns backed by (tenant_id, <col>, id) indexes and usable with cursors. last_booking_at
+# has an index too but is NULL for customers without bookings, so it sorts with page=/per_page= only
+KEYSET_SORT_COLUMNS = ('name', 'email', 'created_at', 'updated_at', 'booking_count', 'total_spend', 'id')
+MAX_PER_PAGE = 200
+
+
+def _filter_by_stats(q, args):
+    """
+    Apply min_bookings, min_spend, last_booking_after and last_booking_before.
+    :raises ValueError: a malformed value
+    """
+    if 'min_bookings' in args:
+        q = q.filter(Customer.booking_count >= int(args['min_bookings']))
+    if 'min_spend' in args:
+        min_spend = Decimal(args['min_spend'])
+        if not min_spend.is_finite():
+            raise ValueError('min_spend must be a number')
+        q = q.filter(Customer.total_spend >= min_spend)
+    for param in ('last_booking_after', 'last_booking_before'):
+        if param in args:
+            when = parse_iso_datetime(args[param])
+            if when is None:
+                raise ValueError(f'{param} must be an ISO 8601 timestamp')
+            q = q.filter(Customer.last_booking_at >= when if param == 'last_booking_after'
+                         else Customer.last_booking_at < when)
+    return q
 
 
 @customers_bp.route('', methods=['GET'])
@@ -37,18 +67,32 @@ def list_customers():
         # No tenant - should not happen in SaaS
         return make_response_payload(False, message="Invalid user configuration"), 403
 
-    # Search
-    search = request.args.get('search')
+    # Filters on the maintained booking stats (see customers/stats.py)
+    try:
+        q = _filter_by_stats(q, request.args)
+    except (ValueError, ArithmeticError):
+        return make_response_payload(False, message="Invalid filter params"), 400
+
+    # max(updated_at) and count over the visible rows, keyed by the query string,
+    # answer an unchanged list with 304 before any row is loaded
+    validators, visible = list_validators(q, Customer.updated_at, user.tenant_id,
+                                 user.studio_id if user.role not in ['Admin', 'Studio Manager'] else None)
+    if validators.matches():
+        return validators.not_modified()
+
+    cursor_mode = 'cursor' in request.args
+
+    # Search (ranked by relevance unless an explicit sort is requested)
+    search = (request.args.get('search') or '').strip()
+    ranked = bool(search) and 'sort' not in request.args and not cursor_mode
     if search:
-        ilike = f"%{search}%"
-        q = q.filter(or_(Customer.name.ilike(ilike),
-                         Customer.email.ilike(ilike)))
+        q = get_search_backend().search(q, search, tenant_id=user.tenant_id, ranked=ranked)
 
     # Sort
     sort = request.args.get('sort', 'name')
     order = request.args.get('order', 'asc').lower()
-    sort_col = getattr(Customer, sort, Customer.name)
-    q = q.order_by(sort_col.desc() if order == 'desc' else sort_col.asc())
+    if order not in ('asc', 'desc'):
+        order = 'asc'
 
     # Pagination
     try:
@@ -57,8 +101,47 @@ def list_customers():
     except ValueError:
         return make_response_payload(False, message="Invalid pagination params"), 400
 
-    pag = q.paginate(page=page, per_page=per_page, error_out=False)
-    data = [c.to_dict() for c in pag.items]
+    # Cursor mode: seek on (sort col, id) without COUNT/OFFSET
+    if cursor_mode:
+        if sort not in KEYSET_SORT_COLUMNS:
+            sort = 'name'
+        sort_col = getattr(Customer, sort)
+        per_page = max(1, min(per_page, MAX_PER_PAGE))
+        cursor = request.args.get('cursor')
+        try:
+            after = decode_cursor(cursor, sort, order) if cursor else None
+        except InvalidCursor as e:
+            return make_response_payload(False, message=str(e)), 400
+
+        total = None
+        if request.args.get('include_total', 'false').lower() == 'true':
+            total = q.order_by(None).count() if search else visible
+
+        items, has_next = keyset_page(q, sort_col, Customer.id, order, after=after, limit=per_page)
+        last = items[-1] if items else None
+        meta = {
+            "total_count": total,
+            "per_page": per_page,
+            "has_next": has_next,
+            "has_prev": after is not None,
+            "cursor": cursor or None,
+            "next_cursor": encode_cursor(sort, order, getattr(last, sort), last.id) if has_next else None,
+        }
+        return validators.apply(make_response_payload(True, data=serializer_for(Customer).dumps_many(items), meta=meta))
+
+    sort_col = getattr(Customer, sort, Customer.name)
+    if ranked:
+        q = q.order_by(Customer.id)
+    elif order == 'desc':
+        q = q.order_by(sort_col.desc(), Customer.id.desc())
+    else:
+        q = q.order_by(sort_col.asc(), Customer.id.asc())
+
+    # Without a search filter the validators already counted the visible rows
+    pag = q.paginate(page=page, per_page=per_page, error_out=False, count=bool(search))
+    if not search:
+        pag.total = visible
+    data = serializer_for(Customer).dumps_many(pag.items)
     meta = {
         "total_count": pag.total,
         "page": pag.page,
@@ -67,6 +150,105 @@ def list_customers():
         "has_prev": pag.has_prev
     }
 
+    return validators.apply(make_response_payload(True, data=data, meta=meta))
+
+
+@customers_bp.route('/analytics', methods=['GET'])
+def customer_analytics():
+    """
+    RFM scores, segment, lifetime value and churn risk per visible customer.
+    Filters: segment (comma separated), churn_risk=true|false, studio_id, min_bookings.
+    Sort: sort=rfm|recency_days|bookings|spend|lifetime_value|predicted_value|last_booking, order=desc|asc.
+    """
+    user = get_current_user()
+    if not user:
+        return make_response_payload(False, message="Unauthorized"), 401
+
+    tenant_id = user.tenant_id
+    if not tenant_id:
+        if user.role != 'Admin':
+            return make_response_payload(False, message="Invalid user configuration"), 403
+        # Global admins pick the tenant explicitly
+        tenant_id = request.args.get('tenant_id', type=int)
+        if not tenant_id:
+            return make_response_payload(False, errors={"tenant_id": ["Tenant is required"]}), 400
+
+    errors = {}
+    sort = request.args.get('sort', 'rfm')
+    if sort not in analytics.SORT_KEYS:
+        errors['sort'] = ['Must be one of ' + ', '.join(analytics.SORT_KEYS)]
+    order = request.args.get('order', 'desc').lower()
+    if order not in ('asc', 'desc'):
+        errors['order'] = ['Must be asc or desc']
+    segments = [s for s in (request.args.get('segment') or '').split(',') if s]
+    if set(segments) - set(analytics.SEGMENTS):
+        errors['segment'] = ['Must be among ' + ', '.join(analytics.SEGMENTS)]
+    churn_risk = request.args.get('churn_risk', '').lower()
+    if churn_risk not in ('', 'true', 'false'):
+        errors['churn_risk'] = ['Must be true or false']
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = max(1, min(int(request.args.get('per_page', 25)), MAX_PER_PAGE))
+        min_bookings = int(request.args.get('min_bookings', 0))
+        studio_id = request.args.get('studio_id', type=int)
+    except ValueError:
+        errors['page'] = ['Invalid pagination params']
+    if errors:
+        return make_response_payload(False, errors=errors), 400
+
+    scores = analytics.customer_scores(tenant_id)
+    studio_scoped = user.tenant_id and user.role not in ['Admin', 'Studio Manager']
+    if studio_scoped:
+        studio_id = user.studio_id
+    if studio_scoped or studio_id is not None:
+        # As in list_customers, a studio-scoped user without a studio matches no customers
+        scores = scores[scores['studio_id'] == studio_id]
+    summary = scores['segment'].value_counts()
+    if segments:
+        scores = scores[scores['segment'].isin(segments)]
+    if churn_risk:
+        scores = scores[scores['churn_risk'] == (churn_risk == 'true')]
+    if min_bookings:
+        scores = scores[scores['bookings'] >= min_bookings]
+
+    ascending = order == 'asc'
+    ordered = scores.rename_axis('customer_id').reset_index().sort_values(
+        [sort, 'customer_id'], ascending=[ascending, ascending], na_position='last', kind='stable')
+    page_rows = ordered.iloc[(page - 1) * per_page:page * per_page]
+    names = dict(db.session.query(Customer.id, Customer.name).filter(
+        Customer.id.in_(page_rows['customer_id'].tolist())).all()) if len(page_rows) else {}
+
+    def when(value):
+        return value.isoformat() + 'Z' if not pd.isna(value) else None
+
+    data = [
+        {
+            "customer_id": int(row.customer_id),
+            "name": names.get(row.customer_id),
+            "studio_id": int(row.studio_id),
+            "segment": row.segment,
+            "r": int(row.r), "f": int(row.f), "m": int(row.m),
+            "rfm": f"{int(row.r)}{int(row.f)}{int(row.m)}",
+            "bookings": int(row.bookings),
+            "recency_days": round(float(row.recency_days), 1) if not pd.isna(row.recency_days) else None,
+            "first_booking": when(row.first_booking),
+            "last_booking": when(row.last_booking),
+            "spend": round(float(row.spend), 2),
+            "predicted_value": round(float(row.predicted_value), 2),
+            "lifetime_value": round(float(row.lifetime_value), 2),
+            "churn_risk": bool(row.churn_risk),
+        }
+        for row in page_rows.itertuples(index=False)
+    ]
+    total = len(ordered)
+    meta = {
+        "total_count": total,
+        "page": page,
+        "per_page": per_page,
+        "has_next": page * per_page < total,
+        "has_prev": page > 1,
+        "segments": {segment: int(summary.get(segment, 0)) for segment in analytics.SEGMENTS},
+    }
     return make_response_payload(True, data=data, meta=meta)
 
 
@@ -91,7 +273,10 @@ def get_customer(customer_id):
     else:
         return make_response_payload(False, message="Access denied"), 403
 
-    return make_response_payload(True, data=c.to_dict())
+    validators = row_validators(c)
+    if validators.matches():
+        return validators.not_modified()
+    return validators.apply(make_response_payload(True, data=c.to_dict()))
 
 
 @customers_bp.route('', methods=['POST'])
@@ -130,6 +315,8 @@ def create_customer():
         notes     = payload.get('notes')
     )
     db.session.add(new_customer)
+    db.session.flush()
+    get_search_backend().index([new_customer])
     db.session.commit()
 
     return make_response_payload(True,
@@ -167,6 +354,8 @@ def update_customer(customer_id):
     for field in ('name', 'email', 'phone', 'notes'):
         if field in payload:
             setattr(c, field, payload[field])
+    if 'name' in payload or 'email' in payload:
+        get_search_backend().index([c])
     db.session.commit()
 
     return make_response_payload(True,
@@ -186,7 +375,87 @@ def delete_customer(customer_id):
     if user.role != 'Admin' and c.studio_id != user.studio_id:
         return make_response_payload(False, message="Forbidden"), 403
 
+    get_search_backend().remove([c.id])
     db.session.delete(c)
     db.session.commit()
 
     return make_response_payload(True, message="Customer deleted successfully")
+
+
+@customers_bp.route('/import', methods=['POST'])
+def import_customers():
+    """
+    Bulk import customers from a CSV or NDJSON request body.
+    The body is parsed incrementally and inserted in chunked transactions;
+    rows that fail validation are reported individually.
+    Bodies over JOBS_IMPORT_ASYNC_BYTES (or ?async=true) are spooled to disk
+    and imported by a background job; the response is then 202 with the job.
+    """
+    user = get_current_user()
+    if not user:
+        return make_response_payload(False, message="Unauthorized"), 401
+    if not user.tenant_id:
+        return make_response_payload(False, message="Invalid user configuration"), 403
+
+    fmt = bulk.detect_format(request.content_type, request.args.get('format'))
+    if not fmt:
+        return make_response_payload(False, message="Send text/csv or application/x-ndjson"), 415
+
+    allowed_studios = None
+    if user.role in ['Admin', 'Studio Manager']:
+        allowed_studios = {sid for (sid,) in db.session.query(Studio.id).filter(Studio.tenant_id == user.tenant_id)}
+
+    chunk_size = current_app.config.get('BULK_IMPORT_CHUNK_SIZE', 1000)
+    threshold = current_app.config.get('JOBS_IMPORT_ASYNC_BYTES', 1048576)
+    if request.args.get('async', '').lower() in ('1', 'true') or (request.content_length or 0) > threshold:
+        upload = f'upload-{uuid.uuid4().hex}.{fmt}'
+        directory = jobs.result_dir()
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, upload), 'wb') as f:
+            shutil.copyfileobj(request.stream, f, 1024 * 1024)
+        job = jobs.submit('customers.import', {
+            "upload": upload, "fmt": fmt, "tenant_id": user.tenant_id, "default_studio_id": user.studio_id,
+            "allowed_studio_ids": sorted(allowed_studios) if allowed_studios is not None else None,
+            "chunk_size": chunk_size,
+        }, user=user)
+        return jobs.accepted(job, message="Import queued")
+
+    result = bulk.import_customers(
+        bulk.iter_records(request.stream, fmt),
+        tenant_id=user.tenant_id,
+        default_studio_id=user.studio_id,
+        allowed_studio_ids=allowed_studios,
+        chunk_size=chunk_size,
+    )
+    message = f"Imported {result['created']} customers"
+    if result['failed']:
+        message += f", {result['failed']} rows failed"
+    return make_response_payload(True, data=result, message=message)
+
+
+@customers_bp.route('/export', methods=['GET'])
+def export_customers():
+    """Stream all visible customers as CSV (default) or NDJSON."""
+    user = get_current_user()
+    if not user:
+        return make_response_payload(False, message="Unauthorized"), 401
+
+    if not user.tenant_id and user.role != 'Admin':
+        return make_response_payload(False, message="Invalid user configuration"), 403
+
+    fmt = request.args.get('format', 'csv')
+    if fmt not in bulk.FORMATS:
+        return make_response_payload(False, message="Unsupported export format"), 400
+
+    def scope(stmt):
+        if user.role == 'Admin' and not user.tenant_id:
+            return stmt
+        stmt = stmt.where(Customer.tenant_id == user.tenant_id)
+        if user.role not in ['Admin', 'Studio Manager']:
+            stmt = stmt.where(Customer.studio_id == user.studio_id)
+        return stmt
+
+    rows = bulk.export_customers(scope, fmt, batch_size=current_app.config.get('BULK_EXPORT_BATCH_SIZE', 1000))
+    response = Response(stream_with_context(rows), mimetype=bulk.FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename=customers.{fmt}'
+    return response
@@ -0,0 +1,295 @@
+# Customer search backends
+"""
+Pluggable, index-backed customer search.
+
+Backends (CUSTOMER_SEARCH_BACKEND):
+- 'trigram': PostgreSQL pg_trgm GIN indexes accelerate ILIKE '%term%'; ranked by similarity()
+- 'fts5':    SQLite FTS5 virtual table with the trigram tokenizer; ranked by bm25()
+- 'ngram':   in-process trigram inverted index per tenant, built lazily from the database
+- 'ilike':   the original unindexed ILIKE scan (no ranking)
+- 'auto':    pick trigram/fts5 from the database dialect, falling back to ngram
+
+Routes call `index()`/`remove()` on create/update/delete so backends that keep
+their own index stay in sync; database-maintained indexes treat them as no-ops.
+"""
+import threading
+import time
+from collections import defaultdict
+
+import sqlalchemy as sa
+from flask import current_app
+from sqlalchemy import or_
+
+from .. import db
+from ..models import Customer
+
+FTS_TABLE = 'customers_fts'
+
+# Terms shorter than a trigram cannot use any of the indexes
+MIN_INDEXED_TERM = 3
+
+
+def _trigrams(text):
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _like_filter(query, term):
+    ilike = f"%{term}%"
+    return query.filter(or_(Customer.name.ilike(ilike), Customer.email.ilike(ilike)))
+
+
+class IlikeBackend:
+    """Unindexed substring match; the baseline every other backend falls back to."""
+
+    name = 'ilike'
+
+    def search(self, query, term, tenant_id=None, ranked=True):
+        return _like_filter(query, term)
+
+    def index(self, customers):
+        pass
+
+    def remove(self, customer_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class TrigramBackend(IlikeBackend):
+    """PostgreSQL pg_trgm: the GIN indexes serve ILIKE directly, similarity() ranks."""
+
+    name = 'trigram'
+
+    def search(self, query, term, tenant_id=None, ranked=True):
+        query = _like_filter(query, term)
+        if ranked:
+            score = sa.func.greatest(sa.func.similarity(Customer.name, term),
+                                     sa.func.similarity(Customer.email, term))
+            query = query.order_by(score.desc())
+        return query
+
+
+class Fts5Backend(IlikeBackend):
+    """SQLite FTS5 table keyed by customer id, kept in sync from the routes."""
+
+    name = 'fts5'
+
+    def search(self, query, term, tenant_id=None, ranked=True):
+        if len(term) < MIN_INDEXED_TERM:
+            return _like_filter(query, term)
+        fts = sa.table(FTS_TABLE, sa.column('rowid'), sa.column('tenant_id'))
+        match_expr = '"' + term.replace('"', '""') + '"'
+        conditions = [sa.text(f"{FTS_TABLE} MATCH :fts_term").bindparams(fts_term=match_expr)]
+        if tenant_id is not None:
+            conditions.append(fts.c.tenant_id == tenant_id)
+        hits = (sa.select(fts.c.rowid.label('customer_id'),
+                          sa.literal_column(f"bm25({FTS_TABLE}, 10.0, 1.0)").label('score'))
+                .select_from(fts).where(*conditions).subquery())
+        query = query.join(hits, hits.c.customer_id == Customer.id)
+        if ranked:
+            # bm25() is lower-is-better
+            query = query.order_by(hits.c.score.asc())
+        return query
+
+    def index(self, customers):
+        rows = [{"id": c.id, "tenant_id": c.tenant_id, "name": c.name or '', "email": c.email or ''}
+                for c in customers]
+        if not rows:
+            return
+        self.remove([r["id"] for r in rows])
+        db.session.execute(
+            sa.text(f"INSERT INTO {FTS_TABLE} (rowid, tenant_id, name, email) VALUES (:id, :tenant_id, :name, :email)"),
+            rows,
+        )
+
+    def remove(self, customer_ids):
+        ids = list(customer_ids)
+        if ids:
+            db.session.execute(sa.text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), [{"id": i} for i in ids])
+
+    def rebuild(self):
+        db.session.execute(sa.text(f"DELETE FROM {FTS_TABLE}"))
+        db.session.execute(sa.text(
+            f"INSERT INTO {FTS_TABLE} (rowid, tenant_id, name, email) SELECT id, tenant_id, name, email FROM customers"
+        ))
+
+
+class _TenantIndex:
+    __slots__ = ('postings', 'docs', 'built_at')
+
+    def __init__(self):
+        self.postings = defaultdict(set)
+        self.docs = {}
+        self.built_at = time.monotonic()
+
+    def add(self, customer_id, name, email):
+        self.discard(customer_id)
+        name, email = (name or '').lower(), (email or '').lower()
+        self.docs[customer_id] = (name, email)
+        for gram in _trigrams(name) | _trigrams(email):
+            self.postings[gram].add(customer_id)
+
+    def discard(self, customer_id):
+        doc = self.docs.pop(customer_id, None)
+        if doc is None:
+            return
+        for gram in _trigrams(doc[0]) | _trigrams(doc[1]):
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.discard(customer_id)
+                if not ids:
+                    del self.postings[gram]
+
+    def query(self, term, limit):
+        term = term.lower()
+        grams = sorted(_trigrams(term), key=lambda g: len(self.postings.get(g, ())))
+        if not grams:
+            return []
+        candidates = set(self.postings.get(grams[0], ()))
+        for gram in grams[1:]:
+            if not candidates:
+                break
+            candidates &= self.postings.get(gram, set())
+
+        scored = []
+        for customer_id in candidates:
+            name, email = self.docs[customer_id]
+            # Trigram hits can be false positives; confirm the substring like ILIKE would
+            score = max(_substring_score(name, term) * 2, _substring_score(email, term))
+            if score:
+                scored.append((-score, customer_id))
+        scored.sort()
+        return [customer_id for _, customer_id in scored[:limit]]
+
+
+def _substring_score(text, term):
+    pos = text.find(term)
+    if pos < 0:
+        return 0
+    if text == term:
+        return 4
+    if pos == 0:
+        return 3
+    if not text[pos - 1].isalnum():
+        return 2  # word start
+    return 1
+
+
+class NgramBackend(IlikeBackend):
+    """
+    In-process trigram inverted index, one per tenant.
+    Built lazily on first search and refreshed after NGRAM_INDEX_TTL seconds so
+    writes made by other workers eventually become visible.
+    """
+
+    name = 'ngram'
+
+    def __init__(self, max_results=1000, ttl=300):
+        self.max_results = max_results
+        self.ttl = ttl
+        self._tenants = {}
+        self._lock = threading.Lock()
+
+    def _tenant_index(self, tenant_id):
+        with self._lock:
+            idx = self._tenants.get(tenant_id)
+            if idx is not None and (not self.ttl or time.monotonic() - idx.built_at < self.ttl):
+                return idx
+        idx = _TenantIndex()
+        rows = db.session.query(Customer.id, Customer.name, Customer.email).filter(Customer.tenant_id == tenant_id)
+        for customer_id, name, email in rows:
+            idx.add(customer_id, name, email)
+        with self._lock:
+            self._tenants[tenant_id] = idx
+        return idx
+
+    def search(self, query, term, tenant_id=None, ranked=True):
+        if tenant_id is None or len(term) < MIN_INDEXED_TERM:
+            return _like_filter(query, term)
+        ids = self._tenant_index(tenant_id).query(term, self.max_results)
+        if not ids:
+            return query.filter(sa.false())
+        query = query.filter(Customer.id.in_(ids))
+        if ranked:
+            # Same tiers as _substring_score, evaluated only on the candidate rows;
+            # a per-id CASE over hundreds of ids costs more than the search itself
+            name, email, needle = sa.func.lower(Customer.name), sa.func.lower(Customer.email), term.lower()
+            tier = sa.case(
+                (name == needle, 0),
+                (name.startswith(needle, autoescape=True), 1),
+                (name.contains(' ' + needle, autoescape=True), 2),
+                (email.startswith(needle, autoescape=True), 3),
+                (name.contains(needle, autoescape=True), 4),
+                else_=5,
+            )
+            query = query.order_by(tier)
+        return query
+
+    def index(self, customers):
+        with self._lock:
+            for c in customers:
+                idx = self._tenants.get(c.tenant_id)
+                if idx is not None:
+                    idx.add(c.id, c.name, c.email)
+
+    def remove(self, customer_ids):
+        with self._lock:
+            for idx in self._tenants.values():
+                for customer_id in customer_ids:
+                    idx.discard(customer_id)
+
+    def rebuild(self):
+        with self._lock:
+            self._tenants.clear()
+
+
+def fts5_available(connection):
+    # The trigram tokenizer needs SQLite 3.34+
+    if connection.dialect.name != 'sqlite' or connection.dialect.dbapi.sqlite_version_info < (3, 34):
+        return False
+    options = {row[0] for row in connection.exec_driver_sql('PRAGMA compile_options')}
+    return 'ENABLE_FTS5' in options
+
+
+def _create_backend(app):
+    choice = app.config.get('CUSTOMER_SEARCH_BACKEND', 'auto')
+    if choice == 'auto':
+        with db.engine.connect() as conn:
+            if conn.dialect.name == 'postgresql':
+                choice = 'trigram'
+            elif fts5_available(conn):
+                choice = 'fts5'
+            else:
+                choice = 'ngram'
+    if choice == 'ngram':
+        return NgramBackend(max_results=app.config.get('CUSTOMER_SEARCH_MAX_RESULTS', 1000),
+                            ttl=app.config.get('NGRAM_INDEX_TTL', 300))
+    backends = {'trigram': TrigramBackend, 'fts5': Fts5Backend, 'ilike': IlikeBackend}
+    if choice not in backends:
+        raise ValueError(f"Unknown CUSTOMER_SEARCH_BACKEND: {choice}")
+    return backends[choice]()
+
+
+def get_search_backend():
+    """Return the configured backend for the current app (created on first use)."""
+    app = current_app._get_current_object()
+    backend = app.extensions.get('customer_search')
+    if backend is None:
+        backend = app.extensions['customer_search'] = _create_backend(app)
+    return backend
+
+
+def _sqlite_fts5(ddl, target, bind, **kw):
+    return fts5_available(bind)
+
+
+# create_all()/drop_all() manage the FTS table alongside the mapped tables on SQLite
+sa.event.listen(db.metadata, 'after_create', sa.DDL(
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+    "USING fts5(tenant_id UNINDEXED, name, email, tokenize='trigram')"
+).execute_if(callable_=_sqlite_fts5))
+sa.event.listen(db.metadata, 'before_drop', sa.DDL(
+    f"DROP TABLE IF EXISTS {FTS_TABLE}"
+).execute_if(callable_=_sqlite_fts5))
@@ -0,0 +1,198 @@
+# Denormalized customer booking stats (incremental maintenance and backfill)
+"""
+Keeps customers.booking_count, last_booking_at and total_spend in step with
+the bookings table, so customer lists sort and filter on them through
+(tenant_id, <column>, id) indexes instead of aggregating bookings per request.
+
+Only confirmed bookings (REPORTED_STATUSES) count. total_spend adds their
+value as the reports and customer analytics define it (booking_value:
+total_amount, or the booked hours at the room's hourly_rate when unpriced).
+last_booking_at is their latest start, which may be an upcoming booking.
+
+Mapper events apply each booking's change inside the flush that writes it,
+so the stats commit or roll back with the booking. Counts and spend move by
+difference; a room rate change re-sums the spend of customers with unpriced
+bookings in that room. The latest start only grows on the way in. When the booking
+holding it stops counting, the customer's bookings are re-read through
+ix_bookings_tenant_customer_start. Each change bumps the customer's
+updated_at, so cached customer lists (ETags) see the new values.
+
+Bulk statements (`session.execute(insert(Booking), rows)`) bypass mapper
+events: callers pass the rows to `apply_rows()`, or run `flask customer-stats`
+afterwards.
+"""
+from decimal import Decimal
+
+import sqlalchemy as sa
+from sqlalchemy import event
+
+from .. import db
+from ..history import previous
+from ..models import Booking, Customer, Room
+from ..reports.rollups import REPORTED_STATUSES, booking_value, booking_value_expression
+
+TRACKED_COLUMNS = ('tenant_id', 'customer_id', 'room_id', 'start_time', 'end_time', 'status', 'total_amount')
+
+
+def _counts(values):
+    return bool(values) and values['customer_id'] is not None and values['status'] in REPORTED_STATUSES
+
+
+def _room_rates(connection, states):
+    """{room_id: hourly_rate} for the rooms of the unpriced bookings among `states`."""
+    room_ids = {values['room_id'] for values in states if _counts(values) and values['total_amount'] is None}
+    if not room_ids:
+        return {}
+    return dict(connection.execute(sa.select(Room.id, Room.hourly_rate).where(Room.id.in_(room_ids))).all())
+
+
+def _contribution(values, rates):
+    """(customer_id, start_time, amount) for a booking's state, or None if it does not count."""
+    if not _counts(values):
+        return None
+    amount = booking_value(values['total_amount'], values['start_time'], values['end_time'],
+                           rates.get(values['room_id']))
+    return values['customer_id'], values['start_time'], amount
+
+
+def _accumulate(changes, values, sign, rates):
+    contribution = _contribution(values, rates)
+    if contribution is None:
+        return
+    customer_id, start, amount = contribution
+    change = changes.setdefault(customer_id, {'count': 0, 'spend': Decimal('0'), 'added': None, 'removed': None})
+    change['count'] += sign
+    change['spend'] += sign * amount
+    key = 'added' if sign > 0 else 'removed'
+    if change[key] is None or start > change[key]:
+        change[key] = start
+
+
+def _latest_start():
+    """Correlated subquery: the latest counted booking start of the customer being updated."""
+    table = Customer.__table__
+    return sa.select(sa.func.max(Booking.start_time)).where(
+        Booking.tenant_id == table.c.tenant_id,
+        Booking.customer_id == table.c.id,
+        Booking.status.in_(REPORTED_STATUSES),
+    ).scalar_subquery()
+
+
+def _flush_changes(connection, changes):
+    table = Customer.__table__
+    for customer_id, change in changes.items():
+        added, removed = change['added'], change['removed']
+        if added == removed and not change['count'] and not change['spend']:
+            continue
+        values = {'booking_count': table.c.booking_count + change['count'],
+                  'total_spend': table.c.total_spend + change['spend']}
+        last = table.c.last_booking_at
+        if removed is not None:
+            # Bookings are written before these events run, so the re-read already sees `added`
+            whens = [(sa.or_(last.is_(None), last <= removed), _latest_start())]
+            if added is not None:
+                whens.append((last < added, added))
+            values['last_booking_at'] = sa.case(*whens, else_=last)
+        elif added is not None:
+            values['last_booking_at'] = sa.case((sa.or_(last.is_(None), last < added), added), else_=last)
+        connection.execute(table.update().where(table.c.id == customer_id).values(values))
+
+
+def apply_change(connection, old, new):
+    """
+    Move a booking's contribution from state `old` to state `new` (dicts of the
+    tracked columns, or None for insert/delete).
+    """
+    changes = {}
+    rates = _room_rates(connection, (old, new))
+    _accumulate(changes, old, -1, rates)
+    _accumulate(changes, new, 1, rates)
+    _flush_changes(connection, changes)
+
+
+def apply_rows(connection, rows, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) the contributions of bookings written with
+    bulk statements, after the statement ran; one UPDATE per affected customer.
+    :param rows: dicts holding at least the tracked booking columns
+    """
+    changes = {}
+    rates = _room_rates(connection, rows)
+    for row in rows:
+        _accumulate(changes, row, sign, rates)
+    _flush_changes(connection, changes)
+
+
+def _current(target):
+    return {name: getattr(target, name) for name in TRACKED_COLUMNS}
+
+
+def _previous(target):
+    return previous(target, TRACKED_COLUMNS)
+
+
+@event.listens_for(Booking, 'after_insert')
+def _booking_inserted(mapper, connection, target):
+    apply_change(connection, None, _current(target))
+
+
+@event.listens_for(Booking, 'after_update')
+def _booking_updated(mapper, connection, target):
+    old, new = _previous(target), _current(target)
+    if old != new:
+        apply_change(connection, old, new)
+
+
+@event.listens_for(Booking, 'after_delete')
+def _booking_deleted(mapper, connection, target):
+    apply_change(connection, _previous(target), None)
+
+
+def _spend():
+    """Correlated subquery: the summed booking value of the customer being updated."""
+    table = Customer.__table__
+    return sa.select(sa.func.coalesce(sa.func.sum(booking_value_expression()), 0)).select_from(
+        Booking).outerjoin(Room, Room.id == Booking.room_id).where(
+        Booking.tenant_id == table.c.tenant_id,
+        Booking.customer_id == table.c.id,
+        Booking.status.in_(REPORTED_STATUSES),
+    ).scalar_subquery()
+
+
+@event.listens_for(Room, 'after_update')
+def _room_updated(mapper, connection, target):
+    if not sa.inspect(target).attrs.hourly_rate.history.has_changes():
+        return
+    table = Customer.__table__
+    unpriced = sa.select(Booking.customer_id).where(
+        Booking.room_id == target.id,
+        Booking.total_amount.is_(None),
+        Booking.status.in_(REPORTED_STATUSES),
+    )
+    connection.execute(table.update().where(table.c.id.in_(unpriced)).values(total_spend=_spend()))
+
+
+def rebuild(tenant_id=None):
+    """
+    Recompute the stats from the bookings table in one UPDATE. Only customers
+    whose stats were wrong are written (and get a new updated_at).
+    :param tenant_id: only rebuild this tenant (all tenants when None)
+    :return: number of customers corrected
+    """
+    table = Customer.__table__
+    counted = sa.select(Booking.id).where(
+        Booking.tenant_id == table.c.tenant_id,
+        Booking.customer_id == table.c.id,
+        Booking.status.in_(REPORTED_STATUSES),
+    )
+    count = counted.with_only_columns(sa.func.count()).scalar_subquery()
+    spend = _spend()
+    latest = counted.with_only_columns(sa.func.max(Booking.start_time)).scalar_subquery()
+    stmt = table.update().where(sa.or_(
+        table.c.booking_count != count,
+        table.c.total_spend != spend,
+        table.c.last_booking_at.is_distinct_from(latest),
+    )).values(booking_count=count, total_spend=spend, last_booking_at=latest)
+    if tenant_id is not None:
+        stmt = stmt.where(table.c.tenant_id == tenant_id)
+    return db.session.execute(stmt).rowcount
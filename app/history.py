@@ -0,0 +1,39 @@
+# Previous values of booking columns for flush-time hooks
+"""
+Old values of Booking columns, as they were before the pending change.
+
+The rollups, customer stats, waitlist and customer analytics hooks compare a
+booking's old and new state when it is flushed. An attribute only records
+its old value on assignment when that value is loaded, and a booking that
+was expired (e.g. after a commit) has nothing loaded. One active-history
+listener per column loads the old value first. They are registered here
+once, for the union of the columns those hooks read (HISTORY_COLUMNS).
+"""
+import sqlalchemy as sa
+from sqlalchemy import event
+
+from .models import Booking
+
+HISTORY_COLUMNS = ('tenant_id', 'room_id', 'customer_id', 'start_time', 'end_time', 'status', 'total_amount')
+
+
+def previous(target, columns):
+    """
+    {column: value} of a booking before its pending change; unchanged columns
+    hold their current value.
+    :param columns: names out of HISTORY_COLUMNS
+    """
+    attrs = sa.inspect(target).attrs
+    values = {}
+    for name in columns:
+        history = attrs[name].history
+        values[name] = history.deleted[0] if history.deleted else getattr(target, name)
+    return values
+
+
+def _load_previous(target, value, oldvalue, initiator):
+    return value
+
+
+for _name in HISTORY_COLUMNS:
+    event.listen(getattr(Booking, _name), 'set', _load_previous, active_history=True, retval=True)
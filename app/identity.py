@@ -0,0 +1,125 @@
+# Request-scoped identity (current user, tenant and studio)
+"""
+Load the logged-in user together with their tenant and studio once per request.
+
+The first call to `get_current_user()` in a request issues a single joined
+query and stores the result on `flask.g`; later calls reuse it. When
+CURRENT_USER_CACHE_TTL is positive, a snapshot of the loaded rows is also kept
+in a per-process LRU so subsequent requests can skip the query entirely. The
+LRU is invalidated whenever a User, Tenant or Studio row is updated or deleted.
+"""
+import copy
+
+from flask import current_app, g, session
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload, make_transient_to_detached
+
+from . import db
+from .cache import LRUCache
+from .models import Studio, Tenant, User
+
+_G_KEY = '_current_identity'
+
+_user_cache = LRUCache(maxsize=1024, ttl=0)
+
+
+def _configure_cache():
+    ttl = current_app.config.get('CURRENT_USER_CACHE_TTL', 0)
+    size = current_app.config.get('CURRENT_USER_CACHE_SIZE', 1024)
+    if _user_cache.ttl != ttl or _user_cache.maxsize != size:
+        _user_cache.ttl = ttl
+        _user_cache.maxsize = size
+        _user_cache.clear()
+    return ttl > 0
+
+
+def _snapshot(obj):
+    """Copy mapped column values so the cache never holds session-bound instances."""
+    if obj is None:
+        return None
+    return {attr.key: copy.deepcopy(getattr(obj, attr.key)) for attr in db.inspect(type(obj)).column_attrs}
+
+
+def _restore(model, values, **related):
+    """Rebuild a detached, clean instance from a snapshot (no database access)."""
+    if values is None:
+        return None
+    obj = model(**values, **related)
+    make_transient_to_detached(obj)
+    return obj
+
+
+def load_user(user_id):
+    """Fetch a user with tenant and studio eagerly loaded in one query."""
+    return (User.query
+            .options(joinedload(User.tenant), joinedload(User.studio))
+            .filter(User.id == user_id)
+            .first())
+
+
+def _load_identity(user_id):
+    use_cache = _configure_cache()
+    if use_cache:
+        cached = _user_cache.get(user_id)
+        if cached is not None:
+            user = _restore(
+                User, cached['user'],
+                tenant=_restore(Tenant, cached['tenant']),
+                studio=_restore(Studio, cached['studio']),
+            )
+            return db.session.merge(user, load=False)
+
+    user = load_user(user_id)
+    if use_cache and user is not None:
+        _user_cache.set(user_id, {
+            'user': _snapshot(user),
+            'tenant': _snapshot(user.tenant),
+            'studio': _snapshot(user.studio),
+        })
+    return user
+
+
+def get_current_user():
+    """Return the current logged-in user (with tenant and studio) or None."""
+    user_id = session.get('user_id')
+    cached = g.get(_G_KEY)
+    if cached is not None and cached[0] == user_id:
+        return cached[1]
+    user = _load_identity(user_id) if user_id else None
+    setattr(g, _G_KEY, (user_id, user))
+    return user
+
+
+def set_current_user(user):
+    """Prime the request-scoped identity after login/registration."""
+    setattr(g, _G_KEY, (user.id if user else None, user))
+
+
+def init_app(app):
+    """Reset the request-scoped identity at the end of every request."""
+    @app.teardown_request
+    def _clear_identity(exc):
+        g.pop(_G_KEY, None)
+
+
+def invalidate_user(user_id=None):
+    """Drop cached identities (all of them when user_id is None)."""
+    if user_id is None:
+        _user_cache.clear()
+    else:
+        _user_cache.delete(user_id)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _evict_user(mapper, connection, target):
+    invalidate_user(target.id)
+
+
+@event.listens_for(Tenant, 'after_update')
+@event.listens_for(Tenant, 'after_delete')
+@event.listens_for(Studio, 'after_update')
+@event.listens_for(Studio, 'after_delete')
+def _evict_all(mapper, connection, target):
+    # Tenant/studio edits are rare; clearing is cheaper than tracking membership
+    invalidate_user()
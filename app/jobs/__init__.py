@@ -0,0 +1,231 @@
+# Background jobs (reports, bulk import, tenant export)
+"""
+Run long operations outside the request that asked for them.
+
+A handler validates its input, calls `submit(kind, params, user)` and
+answers 202 with the job; clients poll GET /api/jobs/<id> and fetch
+GET /api/jobs/<id>/result when it has succeeded. Job functions are
+registered with `@job(kind)` (see tasks.py) and called as
+`fn(ctx, **params)` inside an app context: params must be JSON, the return
+value is stored as the result, and `ctx.progress()` / `ctx.output()` report
+progress and open a result file.
+
+The `jobs` table is the result store, so any worker can answer status
+requests. Result files go under JOBS_RESULT_DIR, which must be shared
+storage when jobs and the API run on different hosts.
+
+Executors (JOBS_EXECUTOR):
+- thread: an in-process pool of JOBS_WORKERS threads per gunicorn worker.
+  Queued jobs are lost if the process exits; they stay 'queued' until purged.
+- celery: jobs are sent to JOBS_BROKER_URL and run by
+  `celery -A app.jobs.worker worker`.
+- eager: run inline during submit (tests, local scripts).
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from flask import current_app, url_for
+
+from .. import db
+from ..models import Job
+from ..utils import make_response_payload
+
+logger = logging.getLogger(__name__)
+
+JOBS = {}
+FINISHED = ('succeeded', 'failed')
+
+
+def job(kind):
+    """Register `fn(ctx, **params)` as the implementation of `kind`."""
+    def register(fn):
+        JOBS[kind] = fn
+        return fn
+    return register
+
+
+def result_dir(app=None):
+    app = app or current_app
+    return app.config.get('JOBS_RESULT_DIR') or os.path.join(app.instance_path, 'jobs')
+
+
+class JobContext:
+    """Handed to job functions for progress reporting and result files."""
+
+    def __init__(self, job_id, directory, min_interval=0.5):
+        self.job_id = job_id
+        self.directory = directory
+        self.min_interval = min_interval
+        self.result_file = None
+        self.result_mimetype = None
+        self._last_write = 0.0
+
+    def progress(self, done, total=None, message=None):
+        """
+        Record progress (`done` of `total`, or a 0..1 fraction). Writes are throttled
+        and go through their own connection, so they never commit the job's own work.
+        """
+        fraction = min(1.0, done / total) if total else float(done)
+        now = time.monotonic()
+        if now - self._last_write < self.min_interval and fraction < 1.0:
+            return
+        self._last_write = now
+        values = {'progress': round(fraction, 4)}
+        if message is not None:
+            values['message'] = message[:255]
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(sa.update(Job).where(Job.id == self.job_id).values(**values))
+        except sa.exc.OperationalError:  # progress is best-effort (e.g. a locked SQLite file)
+            logger.debug('Could not record progress for job %s', self.job_id, exc_info=True)
+
+    def output(self, filename, mimetype):
+        """Path to write the job's result file to; it is served from /api/jobs/<id>/result."""
+        os.makedirs(self.directory, exist_ok=True)
+        self.result_file = f'{self.job_id}-{filename}'
+        self.result_mimetype = mimetype
+        return os.path.join(self.directory, self.result_file)
+
+
+def run(job_id):
+    """Execute a queued job in the current app context (called by every executor)."""
+    job_row = db.session.get(Job, job_id)
+    if job_row is None or job_row.status != 'queued':
+        return
+    job_row.status = 'running'
+    job_row.started_at = datetime.utcnow()
+    kind, params = job_row.kind, dict(job_row.params or {})
+    db.session.commit()
+
+    ctx = JobContext(job_id, result_dir())
+    try:
+        fn = JOBS.get(kind)
+        if fn is None:
+            raise LookupError(f'Unknown job kind {kind!r}')
+        result = fn(ctx, **params)
+    except Exception as exc:
+        logger.exception('Job %s (%s) failed', job_id, kind)
+        db.session.rollback()
+        values = {'status': 'failed', 'error': f'{type(exc).__name__}: {exc}'[:2000]}
+    else:
+        values = {'status': 'succeeded', 'progress': 1.0, 'result': result,
+                  'result_file': ctx.result_file, 'result_mimetype': ctx.result_mimetype}
+    db.session.execute(sa.update(Job).where(Job.id == job_id).values(finished_at=datetime.utcnow(), **values))
+    db.session.commit()
+
+
+def _run_in_context(app, job_id):
+    with app.app_context():
+        try:
+            run(job_id)
+        finally:
+            db.session.remove()
+
+
+class EagerExecutor:
+    """Run the job inline, in a fresh app context (and so a fresh session)."""
+
+    def submit(self, app, job_id):
+        _run_in_context(app, job_id)
+
+
+class ThreadExecutor:
+    """In-process pool. Threads start on first use, so this is safe with gunicorn's preload_app."""
+
+    def __init__(self, workers=2):
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def submit(self, app, job_id):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+        return self._pool.submit(_run_in_context, app, job_id)
+
+
+class CeleryExecutor:
+    """Send job ids to a Celery broker; `celery -A app.jobs.worker worker` runs them."""
+
+    def __init__(self, app):
+        from celery import Celery
+        self.celery = Celery(app.import_name, broker=app.config['JOBS_BROKER_URL'])
+        # The jobs table is the result store; acks_late re-delivers jobs whose worker died
+        self.celery.conf.update(task_ignore_result=True, task_acks_late=True, worker_prefetch_multiplier=1)
+
+        @self.celery.task(name='jobs.run')
+        def run_job(job_id):
+            _run_in_context(app, job_id)
+
+        self.task = run_job
+
+    def submit(self, app, job_id):
+        self.task.delay(job_id)
+
+
+def submit(kind, params, user=None, tenant_id=None):
+    """Queue a job (committing the current session) and hand it to the executor."""
+    if kind not in JOBS:
+        raise LookupError(f'Unknown job kind {kind!r}')
+    job_row = Job(id=uuid.uuid4().hex, kind=kind, params=params, status='queued',
+                  user_id=getattr(user, 'id', None),
+                  tenant_id=tenant_id if tenant_id is not None else getattr(user, 'tenant_id', None))
+    job_id = job_row.id
+    db.session.add(job_row)
+    db.session.commit()
+    app = current_app._get_current_object()
+    app.extensions['jobs'].submit(app, job_id)
+    # An eager (or fast) executor has already updated the row in another session
+    db.session.expire(job_row)
+    return job_row
+
+
+def accepted(job_row, message="Job queued"):
+    """202 response for a submitted job, pointing at its status URL."""
+    status_url = url_for('jobs.get_job', job_id=job_row.id)
+    response = make_response_payload(True, data=job_payload(job_row), message=message)
+    response.headers['Location'] = status_url
+    return response, 202
+
+
+def job_payload(job_row):
+    data = job_row.to_dict()
+    data['status_url'] = url_for('jobs.get_job', job_id=job_row.id)
+    if job_row.status == 'succeeded':
+        data['result_url'] = url_for('jobs.get_job_result', job_id=job_row.id)
+    return data
+
+
+def purge_expired(max_age):
+    """Delete finished jobs older than `max_age` seconds and their files. :return: jobs deleted"""
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+    expired = Job.query.filter(Job.finished_at < cutoff).all()
+    directory = result_dir()
+    for job_row in expired:
+        if job_row.result_file:
+            try:
+                os.remove(os.path.join(directory, job_row.result_file))
+            except FileNotFoundError:
+                pass
+        db.session.delete(job_row)
+    db.session.commit()
+    return len(expired)
+
+
+def init_app(app):
+    """Build the executor: JOBS_EXECUTOR = thread | celery | eager."""
+    from . import tasks  # noqa: F401  registers the job kinds
+    kind = app.config.get('JOBS_EXECUTOR', 'thread')
+    if kind == 'celery':
+        executor = CeleryExecutor(app)
+    elif kind == 'eager':
+        executor = EagerExecutor()
+    else:
+        executor = ThreadExecutor(app.config.get('JOBS_WORKERS', 2))
+    app.extensions['jobs'] = executor
@@ -0,0 +1,76 @@
+# /jobs status and result routes
+import os
+
+from flask import Blueprint, request, send_from_directory
+
+from .. import db
+from ..models import Job
+from ..utils import make_response_payload, get_current_user
+from . import FINISHED, job_payload, result_dir
+
+jobs_bp = Blueprint('jobs', __name__)
+
+
+def _visible_job(job_id):
+    """
+    The job if the current user may see it: its submitter, or an Admin of its tenant
+    (global Admins see every job).
+    :return: (job, None) or (None, error response)
+    """
+    user = get_current_user()
+    if not user:
+        return None, (make_response_payload(False, message="Unauthorized"), 401)
+    job_row = db.session.get(Job, job_id)
+    if job_row is None:
+        return None, (make_response_payload(False, message="Job not found"), 404)
+    if job_row.user_id != user.id and not (
+            user.role == 'Admin' and (not user.tenant_id or user.tenant_id == job_row.tenant_id)):
+        return None, (make_response_payload(False, message="Job not found"), 404)
+    return job_row, None
+
+
+@jobs_bp.route('', methods=['GET'])
+def list_jobs():
+    """The current user's most recent jobs (optionally ?status=queued|running|succeeded|failed)."""
+    user = get_current_user()
+    if not user:
+        return make_response_payload(False, message="Unauthorized"), 401
+    query = Job.query.filter(Job.user_id == user.id)
+    if request.args.get('status'):
+        query = query.filter(Job.status == request.args['status'])
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    jobs = query.order_by(Job.created_at.desc()).limit(limit).all()
+    return make_response_payload(True, data=[job_payload(j) for j in jobs])
+
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status, progress and (once finished) the inline result or error."""
+    job_row, error = _visible_job(job_id)
+    if error:
+        return error
+    response = make_response_payload(True, data=job_payload(job_row))
+    if job_row.status not in FINISHED:
+        # Hint for pollers
+        response.headers['Retry-After'] = '1'
+    return response
+
+
+@jobs_bp.route('/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Download the result file, or the inline result for jobs without one."""
+    job_row, error = _visible_job(job_id)
+    if error:
+        return error
+    if job_row.status != 'succeeded':
+        return make_response_payload(False, data=job_payload(job_row), message="Job has not succeeded"), 409
+    if not job_row.result_file:
+        return make_response_payload(True, data=job_row.result)
+    directory = result_dir()
+    if not os.path.exists(os.path.join(directory, job_row.result_file)):
+        return make_response_payload(False, message="Result has expired"), 410
+    download_name = job_row.result_file.split('-', 1)[-1]
+    response = send_from_directory(directory, job_row.result_file, mimetype=job_row.result_mimetype,
+                                   as_attachment=True, download_name=download_name)
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
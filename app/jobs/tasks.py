@@ -0,0 +1,91 @@
+# Job kinds: report generation, bulk customer import, tenant export
+"""
+Implementations registered with @job. Each runs in an app context without a
+request, so everything it needs (tenant, studio scope, options) arrives in
+its JSON params; handlers check permissions before submitting.
+"""
+import os
+import zipfile
+
+import sqlalchemy as sa
+from flask import current_app
+
+from .. import db
+from ..customers import bulk
+from ..models import Booking, BookingSeries, Customer, Room, Studio, Tenant, User, WaitlistEntry
+from ..reports import engine
+from ..serialization import serializer_for
+from ..utils import parse_iso_datetime
+from . import job
+
+REPORTS = {
+    'occupancy': engine.occupancy_report,
+    'revenue': engine.revenue_report,
+    'heatmap': engine.heatmap_report,
+}
+
+# Tenant-owned tables in dependency order, so an import can replay them
+EXPORT_MODELS = (Studio, Room, User, Customer, BookingSeries, Booking, WaitlistEntry)
+
+
+@job('reports.generate')
+def generate_report(ctx, report, tenant_id, start, end, open_hour=0, close_hour=24, studio_id=None,
+                    options=None):
+    """:return: {"data": ..., "meta": ...} as the synchronous report endpoint answers"""
+    options = options or {}
+    ctx.progress(0, message=f'Building {report} report')
+    rng = engine.ReportRange(parse_iso_datetime(start), parse_iso_datetime(end),
+                             open_hour=open_hour, close_hour=close_hour)
+    data = REPORTS[report](tenant_id, rng, studio_id=studio_id, **options)
+    return {"data": data, "meta": {"start": start, "end": end, **options}}
+
+
+@job('customers.import')
+def import_customers(ctx, upload, fmt, tenant_id, default_studio_id, allowed_studio_ids=None,
+                     chunk_size=1000):
+    """Import a spooled upload (a file under the result directory), deleting it afterwards."""
+    path = os.path.join(ctx.directory, upload)
+    size = os.path.getsize(path) or 1
+    try:
+        with open(path, 'rb') as f:
+            def records():
+                for n, record in enumerate(bulk.iter_records(f, fmt), start=1):
+                    if n % chunk_size == 0:
+                        ctx.progress(f.tell(), size, message=f'{n} rows read')
+                    yield record
+
+            return bulk.import_customers(
+                records(),
+                tenant_id=tenant_id,
+                default_studio_id=default_studio_id,
+                allowed_studio_ids=set(allowed_studio_ids) if allowed_studio_ids is not None else None,
+                chunk_size=chunk_size,
+            )
+    finally:
+        os.remove(path)
+
+
+@job('tenants.export')
+def export_tenant(ctx, tenant_id):
+    """Zip archive with tenant.json and one NDJSON file per tenant-owned table."""
+    tenant = db.session.get(Tenant, tenant_id)
+    if tenant is None:
+        raise LookupError(f'Tenant {tenant_id} not found')
+    batch_size = current_app.config.get('BULK_EXPORT_BATCH_SIZE', 1000)
+    path = ctx.output(f'tenant-{tenant_id}.zip', 'application/zip')
+    counts = {}
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('tenant.json', serializer_for(Tenant).encode(tenant))
+        for done, model in enumerate(EXPORT_MODELS, start=1):
+            serializer = serializer_for(model)
+            stmt = (sa.select(*[getattr(model, f) for f in serializer.fields])
+                    .where(model.tenant_id == tenant_id).order_by(model.id))
+            rows = 0
+            with archive.open(f'{model.__tablename__}.ndjson', 'w', force_zip64=True) as out:
+                result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+                for partition in result.partitions():
+                    out.write(b''.join(serializer.encode_row(row) + b'\n' for row in partition))
+                    rows += len(partition)
+            counts[model.__tablename__] = rows
+            ctx.progress(done, len(EXPORT_MODELS), message=f'Exported {model.__tablename__}')
+    return {"tables": counts}
@@ -0,0 +1,17 @@
+# Celery worker entry point
+"""
+Run background jobs from the broker:
+
+    celery -A app.jobs.worker worker --loglevel=info
+
+The API must run with JOBS_EXECUTOR=celery and the same JOBS_BROKER_URL,
+database and JOBS_RESULT_DIR.
+"""
+from .. import create_app
+from . import CeleryExecutor
+
+app = create_app()
+executor = app.extensions['jobs']
+if not isinstance(executor, CeleryExecutor):
+    executor = CeleryExecutor(app)
+celery = executor.celery
@@ -0,0 +1,309 @@
+# Live booking and customer events (publish/subscribe, Server-Sent Events)
+"""
+Push committed Booking and Customer changes to connected clients.
+
+Session hooks collect the changes while they are flushed and publish them to
+the bus once the transaction commits. Rolled-back changes are never
+published. Every event is encoded once, as a ready-to-send SSE frame, when it
+is published. Fan-out then only appends that frame to each subscriber's
+queue.
+
+Subscribers are indexed by tenant. A tenant's events go to that tenant's
+subscribers and to the all-tenant subscribers (global admins). Events carry
+the studio of the customer, or of the booked room, so subscribers limited to
+one studio (staff outside Admin and Studio Manager) only get theirs. Each
+subscriber buffers at most LIVE_QUEUE_SIZE events. When a slow consumer
+falls behind, its oldest events are dropped and the stream sends a `resync`
+event, so the client knows to reload instead of trusting the feed.
+
+Backends (LIVE_BACKEND):
+- memory: in-process. Clients only see commits made by the same process,
+  which suits a single worker. Events are only collected while the process
+  has subscribers, so ordinary writes cost nothing otherwise.
+- redis: commits are published to LIVE_REDIS_CHANNEL when
+  LIVE_REDIS_PUBLISH is on (subscribers in other processes cannot be seen
+  from here, so publishing is opt-in). Each process runs one listener
+  thread (started with its first subscriber) that fans the events out to
+  its local subscribers.
+- none: no events are collected.
+
+Bulk statements (seeding, bulk imports) bypass the session hooks and publish
+nothing.
+
+Each open stream holds a worker thread. Streams are closed after
+LIVE_STREAM_MAX_SECONDS, and EventSource reconnects on its own, so sync and
+gthread workers are returned to the pool regularly. Publishing is cheap at
+any audience size (scripts/bench_live.py). Waking thousands of stream
+threads in one process is not, so large audiences should be spread over
+several workers with the redis backend.
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import NamedTuple, Optional
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .models import Booking, Customer, Room
+from .serialization import serializer_for
+
+logger = logging.getLogger(__name__)
+
+EVENT_MODELS = {Booking: 'booking', Customer: 'customer'}
+_EVENTS_KEY = '_live_events'
+
+
+class Event(NamedTuple):
+    tenant_id: int
+    type: str
+    frame: bytes  # the encoded SSE message
+    studio_id: Optional[int] = None
+
+    @classmethod
+    def build(cls, tenant_id, event_type, data, studio_id=None):
+        """`data` is the JSON document (bytes)."""
+        return cls(tenant_id, event_type, b'event: ' + event_type.encode() + b'\ndata: ' + data + b'\n\n',
+                   studio_id)
+
+
+def control_frame(event_type, data):
+    """An SSE frame for a stream control event (not published on the bus)."""
+    return Event.build(None, event_type, json.dumps(data).encode()).frame
+
+
+class Subscription:
+    """A bounded queue of encoded frames for one client."""
+
+    def __init__(self, bus, tenant_id, maxsize, studio_id=None):
+        self.bus = bus
+        self.tenant_id = tenant_id
+        self.studio_id = studio_id
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._queue = deque()
+        self._ready = threading.Event()
+
+    def push(self, item):
+        queue = self._queue
+        if len(queue) >= self.maxsize:
+            try:
+                queue.popleft()
+                self.dropped += 1
+            except IndexError:  # drained by the consumer meanwhile
+                pass
+        queue.append(item)
+        # get() clears the flag before draining, so an event appended while it is set is never missed
+        if not self._ready.is_set():
+            self._ready.set()
+
+    def get(self, timeout=None):
+        """
+        Wait up to `timeout` seconds for events.
+        :return: (pending events oldest first, possibly empty; events dropped since the last call)
+        """
+        if not self._queue:
+            self._ready.wait(timeout)
+        self._ready.clear()
+        queue, events = self._queue, []
+        while True:
+            try:
+                events.append(queue.popleft())
+            except IndexError:
+                break
+        dropped, self.dropped = self.dropped, 0
+        return events, dropped
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class MemoryBus:
+    """
+    In-process fan-out. Subscriber lists are copy-on-write tuples, so
+    publishing takes no lock and copies nothing.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._subscribers = {}  # tenant_id (None: all tenants) -> tuple of Subscription
+        self._lock = threading.Lock()
+
+    def subscribe(self, tenant_id=None, studio_id=None):
+        """Subscribe to a tenant (None: all tenants), optionally only one of its studios."""
+        sub = Subscription(self, tenant_id, self.maxsize, studio_id)
+        with self._lock:
+            self._subscribers[tenant_id] = self._subscribers.get(tenant_id, ()) + (sub,)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            remaining = tuple(s for s in self._subscribers.get(sub.tenant_id, ()) if s is not sub)
+            if remaining:
+                self._subscribers[sub.tenant_id] = remaining
+            else:
+                self._subscribers.pop(sub.tenant_id, None)
+
+    def subscriber_count(self):
+        return sum(map(len, self._subscribers.values()))
+
+    def wants_events(self):
+        """Whether commits should be collected at all: only while someone listens here."""
+        return bool(self._subscribers)
+
+    def publish(self, events):
+        self.deliver(events)
+
+    def deliver(self, events):
+        """Queue each event for its tenant's subscribers (of its studio) and the all-tenant ones."""
+        subscribers = self._subscribers
+        everyone = subscribers.get(None, ())
+        for item in events:
+            for sub in subscribers.get(item.tenant_id, ()):
+                if sub.studio_id is None or sub.studio_id == item.studio_id:
+                    sub.push(item)
+            for sub in everyone:
+                sub.push(item)
+
+
+class RedisBus(MemoryBus):
+    """Events go through a Redis channel; a listener thread delivers them to local subscribers."""
+
+    def __init__(self, client, channel, maxsize=256, publishing=True):
+        super().__init__(maxsize)
+        self.client = client
+        self.channel = channel
+        self.publishing = publishing
+        self._listener = None
+
+    def subscribe(self, tenant_id=None, studio_id=None):
+        if self._listener is None:
+            with self._lock:
+                if self._listener is None:
+                    # Started lazily, so the thread is created in the worker after a preload fork
+                    self._listener = threading.Thread(target=self._listen, name='live-events', daemon=True)
+                    self._listener.start()
+        return super().subscribe(tenant_id, studio_id)
+
+    def wants_events(self):
+        return self.publishing
+
+    def publish(self, events):
+        payload = json.dumps([[e.tenant_id, e.type, e.frame.decode(), e.studio_id] for e in events])
+        try:
+            self.client.publish(self.channel, payload)
+        except Exception:  # live events are best-effort; the commit has already happened
+            logger.warning('Could not publish live events', exc_info=True)
+
+    def _listen(self):
+        delay = 1
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                delay = 1
+                for message in pubsub.listen():
+                    if message.get('type') == 'message':
+                        events = json.loads(message['data'])
+                        self.deliver([Event(t, kind, frame.encode(), studio) for t, kind, frame, studio in events])
+            except Exception:  # keep listening through Redis restarts
+                logger.warning('Live event listener lost Redis; retrying in %ss', delay, exc_info=True)
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+
+
+def _current():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('live')
+
+
+def _studio_id(session, obj):
+    if isinstance(obj, Customer):
+        return obj.studio_id
+    # The room is normally in the identity map already (conflict checks load it)
+    room = session.get(Room, obj.room_id)
+    return room.studio_id if room is not None else None
+
+
+def _encode(obj, deleted):
+    if deleted:
+        return json.dumps({'id': obj.id, 'tenant_id': obj.tenant_id}).encode()
+    return serializer_for(type(obj)).encode(obj)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_events(session, flush_context):
+    bus = _current()
+    if bus is None or not bus.wants_events():
+        return
+    pending = None
+    for action, objects in (('created', session.new), ('updated', session.dirty), ('deleted', session.deleted)):
+        for obj in objects:
+            kind = EVENT_MODELS.get(type(obj))
+            if kind is None or (action == 'updated' and not session.is_modified(obj)):
+                continue
+            if pending is None:
+                pending = session.info.setdefault(_EVENTS_KEY, [])
+            pending.append(Event.build(obj.tenant_id, f'{kind}.{action}', _encode(obj, action == 'deleted'),
+                                       _studio_id(session, obj)))
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_committed(session):
+    events = session.info.pop(_EVENTS_KEY, None)
+    bus = _current()
+    if events and bus is not None:
+        bus.publish(events)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_events(session):
+    session.info.pop(_EVENTS_KEY, None)
+
+
+def stream(sub, heartbeat=15, max_seconds=300, types=None):
+    """
+    SSE body for a subscription: events (optionally only those whose type
+    starts with one of `types`), a comment line every `heartbeat` seconds
+    when idle, and a `resync` event after drops. The subscription is closed
+    when the client goes away or after `max_seconds`.
+    """
+    deadline = time.monotonic() + max_seconds
+    try:
+        yield b'retry: 3000\n\n'
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            events, dropped = sub.get(timeout=min(heartbeat, remaining))
+            chunk = b''
+            if dropped:
+                chunk = control_frame('resync', {'dropped': dropped})
+            if types:
+                events = [e for e in events if e.type.startswith(types)]
+            chunk += b''.join(e.frame for e in events)
+            # The heartbeat also detects disconnected clients: the write fails
+            yield chunk or b': keep-alive\n\n'
+    finally:
+        sub.close()
+
+
+def init_app(app):
+    """Build the bus: LIVE_BACKEND = memory | redis | none."""
+    kind = app.config.get('LIVE_BACKEND', 'memory')
+    maxsize = app.config.get('LIVE_QUEUE_SIZE', 256)
+    if kind == 'redis':
+        import redis
+        bus = RedisBus(redis.Redis.from_url(app.config['LIVE_REDIS_URL'], decode_responses=True),
+                       app.config.get('LIVE_REDIS_CHANNEL', 'live-events'), maxsize=maxsize,
+                       publishing=app.config.get('LIVE_REDIS_PUBLISH', False))
+    elif kind == 'memory':
+        bus = MemoryBus(maxsize=maxsize)
+    else:
+        app.extensions.pop('live', None)
+        return
+    app.extensions['live'] = bus
@@ -0,0 +1,109 @@
+# Request and SQL instrumentation (Prometheus /api/metrics)
+"""
+Per-endpoint request metrics in Prometheus format.
+
+Cursor events count every SQL statement and its duration against the current
+request; request hooks observe latency, query count, SQL time and response
+size per endpoint when the request ends.
+
+Under gunicorn, set PROMETHEUS_MULTIPROC_DIR to an empty directory shared by
+the workers (before the app is imported): prometheus_client then keeps the
+values in per-process mmap files and /api/metrics aggregates all of them, so
+a scrape sees the whole server whichever worker answers it. gunicorn.conf.py
+cleans up after exited workers.
+"""
+import os
+import time
+
+import sqlalchemy as sa
+from flask import Response, current_app, g, has_request_context, request
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Histogram, generate_latest, multiprocess
+
+from .utils import make_response_payload
+
+# Metrics live in their own registry so repeated create_app() calls (tests) share them
+REGISTRY = CollectorRegistry(auto_describe=True)
+
+LABELS = ('endpoint', 'method', 'status')
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+SQL_TIME_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 5)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Request latency',
+                            LABELS, buckets=LATENCY_BUCKETS, registry=REGISTRY)
+REQUEST_QUERIES = Histogram('http_request_sql_queries', 'SQL statements issued per request',
+                            LABELS, buckets=QUERY_COUNT_BUCKETS, registry=REGISTRY)
+REQUEST_SQL_TIME = Histogram('http_request_sql_duration_seconds', 'Time spent in SQL per request',
+                             LABELS, buckets=SQL_TIME_BUCKETS, registry=REGISTRY)
+RESPONSE_SIZE = Histogram('http_response_size_bytes', 'Response body size (streamed bodies excluded)',
+                          LABELS, buckets=SIZE_BUCKETS, registry=REGISTRY)
+
+_G_KEY = '_request_metrics'
+
+
+# The start time lives on the statement's execution context, which is discarded with it,
+# so statements that raise (after_cursor_execute never runs) leave nothing behind
+@sa.event.listens_for(sa.engine.Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and has_request_context() and _G_KEY in g:
+        context._metrics_start = time.perf_counter()
+
+
+@sa.event.listens_for(sa.engine.Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_metrics_start', None)
+    if start is None or not has_request_context():
+        return
+    stats = g.get(_G_KEY)
+    if stats is not None:
+        stats['queries'] += 1
+        stats['sql_time'] += time.perf_counter() - start
+
+
+def _endpoint():
+    # Route names, not paths, keep label cardinality bounded (404s share one label)
+    return request.endpoint or 'unmatched'
+
+
+def init_app(app):
+    """Instrument requests and register GET /api/metrics."""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    @app.before_request
+    def _start_request_metrics():
+        g.setdefault(_G_KEY, {'start': time.perf_counter(), 'queries': 0, 'sql_time': 0.0})
+
+    @app.after_request
+    def _record_request_metrics(response):
+        stats = g.pop(_G_KEY, None)
+        if stats is None or request.endpoint == 'metrics':
+            return response
+        labels = (_endpoint(), request.method, str(response.status_code))
+        REQUEST_LATENCY.labels(*labels).observe(time.perf_counter() - stats['start'])
+        REQUEST_QUERIES.labels(*labels).observe(stats['queries'])
+        REQUEST_SQL_TIME.labels(*labels).observe(stats['sql_time'])
+        if not response.is_streamed:
+            RESPONSE_SIZE.labels(*labels).observe(response.calculate_content_length() or 0)
+        return response
+
+    @app.teardown_request
+    def _drop_request_metrics(exc):
+        # after_request does not run for unhandled errors
+        g.pop(_G_KEY, None)
+
+    app.add_url_rule('/api/metrics', 'metrics', metrics_view)
+
+
+def metrics_view():
+    """Prometheus text exposition of the request metrics of every worker."""
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return make_response_payload(False, message="Unauthorized"), 401
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
@@ -11,6 +11,7 @@ class Tenant(db.Model):
     Each tenant represents a separate studio/organization.
     """
     __tablename__ = 'tenants'
+    __json_defaults__ = {'settings': {}}
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -18,6 +19,8 @@ class Tenant(db.Model):
     plan = db.Column(db.String(20), default='free', nullable=False)
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow,
+                           onupdate=datetime.utcnow, nullable=False)
     settings = db.Column(db.JSON, default=dict)
 
     def to_dict(self):
@@ -28,6 +31,7 @@ class Tenant(db.Model):
             "plan": self.plan,
             "is_active": self.is_active,
             "created_at": self.created_at.isoformat() + "Z",
+            "updated_at": self.updated_at.isoformat() + "Z",
             "settings": self.settings or {}
         }
 
@@ -36,6 +40,7 @@ class Studio(db.Model):
     Studio model representing a physical or virtual location within a tenant.
     """
     __tablename__ = 'studios'
+    __json_defaults__ = {'settings': {}}
 
     id = db.Column(db.Integer, primary_key=True)
     tenant_id = db.Column(db.Integer, db.ForeignKey('tenants.id'), nullable=False)
@@ -58,6 +63,7 @@ class Studio(db.Model):
 
 class Customer(db.Model):
     __tablename__ = 'customers'
+    __json_defaults__ = {'notes': '', 'total_spend': 0.0}
 
     id = db.Column(db.Integer, primary_key=True)
     tenant_id = db.Column(db.Integer, db.ForeignKey('tenants.id'), nullable=False)
@@ -69,9 +75,22 @@ class Customer(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow,
                            onupdate=datetime.utcnow, nullable=False)
+    # Confirmed-booking stats, maintained from bookings by app/customers/stats.py
+    booking_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    last_booking_at = db.Column(db.DateTime)
+    total_spend = db.Column(db.Numeric(12, 2), default=0, server_default='0', nullable=False)
 
-    # Unique constraint for email per tenant
-    __table_args__ = (db.UniqueConstraint('tenant_id', 'email', name='_tenant_customer_email_uc'),)
+    # Unique constraint for email per tenant, plus keyset pagination indexes
+    # (the email unique constraint already covers sorting by email)
+    __table_args__ = (
+        db.UniqueConstraint('tenant_id', 'email', name='_tenant_customer_email_uc'),
+        db.Index('ix_customers_tenant_name_id', 'tenant_id', 'name', 'id'),
+        db.Index('ix_customers_tenant_created_id', 'tenant_id', 'created_at', 'id'),
+        db.Index('ix_customers_tenant_updated_id', 'tenant_id', 'updated_at', 'id'),
+        db.Index('ix_customers_tenant_booking_count_id', 'tenant_id', 'booking_count', 'id'),
+        db.Index('ix_customers_tenant_last_booking_id', 'tenant_id', 'last_booking_at', 'id'),
+        db.Index('ix_customers_tenant_total_spend_id', 'tenant_id', 'total_spend', 'id'),
+    )
 
     def to_dict(self):
         return {
@@ -83,7 +102,10 @@ class Customer(db.Model):
             "phone": self.phone,
             "notes": self.notes or "",
             "created_at": self.created_at.isoformat() + "Z",
-            "updated_at": self.updated_at.isoformat() + "Z"
+            "updated_at": self.updated_at.isoformat() + "Z",
+            "booking_count": self.booking_count,
+            "last_booking_at": self.last_booking_at.isoformat() + "Z" if self.last_booking_at else None,
+            "total_spend": float(self.total_spend) if self.total_spend else 0.0
         }
 
 class User(db.Model):
@@ -100,6 +122,8 @@ class User(db.Model):
         tenant_id (int): FK to Tenant.id (nullable only for global Admins).
     """
     __tablename__ = 'users'
+    __json_exclude__ = ('password_hash',)
+    __json_defaults__ = {'permissions': []}
 
     id = db.Column(db.Integer, primary_key=True)
     tenant_id = db.Column(db.Integer, db.ForeignKey('tenants.id'), nullable=True)
@@ -112,6 +136,9 @@ class User(db.Model):
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
+    tenant = db.relationship('Tenant')
+    studio = db.relationship('Studio')
+
     # Unique constraint for email per tenant (global admins have no tenant_id)
     __table_args__ = (db.UniqueConstraint('tenant_id', 'email', name='_tenant_user_email_uc'),)
 
@@ -133,6 +160,7 @@ class User(db.Model):
 class Room(db.Model):
     """Room model for bookable spaces."""
     __tablename__ = 'rooms'
+    __json_defaults__ = {'equipment': []}
 
     id = db.Column(db.Integer, primary_key=True)
     tenant_id = db.Column(db.Integer, db.ForeignKey('tenants.id'), nullable=False)
@@ -169,6 +197,18 @@ class Booking(db.Model):
     notes = db.Column(db.Text)
     total_amount = db.Column(db.Numeric(10, 2))
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    series_id = db.Column(db.Integer, db.ForeignKey('booking_series.id'), nullable=True, index=True)
+
+    # Covers the reporting aggregates so range scans never touch the table, and
+    # lets per-room sweeps (free slots, conflicts) read bookings already in order.
+    # The per-customer index covers the customer analytics aggregates the same way
+    __table_args__ = (
+        db.Index('ix_bookings_tenant_start_report', 'tenant_id', 'start_time', 'end_time',
+                 'room_id', 'status', 'total_amount'),
+        db.Index('ix_bookings_tenant_room_start', 'tenant_id', 'room_id', 'start_time', 'end_time', 'status'),
+        db.Index('ix_bookings_tenant_customer_start', 'tenant_id', 'customer_id', 'start_time', 'end_time',
+                 'room_id', 'status', 'total_amount'),
+    )
 
     def to_dict(self):
         return {
@@ -181,5 +221,164 @@ class Booking(db.Model):
             "status": self.status,
             "notes": self.notes,
             "total_amount": float(self.total_amount) if self.total_amount else None,
+            "created_at": self.created_at.isoformat() + "Z",
+            "series_id": self.series_id
+        }
+
+class BookingSeries(db.Model):
+    """
+    Recurring booking stored as a start, a duration and an RRULE. Occurrences
+    are expanded on demand; Booking rows exist only up to materialized_until.
+    """
+    __tablename__ = 'booking_series'
+
+    id = db.Column(db.Integer, primary_key=True)
+    tenant_id = db.Column(db.Integer, db.ForeignKey('tenants.id'), nullable=False)
+    room_id = db.Column(db.Integer, db.ForeignKey('rooms.id'), nullable=False)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    duration_minutes = db.Column(db.Integer, nullable=False)
+    rrule = db.Column(db.String(255), nullable=False)
+    # End of the last occurrence, so overlapping series are found without expanding them
+    ends_at = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20), default='confirmed', nullable=False)
+    notes = db.Column(db.Text)
+    total_amount = db.Column(db.Numeric(10, 2))
+    # Every occurrence starting before this instant has a Booking row
+    materialized_until = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_booking_series_tenant_room_ends', 'tenant_id', 'room_id', 'ends_at'),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "tenant_id": self.tenant_id,
+            "room_id": self.room_id,
+            "customer_id": self.customer_id,
+            "start_time": self.start_time.isoformat() + "Z",
+            "duration_minutes": self.duration_minutes,
+            "rrule": self.rrule,
+            "ends_at": self.ends_at.isoformat() + "Z",
+            "status": self.status,
+            "notes": self.notes,
+            "total_amount": float(self.total_amount) if self.total_amount else None,
+            "materialized_until": self.materialized_until.isoformat() + "Z" if self.materialized_until else None,
             "created_at": self.created_at.isoformat() + "Z"
         }
+
+class BookingDailyRollup(db.Model):
+    """
+    Per-room daily booking aggregates, keyed by the day a booking starts.
+    Maintained incrementally from Booking writes (see app/reports/rollups.py).
+    """
+    __tablename__ = 'booking_daily_rollups'
+
+    tenant_id = db.Column(db.Integer, db.ForeignKey('tenants.id'), primary_key=True)
+    room_id = db.Column(db.Integer, db.ForeignKey('rooms.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    bookings = db.Column(db.Integer, default=0, nullable=False)
+    booked_minutes = db.Column(db.Float, default=0, nullable=False)
+    # Sum of total_amount; unpriced minutes are valued at the room rate when reporting
+    amount = db.Column(db.Numeric(12, 2), default=0, nullable=False)
+    unpriced_minutes = db.Column(db.Float, default=0, nullable=False)
+    cancellations = db.Column(db.Integer, default=0, nullable=False)
+    # Longest booking started that day (only ever grows); bounds raw lookbacks
+    max_minutes = db.Column(db.Float, default=0, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_booking_daily_rollups_tenant_day', 'tenant_id', 'day'),
+    )
+
+class Job(db.Model):
+    """
+    Background job (report, bulk import, tenant export) with its progress and result.
+    Small results are stored in `result`; file results live under JOBS_RESULT_DIR.
+    """
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.String(32), primary_key=True)
+    tenant_id = db.Column(db.Integer, db.ForeignKey('tenants.id'), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), default='queued', nullable=False)
+    params = db.Column(db.JSON, nullable=False, default=dict)
+    progress = db.Column(db.Float, default=0, nullable=False)
+    message = db.Column(db.String(255))
+    result = db.Column(db.JSON)
+    # Relative to JOBS_RESULT_DIR
+    result_file = db.Column(db.String(255))
+    result_mimetype = db.Column(db.String(100))
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_jobs_user_created', 'user_id', 'created_at'),
+        db.Index('ix_jobs_finished', 'finished_at'),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "tenant_id": self.tenant_id,
+            "user_id": self.user_id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "result": self.result,
+            "has_file": bool(self.result_file),
+            "error": self.error,
+            "created_at": self.created_at.isoformat() + "Z",
+            "started_at": self.started_at.isoformat() + "Z" if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() + "Z" if self.finished_at else None
+        }
+
+class WaitlistEntry(db.Model):
+    """
+    A customer waiting for a room slot that is already booked. When the slot
+    frees up, the highest-priority entry (earliest first on ties) is promoted
+    to a confirmed booking (see app/rooms/waitlist.py).
+    """
+    __tablename__ = 'waitlist_entries'
+
+    id = db.Column(db.Integer, primary_key=True)
+    tenant_id = db.Column(db.Integer, db.ForeignKey('tenants.id'), nullable=False)
+    room_id = db.Column(db.Integer, db.ForeignKey('rooms.id'), nullable=False)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False)
+    # Higher goes first
+    priority = db.Column(db.Integer, default=0, nullable=False)
+    # waiting | promoted | cancelled | expired
+    status = db.Column(db.String(20), default='waiting', nullable=False)
+    notes = db.Column(db.Text)
+    booking_id = db.Column(db.Integer, db.ForeignKey('bookings.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    promoted_at = db.Column(db.DateTime)
+
+    # Promotion reads the waiting entries of one room around the freed interval
+    __table_args__ = (
+        db.Index('ix_waitlist_entries_room_status_start', 'room_id', 'status', 'start_time'),
+        db.Index('ix_waitlist_entries_tenant_status', 'tenant_id', 'status'),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "tenant_id": self.tenant_id,
+            "room_id": self.room_id,
+            "customer_id": self.customer_id,
+            "start_time": self.start_time.isoformat() + "Z",
+            "end_time": self.end_time.isoformat() + "Z",
+            "priority": self.priority,
+            "status": self.status,
+            "notes": self.notes,
+            "booking_id": self.booking_id,
+            "created_at": self.created_at.isoformat() + "Z",
+            "promoted_at": self.promoted_at.isoformat() + "Z" if self.promoted_at else None
+        }
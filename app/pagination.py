@@ -0,0 +1,64 @@
+# Keyset (cursor) pagination helpers
+"""
+Opaque cursors for seek-based pagination.
+
+A cursor records the sort key, direction and the (value, id) of the last row
+on the previous page. The next page seeks past that row using the composite
+(tenant_id, <sort col>, id) indexes instead of OFFSET, so deep pages cost the
+same as the first one.
+"""
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import literal, tuple_
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded or does not match the request."""
+
+
+def encode_cursor(sort, order, value, row_id):
+    if isinstance(value, datetime):
+        value = {"dt": value.isoformat()}
+    elif isinstance(value, Decimal):
+        value = {"dec": str(value)}
+    raw = json.dumps({"s": sort, "o": order, "v": value, "i": row_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort, order):
+    """Return (value, id) from a cursor issued for the same sort and order."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        value, row_id = data['v'], int(data['i'])
+        if isinstance(value, dict):
+            value = Decimal(value['dec']) if 'dec' in value else datetime.fromisoformat(value['dt'])
+    except (ValueError, KeyError, TypeError, ArithmeticError):
+        raise InvalidCursor('Invalid cursor')
+    if data.get('s') != sort or data.get('o') != order:
+        raise InvalidCursor('Cursor does not match sort order')
+    return value, row_id
+
+
+def keyset_page(query, sort_col, id_col, order, after=None, limit=25):
+    """
+    Fetch one page ordered by (sort_col, id_col).
+    :param after: (value, id) of the last row already returned, or None for the first page
+    :return: (rows, has_next)
+    """
+    desc = order == 'desc'
+    if after is not None:
+        # Row-value comparison lets the planner seek straight into the composite index
+        value, row_id = after
+        key = tuple_(sort_col, id_col)
+        seek = tuple_(literal(value, sort_col.type), literal(row_id, id_col.type))
+        query = query.filter(key < seek if desc else key > seek)
+    if desc:
+        query = query.order_by(sort_col.desc(), id_col.desc())
+    else:
+        query = query.order_by(sort_col.asc(), id_col.asc())
+    rows = query.limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
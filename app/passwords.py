@@ -0,0 +1,162 @@
+# Password hashing (algorithm/cost profile and worker pool offload)
+"""
+Password hashing subsystem.
+
+Hashing and verification run in a bounded process pool (PASSWORD_HASH_WORKERS)
+so pbkdf2/bcrypt work does not hold the GIL on gunicorn request threads. When
+more than PASSWORD_HASH_MAX_PENDING jobs are queued, new work is refused with
+HashingBusy instead of piling up behind a login storm. With zero workers the
+work runs inline (the default for development and tests).
+
+The algorithm and cost come from configuration; `needs_rehash()` reports hashes
+created with an older algorithm or a lower cost so login can upgrade them.
+"""
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import bcrypt
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+_PBKDF2_RE = re.compile(r'^pbkdf2:(?P<digest>[a-z0-9]+):(?P<iterations>\d+)\$')
+_BCRYPT_RE = re.compile(r'^\$2[aby]?\$(?P<rounds>\d{2})\$')
+
+
+class HashingBusy(RuntimeError):
+    """Raised when the hashing queue is full; callers should answer 503."""
+
+
+def _hash(password, method, pbkdf2_iterations, bcrypt_rounds):
+    if method == 'bcrypt':
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=bcrypt_rounds)).decode('ascii')
+    return generate_password_hash(password, method=f'{method}:{pbkdf2_iterations}', salt_length=16)
+
+
+def _verify(stored_hash, password):
+    if not stored_hash:
+        return False
+    if _BCRYPT_RE.match(stored_hash):
+        try:
+            return bcrypt.checkpw(password.encode('utf-8'), stored_hash.encode('ascii'))
+        except ValueError:
+            return False
+    try:
+        return check_password_hash(stored_hash, password)
+    except (ValueError, TypeError):
+        # Unknown/unsupported scheme (e.g. scrypt on a platform without hashlib.scrypt)
+        return False
+
+
+class PasswordHasher:
+    """Configured hashing profile plus the optional worker pool."""
+
+    def __init__(self, method='pbkdf2:sha256', pbkdf2_iterations=260000, bcrypt_rounds=12,
+                 workers=0, max_pending=32, timeout=10.0):
+        if method != 'bcrypt' and not method.startswith('pbkdf2:'):
+            raise ValueError(f"Unsupported PASSWORD_HASH_METHOD: {method}")
+        self.method = method
+        self.pbkdf2_iterations = pbkdf2_iterations
+        self.bcrypt_rounds = bcrypt_rounds
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending) if workers else None
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            method=config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256'),
+            pbkdf2_iterations=config.get('PASSWORD_PBKDF2_ITERATIONS', 260000),
+            bcrypt_rounds=config.get('PASSWORD_BCRYPT_ROUNDS', 12),
+            workers=config.get('PASSWORD_HASH_WORKERS', 0),
+            max_pending=config.get('PASSWORD_HASH_MAX_PENDING', 32),
+            timeout=config.get('PASSWORD_HASH_TIMEOUT', 10.0),
+        )
+
+    def _executor(self):
+        # Pools do not survive fork (gunicorn preload), so create one per process
+        with self._pool_lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy("Password hashing queue is full")
+        try:
+            future = self._executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the job finishes, not until we stop waiting: a job that
+        # timed out keeps running in the pool and must still count against the queue
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise HashingBusy("Password hashing timed out")
+
+    def hash(self, password):
+        return self._run(_hash, password, self.method, self.pbkdf2_iterations, self.bcrypt_rounds)
+
+    def verify(self, stored_hash, password):
+        return self._run(_verify, stored_hash, password)
+
+    def needs_rehash(self, stored_hash):
+        """True when the hash uses another algorithm or a lower cost than configured."""
+        if self.method == 'bcrypt':
+            match = _BCRYPT_RE.match(stored_hash or '')
+            return not match or int(match.group('rounds')) < self.bcrypt_rounds
+        match = _PBKDF2_RE.match(stored_hash or '')
+        if not match:
+            return True
+        return (f"pbkdf2:{match.group('digest')}" != self.method
+                or int(match.group('iterations')) < self.pbkdf2_iterations)
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def init_app(app):
+    """Answer 503 + Retry-After when the hashing pool is saturated."""
+    from .utils import make_response_payload
+
+    @app.errorhandler(HashingBusy)
+    def handle_hashing_busy(error):
+        response = make_response_payload(False, message="Server is busy, please retry shortly")
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+
+def get_hasher():
+    """Return the app's hasher, built from config on first use."""
+    hasher = current_app.extensions.get('password_hasher')
+    if hasher is None:
+        hasher = current_app.extensions['password_hasher'] = PasswordHasher.from_config(current_app.config)
+    return hasher
+
+
+def hash_password(password):
+    """Hash a password with the configured algorithm and cost."""
+    return get_hasher().hash(password)
+
+
+def verify_password(stored_hash, password):
+    """Check a password against any supported stored hash."""
+    return get_hasher().verify(stored_hash, password)
+
+
+def needs_rehash(stored_hash):
+    return get_hasher().needs_rehash(stored_hash)
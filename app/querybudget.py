@@ -0,0 +1,138 @@
+# SQL statement budgets and repeated-query (N+1) detection
+"""
+Count the SQL statements a block of code issues.
+
+In tests, `query_budget(n)` fails when the wrapped block (or decorated
+function) issues more than `n` statements, listing them in the message:
+
+    with query_budget(3):
+        client.get('/api/customers')
+
+In development, set QUERY_REPEAT_LOG_THRESHOLD to a positive number and each
+request that issues the same statement shape that many times is logged with
+the stack that issued it. A shape is the statement text with whitespace and
+IN-list placeholders collapsed, so a relationship loaded row by row
+shows up as one shape repeated once per row.
+"""
+import re
+import sysconfig
+import threading
+import traceback
+from collections import Counter
+from contextlib import ContextDecorator
+
+import sqlalchemy as sa
+from flask import current_app, g, has_request_context, request
+
+_IN_LIST = re.compile(r'\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+_G_KEY = '_query_shapes'
+# Frames from these directories (stdlib, installed packages) are left out of logged stacks
+_LIBRARY_DIRS = tuple({sysconfig.get_paths()[key] for key in ('stdlib', 'purelib', 'platlib')})
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block issues more SQL statements than its budget."""
+
+
+def statement_shape(statement):
+    """Normalise a SQL statement so repeats that differ only in parameters compare equal."""
+    return _IN_LIST.sub('(...)', _WHITESPACE.sub(' ', statement).strip())
+
+
+def _app_stack():
+    """The application frames of the current stack, innermost last."""
+    frames = [f for f in traceback.extract_stack()
+              if not f.filename.startswith(_LIBRARY_DIRS) and f.filename != __file__]
+    return ''.join(traceback.format_list(frames))
+
+
+class QueryCounter:
+    """Collects the statements executed on any engine while active."""
+
+    def __init__(self):
+        self.statements = []
+        self._lock = threading.Lock()
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        with self._lock:
+            self.statements.append(statement)
+
+    def __enter__(self):
+        sa.event.listen(sa.engine.Engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        sa.event.remove(sa.engine.Engine, 'before_cursor_execute', self._record)
+        return False
+
+    def __len__(self):
+        return len(self.statements)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def shapes(self):
+        """Counter of statement shapes, most repeated first via most_common()."""
+        return Counter(statement_shape(s) for s in self.statements)
+
+
+def count_queries():
+    """Context manager yielding a QueryCounter for the enclosed block."""
+    return QueryCounter()
+
+
+class query_budget(ContextDecorator):
+    """Fail with QueryBudgetExceeded when the block issues more than `max_queries` statements."""
+
+    def __init__(self, max_queries):
+        self.max_queries = max_queries
+        self.counter = None
+
+    def __enter__(self):
+        self.counter = QueryCounter().__enter__()
+        return self.counter
+
+    def __exit__(self, exc_type, exc, tb):
+        self.counter.__exit__(exc_type, exc, tb)
+        if exc_type is None and self.counter.count > self.max_queries:
+            listing = '\n'.join(f'  {n}x {shape}' for shape, n in self.counter.shapes().most_common())
+            raise QueryBudgetExceeded(
+                f'{self.counter.count} SQL statements issued, budget is {self.max_queries}:\n{listing}')
+        return False
+
+
+@sa.event.listens_for(sa.engine.Engine, 'before_cursor_execute')
+def _record_shape(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context():
+        return
+    shapes = g.get(_G_KEY)
+    if shapes is None:
+        return
+    entry = shapes.setdefault(statement_shape(statement), [0, None])
+    entry[0] += 1
+    # Capture the stack once, when the shape first reaches the threshold
+    if entry[0] == current_app.config['QUERY_REPEAT_LOG_THRESHOLD']:
+        entry[1] = _app_stack()
+
+
+def init_app(app):
+    """Log repeated statement shapes per request while QUERY_REPEAT_LOG_THRESHOLD > 0."""
+
+    @app.before_request
+    def _start_shape_log():
+        if app.config.get('QUERY_REPEAT_LOG_THRESHOLD', 0) > 0:
+            g.setdefault(_G_KEY, {})
+
+    @app.teardown_request
+    def _report_repeated_shapes(exc):
+        shapes = g.pop(_G_KEY, None)
+        if not shapes:
+            return
+        threshold = app.config['QUERY_REPEAT_LOG_THRESHOLD']
+        for shape, (count, stack) in shapes.items():
+            if count >= threshold:
+                app.logger.warning(
+                    'Statement issued %d times in %s %s (possible N+1): %s\nFirst repeated at:\n%s',
+                    count, request.method, request.path, shape, stack)
@@ -0,0 +1,213 @@
+# Request rate limiting (sliding-window counters, memory or Redis)
+"""
+Throttle login, registration and validation calls.
+
+Each rule allows `count` hits per `period` seconds for one key (client IP,
+email or tenant). Limits use the sliding-window counter approximation: the
+previous fixed window's count is weighted by how much of it still overlaps
+the sliding window, so a burst at a window edge cannot double the rate.
+Rejected hits are not counted, by any of the request's rules: when one rule
+rejects, the hits already made against the others are undone. A client that
+backs off for Retry-After seconds is let through again.
+
+Tenant quotas scale with `Tenant.plan` via RATE_LIMIT_PLAN_MULTIPLIERS.
+The memory backend suits a single node. The redis backend
+(RATE_LIMIT_BACKEND=redis) shares counters across gunicorn workers and
+nodes with one pipelined round trip per rule. Client IPs come from
+request.remote_addr, so deployments behind a proxy should apply
+werkzeug's ProxyFix.
+"""
+import logging
+import math
+import threading
+import time
+from typing import NamedTuple
+
+from flask import current_app, request
+
+from .utils import make_response_payload
+
+logger = logging.getLogger(__name__)
+
+
+class Limit(NamedTuple):
+    count: int
+    period: int
+
+    @classmethod
+    def parse(cls, spec):
+        """'20/60' -> Limit(20, 60)."""
+        count, _, period = str(spec).partition('/')
+        return cls(int(count), int(period or 60))
+
+
+def parse_multipliers(spec):
+    """'free=1,basic=2' -> {'free': 1.0, 'basic': 2.0}."""
+    pairs = (item.split('=', 1) for item in str(spec).split(',') if '=' in item)
+    return {plan.strip(): float(value) for plan, value in pairs}
+
+
+def retry_after(prev, curr, elapsed, limit):
+    """Seconds until one more hit fits, given the window counts before this hit."""
+    count, period = limit
+    if curr + 1 > count:
+        # Only the next window can help; there `curr` becomes the decaying previous count
+        wait = period - elapsed
+        if curr > 0:
+            wait += max(0.0, period * (1 - (count - 1) / curr))
+        return wait
+    if prev <= 0:
+        return 0.0
+    return max(0.0, period * (1 - (count - curr - 1) / prev) - elapsed)
+
+
+class MemoryBackend:
+    """Per-process counters: key -> [window index, current count, previous count, period]."""
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, now):
+        count, period = limit
+        index, elapsed = divmod(now, period)
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or state[0] < index - 1:
+                state = [index, 0, 0, period]
+            elif state[0] == index - 1:
+                state = [index, 0, state[1], period]
+            prev, curr = state[2], state[1]
+            weighted = prev * (1 - elapsed / period) + curr
+            allowed = weighted + 1 <= count
+            if allowed:
+                state[1] += 1
+            self._windows[key] = state
+            if len(self._windows) > self.max_keys:
+                self._prune(now)
+        return allowed, (0.0 if allowed else retry_after(prev, curr, elapsed, limit))
+
+    def undo(self, key, limit, now):
+        """Take back an allowed hit made at `now`."""
+        index = now // limit.period
+        with self._lock:
+            state = self._windows.get(key)
+            if state is not None and state[0] == index and state[1] > 0:
+                state[1] -= 1
+
+    def _prune(self, now):
+        # Entries two of their own windows old no longer affect any decision
+        stale = [k for k, (index, _, _, period) in self._windows.items() if index < now // period - 1]
+        for k in stale:
+            del self._windows[k]
+        while len(self._windows) > self.max_keys:
+            self._windows.pop(next(iter(self._windows)))
+
+
+class RedisBackend:
+    """Counters in Redis, one key per (rule key, window) expiring after two windows."""
+
+    def __init__(self, client, prefix='ratelimit'):
+        self.client = client
+        self.prefix = prefix
+
+    def hit(self, key, limit, now):
+        count, period = limit
+        index, elapsed = divmod(now, period)
+        current = f'{self.prefix}:{key}:{int(index)}'
+        pipe = self.client.pipeline(transaction=False)
+        pipe.incr(current)
+        pipe.expire(current, period * 2)
+        pipe.get(f'{self.prefix}:{key}:{int(index) - 1}')
+        curr, _, prev = pipe.execute()
+        prev = int(prev or 0)
+        # curr already includes this hit
+        if prev * (1 - elapsed / period) + curr <= count:
+            return True, 0.0
+        self.client.decr(current)
+        return False, retry_after(prev, curr - 1, elapsed, limit)
+
+    def undo(self, key, limit, now):
+        """Take back an allowed hit made at `now`."""
+        self.client.decr(f'{self.prefix}:{key}:{int(now // limit.period)}')
+
+
+class RateLimiter:
+    """Apply named rules against a backend."""
+
+    def __init__(self, backend, clock=time.time):
+        self.backend = backend
+        self.clock = clock
+
+    def hit(self, name, key, limit, now=None):
+        """:return: (allowed, retry_after seconds); fails open if the backend is unreachable"""
+        try:
+            return self.backend.hit(f'{name}:{key}', limit, self.clock() if now is None else now)
+        except Exception:
+            logger.warning('Rate limiter backend failed; allowing request', exc_info=True)
+            return True, 0.0
+
+    def undo(self, name, key, limit, now):
+        """Take back a hit allowed at `now` (best effort)."""
+        try:
+            self.backend.undo(f'{name}:{key}', limit, now)
+        except Exception:
+            logger.warning('Rate limiter backend failed; hit not undone', exc_info=True)
+
+
+def _config_limit(name):
+    return Limit.parse(current_app.config[name])
+
+
+def tenant_limit(tenant):
+    """The per-tenant quota (RATE_LIMIT_TENANT) scaled by the tenant's plan."""
+    base = _config_limit('RATE_LIMIT_TENANT')
+    multipliers = parse_multipliers(current_app.config.get('RATE_LIMIT_PLAN_MULTIPLIERS', ''))
+    return Limit(max(1, int(base.count * multipliers.get(tenant.plan, 1.0))), base.period)
+
+
+def check(*rules):
+    """
+    Count a hit against each (name, key, limit) rule; rules with a None key are skipped.
+    `limit` is a Limit or the name of a config entry holding one. A rejected
+    request counts against none of the rules.
+    :return: a 429 response when any rule is exhausted, else None
+    """
+    limiter = current_app.extensions.get('rate_limiter')
+    if limiter is None:
+        return None
+    now = limiter.clock()
+    counted = []
+    for name, key, limit in rules:
+        if key is None or key == '':
+            continue
+        if isinstance(limit, str):
+            limit = _config_limit(limit)
+        allowed, wait = limiter.hit(name, key, limit, now)
+        if allowed:
+            counted.append((name, key, limit))
+        else:
+            for rule in counted:
+                limiter.undo(*rule, now)
+            response = make_response_payload(False, message="Too many requests, please try again later")
+            response.headers['Retry-After'] = str(max(1, math.ceil(wait)))
+            return response, 429
+    return None
+
+
+def client_ip():
+    return request.remote_addr or 'unknown'
+
+
+def init_app(app):
+    """Build the limiter: RATE_LIMIT_BACKEND = memory | redis (RATE_LIMIT_ENABLED=false disables)."""
+    if not app.config.get('RATE_LIMIT_ENABLED', True):
+        app.extensions.pop('rate_limiter', None)
+        return
+    if app.config.get('RATE_LIMIT_BACKEND', 'memory') == 'redis':
+        import redis
+        backend = RedisBackend(redis.Redis.from_url(app.config['RATE_LIMIT_REDIS_URL']))
+    else:
+        backend = MemoryBackend()
+    app.extensions['rate_limiter'] = RateLimiter(backend)
@@ -0,0 +1,362 @@
+# Occupancy and revenue reporting engine
+"""
+Room occupancy, revenue and peak-hour reports over arbitrary date ranges.
+
+The database does the heavy lifting: bookings are clipped to the requested
+range and aggregated with GROUP BY (per room and start day, and per start
+weekday/hour/minute and duration for the heatmap), so only a few thousand
+rows ever reach Python however many bookings a tenant has. pandas/NumPy then
+handle the time bucketing: filling empty days, rolling days up into weeks or
+months, and spreading durations across the 7x24 week grid.
+
+A booking is attributed to the day it starts on; bookings without a
+total_amount are valued at the room's hourly_rate.
+
+Per-day totals come from `booking_daily_rollups` for every whole day of the
+range before today. Raw bookings are only read for the partial days at the
+edges, for today, and to clip bookings that overhang either end of the range.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+from flask import current_app
+
+from .. import db
+from ..models import Booking, BookingDailyRollup, Room
+from .rollups import REPORTED_STATUSES, seconds_between, today
+
+BUCKETS = {'day': 'D', 'week': 'W', 'month': 'M'}
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+MINUTES_PER_WEEK = 7 * 24 * 60
+
+
+class ReportRange:
+    """Half-open [start, end) reporting window plus the daily opening hours."""
+
+    def __init__(self, start, end, open_hour=0, close_hour=24):
+        if end <= start:
+            raise ValueError('end must be after start')
+        if not 0 <= open_hour < close_hour <= 24:
+            raise ValueError('Invalid opening hours')
+        self.start = start
+        self.end = end
+        self.open_hour = open_hour
+        self.close_hour = close_hour
+
+    def open_hours(self):
+        """Bookable hours per room within the range."""
+        days = pd.date_range(pd.Timestamp(self.start).normalize(), self.end, freq='D', inclusive='left')
+        opens = days + pd.Timedelta(hours=self.open_hour)
+        closes = days + pd.Timedelta(hours=self.close_hour)
+        lo = np.maximum(opens.values, np.datetime64(self.start))
+        hi = np.minimum(closes.values, np.datetime64(self.end))
+        return float(np.clip((hi - lo) / np.timedelta64(1, 'h'), 0, None).sum())
+
+
+def _clipped(rng):
+    start = sa.case((Booking.start_time < rng.start, sa.literal(rng.start, sa.DateTime)), else_=Booking.start_time)
+    end = sa.case((Booking.end_time > rng.end, sa.literal(rng.end, sa.DateTime)), else_=Booking.end_time)
+    return start, end
+
+
+def _booking_filter(stmt, tenant_id, rng, room_ids, start_from=None, start_before=None):
+    stmt = stmt.where(
+        Booking.tenant_id == tenant_id,
+        Booking.status.in_(REPORTED_STATUSES),
+        Booking.start_time < rng.end,
+        Booking.end_time > rng.start,
+    )
+    if start_from is not None:
+        stmt = stmt.where(Booking.start_time >= start_from)
+    if start_before is not None:
+        stmt = stmt.where(Booking.start_time < start_before)
+    if room_ids is not None:
+        stmt = stmt.where(Booking.room_id.in_(room_ids))
+    return stmt
+
+
+def rooms_frame(tenant_id, studio_id=None):
+    """Rooms of the tenant (optionally one studio) as a DataFrame indexed by room id."""
+    stmt = sa.select(Room.id, Room.studio_id, Room.name, Room.hourly_rate, Room.is_active).where(
+        Room.tenant_id == tenant_id)
+    if studio_id is not None:
+        stmt = stmt.where(Room.studio_id == studio_id)
+    rows = db.session.execute(stmt).all()
+    frame = pd.DataFrame(rows, columns=['room_id', 'studio_id', 'name', 'hourly_rate', 'is_active'])
+    frame['hourly_rate'] = pd.to_numeric(frame['hourly_rate'], errors='coerce').fillna(0.0).astype(float)
+    return frame.set_index('room_id')
+
+
+TOTALS_COLUMNS = ['room_id', 'day', 'bookings', 'hours', 'amount', 'unpriced_hours']
+
+
+def _totals_frame(rows):
+    frame = pd.DataFrame(rows, columns=TOTALS_COLUMNS)
+    frame['day'] = pd.to_datetime(frame['day'])
+    for col in ('hours', 'amount', 'unpriced_hours'):
+        frame[col] = pd.to_numeric(frame[col], errors='coerce').fillna(0.0).astype(float)
+    return frame
+
+
+def _raw_daily_totals(tenant_id, rng, room_ids, start_from=None, start_before=None):
+    """Aggregate raw bookings, clipped to the range, per (room, start day)."""
+    start, end = _clipped(rng)
+    seconds = seconds_between(start, end)
+    day = sa.func.date(start).label('day')
+    stmt = _booking_filter(sa.select(
+        Booking.room_id,
+        day,
+        sa.func.count().label('bookings'),
+        (sa.func.sum(seconds) / 3600.0).label('hours'),
+        sa.func.sum(Booking.total_amount).label('amount'),
+        (sa.func.sum(sa.case((Booking.total_amount.is_(None), seconds), else_=0)) / 3600.0).label('unpriced_hours'),
+    ), tenant_id, rng, room_ids, start_from, start_before).group_by(Booking.room_id, day)
+    return db.session.execute(stmt).all()
+
+
+def _rollup_daily_totals(tenant_id, first_day, last_day, room_ids):
+    """Rollup rows for whole days in [first_day, last_day)."""
+    # Plain float/string columns skip the per-row Decimal and date conversions
+    stmt = sa.select(
+        BookingDailyRollup.room_id,
+        sa.func.date(BookingDailyRollup.day),
+        BookingDailyRollup.bookings,
+        BookingDailyRollup.booked_minutes / 60.0,
+        sa.cast(BookingDailyRollup.amount, sa.Float),
+        BookingDailyRollup.unpriced_minutes / 60.0,
+    ).where(
+        BookingDailyRollup.tenant_id == tenant_id,
+        BookingDailyRollup.day >= first_day.date(),
+        BookingDailyRollup.day < last_day.date(),
+        BookingDailyRollup.bookings != 0,
+    )
+    if room_ids is not None:
+        stmt = stmt.where(BookingDailyRollup.room_id.in_(room_ids))
+    return db.session.execute(stmt).all()
+
+
+def _overhang_corrections(tenant_id, rng, room_ids, start_from, start_before):
+    """
+    Negative adjustments for rolled-up bookings that run past the end of the
+    range (rollups hold their full duration, reports clip it).
+    """
+    overhang = seconds_between(sa.literal(rng.end, sa.DateTime), Booking.end_time)
+    day = sa.func.date(Booking.start_time).label('day')
+    stmt = _booking_filter(sa.select(
+        Booking.room_id,
+        day,
+        sa.literal(0),
+        (-sa.func.sum(overhang) / 3600.0),
+        sa.literal(0),
+        (-sa.func.sum(sa.case((Booking.total_amount.is_(None), overhang), else_=0)) / 3600.0),
+    ), tenant_id, rng, room_ids, start_from, start_before).where(
+        Booking.end_time > rng.end,
+    ).group_by(Booking.room_id, day)
+    return db.session.execute(stmt).all()
+
+
+def daily_room_totals(tenant_id, rng, room_ids=None, use_rollups=None):
+    """
+    Aggregate bookings per (room, start day).
+    :param use_rollups: read whole past days from the rollup table (REPORTS_USE_ROLLUPS when None)
+    :return: DataFrame with room_id, day, bookings, hours, amount, unpriced_hours
+    """
+    if use_rollups is None:
+        use_rollups = current_app.config.get('REPORTS_USE_ROLLUPS', True)
+    first_day = pd.Timestamp(rng.start).ceil('D').to_pydatetime()
+    last_day = min(pd.Timestamp(rng.end).floor('D').to_pydatetime(), today())
+    if not use_rollups or first_day >= last_day:
+        return _totals_frame(_raw_daily_totals(tenant_id, rng, room_ids))
+
+    # No booking is longer than the longest one recorded, which bounds the
+    # raw scans for bookings that start before an edge but reach past it
+    longest = db.session.execute(sa.select(sa.func.max(BookingDailyRollup.max_minutes)).where(
+        BookingDailyRollup.tenant_id == tenant_id)).scalar() or 0
+    lookback = timedelta(minutes=float(longest))
+
+    rows = _rollup_daily_totals(tenant_id, first_day, last_day, room_ids)
+    rows += _raw_daily_totals(tenant_id, rng, room_ids, start_from=rng.start - lookback, start_before=first_day)
+    rows += _raw_daily_totals(tenant_id, rng, room_ids, start_from=last_day)
+    if rng.end - lookback < last_day:
+        rows += _overhang_corrections(tenant_id, rng, room_ids,
+                                      start_from=max(first_day, rng.end - lookback), start_before=last_day)
+    frame = _totals_frame(rows)
+    return frame.groupby(['room_id', 'day'], as_index=False)[TOTALS_COLUMNS[2:]].sum()
+
+
+def _room_filter(rooms, studio_id):
+    # Without a studio filter the tenant condition alone selects the right rooms
+    return rooms.index.tolist() if studio_id is not None else None
+
+
+def _with_revenue(totals, rooms):
+    rates = totals['room_id'].map(rooms['hourly_rate']).fillna(0.0)
+    return totals.assign(revenue=totals['amount'] + totals['unpriced_hours'] * rates)
+
+
+def _open_window_hours(tenant_id, rng, room_ids):
+    """
+    Booked hours per room inside the daily opening hours, bookings clipped to
+    the range. Bookings are grouped by room, start minute of the day and
+    duration; each group's overlap with the opening window of every day it
+    spans is then computed in closed form.
+    """
+    start, end = _clipped(rng)
+    hour, minute = sa.extract('hour', start), sa.extract('minute', start)
+    duration = sa.func.round(seconds_between(start, end) / 60.0)
+    stmt = _booking_filter(
+        sa.select(Booking.room_id, hour, minute, duration, sa.func.count()),
+        tenant_id, rng, room_ids,
+    ).group_by(Booking.room_id, hour, minute, duration)
+    groups = np.array(db.session.execute(stmt).all(), dtype=float).reshape(-1, 5)
+    opens, window = rng.open_hour * 60, (rng.close_hour - rng.open_hour) * 60
+
+    def open_minutes_before(t):
+        # Opening-hour minutes from midnight of the start day up to minute t
+        days, rest = np.divmod(t, 1440)
+        return days * window + np.clip(rest - opens, 0, window)
+
+    starts = groups[:, 1] * 60 + groups[:, 2]
+    minutes = (open_minutes_before(starts + groups[:, 3]) - open_minutes_before(starts)) * groups[:, 4]
+    return pd.Series(minutes / 60.0, index=groups[:, 0].astype(np.int64)).groupby(level=0).sum()
+
+
+def occupancy_report(tenant_id, rng, studio_id=None):
+    """Booked hours, occupancy % and revenue per room, with tenant-wide totals."""
+    rooms = rooms_frame(tenant_id, studio_id)
+    totals = _with_revenue(daily_room_totals(tenant_id, rng, _room_filter(rooms, studio_id)), rooms)
+    per_room = totals.groupby('room_id')[['bookings', 'hours', 'revenue']].sum()
+    per_room = rooms.join(per_room).fillna({'bookings': 0, 'hours': 0.0, 'revenue': 0.0})
+
+    # Occupancy only counts booked time inside the opening hours, like the heatmap
+    available = rng.open_hours()
+    if rng.open_hour > 0 or rng.close_hour < 24:
+        open_booked = _open_window_hours(tenant_id, rng, _room_filter(rooms, studio_id)).reindex(
+            per_room.index, fill_value=0.0)
+    else:
+        open_booked = per_room['hours']
+    per_room['occupancy'] = open_booked / available * 100 if available else 0.0
+    total_available = available * int(per_room['is_active'].sum())
+    return {
+        "rooms": [
+            {
+                "room_id": int(row.Index),
+                "studio_id": int(row.studio_id),
+                "name": row.name,
+                "is_active": bool(row.is_active),
+                "bookings": int(row.bookings),
+                "booked_hours": round(float(row.hours), 2),
+                "available_hours": round(available, 2),
+                "occupancy_pct": round(float(row.occupancy), 2),
+                "revenue": round(float(row.revenue), 2),
+            }
+            for row in per_room.itertuples()
+        ],
+        "totals": {
+            "bookings": int(per_room['bookings'].sum()),
+            "booked_hours": round(float(per_room['hours'].sum()), 2),
+            "available_hours": round(total_available, 2),
+            "occupancy_pct": round(float(open_booked.sum() / total_available * 100), 2) if total_available else 0.0,
+            "revenue": round(float(per_room['revenue'].sum()), 2),
+        },
+    }
+
+
+def revenue_report(tenant_id, rng, group_by='day', bucket='day', studio_id=None):
+    """
+    Revenue grouped by 'room', 'studio' or time ('day', bucketed by day/week/month).
+    Time series include empty buckets so charts need no gap filling.
+    """
+    rooms = rooms_frame(tenant_id, studio_id)
+    totals = _with_revenue(daily_room_totals(tenant_id, rng, _room_filter(rooms, studio_id)), rooms)
+
+    if group_by in ('room', 'studio'):
+        key = 'room_id' if group_by == 'room' else 'studio_id'
+        if group_by == 'studio':
+            totals = totals.assign(studio_id=totals['room_id'].map(rooms['studio_id']))
+        grouped = totals.groupby(key)[['bookings', 'hours', 'revenue']].sum()
+        keys = rooms.index.unique() if group_by == 'room' else rooms['studio_id'].unique()
+        grouped = grouped.reindex(keys, fill_value=0)
+        return [
+            {key: int(row.Index), "bookings": int(row.bookings), "booked_hours": round(float(row.hours), 2),
+             "revenue": round(float(row.revenue), 2)}
+            for row in grouped.sort_index().itertuples()
+        ]
+
+    freq = BUCKETS[bucket]
+    totals = totals.assign(period=totals['day'].dt.to_period(freq))
+    grouped = totals.groupby('period')[['bookings', 'hours', 'revenue']].sum()
+    periods = pd.period_range(pd.Timestamp(rng.start), pd.Timestamp(rng.end) - pd.Timedelta(microseconds=1), freq=freq)
+    grouped = grouped.reindex(periods, fill_value=0)
+    return [
+        {"period": row.Index.start_time.date().isoformat(), "bookings": int(row.bookings),
+         "booked_hours": round(float(row.hours), 2), "revenue": round(float(row.revenue), 2)}
+        for row in grouped.itertuples()
+    ]
+
+
+def _week_minutes_available(rng):
+    """Minutes of the range (within opening hours) falling on each weekday/hour slot."""
+    hours = pd.date_range(pd.Timestamp(rng.start).floor('h'), rng.end, freq='h', inclusive='left')
+    hours = hours[(hours.hour >= rng.open_hour) & (hours.hour < rng.close_hour)]
+    lo = np.maximum(hours.values, np.datetime64(rng.start))
+    hi = np.minimum((hours + pd.Timedelta(hours=1)).values, np.datetime64(rng.end))
+    minutes = (hi - lo) / np.timedelta64(1, 'm')
+    grid = np.zeros((7, 24))
+    np.add.at(grid, (hours.dayofweek, hours.hour), minutes)
+    return grid
+
+
+def heatmap_report(tenant_id, rng, studio_id=None):
+    """
+    Peak-hour heatmap: booked hours and occupancy % per weekday (Monday first) and hour.
+    """
+    rooms = rooms_frame(tenant_id, studio_id)
+    start, end = _clipped(rng)
+    dow, hour, minute = sa.extract('dow', start), sa.extract('hour', start), sa.extract('minute', start)
+    duration = sa.func.round(seconds_between(start, end) / 60.0)
+    stmt = _booking_filter(
+        sa.select(dow, hour, minute, duration, sa.func.count()),
+        tenant_id, rng, _room_filter(rooms, studio_id),
+    ).group_by(dow, hour, minute, duration)
+    groups = np.array(db.session.execute(stmt).all(), dtype=float).reshape(-1, 5)
+
+    # SQL weekdays start on Sunday; the grid starts on Monday
+    offset = (((groups[:, 0] + 6) % 7) * 1440 + groups[:, 1] * 60 + groups[:, 2]).astype(np.int64)
+    duration_min = groups[:, 3].astype(np.int64)
+    counts = groups[:, 4]
+
+    # Difference array over the minutes of a week: +count where bookings start,
+    # -count where they end (wrapping past Sunday midnight), then a cumulative sum
+    full_weeks, remainder = np.divmod(duration_min, MINUTES_PER_WEEK)
+    ends = offset + remainder
+    diff = np.zeros(MINUTES_PER_WEEK + 1)
+    np.add.at(diff, offset, counts)
+    np.add.at(diff, np.minimum(ends, MINUTES_PER_WEEK), -counts)
+    wrapped = ends > MINUTES_PER_WEEK
+    np.add.at(diff, np.zeros(wrapped.sum(), dtype=np.int64), counts[wrapped])
+    np.add.at(diff, ends[wrapped] - MINUTES_PER_WEEK, -counts[wrapped])
+    busy = np.cumsum(diff)[:MINUTES_PER_WEEK] + (full_weeks * counts).sum()
+    booked = busy.reshape(7, 24, 60).sum(axis=2) / 60.0
+
+    capacity = _week_minutes_available(rng) / 60.0 * int(rooms['is_active'].sum())
+    with np.errstate(divide='ignore', invalid='ignore'):
+        occupancy = np.where(capacity > 0, booked / capacity * 100, np.nan)
+
+    peak = np.unravel_index(np.nanargmax(occupancy), occupancy.shape) if booked.any() else None
+    return {
+        "weekdays": list(WEEKDAYS),
+        "hours": list(range(24)),
+        "booked_hours": np.round(booked, 2).tolist(),
+        "occupancy_pct": [[None if np.isnan(v) else round(float(v), 2) for v in row] for row in occupancy],
+        "peak": {"weekday": WEEKDAYS[peak[0]], "hour": int(peak[1]),
+                 "occupancy_pct": round(float(occupancy[peak]), 2)} if peak else None,
+    }
+
+
+def default_range(days=30):
+    """The last `days` whole days up to the start of tomorrow (UTC)."""
+    end = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    return end - timedelta(days=days), end
@@ -0,0 +1,192 @@
+# Room demand forecasting (weekly-seasonal exponential smoothing)
+"""
+Forecast booked hours per room and day from the recent daily history.
+
+History is the booked hours per room and start day over the last
+`history_days` whole days before today. It is read with one aggregate query
+(GROUP BY room), from `booking_daily_rollups` (REPORTS_USE_ROLLUPS) or from
+raw bookings, and pivoted into a rooms x days matrix. Days without bookings
+count as zero.
+
+Every room gets additive Holt-Winters smoothing with a weekly season and no
+trend (ETS(A,N,A)): a level, plus one seasonal offset per weekday. The
+recursion loops over days only; each step updates all rooms at once as NumPy
+vectors. The smoothing weights are picked per room from a small grid, and
+every grid point runs in the same vectors, so the fit costs one pass over the
+history whatever the number of rooms.
+
+Prediction intervals use the ETS(A,N,A) forecast variance with the room's
+one-step residual variance. Studio and tenant totals add the room forecasts
+and their variances, which treats rooms as independent. Forecasts and bounds
+are clipped at zero hours.
+"""
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+
+from .. import db
+from ..models import Booking, BookingDailyRollup
+from .engine import rooms_frame
+from .rollups import REPORTED_STATUSES, seconds_between, today
+
+SEASON = 7
+METHOD = 'holt_winters_additive_weekly'
+# Smoothing weights tried for every room: level (alpha) x season (gamma)
+ALPHAS = (0.05, 0.1, 0.2, 0.3, 0.5)
+GAMMAS = (0.05, 0.1, 0.2)
+# Two-sided normal quantiles for the supported interval levels (%)
+Z_SCORES = {80: 1.2816, 90: 1.6449, 95: 1.9600, 99: 2.5758}
+
+
+def _concat(values):
+    """SQL aggregate joining `values` (text) with commas."""
+    if db.engine.dialect.name == 'postgresql':
+        return sa.func.string_agg(values, ',')
+    return sa.func.group_concat(values, ',')
+
+
+def _history_query(tenant_id, first_day, last_day, room_ids, use_rollups):
+    """
+    One row per room: (room_id, 'day,minutes,day,minutes,...'). Packing each
+    room's series into one string keeps a few thousand rows, not a million,
+    between the database and NumPy.
+    """
+    if use_rollups:
+        table, when, minutes = BookingDailyRollup, BookingDailyRollup.day, BookingDailyRollup.booked_minutes
+        conditions = [BookingDailyRollup.day >= first_day.date(), BookingDailyRollup.day < last_day.date()]
+    else:
+        # Several bookings on one day are added up when the matrix is filled
+        table, when = Booking, Booking.start_time
+        minutes = seconds_between(Booking.start_time, Booking.end_time) / 60.0
+        conditions = [Booking.status.in_(REPORTED_STATUSES), Booking.start_time >= first_day,
+                      Booking.start_time < last_day]
+    stmt = sa.select(table.room_id, _concat(sa.cast(when, sa.String) + ',' + sa.cast(minutes, sa.String))).where(
+        table.tenant_id == tenant_id, *conditions).group_by(table.room_id)
+    if room_ids is not None:
+        stmt = stmt.where(table.room_id.in_(room_ids))
+    return stmt
+
+
+def history_matrix(tenant_id, room_ids, first_day, last_day, use_rollups=True, restrict=False):
+    """
+    Booked hours per room and start day as a len(room_ids) x days matrix (rows follow `room_ids`).
+    :param restrict: filter the query by `room_ids` (otherwise the tenant's rows are read and unknown rooms dropped)
+    """
+    days = (last_day - first_day).days
+    matrix = np.zeros((len(room_ids), days))
+    stmt = _history_query(tenant_id, first_day, last_day, list(room_ids) if restrict else None, use_rollups)
+    rows = db.session.execute(stmt).all()
+    if not rows:
+        return matrix
+    positions = np.repeat(pd.Index(room_ids).get_indexer([room_id for room_id, _ in rows]),
+                          [series.count(',') // 2 + 1 for _, series in rows])
+    values = ','.join(series for _, series in rows).split(',')
+    # ISO dates or timestamps; whole days from first_day
+    starts = np.array(values[0::2], dtype='datetime64[us]').astype('datetime64[D]')
+    offsets = (starts - np.datetime64(first_day.date(), 'D')).astype(np.int64)
+    keep = (positions >= 0) & (offsets >= 0) & (offsets < days)
+    np.add.at(matrix, (positions[keep], offsets[keep]), np.array(values[1::2], dtype=float)[keep] / 60.0)
+    return matrix
+
+
+def fit(history, horizon, alphas=ALPHAS, gammas=GAMMAS):
+    """
+    Fit ETS(A,N,A) with a weekly season to every row of `history` (rooms x days,
+    at least two weeks) and forecast `horizon` days past its last column.
+    :return: dict of per-room arrays: forecast and variance (rooms x horizon),
+             alpha, gamma and rmse (rooms)
+    """
+    rooms, days = history.shape
+    if days < 2 * SEASON:
+        raise ValueError('At least two weeks of history are required')
+    # One row per (alpha, gamma) pair of the grid
+    grid_alpha, grid_gamma = (g.reshape(-1, 1) for g in np.meshgrid(alphas, gammas, indexing='ij'))
+
+    # Start from the first two weeks: their mean level and mean weekday offsets
+    start = history[:, :2 * SEASON]
+    level0 = start.mean(axis=1)
+    season0 = start.reshape(rooms, 2, SEASON).mean(axis=1) - level0[:, None]
+
+    combos = grid_alpha.shape[0]
+    level = np.broadcast_to(level0, (combos, rooms)).copy()
+    season = np.broadcast_to(season0, (combos, rooms, SEASON)).copy()
+    sse = np.zeros((combos, rooms))
+    for t in range(days):
+        phase = t % SEASON
+        error = history[:, t] - (level + season[:, :, phase])
+        if t >= SEASON:  # the first week only settles the initial state
+            sse += error * error
+        level += grid_alpha * error
+        season[:, :, phase] += grid_gamma * error
+
+    best = sse.argmin(axis=0)
+    pick = (best, np.arange(rooms))
+    alpha, gamma = grid_alpha[best, 0], grid_gamma[best, 0]
+    sigma2 = sse[pick] / (days - SEASON)
+
+    steps = np.arange(1, horizon + 1)
+    phases = (days + steps - 1) % SEASON
+    forecast = level[pick][:, None] + season[pick][:, phases]
+    seasons_ahead = (steps - 1) // SEASON
+    variance = sigma2[:, None] * (1 + alpha[:, None] ** 2 * (steps - 1)
+                                  + (gamma * (2 * alpha + gamma))[:, None] * seasons_ahead)
+    return {"forecast": forecast, "variance": variance, "alpha": alpha, "gamma": gamma, "rmse": np.sqrt(sigma2)}
+
+
+def _band(forecast, variance, z):
+    """(forecast, lower, upper) rounded to 2 decimals and clipped at zero, as lists."""
+    spread = z * np.sqrt(variance)
+    return tuple(np.round(np.clip(values, 0, None), 2).tolist()
+                 for values in (forecast, forecast - spread, forecast + spread))
+
+
+def forecast_report(tenant_id, history_days=182, horizon=28, level=95, group_by='room', studio_id=None,
+                    use_rollups=True):
+    """
+    Daily booked-hours forecast for the tenant's active rooms (optionally one
+    studio), per room or per studio, with tenant totals.
+    """
+    rooms = rooms_frame(tenant_id, studio_id)
+    rooms = rooms[rooms['is_active'].astype(bool)]
+    last_day = today()
+    first_day = last_day - timedelta(days=history_days)
+    history = history_matrix(tenant_id, rooms.index.tolist(), first_day, last_day, use_rollups=use_rollups,
+                             restrict=studio_id is not None)
+    days = [(last_day + timedelta(days=n)).date().isoformat() for n in range(horizon)]
+    z = Z_SCORES[level]
+    meta = {"method": METHOD, "level": level, "history_start": first_day.date().isoformat(),
+            "history_days": history_days, "days": days}
+    if rooms.empty:
+        empty = [0.0] * horizon
+        return {**meta, group_by + "s": [], "totals": {"forecast": empty, "lower": empty, "upper": empty}}
+
+    model = fit(history, horizon)
+    forecast, variance = model['forecast'], model['variance']
+    if group_by == 'studio':
+        codes, studios = pd.factorize(rooms['studio_id'])
+        sums = np.zeros((len(studios), horizon))
+        variances = np.zeros((len(studios), horizon))
+        np.add.at(sums, codes, forecast)
+        np.add.at(variances, codes, variance)
+        order = np.argsort(studios)
+        items = []
+        for n in order:
+            point, lower, upper = _band(sums[n], variances[n], z)
+            items.append({"studio_id": int(studios[n]), "rooms": int((codes == n).sum()),
+                          "forecast": point, "lower": lower, "upper": upper})
+    else:
+        points, lowers, uppers = _band(forecast, variance, z)
+        rmse = np.round(model['rmse'], 3).tolist()
+        items = [
+            {"room_id": int(room_id), "studio_id": int(studio), "name": name,
+             "history_hours": round(float(total), 2), "alpha": float(a), "gamma": float(g), "rmse": r,
+             "forecast": point, "lower": lower, "upper": upper}
+            for room_id, studio, name, total, a, g, r, point, lower, upper in zip(
+                rooms.index, rooms['studio_id'], rooms['name'], history.sum(axis=1), model['alpha'],
+                model['gamma'], rmse, points, lowers, uppers)
+        ]
+
+    point, lower, upper = _band(forecast.sum(axis=0), variance.sum(axis=0), z)
+    return {**meta, group_by + "s": items, "totals": {"forecast": point, "lower": lower, "upper": upper}}
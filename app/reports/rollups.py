@@ -0,0 +1,212 @@
+# Daily booking rollups (incremental maintenance and backfill)
+"""
+Keeps `booking_daily_rollups` in step with the bookings table.
+
+Each booking contributes to the row for its tenant, room and start day:
+reported (confirmed) bookings add their count, minutes and amount, cancelled
+ones add a cancellation. Mapper events apply the difference between a
+booking's old and new contribution inside the flush that writes it, so the
+rollup commits or rolls back with the booking itself.
+
+Bulk statements (`session.execute(insert(Booking), rows)`, `Query.update()`)
+bypass mapper events: callers pass the rows to `apply_rows()`, or run
+`flask reports-rollup` afterwards.
+"""
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+
+import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .. import db
+from ..history import previous
+from ..models import Booking, BookingDailyRollup, Room
+from ..rooms.conflicts import BLOCKING_STATUSES
+
+# Bookings that actually used the room
+REPORTED_STATUSES = BLOCKING_STATUSES
+CANCELLED_STATUS = 'cancelled'
+
+KEY_COLUMNS = ('tenant_id', 'room_id', 'day')
+SUMMED_COLUMNS = ('bookings', 'booked_minutes', 'amount', 'unpriced_minutes', 'cancellations')
+TRACKED_COLUMNS = ('tenant_id', 'room_id', 'start_time', 'end_time', 'status', 'total_amount')
+
+
+def seconds_between(start, end):
+    """SQL expression for the seconds from `start` to `end`."""
+    if db.engine.dialect.name == 'sqlite':
+        # One julianday() per side is cheaper than strftime('%s') + CAST on every row
+        return (sa.func.julianday(end) - sa.func.julianday(start)) * 86400.0
+    return sa.extract('epoch', end) - sa.extract('epoch', start)
+
+
+def booking_value(amount, start, end, hourly_rate):
+    """
+    What a reported booking is worth: its total_amount, or when unpriced its
+    hours at the room's hourly_rate, rounded to cents (no rate counts as 0).
+    """
+    if amount is not None:
+        return Decimal(str(amount))
+    if hourly_rate is None:
+        return Decimal('0')
+    seconds = round((end - start).total_seconds())
+    return (Decimal(str(hourly_rate)) * seconds / 3600).quantize(Decimal('0.01'), ROUND_HALF_UP)
+
+
+def booking_value_expression():
+    """SQL for booking_value(); the statement must outer join Room on Booking.room_id."""
+    hours = sa.func.round(seconds_between(Booking.start_time, Booking.end_time)) / 3600.0
+    at_rate = sa.cast(hours * sa.func.coalesce(Room.hourly_rate, 0), sa.Numeric)
+    return sa.func.coalesce(Booking.total_amount, sa.func.round(at_rate, 2))
+
+
+def _contribution(values):
+    """Return (key, deltas) for a booking's state, or None if it adds nothing."""
+    start, end, status = values['start_time'], values['end_time'], values['status']
+    if start is None or end is None or values['room_id'] is None:
+        return None
+    key = (values['tenant_id'], values['room_id'], start.date())
+    if status in REPORTED_STATUSES:
+        minutes = (end - start).total_seconds() / 60.0
+        amount = values['total_amount']
+        return key, {
+            'bookings': 1,
+            'booked_minutes': minutes,
+            'amount': Decimal(str(amount)) if amount is not None else Decimal('0'),
+            'unpriced_minutes': minutes if amount is None else 0.0,
+            'cancellations': 0,
+            'max_minutes': minutes,
+        }
+    if status == CANCELLED_STATUS:
+        return key, {'bookings': 0, 'booked_minutes': 0.0, 'amount': Decimal('0'),
+                     'unpriced_minutes': 0.0, 'cancellations': 1, 'max_minutes': 0.0}
+    return None
+
+
+def _upsert(connection, key, deltas):
+    table = BookingDailyRollup.__table__
+    values = dict(zip(KEY_COLUMNS, key), **deltas)
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = (sqlite if dialect == 'sqlite' else postgresql).insert(table).values(values)
+        updates = {col: table.c[col] + insert.excluded[col] for col in SUMMED_COLUMNS}
+        updates['max_minutes'] = sa.case(
+            (insert.excluded.max_minutes > table.c.max_minutes, insert.excluded.max_minutes),
+            else_=table.c.max_minutes)
+        connection.execute(insert.on_conflict_do_update(index_elements=list(KEY_COLUMNS), set_=updates))
+        return
+
+    where = sa.and_(*(table.c[col] == value for col, value in zip(KEY_COLUMNS, key)))
+    updates = {col: table.c[col] + deltas[col] for col in SUMMED_COLUMNS}
+    updates['max_minutes'] = sa.case((table.c.max_minutes < deltas['max_minutes'], deltas['max_minutes']),
+                                     else_=table.c.max_minutes)
+    if not connection.execute(table.update().where(where).values(updates)).rowcount:
+        connection.execute(table.insert().values(values))
+
+
+def _accumulate(changes, state, sign):
+    contribution = _contribution(state) if state else None
+    if contribution is None:
+        return
+    key, deltas = contribution
+    merged = changes.setdefault(key, {col: 0 for col in SUMMED_COLUMNS} | {'max_minutes': 0.0})
+    for col in SUMMED_COLUMNS:
+        merged[col] += sign * deltas[col]
+    if sign > 0 and deltas['max_minutes'] > merged['max_minutes']:
+        # A shrinking max is not tracked; it only bounds raw lookbacks
+        merged['max_minutes'] = deltas['max_minutes']
+
+
+def _flush_changes(connection, changes):
+    for key, deltas in changes.items():
+        if any(deltas[col] for col in SUMMED_COLUMNS):
+            _upsert(connection, key, deltas)
+
+
+def apply_change(connection, old, new):
+    """
+    Move a booking's contribution from state `old` to state `new` (dicts of the
+    tracked columns, or None for insert/delete).
+    """
+    changes = {}
+    _accumulate(changes, old, -1)
+    _accumulate(changes, new, 1)
+    _flush_changes(connection, changes)
+
+
+def apply_rows(connection, rows, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) the contributions of bookings written with
+    bulk statements, one upsert per affected rollup row.
+    :param rows: dicts holding at least the tracked booking columns
+    """
+    changes = {}
+    for row in rows:
+        _accumulate(changes, row, sign)
+    _flush_changes(connection, changes)
+
+
+def _current(target):
+    return {name: getattr(target, name) for name in TRACKED_COLUMNS}
+
+
+def _previous(target):
+    return previous(target, TRACKED_COLUMNS)
+
+
+@event.listens_for(Booking, 'after_insert')
+def _booking_inserted(mapper, connection, target):
+    apply_change(connection, None, _current(target))
+
+
+@event.listens_for(Booking, 'after_update')
+def _booking_updated(mapper, connection, target):
+    old, new = _previous(target), _current(target)
+    if old != new:
+        apply_change(connection, old, new)
+
+
+@event.listens_for(Booking, 'after_delete')
+def _booking_deleted(mapper, connection, target):
+    apply_change(connection, _previous(target), None)
+
+
+def rebuild(tenant_id=None):
+    """
+    Recompute rollups from the bookings table in one INSERT ... SELECT.
+    :param tenant_id: only rebuild this tenant (all tenants when None)
+    :return: number of rollup rows written
+    """
+    table = BookingDailyRollup.__table__
+    reported = Booking.status.in_(REPORTED_STATUSES)
+    # Whole seconds, so rebuilt rows match the incremental ones exactly
+    minutes = sa.func.round(seconds_between(Booking.start_time, Booking.end_time)) / 60.0
+    day = sa.func.date(Booking.start_time)
+
+    select = sa.select(
+        Booking.tenant_id,
+        Booking.room_id,
+        day,
+        sa.func.sum(sa.case((reported, 1), else_=0)),
+        sa.func.sum(sa.case((reported, minutes), else_=0.0)),
+        sa.func.sum(sa.case((reported, sa.func.coalesce(Booking.total_amount, 0)), else_=0)),
+        sa.func.sum(sa.case((sa.and_(reported, Booking.total_amount.is_(None)), minutes), else_=0.0)),
+        sa.func.sum(sa.case((Booking.status == CANCELLED_STATUS, 1), else_=0)),
+        sa.func.max(sa.case((reported, minutes), else_=0.0)),
+    ).where(Booking.status.in_(REPORTED_STATUSES + (CANCELLED_STATUS,))).group_by(
+        Booking.tenant_id, Booking.room_id, day)
+
+    delete = table.delete()
+    if tenant_id is not None:
+        select = select.where(Booking.tenant_id == tenant_id)
+        delete = delete.where(table.c.tenant_id == tenant_id)
+
+    db.session.execute(delete)
+    columns = list(KEY_COLUMNS) + list(SUMMED_COLUMNS) + ['max_minutes']
+    return db.session.execute(table.insert().from_select(columns, select)).rowcount
+
+
+def today():
+    """Start of the current (UTC) day; rollups are only read before it."""
+    return datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
@@ -1 +1,210 @@
 ﻿# /reports/bookings, /reports/revenue, CSV/PDF exports routes
+from datetime import timedelta
+
+from flask import Blueprint, Response, current_app, request, stream_with_context
+
+from .. import jobs
+from ..models import Studio
+from ..rowcache import get_cached
+from ..utils import make_response_payload, get_current_user, parse_iso_datetime
+from . import engine, exports, forecast
+
+reports_bp = Blueprint('reports_bp', __name__)
+
+REPORT_ROLES = ('Admin', 'Studio Manager')
+
+
+def _report_scope():
+    """
+    Resolve the tenant and studio filter from the request.
+    :return: (tenant_id, studio_id, validation errors, None) or (None, None, None, error response)
+    """
+    user = get_current_user()
+    if not user:
+        return None, None, None, (make_response_payload(False, message="Unauthorized"), 401)
+    if user.role not in REPORT_ROLES:
+        return None, None, None, (make_response_payload(False, message="Permission denied"), 403)
+
+    tenant_id = user.tenant_id
+    if not tenant_id:
+        # Global admins pick the tenant explicitly
+        tenant_id = request.args.get('tenant_id', type=int)
+        if not tenant_id:
+            return None, None, None, (make_response_payload(False, errors={"tenant_id": ["Tenant is required"]}), 400)
+
+    errors = {}
+    studio_id = request.args.get('studio_id', type=int)
+    if studio_id is not None and getattr(get_cached(Studio, studio_id), 'tenant_id', None) != tenant_id:
+        errors.setdefault('studio_id', []).append('Invalid studio')
+    return tenant_id, studio_id, errors, None
+
+
+def _report_context():
+    """
+    Resolve tenant, studio filter and date range from the request.
+    :return: (tenant_id, studio_id, ReportRange, None) or (None, None, None, error response)
+    """
+    tenant_id, studio_id, errors, error = _report_scope()
+    if error:
+        return None, None, None, error
+
+    start, end = engine.default_range()
+    if request.args.get('start'):
+        start = parse_iso_datetime(request.args['start'])
+        if start is None:
+            errors.setdefault('start', []).append('Invalid datetime')
+    if request.args.get('end'):
+        end = parse_iso_datetime(request.args['end'])
+        if end is None:
+            errors.setdefault('end', []).append('Invalid datetime')
+    if errors:
+        return None, None, None, (make_response_payload(False, errors=errors), 400)
+
+    if end <= start:
+        errors['end'] = ['End must be after start']
+    elif end - start > timedelta(days=current_app.config.get('REPORTS_MAX_RANGE_DAYS', 731)):
+        errors['end'] = ['Date range is too long']
+    if errors:
+        return None, None, None, (make_response_payload(False, errors=errors), 400)
+
+    rng = engine.ReportRange(start, end,
+                             open_hour=current_app.config.get('REPORTS_OPEN_HOUR', 0),
+                             close_hour=current_app.config.get('REPORTS_CLOSE_HOUR', 24))
+    return tenant_id, studio_id, rng, None
+
+
+def _range_meta(rng, **extra):
+    return {"start": rng.start.isoformat() + "Z", "end": rng.end.isoformat() + "Z", **extra}
+
+
+@reports_bp.route('/occupancy', methods=['GET'])
+def occupancy():
+    """Occupancy % and revenue per room for the range."""
+    tenant_id, studio_id, rng, error = _report_context()
+    if error:
+        return error
+    data = engine.occupancy_report(tenant_id, rng, studio_id=studio_id)
+    return make_response_payload(True, data=data, meta=_range_meta(rng))
+
+
+@reports_bp.route('/revenue', methods=['GET'])
+def revenue():
+    """Revenue per room, studio or time bucket (group_by=room|studio|day, bucket=day|week|month)."""
+    tenant_id, studio_id, rng, error = _report_context()
+    if error:
+        return error
+    options, error = _revenue_options()
+    if error:
+        return error
+    data = engine.revenue_report(tenant_id, rng, studio_id=studio_id, **options)
+    return make_response_payload(True, data=data, meta=_range_meta(rng, **options))
+
+
+def _revenue_options():
+    """:return: ({"group_by", "bucket"}, None) or (None, error response)"""
+    group_by = request.args.get('group_by', 'day')
+    bucket = request.args.get('bucket', 'day')
+    errors = {}
+    if group_by not in ('room', 'studio', 'day'):
+        errors['group_by'] = ['Must be one of room, studio, day']
+    if bucket not in engine.BUCKETS:
+        errors['bucket'] = ['Must be one of day, week, month']
+    if errors:
+        return None, (make_response_payload(False, errors=errors), 400)
+    return {"group_by": group_by, "bucket": bucket}, None
+
+
+@reports_bp.route('/heatmap', methods=['GET'])
+def heatmap():
+    """Peak-hour heatmap (weekday x hour occupancy)."""
+    tenant_id, studio_id, rng, error = _report_context()
+    if error:
+        return error
+    data = engine.heatmap_report(tenant_id, rng, studio_id=studio_id)
+    return make_response_payload(True, data=data, meta=_range_meta(rng))
+
+
+@reports_bp.route('/forecast', methods=['GET'])
+def demand_forecast():
+    """
+    Daily booked-hours forecast with prediction intervals, per room or studio
+    (group_by=room|studio, horizon=days ahead, history=days fitted, level=80|90|95|99).
+    """
+    tenant_id, studio_id, errors, error = _report_scope()
+    if error:
+        return error
+    max_horizon = current_app.config.get('FORECAST_MAX_HORIZON_DAYS', 90)
+    max_history = current_app.config.get('REPORTS_MAX_RANGE_DAYS', 731)
+    horizon = request.args.get('horizon', 28, type=int)
+    history = request.args.get('history', current_app.config.get('FORECAST_HISTORY_DAYS', 182), type=int)
+    level = request.args.get('level', 95, type=int)
+    group_by = request.args.get('group_by', 'room')
+    if not 1 <= horizon <= max_horizon:
+        errors['horizon'] = [f'Must be between 1 and {max_horizon}']
+    if not 2 * forecast.SEASON <= history <= max_history:
+        errors['history'] = [f'Must be between {2 * forecast.SEASON} and {max_history}']
+    if level not in forecast.Z_SCORES:
+        errors['level'] = ['Must be one of ' + ', '.join(map(str, forecast.Z_SCORES))]
+    if group_by not in ('room', 'studio'):
+        errors['group_by'] = ['Must be one of room, studio']
+    if errors:
+        return make_response_payload(False, errors=errors), 400
+    data = forecast.forecast_report(tenant_id, history_days=history, horizon=horizon, level=level,
+                                    group_by=group_by, studio_id=studio_id,
+                                    use_rollups=current_app.config.get('REPORTS_USE_ROLLUPS', True))
+    return make_response_payload(True, data=data, meta={"horizon": horizon, "group_by": group_by})
+
+
+@reports_bp.route('/<any(occupancy, revenue, heatmap):report>/jobs', methods=['POST'])
+def submit_report_job(report):
+    """
+    Build a report in the background (same query parameters as the GET endpoint).
+    Answers 202 with the job; its result is the GET endpoint's data and meta.
+    """
+    tenant_id, studio_id, rng, error = _report_context()
+    if error:
+        return error
+    options = {}
+    if report == 'revenue':
+        options, error = _revenue_options()
+        if error:
+            return error
+    meta = _range_meta(rng)
+    job = jobs.submit('reports.generate', {
+        "report": report, "tenant_id": tenant_id, "studio_id": studio_id,
+        "start": meta["start"], "end": meta["end"],
+        "open_hour": rng.open_hour, "close_hour": rng.close_hour, "options": options,
+    }, user=get_current_user(), tenant_id=tenant_id)
+    return jobs.accepted(job)
+
+
+def _export_response(rows, name, fmt):
+    response = Response(stream_with_context(rows), mimetype=exports.FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={name}.{fmt}'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@reports_bp.route('/bookings.<any(csv, ndjson):fmt>', methods=['GET'])
+def export_bookings(fmt):
+    """Stream bookings starting in the range (optionally ?status=) as CSV or NDJSON."""
+    tenant_id, studio_id, rng, error = _report_context()
+    if error:
+        return error
+    stmt = exports.bookings_query(tenant_id, rng.start, rng.end, studio_id=studio_id,
+                                  status=request.args.get('status'))
+    rows = exports.stream_rows(stmt, exports.BOOKING_FIELDS, fmt,
+                               batch_size=current_app.config.get('BULK_EXPORT_BATCH_SIZE', 1000))
+    return _export_response(rows, 'bookings', fmt)
+
+
+@reports_bp.route('/revenue.<any(csv, ndjson):fmt>', methods=['GET'])
+def export_revenue(fmt):
+    """Stream revenue per day and room for the range as CSV or NDJSON."""
+    tenant_id, studio_id, rng, error = _report_context()
+    if error:
+        return error
+    stmt = exports.revenue_query(tenant_id, rng.start, rng.end, studio_id=studio_id)
+    rows = exports.stream_rows(stmt, exports.REVENUE_FIELDS, fmt,
+                               batch_size=current_app.config.get('BULK_EXPORT_BATCH_SIZE', 1000))
+    return _export_response(rows, 'revenue', fmt)
@@ -0,0 +1,205 @@
+# Booking conflict detection (per-room interval index)
+"""
+Interval index over Booking rows for fast overlap checks.
+
+Each room gets a static index: bookings sorted by start time plus a max-end
+segment tree over that order. "Does [start, end) overlap anything?" bisects
+the starts and then only descends into subtrees whose latest end is after
+the probe start, giving O(log n) checks and O(log n + k) enumeration.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+
+from .. import db
+from ..models import Booking, BookingSeries
+
+# Only confirmed bookings occupy a room (matches the worker's conflict query)
+BLOCKING_STATUSES = ('confirmed',)
+
+
+class RoomIntervalIndex:
+    """Static interval index for the bookings of a single room."""
+
+    __slots__ = ('starts', 'ends', 'ids', '_size', '_max_end')
+
+    def __init__(self, intervals=()):
+        """
+        :param intervals: iterable of (start, end, booking_id) tuples
+        """
+        rows = sorted(intervals, key=lambda r: (r[0], r[1]))
+        self.starts = [r[0] for r in rows]
+        self.ends = [r[1] for r in rows]
+        self.ids = [r[2] for r in rows]
+
+        size = 1
+        while size < len(rows):
+            size *= 2
+        self._size = size
+        tree = [None] * (2 * size)
+        tree[size:size + len(rows)] = self.ends
+        for node in range(size - 1, 0, -1):
+            left, right = tree[2 * node], tree[2 * node + 1]
+            if left is None or (right is not None and right > left):
+                left = right
+            tree[node] = left
+        self._max_end = tree
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _candidates(self, start, end, first_only=False):
+        """Yield positions of intervals overlapping [start, end)."""
+        # Only intervals starting before `end` can overlap
+        limit = bisect_left(self.starts, end)
+        if not limit:
+            return
+        tree = self._max_end
+        size = self._size
+        stack = [(1, 0, size)]
+        while stack:
+            node, lo, hi = stack.pop()
+            if lo >= limit:
+                continue
+            node_end = tree[node]
+            if node_end is None or node_end <= start:
+                continue
+            if node >= size:
+                yield lo
+                if first_only:
+                    return
+                continue
+            mid = (lo + hi) // 2
+            # Push right first so results come out in start order
+            stack.append((2 * node + 1, mid, hi))
+            stack.append((2 * node, lo, mid))
+
+    def has_overlap(self, start, end):
+        """Return True if any indexed booking overlaps [start, end)."""
+        for _ in self._candidates(start, end, first_only=True):
+            return True
+        return False
+
+    def overlapping(self, start, end):
+        """Return (booking_id, start, end) for every booking overlapping [start, end)."""
+        return [(self.ids[i], self.starts[i], self.ends[i]) for i in self._candidates(start, end)]
+
+
+class BookingConflictIndex:
+    """Collection of per-room interval indexes loaded in a single query."""
+
+    def __init__(self, rooms=None):
+        self.rooms = rooms or {}
+
+    @classmethod
+    def load(cls, room_ids, window_start, window_end, tenant_id=None, exclude_ids=()):
+        """
+        Build indexes for `room_ids` from bookings that touch [window_start, window_end).
+        Occurrences of recurring series that have no Booking row yet are included.
+        :param tenant_id: restrict to a tenant (None for global admins)
+        :param exclude_ids: booking ids to ignore (e.g. the booking being edited)
+        """
+        # Lazy import: recurrence builds on this module
+        from .recurrence import unmaterialized_occurrences
+
+        q = db.session.query(Booking.room_id, Booking.start_time, Booking.end_time,
+                             Booking.id, Booking.series_id).filter(
+            Booking.room_id.in_(list(room_ids)),
+            Booking.status.in_(BLOCKING_STATUSES),
+            Booking.start_time < window_end,
+            Booking.end_time > window_start,
+        )
+        if tenant_id is not None:
+            q = q.filter(Booking.tenant_id == tenant_id)
+        if exclude_ids:
+            q = q.filter(Booking.id.notin_(list(exclude_ids)))
+
+        # Interval ids are (booking_id, series_id); unmaterialized occurrences have no booking id
+        grouped = defaultdict(list)
+        for room_id, start, end, booking_id, series_id in q:
+            grouped[room_id].append((start, end, (booking_id, series_id)))
+
+        sq = BookingSeries.query.filter(
+            BookingSeries.room_id.in_(list(room_ids)),
+            BookingSeries.status.in_(BLOCKING_STATUSES),
+            BookingSeries.start_time < window_end,
+            BookingSeries.ends_at > window_start,
+        )
+        if tenant_id is not None:
+            sq = sq.filter(BookingSeries.tenant_id == tenant_id)
+        for series in sq:
+            for start, end in unmaterialized_occurrences(series, window_start, window_end):
+                grouped[series.room_id].append((start, end, (None, series.id)))
+        return cls({room_id: RoomIntervalIndex(rows) for room_id, rows in grouped.items()})
+
+    def has_overlap(self, room_id, start, end):
+        index = self.rooms.get(room_id)
+        return bool(index) and index.has_overlap(start, end)
+
+    def overlapping(self, room_id, start, end):
+        index = self.rooms.get(room_id)
+        return index.overlapping(start, end) if index else []
+
+    def find_conflicts(self, slots):
+        """
+        Validate candidate slots against indexed bookings and against each other.
+        :param slots: list of dicts with room_id, start_time and end_time (datetimes)
+        :return: list of conflict entries, ordered by slot index
+        """
+        conflicts = []
+        for i, slot in enumerate(slots):
+            for (booking_id, series_id), start, end in self.overlapping(
+                    slot['room_id'], slot['start_time'], slot['end_time']):
+                conflicts.append({
+                    "slot_index": i,
+                    "room_id": slot['room_id'],
+                    "booking_id": booking_id,
+                    "series_id": series_id,
+                    "start_time": start.isoformat() + "Z",
+                    "end_time": end.isoformat() + "Z",
+                })
+        conflicts.extend(_batch_conflicts(slots))
+        conflicts.sort(key=lambda c: c['slot_index'])
+        return conflicts
+
+
+def _batch_conflicts(slots):
+    """Sweep candidate slots per room to report overlaps inside the batch itself."""
+    by_room = defaultdict(list)
+    for i, slot in enumerate(slots):
+        by_room[slot['room_id']].append((slot['start_time'], slot['end_time'], i))
+
+    conflicts = []
+    for room_id, rows in by_room.items():
+        rows.sort()
+        active = []  # (end, index) of earlier slots still open
+        for start, end, i in rows:
+            active = [(e, j) for e, j in active if e > start]
+            for other_end, j in active:
+                other = slots[j]
+                conflicts.append({
+                    "slot_index": i,
+                    "room_id": room_id,
+                    "booking_id": None,
+                    "conflicting_slot_index": j,
+                    "start_time": other['start_time'].isoformat() + "Z",
+                    "end_time": other_end.isoformat() + "Z",
+                })
+            active.append((end, i))
+    return conflicts
+
+
+def validate_slots(slots, tenant_id=None, exclude_ids=()):
+    """
+    Check candidate slots for overlaps with existing confirmed bookings.
+    Loads every affected room in one query bounded by the batch's time window.
+    """
+    if not slots:
+        return []
+    index = BookingConflictIndex.load(
+        {s['room_id'] for s in slots},
+        min(s['start_time'] for s in slots),
+        max(s['end_time'] for s in slots),
+        tenant_id=tenant_id,
+        exclude_ids=exclude_ids,
+    )
+    return index.find_conflicts(slots)
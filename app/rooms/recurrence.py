@@ -0,0 +1,402 @@
+# Recurring bookings (RRULE expansion, set-based conflict sweep, materialization)
+"""
+Recurring booking series.
+
+A BookingSeries stores a first start, a duration and an RRULE subset:
+
+    FREQ=DAILY|WEEKLY|MONTHLY [;INTERVAL=n] [;BYDAY=MO,WE,...] (;COUNT=n | ;UNTIL=YYYYMMDD[THHMMSS[Z]])
+
+`Recurrence.starts()` yields occurrence starts lazily and jumps straight to
+the queried window for daily and weekly rules, so even a five-year daily
+series is never held in memory.
+
+Creating or editing a series checks every occurrence in one pass: the
+room's confirmed bookings (streamed in start order) and the unmaterialized
+occurrences of other series are merged into a single sorted stream and swept
+against the series' own occurrences. Booking rows are only written for the
+near-term horizon, with one bulk insert; `materialize_due()` extends the
+horizon as time passes.
+"""
+import heapq
+from calendar import monthrange
+from collections import deque
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+from .. import db
+from ..customers import stats as customer_stats
+from ..models import Booking, BookingSeries
+from ..reports import rollups
+from .conflicts import BLOCKING_STATUSES
+
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY')
+WEEKDAY_CODES = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+
+class RecurrenceError(ValueError):
+    """Raised for malformed or unsupported recurrence rules."""
+
+
+class SeriesConflict(Exception):
+    """Raised when occurrences of a series overlap existing bookings."""
+
+    def __init__(self, conflicts):
+        super().__init__(f'{len(conflicts)} conflicting occurrences')
+        self.conflicts = conflicts
+
+
+def _parse_until(value):
+    for fmt in ('%Y%m%dT%H%M%SZ', '%Y%m%dT%H%M%S', '%Y%m%d'):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        # A bare date includes the whole day
+        return parsed + timedelta(days=1) - timedelta(microseconds=1) if fmt == '%Y%m%d' else parsed
+    raise RecurrenceError(f'Invalid UNTIL: {value!r}')
+
+
+def _add_months(value, months):
+    """`value` moved by whole months, or None when the day does not exist there."""
+    month_index = value.year * 12 + value.month - 1 + months
+    year, month = divmod(month_index, 12)
+    if value.day > monthrange(year, month + 1)[1]:
+        return None
+    return value.replace(year=year, month=month + 1)
+
+
+class Recurrence:
+    """Parsed RRULE subset; expansion is anchored on the series' first start."""
+
+    __slots__ = ('freq', 'interval', 'byday', 'count', 'until')
+
+    def __init__(self, freq, interval=1, byday=None, count=None, until=None):
+        self.freq = freq
+        self.interval = interval
+        self.byday = tuple(sorted(set(byday))) if byday else None
+        self.count = count
+        self.until = until
+
+    @classmethod
+    def parse(cls, text):
+        if not isinstance(text, str) or not text.strip():
+            raise RecurrenceError('Recurrence rule is required')
+        body = text.strip()
+        if body.upper().startswith('RRULE:'):
+            body = body[6:]
+        parts = {}
+        for part in body.split(';'):
+            name, sep, value = part.partition('=')
+            if not sep or not value:
+                raise RecurrenceError(f'Invalid rule part: {part!r}')
+            parts[name.strip().upper()] = value.strip().upper()
+
+        unsupported = set(parts) - {'FREQ', 'INTERVAL', 'BYDAY', 'COUNT', 'UNTIL'}
+        if unsupported:
+            raise RecurrenceError(f'Unsupported rule part: {sorted(unsupported)[0]}')
+        freq = parts.get('FREQ')
+        if freq not in FREQUENCIES:
+            raise RecurrenceError('FREQ must be DAILY, WEEKLY or MONTHLY')
+        try:
+            interval = int(parts.get('INTERVAL', 1))
+            count = int(parts['COUNT']) if 'COUNT' in parts else None
+        except ValueError:
+            raise RecurrenceError('INTERVAL and COUNT must be integers') from None
+        if interval < 1 or (count is not None and count < 1):
+            raise RecurrenceError('INTERVAL and COUNT must be positive')
+        until = _parse_until(parts['UNTIL']) if 'UNTIL' in parts else None
+        if (count is None) == (until is None):
+            raise RecurrenceError('Exactly one of COUNT or UNTIL is required')
+
+        byday = None
+        if 'BYDAY' in parts:
+            if freq != 'WEEKLY':
+                raise RecurrenceError('BYDAY is only supported with FREQ=WEEKLY')
+            codes = parts['BYDAY'].split(',')
+            if any(code not in WEEKDAY_CODES for code in codes):
+                raise RecurrenceError(f"Invalid BYDAY: {parts['BYDAY']}")
+            byday = [WEEKDAY_CODES.index(code) for code in codes]
+        return cls(freq, interval=interval, byday=byday, count=count, until=until)
+
+    def __str__(self):
+        parts = [f'FREQ={self.freq}']
+        if self.interval != 1:
+            parts.append(f'INTERVAL={self.interval}')
+        if self.byday:
+            parts.append('BYDAY=' + ','.join(WEEKDAY_CODES[d] for d in self.byday))
+        if self.count is not None:
+            parts.append(f'COUNT={self.count}')
+        if self.until is not None:
+            parts.append('UNTIL=' + self.until.strftime('%Y%m%dT%H%M%S'))
+        return ';'.join(parts)
+
+    def min_gap(self, dtstart):
+        """Shortest time between consecutive occurrence starts."""
+        if self.freq == 'DAILY':
+            return timedelta(days=self.interval)
+        if self.freq == 'MONTHLY':
+            return timedelta(days=28 * self.interval)
+        days = self.byday or (dtstart.weekday(),)
+        gaps = [b - a for a, b in zip(days, days[1:])] + [7 * self.interval - (days[-1] - days[0])]
+        return timedelta(days=min(gaps))
+
+    def starts(self, dtstart, after=None, before=None):
+        """
+        Lazily yield occurrence starts `s` with after <= s < before.
+        COUNT is always counted from dtstart, whatever the window.
+        """
+        if self.freq == 'DAILY':
+            candidates = self._daily(dtstart, after)
+        elif self.freq == 'WEEKLY':
+            candidates = self._weekly(dtstart, after)
+        else:
+            candidates = self._monthly(dtstart)
+        for index, start in candidates:
+            if self.count is not None and index >= self.count:
+                return
+            if self.until is not None and start > self.until:
+                return
+            if before is not None and start >= before:
+                return
+            if after is None or start >= after:
+                yield start
+
+    def last_start(self, dtstart):
+        """Start of the final occurrence (None if the rule yields nothing)."""
+        last = deque(self.starts(dtstart), maxlen=1)
+        return last[0] if last else None
+
+    def _daily(self, dtstart, after):
+        step = timedelta(days=self.interval)
+        index = 0
+        if after is not None and after > dtstart:
+            index = -((dtstart - after) // step)  # ceiling division
+        start = dtstart + index * step
+        while True:
+            yield index, start
+            index += 1
+            start += step
+
+    def _weekly(self, dtstart, after):
+        days = self.byday or (dtstart.weekday(),)
+        anchor = dtstart - timedelta(days=dtstart.weekday())
+        period = timedelta(weeks=self.interval)
+        # Occurrences in the first (partial) week; every later period adds len(days)
+        first_week = sum(1 for d in days if d >= dtstart.weekday())
+        p = 0
+        if after is not None and after > dtstart:
+            p = (after - anchor) // period
+        while True:
+            week = anchor + p * period
+            for position, day in enumerate(days):
+                start = week + timedelta(days=day)
+                if start < dtstart:
+                    continue
+                if p == 0:
+                    index = position - (len(days) - first_week)
+                else:
+                    index = first_week + (p - 1) * len(days) + position
+                yield index, start
+            p += 1
+
+    def _monthly(self, dtstart):
+        index, months = 0, 0
+        while True:
+            start = _add_months(dtstart, months)
+            if start is not None:
+                yield index, start
+                index += 1
+            months += self.interval
+
+
+def occurrences(series, window_start=None, window_end=None):
+    """Lazily yield (start, end) of a series' occurrences overlapping the window."""
+    duration = timedelta(minutes=series.duration_minutes)
+    after = window_start - duration + timedelta(microseconds=1) if window_start is not None else None
+    for start in Recurrence.parse(series.rrule).starts(series.start_time, after=after, before=window_end):
+        yield start, start + duration
+
+
+def unmaterialized_occurrences(series, window_start=None, window_end=None):
+    """Occurrences in the window that have no Booking row yet."""
+    floor = series.materialized_until
+    if floor is not None and (window_start is None or window_start < floor):
+        # Occurrences starting before materialized_until already exist as rows
+        window_start = floor
+    for start, end in occurrences(series, window_start, window_end):
+        if floor is None or start >= floor:
+            yield start, end
+
+
+def _busy_stream(tenant_id, room_id, window_start, window_end, exclude_series_id=None, batch_size=5000):
+    """Confirmed bookings plus unmaterialized series occurrences of a room, in start order."""
+    stmt = sa.select(Booking.start_time, Booking.end_time, Booking.id, Booking.series_id).where(
+        Booking.tenant_id == tenant_id,
+        Booking.room_id == room_id,
+        Booking.status.in_(BLOCKING_STATUSES),
+        Booking.start_time < window_end,
+        Booking.end_time > window_start,
+    )
+    if exclude_series_id is not None:
+        stmt = stmt.where(sa.or_(Booking.series_id.is_(None), Booking.series_id != exclude_series_id))
+    bookings = db.session.connection().execute(
+        stmt.order_by(Booking.start_time).execution_options(yield_per=batch_size))
+
+    series_q = BookingSeries.query.filter(
+        BookingSeries.tenant_id == tenant_id,
+        BookingSeries.room_id == room_id,
+        BookingSeries.status.in_(BLOCKING_STATUSES),
+        BookingSeries.start_time < window_end,
+        BookingSeries.ends_at > window_start,
+    )
+    if exclude_series_id is not None:
+        series_q = series_q.filter(BookingSeries.id != exclude_series_id)
+    streams = [((start, end, None, other.id) for start, end in
+                unmaterialized_occurrences(other, window_start, window_end)) for other in series_q]
+    return heapq.merge(bookings, *streams, key=lambda row: row[0])
+
+
+def find_series_conflicts(candidates, busy):
+    """
+    Sweep two start-ordered streams and yield every overlap.
+    :param candidates: (start, end) occurrences, non-overlapping
+    :param busy: (start, end, booking_id, series_id) rows
+    """
+    busy = iter(busy)
+    pending = next(busy, None)
+    active = []
+    for start, end in candidates:
+        active = [row for row in active if row[1] > start]
+        while pending is not None and pending[0] < end:
+            if pending[1] > start:
+                active.append(pending)
+            pending = next(busy, None)
+        for row in active:
+            yield {
+                "occurrence_start": start.isoformat() + "Z",
+                "occurrence_end": end.isoformat() + "Z",
+                "booking_id": row[2],
+                "series_id": row[3],
+                "start_time": row[0].isoformat() + "Z",
+                "end_time": row[1].isoformat() + "Z",
+            }
+
+
+def _check(series, recurrence, from_time, limit, max_days):
+    duration = timedelta(minutes=series.duration_minutes)
+    if duration > recurrence.min_gap(series.start_time):
+        raise RecurrenceError('Duration is longer than the gap between occurrences')
+    # Seeks past the limit instead of counting every occurrence up to it
+    if next(recurrence.starts(series.start_time, after=series.start_time + timedelta(days=max_days)), None):
+        raise RecurrenceError(f'Series may span at most {max_days} days')
+    last = recurrence.last_start(series.start_time)
+    if last is None:
+        raise RecurrenceError('Recurrence rule yields no occurrences')
+    series.ends_at = last + duration
+
+    candidates = ((s, s + duration) for s in recurrence.starts(series.start_time, after=from_time))
+    busy = _busy_stream(series.tenant_id, series.room_id, max(series.start_time, from_time), series.ends_at,
+                        exclude_series_id=series.id)
+    conflicts = []
+    for conflict in find_series_conflicts(candidates, busy):
+        conflicts.append(conflict)
+        if len(conflicts) >= limit:
+            break
+    if conflicts:
+        raise SeriesConflict(conflicts)
+
+
+def _booking_row(series, start):
+    return {
+        'tenant_id': series.tenant_id, 'room_id': series.room_id, 'customer_id': series.customer_id,
+        'start_time': start, 'end_time': start + timedelta(minutes=series.duration_minutes),
+        'status': series.status, 'notes': series.notes, 'total_amount': series.total_amount,
+        'created_at': datetime.utcnow(), 'series_id': series.id,
+    }
+
+
+def materialize(series, until):
+    """
+    Bulk insert Booking rows for occurrences starting in [materialized_until, until).
+    :return: number of bookings created
+    """
+    if series.materialized_until is not None and series.materialized_until >= until:
+        return 0
+    recurrence = Recurrence.parse(series.rrule)
+    rows = [_booking_row(series, start)
+            for start in recurrence.starts(series.start_time, after=series.materialized_until, before=until)]
+    if rows:
+        db.session.execute(sa.insert(Booking), rows)
+        rollups.apply_rows(db.session.connection(), rows)
+        customer_stats.apply_rows(db.session.connection(), rows)
+    series.materialized_until = until
+    return len(rows)
+
+
+def create_series(tenant_id, room_id, customer_id, start_time, duration_minutes, rrule,
+                  total_amount=None, notes=None, horizon_days=90, max_days=3660, conflict_limit=100, now=None):
+    """
+    Validate, conflict-check and save a series, materializing the near-term horizon.
+    The caller commits.
+    :raises RecurrenceError: invalid rule or duration
+    :raises SeriesConflict: occurrences overlap existing bookings or series
+    """
+    recurrence = Recurrence.parse(rrule)
+    if duration_minutes < 1:
+        raise RecurrenceError('Duration must be positive')
+    series = BookingSeries(tenant_id=tenant_id, room_id=room_id, customer_id=customer_id,
+                           start_time=start_time, duration_minutes=duration_minutes, rrule=str(recurrence),
+                           total_amount=total_amount, notes=notes, status='confirmed')
+    _check(series, recurrence, start_time, conflict_limit, max_days)
+    db.session.add(series)
+    db.session.flush()
+    now = now or datetime.utcnow()
+    materialize(series, max(now, start_time) + timedelta(days=horizon_days))
+    return series
+
+
+def update_series(series, changes, horizon_days=90, max_days=3660, conflict_limit=100, now=None):
+    """
+    Apply `changes` (start_time, duration_minutes, rrule, room_id, total_amount,
+    notes) to occurrences that have not started yet. Their future Booking rows
+    are replaced; past occurrences keep theirs. The caller commits.
+    """
+    now = now or datetime.utcnow()
+    cutoff = max(now, series.start_time)
+    for key in ('start_time', 'duration_minutes', 'rrule', 'room_id', 'total_amount', 'notes'):
+        if key in changes:
+            setattr(series, key, changes[key])
+    recurrence = Recurrence.parse(series.rrule)
+    if series.duration_minutes < 1:
+        raise RecurrenceError('Duration must be positive')
+    series.rrule = str(recurrence)
+    _check(series, recurrence, cutoff, conflict_limit, max_days)
+
+    # Replace future rows, keeping the rollups and customer stats in step with the bulk delete
+    tracked = dict.fromkeys(rollups.TRACKED_COLUMNS + customer_stats.TRACKED_COLUMNS)
+    columns = [Booking.id] + [getattr(Booking, name) for name in tracked]
+    future = db.session.execute(sa.select(*columns).where(
+        Booking.series_id == series.id, Booking.start_time >= cutoff)).mappings().all()
+    if future:
+        db.session.execute(sa.delete(Booking).where(Booking.id.in_([row['id'] for row in future])),
+                           execution_options={'synchronize_session': False})
+        rollups.apply_rows(db.session.connection(), future, sign=-1)
+        customer_stats.apply_rows(db.session.connection(), future, sign=-1)
+    series.materialized_until = cutoff
+    materialize(series, cutoff + timedelta(days=horizon_days))
+    return series
+
+
+def materialize_due(horizon_days=90, now=None):
+    """Extend every active series' Booking rows to now + horizon. The caller commits."""
+    until = (now or datetime.utcnow()) + timedelta(days=horizon_days)
+    created = 0
+    due = BookingSeries.query.filter(
+        BookingSeries.status.in_(BLOCKING_STATUSES),
+        BookingSeries.ends_at > BookingSeries.materialized_until,
+        BookingSeries.materialized_until < until,
+    )
+    for series in due:
+        created += materialize(series, until)
+    return created
@@ -1 +1,353 @@
 ﻿# /rooms, /bookings, conflict logic routes
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from flask import Blueprint, Response, current_app, request, stream_with_context
+from sqlalchemy import and_, or_
+
+from .. import db
+from ..models import Booking, BookingSeries, Customer, Room, Studio, WaitlistEntry
+from ..rowcache import get_cached
+from ..utils import make_response_payload, get_current_user, parse_iso_datetime
+from . import recurrence, waitlist
+from .conflicts import validate_slots
+from .slots import OpeningHoursError, find_free_slots
+
+rooms_bp = Blueprint('rooms_bp', __name__)
+
+SLOT_FORMATS = ('json', 'ndjson')
+
+
+def _encode_slot(slot):
+    return {**slot, "start_time": slot["start_time"].isoformat() + "Z",
+            "end_time": slot["end_time"].isoformat() + "Z"}
+
+
+@rooms_bp.route('/slots', methods=['GET'])
+def available_slots():
+    """
+    Free slots of at least `min_minutes` between `start` and `end`, for the
+    rooms of `studio_id` (or the given `room_id`s, or the whole tenant).
+    format=ndjson streams one slot per line for large ranges.
+    """
+    user = get_current_user()
+    if not user:
+        return make_response_payload(False, message="Unauthorized"), 401
+
+    tenant_id = user.tenant_id or request.args.get('tenant_id', type=int)
+    if not tenant_id:
+        return make_response_payload(False, errors={"tenant_id": ["Tenant is required"]}), 400
+
+    errors = {}
+    start = parse_iso_datetime(request.args.get('start'))
+    end = parse_iso_datetime(request.args.get('end'))
+    if not start:
+        errors['start'] = ['Valid start time is required']
+    if not end:
+        errors['end'] = ['Valid end time is required']
+    elif start and end <= start:
+        errors['end'] = ['End must be after start']
+    elif start and end - start > timedelta(days=current_app.config.get('ROOM_SLOTS_MAX_RANGE_DAYS', 366)):
+        errors['end'] = ['Date range is too long']
+
+    min_minutes = request.args.get('min_minutes', 30, type=int)
+    if min_minutes is None or min_minutes < 1:
+        errors['min_minutes'] = ['Must be a positive number of minutes']
+
+    fmt = request.args.get('format', 'json')
+    if fmt not in SLOT_FORMATS:
+        errors['format'] = ['Must be one of json, ndjson']
+
+    studio_id = request.args.get('studio_id', type=int)
+    if studio_id is not None and getattr(get_cached(Studio, studio_id), 'tenant_id', None) != tenant_id:
+        errors['studio_id'] = ['Invalid studio']
+
+    room_ids = request.args.getlist('room_id', type=int) or None
+    if room_ids is not None:
+        known = {r.id for r in Room.query.with_entities(Room.id).filter(
+            Room.id.in_(room_ids), Room.tenant_id == tenant_id)}
+        if known != set(room_ids):
+            errors['room_id'] = ['Room not found']
+    if errors:
+        return make_response_payload(False, errors=errors), 400
+
+    slots = find_free_slots(tenant_id, start, end, min_minutes=min_minutes, studio_id=studio_id,
+                            room_ids=room_ids, batch_size=current_app.config.get('ROOM_SLOTS_BATCH_SIZE', 5000))
+    meta = {"start": start.isoformat() + "Z", "end": end.isoformat() + "Z", "min_minutes": min_minutes}
+    try:
+        if fmt == 'json':
+            data = [_encode_slot(slot) for slot in slots]
+            return make_response_payload(True, data=data, meta={**meta, "count": len(data)})
+        # Pull the first slot now so bad opening hours still produce a 400
+        first = next(slots, None)
+    except OpeningHoursError as e:
+        return make_response_payload(False, errors={"opening_hours": [str(e)]}), 400
+
+    dumps = current_app.json.dumps
+
+    def lines():
+        if first is None:
+            return
+        yield dumps(_encode_slot(first)) + '\n'
+        for slot in slots:
+            yield dumps(_encode_slot(slot)) + '\n'
+
+    return Response(stream_with_context(lines()), mimetype='application/x-ndjson')
+
+
+def _series_fields(data, partial=False):
+    """Validate series fields from a JSON body. Returns (values, errors)."""
+    values, errors = {}, {}
+    if 'start_time' in data or not partial:
+        values['start_time'] = parse_iso_datetime(data.get('start_time'))
+        if not values['start_time']:
+            errors['start_time'] = ['Valid start time is required']
+    if 'duration_minutes' in data or not partial:
+        duration = data.get('duration_minutes')
+        if not isinstance(duration, int) or isinstance(duration, bool) or duration < 1:
+            errors['duration_minutes'] = ['Must be a positive number of minutes']
+        values['duration_minutes'] = duration
+    if 'rrule' in data or not partial:
+        try:
+            values['rrule'] = str(recurrence.Recurrence.parse(data.get('rrule')))
+        except recurrence.RecurrenceError as e:
+            errors['rrule'] = [str(e)]
+    for key in ('room_id', 'customer_id'):
+        if key in data or not partial:
+            value = data.get(key)
+            if not isinstance(value, int) or isinstance(value, bool):
+                errors[key] = ['Is required']
+            values[key] = value
+    if data.get('total_amount') is not None:
+        try:
+            values['total_amount'] = Decimal(str(data['total_amount']))
+        except InvalidOperation:
+            errors['total_amount'] = ['Must be a number']
+    elif 'total_amount' in data:
+        values['total_amount'] = None
+    if 'notes' in data:
+        values['notes'] = data.get('notes')
+    return values, errors
+
+
+def _series_scope_errors(values, tenant_id):
+    errors = {}
+    if 'room_id' in values and getattr(get_cached(Room, values['room_id']), 'tenant_id', None) != tenant_id:
+        errors['room_id'] = ['Room not found']
+    if 'customer_id' in values and not Customer.query.filter_by(id=values['customer_id'], tenant_id=tenant_id).first():
+        errors['customer_id'] = ['Customer not found']
+    return errors
+
+
+def _series_options():
+    config = current_app.config
+    return {"horizon_days": config.get('BOOKING_SERIES_HORIZON_DAYS', 90),
+            "max_days": config.get('BOOKING_SERIES_MAX_DAYS', 3660),
+            "conflict_limit": config.get('BOOKING_SERIES_CONFLICT_LIMIT', 100)}
+
+
+@rooms_bp.route('/series', methods=['POST'])
+def create_series():
+    """
+    Create a recurring booking { room_id, customer_id, start_time, duration_minutes,
+    rrule, total_amount?, notes? }. Every occurrence is checked for conflicts;
+    Booking rows are created for the near-term horizon only.
+    """
+    user = get_current_user()
+    if not user:
+        return make_response_payload(False, message="Unauthorized"), 401
+    if not user.tenant_id:
+        return make_response_payload(False, message="Invalid user configuration"), 403
+
+    values, errors = _series_fields(request.get_json() or {})
+    if not errors:
+        errors = _series_scope_errors(values, user.tenant_id)
+    if errors:
+        return make_response_payload(False, errors=errors), 400
+
+    try:
+        series = recurrence.create_series(user.tenant_id, **values, **_series_options())
+    except recurrence.RecurrenceError as e:
+        return make_response_payload(False, errors={"rrule": [str(e)]}), 400
+    except recurrence.SeriesConflict as e:
+        db.session.rollback()
+        return make_response_payload(False, message="Booking conflicts found", conflicts=e.conflicts), 409
+    db.session.commit()
+    return make_response_payload(True, data=series.to_dict(), message="Series created"), 201
+
+
+@rooms_bp.route('/series/<int:series_id>', methods=['PUT'])
+def update_series(series_id):
+    """Edit a series; changes apply to occurrences that have not started yet."""
+    user = get_current_user()
+    if not user:
+        return make_response_payload(False, message="Unauthorized"), 401
+    series = BookingSeries.query.filter_by(id=series_id, tenant_id=user.tenant_id).first()
+    if not series:
+        return make_response_payload(False, message="Series not found"), 404
+
+    values, errors = _series_fields(request.get_json() or {}, partial=True)
+    values.pop('customer_id', None)
+    if not errors:
+        errors = _series_scope_errors(values, user.tenant_id)
+    if errors:
+        return make_response_payload(False, errors=errors), 400
+
+    try:
+        recurrence.update_series(series, values, **_series_options())
+    except recurrence.RecurrenceError as e:
+        db.session.rollback()
+        return make_response_payload(False, errors={"rrule": [str(e)]}), 400
+    except recurrence.SeriesConflict as e:
+        db.session.rollback()
+        return make_response_payload(False, message="Booking conflicts found", conflicts=e.conflicts), 409
+    db.session.commit()
+    return make_response_payload(True, data=series.to_dict(), message="Series updated")
+
+
+@rooms_bp.route('/series/<int:series_id>/occurrences', methods=['GET'])
+def series_occurrences(series_id):
+    """Occurrences overlapping [start, end), expanded lazily; format=ndjson streams them."""
+    user = get_current_user()
+    if not user:
+        return make_response_payload(False, message="Unauthorized"), 401
+    series = BookingSeries.query.filter_by(id=series_id, tenant_id=user.tenant_id).first()
+    if not series:
+        return make_response_payload(False, message="Series not found"), 404
+
+    start = parse_iso_datetime(request.args.get('start')) or series.start_time
+    end = parse_iso_datetime(request.args.get('end')) or series.ends_at
+    fmt = request.args.get('format', 'json')
+    if fmt not in SLOT_FORMATS:
+        return make_response_payload(False, errors={"format": ["Must be one of json, ndjson"]}), 400
+
+    def encoded():
+        for lo, hi in recurrence.occurrences(series, start, end):
+            yield {"start_time": lo.isoformat() + "Z", "end_time": hi.isoformat() + "Z",
+                   "materialized": series.materialized_until is not None and lo < series.materialized_until}
+
+    if fmt == 'json':
+        data = list(encoded())
+        return make_response_payload(True, data=data, meta={"series_id": series.id, "count": len(data)})
+    dumps = current_app.json.dumps
+    return Response(stream_with_context(dumps(o) + '\n' for o in encoded()), mimetype='application/x-ndjson')
+
+
+def _waitlist_fields(data, user):
+    """Validate a waitlist request body. Returns (values, errors)."""
+    values, errors = {}, {}
+    for key in ('start_time', 'end_time'):
+        values[key] = parse_iso_datetime(data.get(key))
+        if not values[key]:
+            errors[key] = ['Valid time is required']
+    if not errors:
+        if values['end_time'] <= values['start_time']:
+            errors['end_time'] = ['End must be after start']
+        elif values['start_time'] <= datetime.utcnow():
+            errors['start_time'] = ['Slot has already started']
+    for key in ('room_id', 'customer_id'):
+        value = data.get(key)
+        if not isinstance(value, int) or isinstance(value, bool):
+            errors[key] = ['Is required']
+        values[key] = value
+    priority = data.get('priority', 0)
+    if not isinstance(priority, int) or isinstance(priority, bool):
+        errors['priority'] = ['Must be an integer']
+    elif priority and user.role not in ('Admin', 'Studio Manager'):
+        errors['priority'] = ['Only managers can set a priority']
+    values['priority'] = priority
+    values['notes'] = data.get('notes')
+    return values, errors
+
+
+@rooms_bp.route('/waitlist', methods=['POST'])
+def join_waitlist():
+    """
+    Wait for a booked slot { room_id, customer_id, start_time, end_time,
+    priority?, notes? }. The entry is booked automatically when the slot
+    frees up; a slot that is free already is refused with 409.
+    """
+    user = get_current_user()
+    if not user:
+        return make_response_payload(False, message="Unauthorized"), 401
+    if not user.tenant_id:
+        return make_response_payload(False, message="Invalid user configuration"), 403
+
+    values, errors = _waitlist_fields(request.get_json() or {}, user)
+    if not errors:
+        errors = _series_scope_errors(values, user.tenant_id)
+    if errors:
+        return make_response_payload(False, errors=errors), 400
+
+    slot = {"room_id": values['room_id'], "start_time": values['start_time'], "end_time": values['end_time']}
+    if not validate_slots([slot], tenant_id=user.tenant_id):
+        return make_response_payload(False, message="Slot is available; book it instead"), 409
+
+    entry = WaitlistEntry(tenant_id=user.tenant_id, **values)
+    db.session.add(entry)
+    db.session.commit()
+    ahead = WaitlistEntry.query.filter(
+        WaitlistEntry.room_id == entry.room_id,
+        WaitlistEntry.status == waitlist.WAITING,
+        WaitlistEntry.start_time == entry.start_time,
+        WaitlistEntry.end_time == entry.end_time,
+        or_(WaitlistEntry.priority > entry.priority,
+               and_(WaitlistEntry.priority == entry.priority, WaitlistEntry.id < entry.id)),
+    ).count()
+    return make_response_payload(True, data={**entry.to_dict(), "position": ahead + 1},
+                                 message="Added to waitlist"), 201
+
+
+@rooms_bp.route('/waitlist', methods=['GET'])
+def list_waitlist():
+    """The tenant's waitlist (?room_id=, ?status=waiting|promoted|cancelled|expired), in promotion order."""
+    user = get_current_user()
+    if not user:
+        return make_response_payload(False, message="Unauthorized"), 401
+
+    query = WaitlistEntry.query.filter(WaitlistEntry.tenant_id == user.tenant_id,
+                                       WaitlistEntry.status == request.args.get('status', waitlist.WAITING))
+    room_id = request.args.get('room_id', type=int)
+    if room_id is not None:
+        query = query.filter(WaitlistEntry.room_id == room_id)
+    limit = min(request.args.get('limit', 100, type=int) or 100, 1000)
+    entries = query.order_by(WaitlistEntry.room_id, WaitlistEntry.start_time, WaitlistEntry.end_time,
+                             WaitlistEntry.priority.desc(), WaitlistEntry.id).limit(limit).all()
+    return make_response_payload(True, data=[e.to_dict() for e in entries], meta={"count": len(entries)})
+
+
+@rooms_bp.route('/waitlist/<int:entry_id>', methods=['DELETE'])
+def leave_waitlist(entry_id):
+    """Withdraw a waiting entry."""
+    user = get_current_user()
+    if not user:
+        return make_response_payload(False, message="Unauthorized"), 401
+    entry = WaitlistEntry.query.filter_by(id=entry_id, tenant_id=user.tenant_id).first()
+    if not entry:
+        return make_response_payload(False, message="Waitlist entry not found"), 404
+    if entry.status != waitlist.WAITING:
+        return make_response_payload(False, message=f"Entry is already {entry.status}"), 409
+    entry.status = waitlist.CANCELLED
+    db.session.commit()
+    return make_response_payload(True, data=entry.to_dict(), message="Removed from waitlist")
+
+
+@rooms_bp.route('/bookings/<int:booking_id>/cancel', methods=['POST'])
+def cancel_booking(booking_id):
+    """Cancel a confirmed booking; the freed slot goes to the waitlist in the same transaction."""
+    user = get_current_user()
+    if not user:
+        return make_response_payload(False, message="Unauthorized"), 401
+    booking = Booking.query.filter_by(id=booking_id, tenant_id=user.tenant_id).first()
+    if not booking:
+        return make_response_payload(False, message="Booking not found"), 404
+    if booking.status != 'confirmed':
+        return make_response_payload(False, message=f"Booking is already {booking.status}"), 409
+
+    booking.status = 'cancelled'
+    promoted = waitlist.promote_pending()
+    db.session.commit()
+    return make_response_payload(True, data={
+        **booking.to_dict(),
+        "promoted": [{"waitlist_entry_id": entry_id, "booking": b.to_dict()} for entry_id, b in promoted],
+    }, message="Booking cancelled")
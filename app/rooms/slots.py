@@ -0,0 +1,205 @@
+# Free time-slot finder (per-room busy sweep clipped to opening hours)
+"""
+Find free slots of at least N minutes across many rooms.
+
+Bookings for every requested room come back from one query ordered by
+(room_id, start_time) and are consumed as a stream: each room's busy
+intervals are merged in a single sweep, their gaps inside the range are
+intersected with the studio's opening hours, and free slots are yielded as
+they are found. Nothing is materialised per room beyond the current interval.
+
+Opening hours live in `Studio.settings['opening_hours']`, keyed by weekday:
+
+    {"monday": [["09:00", "17:00"]], "saturday": [["10:00", "14:00"]], ...}
+
+A weekday without an entry is closed; a studio without `opening_hours` is
+open around the clock. Times use the same clock as booking start/end times,
+"24:00" closes at midnight, and windows that touch across midnight join up.
+"""
+from datetime import datetime, time, timedelta
+from itertools import groupby
+from operator import itemgetter
+
+import sqlalchemy as sa
+
+from .. import db
+from ..models import Booking, Room, Studio
+from .conflicts import BLOCKING_STATUSES
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+
+class OpeningHoursError(ValueError):
+    """Raised when a studio's opening_hours setting is malformed."""
+
+
+def _parse_clock(value):
+    if value == '24:00':
+        return timedelta(hours=24)
+    try:
+        parsed = time.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise OpeningHoursError(f'Invalid time: {value!r}') from None
+    return timedelta(hours=parsed.hour, minutes=parsed.minute)
+
+
+class OpeningHours:
+    """Weekly opening windows as offsets from midnight, Monday first."""
+
+    def __init__(self, weekly=None):
+        """
+        :param weekly: list of 7 lists of (open, close) timedeltas, or None for always open
+        """
+        self.weekly = weekly
+
+    @classmethod
+    def from_settings(cls, settings):
+        spec = (settings or {}).get('opening_hours')
+        if spec is None:
+            return cls()
+        if not isinstance(spec, dict):
+            raise OpeningHoursError('opening_hours must be an object keyed by weekday')
+        unknown = set(spec) - set(WEEKDAYS)
+        if unknown:
+            raise OpeningHoursError(f'Unknown weekday: {sorted(unknown)[0]}')
+        weekly = []
+        for day in WEEKDAYS:
+            windows = []
+            for pair in spec.get(day) or []:
+                if not isinstance(pair, (list, tuple)) or len(pair) != 2:
+                    raise OpeningHoursError(f'{day}: expected [open, close] pairs')
+                opens, closes = _parse_clock(pair[0]), _parse_clock(pair[1])
+                if closes <= opens:
+                    raise OpeningHoursError(f'{day}: close must be after open')
+                windows.append((opens, closes))
+            weekly.append(sorted(windows))
+        return cls(weekly)
+
+    def windows(self, start, end):
+        """Yield merged open (start, end) datetimes within [start, end)."""
+        if self.weekly is None:
+            yield start, end
+            return
+
+        def raw():
+            day = datetime.combine(start.date(), time())
+            while day < end:
+                for opens, closes in self.weekly[day.weekday()]:
+                    lo, hi = max(day + opens, start), min(day + closes, end)
+                    if lo < hi:
+                        yield lo, hi
+                day += timedelta(days=1)
+
+        yield from merge_intervals(raw())
+
+
+def merge_intervals(intervals):
+    """Merge (start, end) intervals sorted by start; touching intervals join."""
+    current_start = current_end = None
+    for start, end in intervals:
+        if current_end is None:
+            current_start, current_end = start, end
+        elif start <= current_end:
+            if end > current_end:
+                current_end = end
+        else:
+            yield current_start, current_end
+            current_start, current_end = start, end
+    if current_end is not None:
+        yield current_start, current_end
+
+
+def _gaps(busy, start, end):
+    """Complement of merged busy intervals within [start, end)."""
+    cursor = start
+    for busy_start, busy_end in busy:
+        if busy_start >= end:
+            break
+        if busy_start > cursor:
+            yield cursor, busy_start
+        if busy_end > cursor:
+            cursor = busy_end
+    if cursor < end:
+        yield cursor, end
+
+
+def _intersect(left, right):
+    """Intersect two sorted streams of disjoint intervals."""
+    right = iter(right)
+    current = next(right, None)
+    for lo, hi in left:
+        while current is not None and current[1] <= lo:
+            current = next(right, None)
+        while current is not None and current[0] < hi:
+            a, b = max(lo, current[0]), min(hi, current[1])
+            if a < b:
+                yield a, b
+            if current[1] > hi:
+                break
+            current = next(right, None)
+
+
+def free_slots(busy, open_windows, start, end, min_duration):
+    """
+    Free intervals of at least `min_duration` for one room.
+    :param busy: (start, end) bookings sorted by start (may overlap)
+    :param open_windows: sorted, disjoint opening windows
+    """
+    for lo, hi in _intersect(_gaps(merge_intervals(busy), start, end), open_windows):
+        if hi - lo >= min_duration:
+            yield lo, hi
+
+
+def find_free_slots(tenant_id, start, end, min_minutes=30, studio_id=None, room_ids=None, batch_size=5000):
+    """
+    Stream free slots for the active rooms of a tenant (optionally one studio or
+    a subset of rooms), ordered by room and then time.
+    :return: generator of dicts with room_id, studio_id, start_time, end_time and minutes
+    """
+    room_stmt = sa.select(Room.id, Room.studio_id).where(Room.tenant_id == tenant_id, Room.is_active.is_(True))
+    if studio_id is not None:
+        room_stmt = room_stmt.where(Room.studio_id == studio_id)
+    if room_ids is not None:
+        room_stmt = room_stmt.where(Room.id.in_(list(room_ids)))
+    rooms = db.session.execute(room_stmt.order_by(Room.id)).all()
+    if not rooms:
+        return
+
+    # Opening windows are shared by every room of a studio
+    studio_ids = {r.studio_id for r in rooms}
+    hours = {s.id: OpeningHours.from_settings(s.settings)
+             for s in db.session.execute(sa.select(Studio).where(Studio.id.in_(studio_ids))).scalars()}
+    windows = {sid: list(hours[sid].windows(start, end)) for sid in studio_ids}
+
+    booking_stmt = sa.select(Booking.room_id, Booking.start_time, Booking.end_time).where(
+        Booking.tenant_id == tenant_id,
+        Booking.status.in_(BLOCKING_STATUSES),
+        Booking.start_time < end,
+        Booking.end_time > start,
+    )
+    if studio_id is not None or room_ids is not None:
+        booking_stmt = booking_stmt.where(Booking.room_id.in_([r.id for r in rooms]))
+    # Core execution on the session's connection skips ORM row loading
+    result = db.session.connection().execute(
+        booking_stmt.order_by(Booking.room_id, Booking.start_time).execution_options(yield_per=batch_size))
+
+    by_room = groupby(result, key=itemgetter(0))
+    pending = next(by_room, None)
+    min_duration = timedelta(minutes=min_minutes)
+    for room_id, room_studio_id in rooms:
+        # Skip bookings of rooms that were filtered out (e.g. inactive)
+        while pending is not None and pending[0] < room_id:
+            pending = next(by_room, None)
+        busy = ()
+        if pending is not None and pending[0] == room_id:
+            busy = ((row[1], row[2]) for row in pending[1])
+        for lo, hi in free_slots(busy, windows[room_studio_id], start, end, min_duration):
+            yield {
+                "room_id": room_id,
+                "studio_id": room_studio_id,
+                "start_time": lo,
+                "end_time": hi,
+                "minutes": int((hi - lo).total_seconds() // 60),
+            }
+        if pending is not None and pending[0] == room_id:
+            pending = next(by_room, None)
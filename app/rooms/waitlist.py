@@ -0,0 +1,331 @@
+# Room waitlist (per-slot priority queues, promotion on cancellation)
+"""
+Promote waitlisted customers into slots freed by cancellations.
+
+A WaitlistEntry asks for one room slot [start_time, end_time). Entries for
+the same room and slot form a queue: higher priority first, then earlier
+entries (lower id) first.
+
+WaitlistIndex holds these queues in memory. Each room has a heap per slot
+and its slot keys sorted by start. A freed interval only touches the slots
+that overlap it, found by bisecting the room's keys, and pops their heads.
+The rest of the waitlist is never read. The index is rebuilt from the table
+when the app starts (or on first use, if the table did not exist yet).
+Entries popped by a transaction that rolls back are put back.
+
+When a session flushes a Booking that stops blocking its interval, the
+interval is recorded. That covers a status leaving `confirmed`, a move and
+a delete. Before the session commits, `promote()` runs for each freed
+interval inside the same transaction, so the cancellation and its
+promotions commit or roll back together. For each overlapping slot, best
+head first, `promote()`:
+1. merges in the room's waiting entries around the interval from the
+   database, so entries that joined through other workers count too;
+2. skips the slot while a confirmed booking, a series occurrence or a
+   promotion made in this pass still overlaps it;
+3. claims the head with UPDATE ... WHERE status = 'waiting' and books it.
+   A claim that updates no row lost a race (the entry was cancelled or
+   promoted elsewhere), and the next entry is tried.
+
+Racing cancellations are serialized per room. PostgreSQL locks the room row
+(SELECT ... FOR UPDATE). SQLite allows a single writer, and the
+cancellation has already written. Either way, the second promotion sees
+the first one's booking. Entries whose slot has started are marked expired
+when they are reached.
+
+Bulk statements bypass the session hooks and promote nothing.
+"""
+import heapq
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .. import db
+from ..history import previous
+from ..models import Booking, Room, WaitlistEntry
+from .conflicts import BLOCKING_STATUSES, BookingConflictIndex
+
+WAITING, PROMOTED, CANCELLED, EXPIRED = 'waiting', 'promoted', 'cancelled', 'expired'
+TRACKED_COLUMNS = ('room_id', 'start_time', 'end_time', 'status')
+PROMOTED_NOTE = 'Promoted from waitlist'
+
+_FREED_KEY = '_waitlist_freed'
+_POPPED_KEY = '_waitlist_popped'
+_PROMOTING_KEY = '_waitlist_promoting'
+
+_ENTRY_COLUMNS = (WaitlistEntry.id, WaitlistEntry.tenant_id, WaitlistEntry.room_id, WaitlistEntry.customer_id,
+                  WaitlistEntry.start_time, WaitlistEntry.end_time, WaitlistEntry.priority)
+
+
+class _RoomQueues:
+    """Waiting entries of one room: a heap per slot, and the slots sorted by (start, end)."""
+
+    __slots__ = ('heaps', 'keys', 'longest')
+
+    def __init__(self):
+        self.heaps = {}
+        self.keys = []
+        self.longest = timedelta(0)
+
+    def push(self, key, item):
+        heap = self.heaps.get(key)
+        if heap is None:
+            heap = self.heaps[key] = []
+            insort(self.keys, key)
+            self.longest = max(self.longest, key[1] - key[0])
+        heapq.heappush(heap, item)
+
+    def overlapping(self, start, end):
+        """Slot keys overlapping [start, end)."""
+        # No slot is longer than `longest`, so earlier starts cannot reach `start`
+        lo = bisect_left(self.keys, (start - self.longest,))
+        hi = bisect_left(self.keys, (end,))
+        return [key for key in self.keys[lo:hi] if key[1] > start]
+
+    def drop(self, key):
+        del self.heaps[key]
+        del self.keys[bisect_left(self.keys, key)]
+
+
+class WaitlistIndex:
+    """
+    Per-process priority queues of waiting entries. Heap items are
+    (-priority, entry_id, customer_id, tenant_id).
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self._rooms = {}
+        self._known = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._known)
+
+    def rebuild(self, session):
+        """Reload every waiting entry (one query)."""
+        rows = session.execute(sa.select(*_ENTRY_COLUMNS).where(WaitlistEntry.status == WAITING)).all()
+        with self._lock:
+            self._rooms, self._known = {}, set()
+            self._add(rows)
+            self.loaded = True
+
+    def add(self, rows):
+        """Index entry rows (id, tenant_id, room_id, customer_id, start_time, end_time, priority) not seen yet."""
+        with self._lock:
+            self._add(rows)
+
+    def _add(self, rows):
+        for entry_id, tenant_id, room_id, customer_id, start, end, priority in rows:
+            if entry_id in self._known:
+                continue
+            self._known.add(entry_id)
+            queues = self._rooms.get(room_id)
+            if queues is None:
+                queues = self._rooms[room_id] = _RoomQueues()
+            queues.push((start, end), (-priority, entry_id, customer_id, tenant_id))
+
+    def candidates(self, room_id, start, end):
+        """Slots of the room overlapping [start, end), best head first."""
+        with self._lock:
+            queues = self._rooms.get(room_id)
+            if queues is None:
+                return []
+            return sorted(queues.overlapping(start, end), key=lambda key: queues.heaps[key][0])
+
+    def pop(self, room_id, key):
+        """Remove and return the head of a slot's queue, or None when it is empty."""
+        with self._lock:
+            queues = self._rooms.get(room_id)
+            heap = queues.heaps.get(key) if queues is not None else None
+            if not heap:
+                return None
+            item = heapq.heappop(heap)
+            self._known.discard(item[1])
+            if not heap:
+                queues.drop(key)
+                if not queues.heaps:
+                    del self._rooms[room_id]
+            return item
+
+    def restore(self, popped):
+        """Put back (room_id, key, item) triples popped by a rolled-back transaction."""
+        with self._lock:
+            for room_id, key, item in popped:
+                if item[1] in self._known:
+                    continue
+                self._known.add(item[1])
+                queues = self._rooms.get(room_id)
+                if queues is None:
+                    queues = self._rooms[room_id] = _RoomQueues()
+                queues.push(key, item)
+
+
+def _current():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('waitlist')
+
+
+def _claim(session, room_id, key, item, now):
+    """Promote one entry if it is still waiting; return its new Booking (None if it lost a race)."""
+    _, entry_id, customer_id, tenant_id = item
+    claimed = session.execute(
+        sa.update(WaitlistEntry)
+        .where(WaitlistEntry.id == entry_id, WaitlistEntry.status == WAITING)
+        .values(status=PROMOTED, promoted_at=now)
+    ).rowcount
+    if not claimed:
+        return None
+    booking = Booking(tenant_id=tenant_id, room_id=room_id, customer_id=customer_id, start_time=key[0],
+                      end_time=key[1], status='confirmed', notes=PROMOTED_NOTE)
+    session.add(booking)
+    session.flush()
+    session.execute(sa.update(WaitlistEntry).where(WaitlistEntry.id == entry_id).values(booking_id=booking.id))
+    return booking
+
+
+def promote(session, room_id, start, end, now=None):
+    """
+    Fill the slots of `room_id` overlapping [start, end) from the waitlist,
+    inside the session's current transaction.
+    :return: list of (entry_id, booking) promoted
+    """
+    index = _current()
+    if index is None:
+        return []
+    now = now or datetime.utcnow()
+    if not index.loaded:
+        index.rebuild(session)
+    index.add(session.execute(sa.select(*_ENTRY_COLUMNS).where(
+        WaitlistEntry.room_id == room_id,
+        WaitlistEntry.status == WAITING,
+        WaitlistEntry.start_time > now,
+        WaitlistEntry.start_time < end,
+        WaitlistEntry.end_time > start,
+    )))
+    keys = index.candidates(room_id, start, end)
+    if not keys:
+        return []
+
+    # Serializes promotions for the room on PostgreSQL (SQLite ignores it: one writer at a time)
+    session.execute(sa.select(Room.id).where(Room.id == room_id).with_for_update())
+    conflicts = BookingConflictIndex.load([room_id], min(k[0] for k in keys), max(k[1] for k in keys))
+
+    popped = session.info.setdefault(_POPPED_KEY, [])
+    promoted, taken, expired = [], [], []
+    for key in keys:
+        slot_start, slot_end = key
+        if slot_start <= now:
+            while True:
+                item = index.pop(room_id, key)
+                if item is None:
+                    break
+                popped.append((room_id, key, item))
+                expired.append(item[1])
+            continue
+        if conflicts.has_overlap(room_id, slot_start, slot_end) or any(
+                s < slot_end and e > slot_start for s, e in taken):
+            continue
+        while True:
+            item = index.pop(room_id, key)
+            if item is None:
+                break
+            popped.append((room_id, key, item))
+            booking = _claim(session, room_id, key, item, now)
+            if booking is not None:
+                promoted.append((item[1], booking))
+                taken.append(key)
+                break
+    if expired:
+        session.execute(sa.update(WaitlistEntry)
+                        .where(WaitlistEntry.id.in_(expired), WaitlistEntry.status == WAITING)
+                        .values(status=EXPIRED))
+    return promoted
+
+
+def _previous(target):
+    return tuple(previous(target, TRACKED_COLUMNS).values())
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_freed(session, flush_context):
+    if _current() is None:
+        return
+    freed = None
+    for obj in (*session.dirty, *session.deleted):
+        if not isinstance(obj, Booking):
+            continue
+        room_id, start, end, status = previous = _previous(obj)
+        if status not in BLOCKING_STATUSES:
+            continue
+        if obj not in session.deleted and previous == tuple(getattr(obj, name) for name in TRACKED_COLUMNS):
+            continue
+        if freed is None:
+            freed = session.info.setdefault(_FREED_KEY, set())
+        freed.add((room_id, start, end))
+
+
+def promote_pending(session=None):
+    """
+    Flush, then promote into every interval freed since the last call. Runs
+    on its own before each commit; call it directly to get the promotions.
+    :return: list of (entry_id, booking) promoted
+    """
+    session = session or db.session()
+    if _current() is None or session.info.get(_PROMOTING_KEY):
+        return []
+    session.flush()
+    freed = session.info.pop(_FREED_KEY, None)
+    if not freed:
+        return []
+    session.info[_PROMOTING_KEY] = True
+    try:
+        promoted = []
+        for room_id, start, end in sorted(freed):
+            promoted.extend(promote(session, room_id, start, end))
+        return promoted
+    finally:
+        session.info.pop(_PROMOTING_KEY, None)
+
+
+@event.listens_for(Session, 'before_commit')
+def _promote_before_commit(session):
+    # Commit flushes after this hook, so promote_pending flushes first to see pending cancellations
+    promote_pending(session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _forget_popped(session):
+    session.info.pop(_POPPED_KEY, None)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _restore_popped(session):
+    session.info.pop(_FREED_KEY, None)
+    popped = session.info.pop(_POPPED_KEY, None)
+    index = _current()
+    if popped and index is not None:
+        index.restore(popped)
+
+
+def init_app(app):
+    """Build the index (WAITLIST_AUTO_PROMOTE=false disables promotion) and load it if the table exists."""
+    if not app.config.get('WAITLIST_AUTO_PROMOTE', True):
+        app.extensions.pop('waitlist', None)
+        return
+    index = app.extensions['waitlist'] = WaitlistIndex()
+    with app.app_context():
+        try:
+            index.rebuild(db.session)
+        except sa.exc.SQLAlchemyError:  # not migrated yet: loaded on first use instead
+            db.session.rollback()
+        finally:
+            db.session.remove()
+            # Close the startup connection so workers forked from a preloaded app open their own
+            db.engine.dispose()
@@ -0,0 +1,253 @@
+# Read-through cache for rarely-changing rows (tenants, studios, rooms)
+"""
+Cache Tenant, Studio and Room rows by primary key.
+
+`get_cached(Model, id)` returns a detached, read-only snapshot of the row,
+loading it from the database on a miss. Load from the session instead when
+the row is going to be modified.
+
+Keys are versioned. Every row has a version counter, and every table has
+one for lookups that are not by primary key (`first_cached`). A reader
+fetches the version before reading the database and stores the value under
+that version. When a session commits changes to a cached model, the
+after_commit hook bumps the affected versions. Readers then go to keys that
+do not exist yet, and a value computed from pre-commit data cannot mask the
+new row.
+
+Backends:
+- memory: per-process LRU with TTL. Versions are per process, so other
+  gunicorn workers only see a change once their entry expires
+  (ROW_CACHE_TTL).
+- redis: values and version counters live in Redis, so a commit in one
+  worker invalidates all of them at once. Redis errors fall back to the
+  database.
+"""
+import copy
+import json
+import logging
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal
+
+import sqlalchemy as sa
+from flask import current_app, has_app_context
+from prometheus_client import Counter as MetricCounter
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from . import db
+from .cache import LRUCache
+from .metrics import REGISTRY
+from .models import Room, Studio, Tenant
+
+logger = logging.getLogger(__name__)
+
+CACHED_MODELS = (Tenant, Studio, Room)
+_CHANGES_KEY = '_row_cache_changes'
+
+CACHE_REQUESTS = MetricCounter('row_cache_requests', 'Row cache lookups', ('model', 'result'), registry=REGISTRY)
+
+
+class MemoryBackend:
+    """In-process LRU; values are kept as snapshots, versions in a dict."""
+
+    def __init__(self, maxsize=4096, ttl=60):
+        self._values = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._versions = Counter()
+
+    def version(self, key):
+        return self._versions[key]
+
+    def bump(self, keys):
+        for key in keys:
+            self._versions[key] += 1
+
+    def get(self, key):
+        return self._values.get(key)
+
+    def set(self, key, value):
+        self._values.set(key, value)
+
+
+class RedisBackend:
+    """Values as JSON with a TTL; version counters never expire."""
+
+    def __init__(self, client, ttl=60, prefix='rowcache'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def version(self, key):
+        value = self.client.get(f'{self.prefix}:ver:{key}')
+        return int(value) if value is not None else 0
+
+    def bump(self, keys):
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.incr(f'{self.prefix}:ver:{key}')
+        pipe.execute()
+
+    def get(self, key):
+        raw = self.client.get(f'{self.prefix}:{key}')
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value):
+        self.client.set(f'{self.prefix}:{key}', json.dumps(value, separators=(',', ':')), ex=self.ttl or None)
+
+
+def _encode(obj):
+    """Column values as JSON-safe primitives."""
+    values = {}
+    for attr in sa.inspect(type(obj)).column_attrs:
+        value = getattr(obj, attr.key)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        values[attr.key] = value
+    return values
+
+
+def _decode(model, values):
+    """Rebuild a detached, clean instance from _encode() output (no database access)."""
+    decoded = {}
+    for attr in sa.inspect(model).column_attrs:
+        value = values.get(attr.key)
+        if value is not None:
+            column_type = attr.columns[0].type
+            if isinstance(column_type, sa.DateTime):
+                value = datetime.fromisoformat(value)
+            elif isinstance(column_type, sa.Numeric) and not isinstance(column_type, sa.Float):
+                value = Decimal(value)
+            elif isinstance(column_type, sa.JSON):
+                value = copy.deepcopy(value)
+        decoded[attr.key] = value
+    obj = model(**decoded)
+    make_transient_to_detached(obj)
+    return obj
+
+
+class RowCache:
+    """Versioned read-through cache over a backend, with hit/miss counters."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.stats = Counter()
+
+    def _count(self, model, result):
+        self.stats[(model.__name__, result)] += 1
+        CACHE_REQUESTS.labels(model.__name__, result).inc()
+
+    def _call(self, method, *args):
+        try:
+            return getattr(self.backend, method)(*args)
+        except Exception:  # backend outage degrades to database reads
+            logger.warning('Row cache %s failed', method, exc_info=True)
+            return None
+
+    def get(self, model, row_id):
+        table = model.__tablename__
+        version = self._call('version', f'{table}:{row_id}')
+        key = f'{table}:{row_id}:v{version}'
+        values = self._call('get', key) if version is not None else None
+        if values is not None:
+            self._count(model, 'hit')
+            return _decode(model, values)
+        self._count(model, 'miss')
+        obj = db.session.get(model, row_id)
+        if obj is not None and version is not None and _committed_state(model):
+            self._call('set', key, _encode(obj))
+        return obj
+
+    def first(self, model, **filters):
+        """First row matching equality filters; cached as the primary key under the table version."""
+        table = model.__tablename__
+        version = self._call('version', table)
+        key = f'{table}:first:{json.dumps(sorted(filters.items()))}:v{version}'
+        row_id = self._call('get', key) if version is not None else None
+        if row_id is not None:
+            return self.get(model, row_id)
+        obj = model.query.filter_by(**filters).first()
+        if obj is not None and version is not None and _committed_state(model):
+            self._call('set', key, obj.id)
+        return obj
+
+    def invalidate(self, changes):
+        """Bump the versions for (table, id) pairs and their tables."""
+        keys = {table for table, _ in changes} | {f'{table}:{row_id}' for table, row_id in changes}
+        self._call('bump', sorted(keys))
+
+
+def _committed_state(model):
+    """False while the session holds uncommitted changes to `model`, which must not be cached."""
+    session = db.session()
+    if model.__tablename__ in {t for t, _ in session.info.get(_CHANGES_KEY, ())}:
+        return False
+    return not any(isinstance(o, model) for o in (*session.new, *session.dirty, *session.deleted))
+
+
+def _current():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('row_cache')
+
+
+def enabled():
+    """True when a row cache is configured (ROW_CACHE_BACKEND other than none)."""
+    return _current() is not None
+
+
+def get_cached(model, row_id):
+    """Row by primary key through the cache (a plain session get when caching is off)."""
+    if row_id is None:
+        return None
+    cache = _current()
+    if cache is None:
+        return db.session.get(model, row_id)
+    return cache.get(model, row_id)
+
+
+def first_cached(model, **filters):
+    """`Model.query.filter_by(**filters).first()` through the cache."""
+    cache = _current()
+    if cache is None:
+        return model.query.filter_by(**filters).first()
+    return cache.first(model, **filters)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    changes = None
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if type(obj) in CACHED_MODELS:
+            if changes is None:
+                changes = session.info.setdefault(_CHANGES_KEY, set())
+            changes.add((obj.__tablename__, obj.id))
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    changes = session.info.pop(_CHANGES_KEY, None)
+    cache = _current()
+    if changes and cache is not None:
+        cache.invalidate(changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop(_CHANGES_KEY, None)
+
+
+def init_app(app):
+    """Build the configured backend: ROW_CACHE_BACKEND = none | memory | redis."""
+    kind = app.config.get('ROW_CACHE_BACKEND', 'none')
+    ttl = app.config.get('ROW_CACHE_TTL', 60)
+    if kind == 'memory':
+        backend = MemoryBackend(maxsize=app.config.get('ROW_CACHE_SIZE', 4096), ttl=ttl)
+    elif kind == 'redis':
+        import redis
+        backend = RedisBackend(redis.Redis.from_url(app.config['ROW_CACHE_REDIS_URL']), ttl=ttl)
+    else:
+        app.extensions.pop('row_cache', None)
+        return
+    app.extensions['row_cache'] = RowCache(backend)
@@ -0,0 +1,220 @@
+# Synthetic data generator (flask seed, scripts/seed_db.py, load tests)
+"""
+Fill the database with tenants, studios, rooms, users, customers and bookings
+at any scale.
+
+Rows go in through Core executemany inserts in batches, never through the
+ORM unit of work. Every user shares one password hash computed up front, and
+all values come from a `random.Random(seed)`. The same seed and start date
+therefore produce the same rows.
+
+Each tenant is generated and committed before the next, so memory depends
+on the size of one tenant, not on the total. Bulk inserts bypass the mapper
+events, so the booking rollups, the customers' booking stats and the
+customer search index are rebuilt at the end.
+
+Logins follow a fixed pattern, so load tests can derive them (password
+'password'):
+- global admin: admin@example.com
+- tenant admin: admin@<subdomain>.example.com
+- per studio: manager<n>@, staff<n>@, reception<n>@<subdomain>.example.com
+"""
+import random
+import re
+from datetime import datetime, timedelta
+
+from . import db
+from .models import Booking, Customer, Room, Studio, Tenant, User
+from .passwords import hash_password
+
+PASSWORD = 'password'
+PLANS = (('free', 60), ('basic', 25), ('premium', 12), ('enterprise', 3))
+STUDIO_ROLES = (
+    ('manager', 'Studio Manager', ['view_reports', 'manage_staff']),
+    ('staff', 'Staff/Instructor', ['create_booking']),
+    ('reception', 'Receptionist', ['create_booking', 'edit_customer']),
+)
+FIRST_NAMES = ('Ada', 'Ben', 'Cleo', 'Dev', 'Ela', 'Finn', 'Gia', 'Hugo', 'Iris', 'Jon', 'Kai', 'Lena',
+               'Milo', 'Nora', 'Omar', 'Pia', 'Quinn', 'Rosa', 'Sam', 'Tara', 'Uma', 'Vic', 'Wren', 'Yara')
+LAST_NAMES = ('Adams', 'Baker', 'Chen', 'Diaz', 'Evans', 'Fischer', 'Garcia', 'Hill', 'Ito', 'Jones',
+              'Khan', 'Lopez', 'Moreau', 'Novak', 'Okafor', 'Patel', 'Rossi', 'Silva', 'Tanaka', 'Weber')
+WORDS = ('Blue', 'Echo', 'Golden', 'Harbor', 'Iron', 'Lunar', 'Maple', 'North', 'Oak', 'Pulse',
+         'Red', 'River', 'Studio', 'Summit', 'Tempo', 'Urban', 'Velvet', 'Wave')
+ROOM_TYPES = ('Live Room', 'Booth', 'Control Room', 'Rehearsal Room', 'Dance Floor', 'Podcast Suite')
+# Booking shape: durations and gaps in hours, bookable between OPEN_HOUR and CLOSE_HOUR
+DURATIONS = (1, 1, 2, 2, 2, 3, 4)
+GAPS = (0, 0, 0, 1, 1, 2, 3)
+OPEN_HOUR, CLOSE_HOUR = 8, 22
+
+_COUNT_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kKmM]?)\s*$')
+
+
+def parse_count(value):
+    """'5000' -> 5000, '250k' -> 250000, '10M' -> 10000000."""
+    if isinstance(value, int):
+        return value
+    match = _COUNT_RE.match(str(value))
+    if not match:
+        raise ValueError(f'Invalid count: {value!r}')
+    number, suffix = match.groups()
+    return int(float(number) * {'': 1, 'k': 1_000, 'm': 1_000_000}[suffix.lower()])
+
+
+def _split(total, parts):
+    """`total` spread over `parts` as evenly as possible."""
+    base, extra = divmod(total, parts) if parts else (0, 0)
+    return [base + (i < extra) for i in range(parts)]
+
+
+def _insert(model, rows, batch_size, returning=False):
+    """executemany in batches; with returning=True, the new ids in parameter order."""
+    # Insert into the Table, not the mapped class: ORM bulk inserts split batches
+    # into separate statements wherever the set of None values changes
+    table = model.__table__
+    ids = []
+    stmt = table.insert()
+    if returning:
+        stmt = stmt.returning(table.c.id, sort_by_parameter_order=True)
+    for i in range(0, len(rows), batch_size):
+        result = db.session.execute(stmt, rows[i:i + batch_size])
+        if returning:
+            ids.extend(result.scalars())
+    return ids
+
+
+class Generator:
+    """One seeded run; `run()` returns the number of rows written per table."""
+
+    def __init__(self, tenants=1, studios_per_tenant=2, rooms_per_studio=3, customers_per_tenant=50,
+                 bookings=1000, seed=1, start=None, batch_size=5000, echo=None):
+        self.tenants = tenants
+        self.studios_per_tenant = studios_per_tenant
+        self.rooms_per_studio = rooms_per_studio
+        self.customers_per_tenant = customers_per_tenant
+        self.bookings = bookings
+        self.rng = random.Random(seed)
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.start = start or today - timedelta(days=365)
+        self.batch_size = batch_size
+        self.echo = echo or (lambda message: None)
+        self.counts = dict.fromkeys(('tenants', 'studios', 'rooms', 'users', 'customers', 'bookings'), 0)
+
+    def _name(self):
+        return f'{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}'
+
+    def run(self):
+        if Tenant.query.filter(Tenant.subdomain == 'tenant-00000').first() is not None:
+            raise RuntimeError('Database already holds generated tenants; use an empty database')
+        self.password_hash = hash_password(PASSWORD)
+        if not User.query.filter(User.tenant_id.is_(None), User.email == 'admin@example.com').first():
+            self._users([('admin@example.com', 'Admin User', 'Admin', ['create_booking', 'edit_customer',
+                                                                       'view_reports', 'manage_staff'], None, None)])
+
+        plans, weights = zip(*PLANS)
+        tenant_ids = _insert(Tenant, [
+            {'name': f'{self.rng.choice(WORDS)} {self.rng.choice(WORDS)} {i}', 'subdomain': f'tenant-{i:05d}',
+             'plan': self.rng.choices(plans, weights)[0], 'is_active': True, 'settings': {},
+             'created_at': self.start, 'updated_at': self.start}
+            for i in range(self.tenants)
+        ], self.batch_size, returning=True)
+        self.counts['tenants'] = len(tenant_ids)
+        db.session.commit()
+
+        per_tenant = _split(self.bookings, len(tenant_ids))
+        for i, (tenant_id, bookings) in enumerate(zip(tenant_ids, per_tenant)):
+            self._tenant(tenant_id, f'tenant-{i:05d}', bookings)
+            db.session.commit()
+            if (i + 1) % max(1, len(tenant_ids) // 20) == 0 or i + 1 == len(tenant_ids):
+                self.echo(f'{i + 1}/{len(tenant_ids)} tenants, {self.counts["bookings"]:,} bookings')
+
+        from .customers import stats
+        from .customers.search import get_search_backend
+        from .reports import rollups
+        rollups.rebuild()
+        stats.rebuild()
+        get_search_backend().rebuild()
+        db.session.commit()
+        return self.counts
+
+    def _users(self, users):
+        _insert(User, [
+            {'email': email, 'name': name, 'role': role, 'permissions': permissions, 'tenant_id': tenant_id,
+             'studio_id': studio_id, 'password_hash': self.password_hash, 'is_active': True,
+             'created_at': self.start}
+            for email, name, role, permissions, tenant_id, studio_id in users
+        ], self.batch_size)
+        self.counts['users'] += len(users)
+
+    def _tenant(self, tenant_id, subdomain, bookings):
+        rng = self.rng
+        studio_ids = _insert(Studio, [
+            {'tenant_id': tenant_id, 'name': f'{rng.choice(WORDS)} Studio {n + 1}', 'settings': {},
+             'email': f'studio{n + 1}@{subdomain}.example.com'}
+            for n in range(self.studios_per_tenant)
+        ], self.batch_size, returning=True)
+        rooms = [
+            {'tenant_id': tenant_id, 'studio_id': studio_id, 'name': f'{rng.choice(ROOM_TYPES)} {n + 1}',
+             'capacity': rng.randint(1, 20), 'hourly_rate': rng.choice((15, 20, 25, 35, 50, 75)),
+             'equipment': [], 'is_active': True}
+            for studio_id in studio_ids for n in range(self.rooms_per_studio)
+        ]
+        room_ids = _insert(Room, rooms, self.batch_size, returning=True)
+
+        domain = f'{subdomain}.example.com'
+        users = [(f'admin@{domain}', self._name(), 'Admin', [], tenant_id, None)]
+        for n, studio_id in enumerate(studio_ids, start=1):
+            users += [(f'{prefix}{n}@{domain}', self._name(), role, permissions, tenant_id, studio_id)
+                      for prefix, role, permissions in STUDIO_ROLES]
+        self._users(users)
+
+        customers = []
+        for n in range(self.customers_per_tenant):
+            name = self._name()
+            created = self.start + timedelta(minutes=rng.randrange(365 * 24 * 60))
+            customers.append({
+                'tenant_id': tenant_id, 'studio_id': rng.choice(studio_ids), 'name': name,
+                'email': f"{name.replace(' ', '.').lower()}.{n}@example.com",
+                'phone': f'+1555{rng.randrange(10 ** 7):07d}', 'notes': None,
+                'created_at': created, 'updated_at': created,
+            })
+        customer_ids = _insert(Customer, customers, self.batch_size, returning=True)
+
+        self.counts['studios'] += len(studio_ids)
+        self.counts['rooms'] += len(room_ids)
+        self.counts['customers'] += len(customer_ids)
+        if customer_ids and room_ids:
+            rates = [room['hourly_rate'] for room in rooms]
+            for room_id, rate, count in zip(room_ids, rates, _split(bookings, len(room_ids))):
+                self._room_bookings(tenant_id, room_id, rate, count, customer_ids)
+
+    def _room_bookings(self, tenant_id, room_id, rate, count, customer_ids):
+        """`count` non-overlapping bookings for one room, laid out from the start date."""
+        rng = self.rng
+        t = self.start + timedelta(hours=OPEN_HOUR)
+        batch = []
+        for _ in range(count):
+            hours = rng.choice(DURATIONS)
+            t += timedelta(hours=rng.choice(GAPS))
+            if t.hour + hours > CLOSE_HOUR or t.hour < OPEN_HOUR:
+                t = t.replace(hour=OPEN_HOUR) + timedelta(days=1 if t.hour >= OPEN_HOUR else 0)
+            end = t + timedelta(hours=hours)
+            cancelled = rng.random() < 0.08
+            batch.append({
+                'tenant_id': tenant_id, 'room_id': room_id, 'customer_id': rng.choice(customer_ids),
+                'start_time': t, 'end_time': end, 'status': 'cancelled' if cancelled else 'confirmed',
+                'total_amount': hours * rate if rng.random() < 0.8 else None,
+                'created_at': t - timedelta(days=rng.randint(0, 30)),
+            })
+            t = end
+            if len(batch) >= self.batch_size:
+                _insert(Booking, batch, self.batch_size)
+                self.counts['bookings'] += len(batch)
+                batch = []
+        if batch:
+            _insert(Booking, batch, self.batch_size)
+            self.counts['bookings'] += len(batch)
+
+
+def generate(**options):
+    """Run a Generator with `options` (see Generator) and return the row counts."""
+    return Generator(**options).run()
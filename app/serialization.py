@@ -0,0 +1,141 @@
+# Fast JSON encoding (JSON provider and compiled model serializers)
+"""
+Fast-path JSON serialization.
+
+- OrjsonProvider: Flask JSON provider backed by orjson when it is installed,
+  keeping Flask's handling of dates, decimals and UUIDs.
+- ModelSerializer: per-model encoder compiled once from the mapped columns.
+  It turns a row (ORM instance, or a Core Row selected in `fields` order)
+  straight into JSON bytes using a pre-built byte template, producing the
+  same document as the model's to_dict() without an intermediate dict.
+- RawJSON: pre-encoded JSON that make_response_payload embeds verbatim.
+"""
+import json
+
+import sqlalchemy as sa
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+class RawJSON(bytes):
+    """Already-encoded JSON value, embedded as-is in API responses."""
+
+
+def _stdlib_dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+if orjson is not None:
+    _dumps = orjson.dumps
+else:
+    _dumps = _stdlib_dumps
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """DefaultJSONProvider with orjson doing the encoding and decoding."""
+
+    def _option(self):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._option()).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self._option() | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_app(app):
+    """Install the orjson provider unless disabled or unavailable."""
+    if orjson is not None and app.config.get('JSON_FAST_ENCODER', True):
+        app.json = OrjsonProvider(app)
+
+
+def _encoder_expr(column, var, default):
+    """Return a Python expression encoding `var` (a column value) to JSON bytes."""
+    col_type = column.type
+    fallback = repr(_dumps(default)) if default is not None else "b'null'"
+
+    if isinstance(col_type, sa.Boolean):
+        return f"(b'true' if {var} else b'false') if {var} is not None else {fallback}"
+    if isinstance(col_type, sa.Integer):
+        return f"(b'%d' % {var}) if {var} is not None else {fallback}"
+    if isinstance(col_type, sa.DateTime):
+        # isoformat() never needs escaping, so skip the generic encoder
+        return f"(b'\"' + {var}.isoformat().encode() + b'Z\"') if {var} is not None else {fallback}"
+    if isinstance(col_type, sa.Numeric):
+        # Mirrors to_dict(): float(value) if value else None
+        return f"repr(float({var})).encode() if {var} else {fallback}"
+    if isinstance(col_type, sa.JSON):
+        return f"_dumps({var}) if {var} else {fallback}" if default is not None else f"_dumps({var})"
+    if default is not None:
+        return f"_dumps({var}) if {var} else {fallback}"
+    return f"_dumps({var})"
+
+
+class ModelSerializer:
+    """
+    JSON encoder for one model, compiled from its columns.
+    Models can set __json_exclude__ (column keys to omit) and
+    __json_defaults__ (replacement values for falsy columns, e.g. notes -> "").
+    """
+
+    def __init__(self, model):
+        self.model = model
+        exclude = set(getattr(model, '__json_exclude__', ()))
+        defaults = getattr(model, '__json_defaults__', {})
+        columns = [(attr.key, attr.columns[0]) for attr in sa.inspect(model).column_attrs if attr.key not in exclude]
+        self.fields = tuple(key for key, _ in columns)
+
+        template = b'{' + b','.join(_dumps(key) + b':%b' for key, _ in columns) + b'}'
+        names = ", ".join(f"v{i}" for i in range(len(columns)))
+        exprs = [_encoder_expr(column, f"v{i}", defaults.get(key)) for i, (key, column) in enumerate(columns)]
+        body = "    return _template % (" + ", ".join(f"({e})" for e in exprs) + ",)"
+        source = "\n".join([
+            # ORM instances: read loaded values straight from __dict__, bypassing the
+            # instrumented descriptors; fall back to attribute access if any are expired
+            "def encode(obj):",
+            "    d = obj.__dict__",
+            "    try:",
+            f"        {names}, = " + ", ".join(f"d[{key!r}]" for key, _ in columns),
+            "    except KeyError:",
+            f"        {names}, = " + ", ".join(f"obj.{key}" for key, _ in columns),
+            body,
+            # Core rows selected with columns in `fields` order
+            "def encode_row(row):",
+            f"    {names}, = row",
+            body,
+        ])
+        namespace = {'_template': template, '_dumps': _dumps}
+        exec(compile(source, f"<serializer {model.__name__}>", "exec"), namespace)
+        self.encode = namespace['encode']
+        self.encode_row = namespace['encode_row']
+
+    def dumps_many(self, rows):
+        """Encode an iterable of ORM instances as a JSON array."""
+        return RawJSON(b'[' + b','.join(map(self.encode, rows)) + b']')
+
+    def dumps(self, row):
+        return RawJSON(self.encode(row))
+
+
+_serializers = {}
+
+
+def serializer_for(model):
+    """Return the compiled serializer for `model` (built on first use)."""
+    serializer = _serializers.get(model)
+    if serializer is None:
+        serializer = _serializers[model] = ModelSerializer(model)
+    return serializer
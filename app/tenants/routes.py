@@ -1,9 +1,12 @@
-from flask import Blueprint, request
-from werkzeug.security import generate_password_hash
-from sqlalchemy import or_
-from .. import db
-from ..models import Tenant, Studio, User
+from datetime import datetime
+from flask import Blueprint, Response, current_app, request
+from sqlalchemy import func, or_
+from .. import db, jobs, live
+from ..models import Booking, Tenant, Studio, User
 from ..utils import make_response_payload, get_current_user
+from ..passwords import hash_password
+from ..conditional import row_validators
+from ..rowcache import get_cached
 import re
 
 tenants_bp = Blueprint('tenants', __name__)
@@ -64,6 +67,8 @@ def create_tenant():
     if errors:
         return make_response_payload(False, errors=errors), 400
 
+    password_hash = hash_password(admin_password)
+
     try:
         # Create tenant
         tenant = Tenant(
@@ -89,7 +94,7 @@ def create_tenant():
             studio_id=studio.id,
             name=admin_name,
             email=admin_email,
-            password_hash=generate_password_hash(admin_password),
+            password_hash=password_hash,
             role='Studio Manager',  # Tenant admin role
             permissions=[
                 'view_customers', 'create_customer', 'edit_customer', 'delete_customer',
@@ -140,11 +145,14 @@ def get_tenant(tenant_id):
     if user.role != 'Admin' and user.tenant_id != tenant_id:
         return make_response_payload(False, message="Access denied"), 403
 
-    tenant = Tenant.query.get(tenant_id)
+    tenant = get_cached(Tenant, tenant_id)
     if not tenant:
         return make_response_payload(False, message="Tenant not found"), 404
 
-    return make_response_payload(True, data=tenant.to_dict())
+    validators = row_validators(tenant)
+    if validators.matches():
+        return validators.not_modified()
+    return validators.apply(make_response_payload(True, data=tenant.to_dict()))
 
 @tenants_bp.route('/<int:tenant_id>', methods=['PUT'])
 def update_tenant(tenant_id):
@@ -186,4 +194,76 @@ def update_tenant(tenant_id):
         )
     except Exception as e:
         db.session.rollback()
-        return make_response_payload(False, message=f"Failed to update tenant: {str(e)}"), 500
\ No newline at end of file
+        return make_response_payload(False, message=f"Failed to update tenant: {str(e)}"), 500
+
+@tenants_bp.route('/<int:tenant_id>/export', methods=['POST'])
+def export_tenant(tenant_id):
+    """Queue a full export of the tenant's data (zip of NDJSON files) as a background job."""
+    user = get_current_user()
+    if not user:
+        return make_response_payload(False, message="Unauthorized"), 401
+
+    # Tenant Studio Managers and Admins export their own tenant; global Admins any tenant
+    own_tenant = user.tenant_id == tenant_id or (user.role == 'Admin' and not user.tenant_id)
+    if user.role not in ['Admin', 'Studio Manager'] or not own_tenant:
+        return make_response_payload(False, message="Access denied"), 403
+
+    if not get_cached(Tenant, tenant_id):
+        return make_response_payload(False, message="Tenant not found"), 404
+
+    job = jobs.submit('tenants.export', {"tenant_id": tenant_id}, user=user, tenant_id=tenant_id)
+    return jobs.accepted(job, message="Export queued")
+
+@tenants_bp.route('/live-bookings', methods=['GET'])
+def live_bookings():
+    """Confirmed bookings in progress right now, per tenant (global Admins see every tenant)."""
+    user = get_current_user()
+    if not user:
+        return make_response_payload(False, message="Unauthorized"), 401
+
+    now = datetime.utcnow()
+    query = db.session.query(Booking.tenant_id, func.count()).filter(
+        Booking.status == 'confirmed', Booking.start_time <= now, Booking.end_time > now)
+    if user.tenant_id is not None:
+        query = query.filter(Booking.tenant_id == user.tenant_id)
+    rows = query.group_by(Booking.tenant_id).all()
+    return make_response_payload(True, data=[{"tenant_id": tenant_id, "cnt": count} for tenant_id, count in rows])
+
+@tenants_bp.route('/events', methods=['GET'])
+def live_events():
+    """
+    Server-Sent Events for committed booking and customer changes in the
+    user's tenant, and only the user's studio below Studio Manager (as in the
+    customer list). ?types=booking,customer limits the event kinds; global
+    Admins get every tenant, or one with ?tenant_id=.
+    """
+    user = get_current_user()
+    if not user:
+        return make_response_payload(False, message="Unauthorized"), 401
+
+    bus = current_app.extensions.get('live')
+    if bus is None:
+        return make_response_payload(False, message="Live events are disabled"), 503
+
+    # Scoped like the customer list: global admins pick any tenant, non-managers see their studio
+    tenant_id, studio_id = user.tenant_id, None
+    if tenant_id is None:
+        if user.role != 'Admin':
+            return make_response_payload(False, message="Invalid user configuration"), 403
+        tenant_id = request.args.get('tenant_id', type=int)
+    elif user.role not in ['Admin', 'Studio Manager']:
+        if user.studio_id is None:
+            return make_response_payload(False, message="Invalid user configuration"), 403
+        studio_id = user.studio_id
+    types = tuple(f"{t.strip()}." for t in request.args.get('types', '').split(',') if t.strip())
+
+    sub = bus.subscribe(tenant_id, studio_id)
+    config = current_app.config
+    response = Response(live.stream(sub, heartbeat=config.get('LIVE_HEARTBEAT', 15),
+                                    max_seconds=config.get('LIVE_STREAM_MAX_SECONDS', 300), types=types or None),
+                        mimetype='text/event-stream')
+    # Unsubscribes even if the body is never iterated
+    response.call_on_close(sub.close)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -3,7 +3,11 @@
 Utility functions for standardized JSON responses and error handling.
 """
 
-from flask import jsonify, session
+from datetime import datetime, timezone
+
+from flask import current_app, jsonify
+
+from .serialization import RawJSON
 
 def make_response_payload(success, data=None, message=None, errors=None, meta=None, conflicts=None):
     """
@@ -14,11 +18,17 @@ def make_response_payload(success, data=None, message=None, errors=None, meta=No
     :param errors: dict mapping field names to lists of error messages
     :param meta: dict for pagination metadata
     :param conflicts: list of conflict entries (e.g. booking overlaps)
+    data may also be pre-encoded JSON (serialization.RawJSON), which is
+    spliced into the body without being decoded.
     """
     payload = {"success": success}
 
+    raw_data = None
     if data is not None:
-        payload["data"] = data
+        if isinstance(data, RawJSON):
+            raw_data = data
+        else:
+            payload["data"] = data
     if message is not None:
         payload["message"] = message
     if errors is not None:
@@ -28,6 +38,11 @@ def make_response_payload(success, data=None, message=None, errors=None, meta=No
     if conflicts is not None:
         payload["conflicts"] = conflicts
 
+    if raw_data is not None:
+        rest = current_app.json.dumps(payload).encode('utf-8')
+        body = b'{"data":' + raw_data + b',' + rest[1:] + b'\n'
+        return current_app.response_class(body, mimetype=current_app.json.mimetype)
+
     return jsonify(payload)
 
 def register_error_handlers(app):
@@ -55,10 +70,25 @@ def register_error_handlers(app):
         return make_response_payload(False, message="Internal server error"), 500
 
 def get_current_user():
-    """Return the current logged-in user from session or None."""
-    user_id = session.get('user_id')
-    if not user_id:
-        return None
+    """Return the current logged-in user from session or None (cached per request)."""
     # Lazy import to avoid circular dependency at import time
-    from .models import User
-    return User.query.get(user_id)
+    from .identity import get_current_user as _get_current_user
+    return _get_current_user()
+
+def parse_iso_datetime(value):
+    """
+    Parse an ISO 8601 timestamp (optionally suffixed with 'Z') into a naive UTC datetime.
+    Returns None when the value is missing or malformed.
+    """
+    if not value or not isinstance(value, str):
+        return None
+    text = value.strip()
+    if text.endswith('Z') or text.endswith('z'):
+        text = text[:-1] + '+00:00'
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
@@ -31,3 +31,11 @@ worker_tmp_dir = "/dev/shm"
 
 # Preload to reduce memory on copy-on-write OS
 preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+
+# Multiprocess Prometheus metrics (app/metrics.py): drop the live-gauge files of
+# exited workers. PROMETHEUS_MULTIPROC_DIR must be an empty directory at startup.
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,31 @@
+"""Per-customer booking index for customer analytics
+
+Revision ID: 2f8c6a1e9d47
+Revises: 7d3b9f2c6e14
+Create Date: 2025-10-20
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2f8c6a1e9d47'
+down_revision = '7d3b9f2c6e14'
+branch_labels = None
+depends_on = None
+
+INDEX = 'ix_bookings_tenant_customer_start'
+COLUMNS = ['tenant_id', 'customer_id', 'start_time', 'end_time', 'room_id', 'status', 'total_amount']
+
+
+def upgrade():
+    existing = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('bookings')}
+    if INDEX not in existing:
+        op.create_index(INDEX, 'bookings', COLUMNS)
+
+
+def downgrade():
+    existing = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('bookings')}
+    if INDEX in existing:
+        op.drop_index(INDEX, table_name='bookings')
@@ -0,0 +1,37 @@
+"""Composite indexes for customer keyset pagination
+
+Revision ID: 3c9e1f2a7b41
+Revises: a1b2c3d4e5f7
+Create Date: 2025-09-08
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9e1f2a7b41'
+down_revision = 'a1b2c3d4e5f7'
+branch_labels = None
+depends_on = None
+
+# (tenant_id, email) is already covered by _tenant_customer_email_uc
+INDEXES = {
+    'ix_customers_tenant_name_id': ['tenant_id', 'name', 'id'],
+    'ix_customers_tenant_created_id': ['tenant_id', 'created_at', 'id'],
+    'ix_customers_tenant_updated_id': ['tenant_id', 'updated_at', 'id'],
+}
+
+
+def upgrade():
+    existing = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('customers')}
+    for name, cols in INDEXES.items():
+        if name not in existing:
+            op.create_index(name, 'customers', cols)
+
+
+def downgrade():
+    existing = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('customers')}
+    for name in INDEXES:
+        if name in existing:
+            op.drop_index(name, table_name='customers')
@@ -0,0 +1,45 @@
+"""Background jobs
+
+Revision ID: 4a7c2e9d1b35
+Revises: e2f6b8d1a047
+Create Date: 2025-10-06
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a7c2e9d1b35'
+down_revision = 'e2f6b8d1a047'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'jobs',
+        sa.Column('id', sa.String(length=32), primary_key=True),
+        sa.Column('tenant_id', sa.Integer(), sa.ForeignKey('tenants.id'), nullable=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=True),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='queued'),
+        sa.Column('params', sa.JSON(), nullable=False),
+        sa.Column('progress', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('message', sa.String(length=255), nullable=True),
+        sa.Column('result', sa.JSON(), nullable=True),
+        sa.Column('result_file', sa.String(length=255), nullable=True),
+        sa.Column('result_mimetype', sa.String(length=100), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_jobs_user_created', 'jobs', ['user_id', 'created_at'])
+    op.create_index('ix_jobs_finished', 'jobs', ['finished_at'])
+
+
+def downgrade():
+    op.drop_index('ix_jobs_finished', table_name='jobs')
+    op.drop_index('ix_jobs_user_created', table_name='jobs')
+    op.drop_table('jobs')
@@ -0,0 +1,31 @@
+"""Covering index for booking reports
+
+Revision ID: 5e1a9c3d7b20
+Revises: 7d2b5e8c4f13
+Create Date: 2025-09-15
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e1a9c3d7b20'
+down_revision = '7d2b5e8c4f13'
+branch_labels = None
+depends_on = None
+
+INDEX = 'ix_bookings_tenant_start_report'
+COLUMNS = ['tenant_id', 'start_time', 'end_time', 'room_id', 'status', 'total_amount']
+
+
+def upgrade():
+    existing = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('bookings')}
+    if INDEX not in existing:
+        op.create_index(INDEX, 'bookings', COLUMNS)
+
+
+def downgrade():
+    existing = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('bookings')}
+    if INDEX in existing:
+        op.drop_index(INDEX, table_name='bookings')
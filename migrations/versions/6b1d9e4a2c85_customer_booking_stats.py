@@ -0,0 +1,62 @@
+"""Denormalized booking stats on customers
+
+Revision ID: 6b1d9e4a2c85
+Revises: 2f8c6a1e9d47
+Create Date: 2025-10-24
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6b1d9e4a2c85'
+down_revision = '2f8c6a1e9d47'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    'ix_customers_tenant_booking_count_id': ['tenant_id', 'booking_count', 'id'],
+    'ix_customers_tenant_last_booking_id': ['tenant_id', 'last_booking_at', 'id'],
+    'ix_customers_tenant_total_spend_id': ['tenant_id', 'total_spend', 'id'],
+}
+
+
+def upgrade():
+    op.add_column('customers', sa.Column('booking_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('customers', sa.Column('last_booking_at', sa.DateTime(), nullable=True))
+    op.add_column('customers', sa.Column('total_spend', sa.Numeric(12, 2), nullable=False, server_default='0'))
+
+    # Backfill from confirmed bookings (same aggregation as `flask customer-stats`);
+    # unpriced bookings are valued at the room's hourly_rate, as in the reports
+    if op.get_bind().dialect.name == 'sqlite':
+        seconds = "(julianday(b.end_time) - julianday(b.start_time)) * 86400.0"
+    else:
+        seconds = "EXTRACT(EPOCH FROM b.end_time) - EXTRACT(EPOCH FROM b.start_time)"
+    op.execute(
+        "UPDATE customers SET "
+        "booking_count = (SELECT COUNT(*) FROM bookings b WHERE b.tenant_id = customers.tenant_id "
+        "AND b.customer_id = customers.id AND b.status = 'confirmed'), "
+        "total_spend = (SELECT COALESCE(SUM(COALESCE(b.total_amount, "
+        f"ROUND(CAST(ROUND({seconds}) / 3600.0 * COALESCE(r.hourly_rate, 0) AS NUMERIC), 2))), 0) "
+        "FROM bookings b LEFT JOIN rooms r ON r.id = b.room_id "
+        "WHERE b.tenant_id = customers.tenant_id AND b.customer_id = customers.id AND b.status = 'confirmed'), "
+        "last_booking_at = (SELECT MAX(b.start_time) FROM bookings b WHERE b.tenant_id = customers.tenant_id "
+        "AND b.customer_id = customers.id AND b.status = 'confirmed')"
+    )
+
+    existing = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('customers')}
+    for name, columns in INDEXES.items():
+        if name not in existing:
+            op.create_index(name, 'customers', columns)
+
+
+def downgrade():
+    existing = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('customers')}
+    for name in INDEXES:
+        if name in existing:
+            op.drop_index(name, table_name='customers')
+    with op.batch_alter_table('customers') as batch_op:
+        batch_op.drop_column('total_spend')
+        batch_op.drop_column('last_booking_at')
+        batch_op.drop_column('booking_count')
@@ -0,0 +1,48 @@
+"""Indexed customer search (pg_trgm GIN on PostgreSQL, FTS5 on SQLite)
+
+Revision ID: 7d2b5e8c4f13
+Revises: 3c9e1f2a7b41
+Create Date: 2025-09-10
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2b5e8c4f13'
+down_revision = '3c9e1f2a7b41'
+branch_labels = None
+depends_on = None
+
+
+def _fts5_available(bind):
+    if bind.dialect.name != 'sqlite' or bind.dialect.dbapi.sqlite_version_info < (3, 34):
+        return False
+    return 'ENABLE_FTS5' in {row[0] for row in bind.exec_driver_sql('PRAGMA compile_options')}
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute('CREATE INDEX IF NOT EXISTS ix_customers_name_trgm ON customers USING gin (name gin_trgm_ops)')
+        op.execute('CREATE INDEX IF NOT EXISTS ix_customers_email_trgm ON customers USING gin (email gin_trgm_ops)')
+    elif _fts5_available(bind):
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts "
+            "USING fts5(tenant_id UNINDEXED, name, email, tokenize='trigram')"
+        )
+        op.execute('DELETE FROM customers_fts')
+        op.execute(
+            'INSERT INTO customers_fts (rowid, tenant_id, name, email) '
+            'SELECT id, tenant_id, name, email FROM customers'
+        )
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_customers_email_trgm')
+        op.execute('DROP INDEX IF EXISTS ix_customers_name_trgm')
+    elif bind.dialect.name == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS customers_fts')
@@ -0,0 +1,43 @@
+"""Room waitlist
+
+Revision ID: 7d3b9f2c6e14
+Revises: 4a7c2e9d1b35
+Create Date: 2025-10-13
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d3b9f2c6e14'
+down_revision = '4a7c2e9d1b35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'waitlist_entries',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('tenant_id', sa.Integer(), sa.ForeignKey('tenants.id'), nullable=False),
+        sa.Column('room_id', sa.Integer(), sa.ForeignKey('rooms.id'), nullable=False),
+        sa.Column('customer_id', sa.Integer(), sa.ForeignKey('customers.id'), nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('end_time', sa.DateTime(), nullable=False),
+        sa.Column('priority', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='waiting'),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('booking_id', sa.Integer(), sa.ForeignKey('bookings.id'), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('promoted_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_waitlist_entries_room_status_start', 'waitlist_entries',
+                    ['room_id', 'status', 'start_time'])
+    op.create_index('ix_waitlist_entries_tenant_status', 'waitlist_entries', ['tenant_id', 'status'])
+
+
+def downgrade():
+    op.drop_index('ix_waitlist_entries_tenant_status', table_name='waitlist_entries')
+    op.drop_index('ix_waitlist_entries_room_status_start', table_name='waitlist_entries')
+    op.drop_table('waitlist_entries')
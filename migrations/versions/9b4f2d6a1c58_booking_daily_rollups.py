@@ -0,0 +1,61 @@
+"""Daily booking rollups for reports
+
+Revision ID: 9b4f2d6a1c58
+Revises: 5e1a9c3d7b20
+Create Date: 2025-09-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b4f2d6a1c58'
+down_revision = '5e1a9c3d7b20'
+branch_labels = None
+depends_on = None
+
+TABLE = 'booking_daily_rollups'
+
+
+def _minutes(dialect):
+    if dialect == 'sqlite':
+        return 'ROUND((julianday(end_time) - julianday(start_time)) * 86400.0) / 60.0'
+    return 'ROUND(EXTRACT(EPOCH FROM end_time - start_time)) / 60.0'
+
+
+def upgrade():
+    op.create_table(
+        TABLE,
+        sa.Column('tenant_id', sa.Integer(), sa.ForeignKey('tenants.id'), primary_key=True),
+        sa.Column('room_id', sa.Integer(), sa.ForeignKey('rooms.id'), primary_key=True),
+        sa.Column('day', sa.Date(), primary_key=True),
+        sa.Column('bookings', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('booked_minutes', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('amount', sa.Numeric(12, 2), nullable=False, server_default='0'),
+        sa.Column('unpriced_minutes', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('cancellations', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_minutes', sa.Float(), nullable=False, server_default='0'),
+    )
+    op.create_index('ix_booking_daily_rollups_tenant_day', TABLE, ['tenant_id', 'day'])
+
+    # Backfill from existing bookings (same aggregation as `flask reports-rollup`)
+    minutes = _minutes(op.get_bind().dialect.name)
+    op.execute(
+        f"INSERT INTO {TABLE} (tenant_id, room_id, day, bookings, booked_minutes, amount, "
+        "unpriced_minutes, cancellations, max_minutes) "
+        "SELECT tenant_id, room_id, date(start_time), "
+        "SUM(CASE WHEN status = 'confirmed' THEN 1 ELSE 0 END), "
+        f"SUM(CASE WHEN status = 'confirmed' THEN {minutes} ELSE 0 END), "
+        "SUM(CASE WHEN status = 'confirmed' THEN COALESCE(total_amount, 0) ELSE 0 END), "
+        f"SUM(CASE WHEN status = 'confirmed' AND total_amount IS NULL THEN {minutes} ELSE 0 END), "
+        "SUM(CASE WHEN status = 'cancelled' THEN 1 ELSE 0 END), "
+        f"MAX(CASE WHEN status = 'confirmed' THEN {minutes} ELSE 0 END) "
+        "FROM bookings WHERE status IN ('confirmed', 'cancelled') "
+        "GROUP BY tenant_id, room_id, date(start_time)"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_booking_daily_rollups_tenant_day', table_name=TABLE)
+    op.drop_table(TABLE)
@@ -0,0 +1,31 @@
+"""Per-room booking index for free-slot sweeps
+
+Revision ID: c3e8a1f5d902
+Revises: 9b4f2d6a1c58
+Create Date: 2025-09-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e8a1f5d902'
+down_revision = '9b4f2d6a1c58'
+branch_labels = None
+depends_on = None
+
+INDEX = 'ix_bookings_tenant_room_start'
+COLUMNS = ['tenant_id', 'room_id', 'start_time', 'end_time', 'status']
+
+
+def upgrade():
+    existing = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('bookings')}
+    if INDEX not in existing:
+        op.create_index(INDEX, 'bookings', COLUMNS)
+
+
+def downgrade():
+    existing = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('bookings')}
+    if INDEX in existing:
+        op.drop_index(INDEX, table_name='bookings')
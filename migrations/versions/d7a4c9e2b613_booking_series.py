@@ -0,0 +1,51 @@
+"""Recurring booking series
+
+Revision ID: d7a4c9e2b613
+Revises: c3e8a1f5d902
+Create Date: 2025-09-22
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a4c9e2b613'
+down_revision = 'c3e8a1f5d902'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'booking_series',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('tenant_id', sa.Integer(), sa.ForeignKey('tenants.id'), nullable=False),
+        sa.Column('room_id', sa.Integer(), sa.ForeignKey('rooms.id'), nullable=False),
+        sa.Column('customer_id', sa.Integer(), sa.ForeignKey('customers.id'), nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('duration_minutes', sa.Integer(), nullable=False),
+        sa.Column('rrule', sa.String(length=255), nullable=False),
+        sa.Column('ends_at', sa.DateTime(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='confirmed'),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('total_amount', sa.Numeric(10, 2), nullable=True),
+        sa.Column('materialized_until', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_booking_series_tenant_room_ends', 'booking_series', ['tenant_id', 'room_id', 'ends_at'])
+
+    with op.batch_alter_table('bookings') as batch_op:
+        batch_op.add_column(sa.Column('series_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_bookings_series_id', 'booking_series', ['series_id'], ['id'])
+        batch_op.create_index('ix_bookings_series_id', ['series_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('bookings') as batch_op:
+        batch_op.drop_index('ix_bookings_series_id')
+        batch_op.drop_constraint('fk_bookings_series_id', type_='foreignkey')
+        batch_op.drop_column('series_id')
+
+    op.drop_index('ix_booking_series_tenant_room_ends', table_name='booking_series')
+    op.drop_table('booking_series')
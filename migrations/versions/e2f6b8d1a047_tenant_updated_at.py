@@ -0,0 +1,29 @@
+"""Add updated_at to Tenant
+
+Revision ID: e2f6b8d1a047
+Revises: d7a4c9e2b613
+Create Date: 2025-09-29
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2f6b8d1a047'
+down_revision = 'd7a4c9e2b613'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Backfill from created_at, then tighten (batch mode recreates the table on SQLite)
+    op.add_column('tenants', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute('UPDATE tenants SET updated_at = created_at')
+    with op.batch_alter_table('tenants') as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('tenants') as batch_op:
+        batch_op.drop_column('updated_at')
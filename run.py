@@ -4,9 +4,7 @@ from flask import Flask
 from app import create_app, db
 from flask_migrate import Migrate
 import click
-from faker import Faker
-from werkzeug.security import generate_password_hash
-from app.models import Studio, User, Tenant
+from app.models import Studio, User
 
 app = create_app()
 migrate = Migrate(app, db)
@@ -20,58 +18,85 @@ def make_shell_context():
     }
 
 @app.cli.command("seed")
-def seed():
+@click.option("--tenants", default="1", help="Number of tenants (accepts 1k / 2M suffixes).")
+@click.option("--studios-per-tenant", default=2, show_default=True)
+@click.option("--rooms-per-studio", default=3, show_default=True)
+@click.option("--customers-per-tenant", default="50", show_default=True)
+@click.option("--bookings", default="1000", show_default=True, help="Total bookings across all tenants, e.g. 10M.")
+@click.option("--seed", "random_seed", default=1, show_default=True, help="Random seed; same seed, same data.")
+@click.option("--start", type=click.DateTime(["%Y-%m-%d"]), default=None,
+              help="First booking day (default: a year ago).")
+@click.option("--batch-size", default=5000, show_default=True)
+def seed(tenants, studios_per_tenant, rooms_per_studio, customers_per_tenant, bookings, random_seed, start,
+         batch_size):
     """
-    Seed the database with:
-    - 2 studios
-    - 1 Admin user
-    - 1 Studio Manager, Staff/Instructor, Receptionist per studio
+    Generate synthetic tenants, studios, rooms, users, customers and bookings
+    with bulk inserts (see app/seeding.py), e.g.
+    flask seed --tenants 1000 --customers-per-tenant 5000 --bookings 10M
+    Every user's password is "password"; the global admin is admin@example.com.
     """
-    fake = Faker()
-
-    # Create a tenant
-    tenant = Tenant(name=fake.company(), subdomain=fake.unique.slug(), plan='free', is_active=True)
-    db.session.add(tenant)
-    db.session.flush()
-
-    # Create Studios for the tenant
-    studios = []
-    for _ in range(2):
-        s = Studio(tenant_id=tenant.id, name=fake.company())
-        studios.append(s)
-        db.session.add(s)
-    db.session.flush()
-
-    # Create Global Admin (no tenant)
-    admin = User(
-        name="Admin User",
-        email="admin@example.com",
-        password_hash=generate_password_hash("password"),
-        role="Admin",
-        permissions=["create_booking","edit_customer","view_reports","manage_staff"],
-        studio_id=None,
-        tenant_id=None
-    )
-    db.session.add(admin)
-
-    # Other roles per studio within the tenant
-    roles_perms = {
-        "Studio Manager": ["view_reports","manage_staff"],
-        "Staff/Instructor": ["create_booking"],
-        "Receptionist": ["create_booking","edit_customer"]
-    }
-    for studio in studios:
-        for role, perms in roles_perms.items():
-            user = User(
-                tenant_id=tenant.id,
-                name=fake.name(),
-                email=fake.unique.email(),
-                password_hash=generate_password_hash("password"),
-                role=role,
-                permissions=perms,
-                studio_id=studio.id
-            )
-            db.session.add(user)
+    from app.seeding import generate, parse_count
+    try:
+        counts = generate(tenants=parse_count(tenants), studios_per_tenant=studios_per_tenant,
+                          rooms_per_studio=rooms_per_studio, customers_per_tenant=parse_count(customers_per_tenant),
+                          bookings=parse_count(bookings), seed=random_seed, start=start, batch_size=batch_size,
+                          echo=click.echo)
+    except (ValueError, RuntimeError) as e:
+        raise click.ClickException(str(e))
+    click.echo("Seed data created: " + ", ".join(f"{n:,} {table}" for table, n in counts.items()))
+
+
+@app.cli.command("search-reindex")
+def search_reindex():
+    """Rebuild the customer search index from the customers table."""
+    from app.customers.search import get_search_backend
+    backend = get_search_backend()
+    backend.rebuild()
+    db.session.commit()
+    click.echo(f"Customer search index rebuilt ({backend.name}).")
+
+
+@app.cli.command("reports-rollup")
+@click.option("--tenant-id", type=int, default=None, help="Only rebuild this tenant.")
+def reports_rollup(tenant_id):
+    """Backfill the daily booking rollups used by the reports from the bookings table."""
+    from app.reports import rollups
+    rows = rollups.rebuild(tenant_id)
+    db.session.commit()
+    click.echo(f"Booking rollups rebuilt ({rows} rows).")
+
 
+@app.cli.command("customer-stats")
+@click.option("--tenant-id", type=int, default=None, help="Only rebuild this tenant.")
+def customer_stats(tenant_id):
+    """Backfill the customers' booking count, last booking and total spend from the bookings table."""
+    from app.customers import stats
+    rows = stats.rebuild(tenant_id)
     db.session.commit()
-    click.echo("Seed data created successfully.")
+    click.echo(f"Customer booking stats rebuilt ({rows} customers corrected).")
+
+
+@app.cli.command("series-materialize")
+def series_materialize():
+    """Create Booking rows for recurring-series occurrences entering the horizon (run daily)."""
+    from app.rooms.recurrence import materialize_due
+    created = materialize_due(app.config.get('BOOKING_SERIES_HORIZON_DAYS', 90))
+    db.session.commit()
+    click.echo(f"Materialized {created} recurring bookings.")
+
+
+@app.cli.command("assets-build")
+def assets_build():
+    """Fingerprint and precompress app/static into app/static/dist (restart to serve it)."""
+    from app.assets import build
+    manifest = build(app.static_folder, min_size=app.config.get('COMPRESS_MIN_SIZE', 500))
+    click.echo(f"Built {len(manifest['files'])} static assets "
+               f"({len(manifest['encodings'])} precompressed).")
+
+
+@app.cli.command("jobs-purge")
+def jobs_purge():
+    """Delete finished background jobs (and result files) older than JOBS_RESULT_TTL."""
+    from app.jobs import purge_expired
+    deleted = purge_expired(app.config.get('JOBS_RESULT_TTL', 7 * 24 * 3600))
+    click.echo(f"Purged {deleted} jobs.")
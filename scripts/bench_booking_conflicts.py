@@ -0,0 +1,120 @@
+# Booking conflict engine benchmark
+"""
+Compare the per-room interval index against a naive SQL overlap query.
+
+Usage:
+    python scripts/bench_booking_conflicts.py --bookings 1000000 --rooms 1000 --probes 20000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bookings', type=int, default=1_000_000)
+    parser.add_argument('--rooms', type=int, default=1000)
+    parser.add_argument('--probes', type=int, default=20_000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    import sqlalchemy as sa
+    from app import create_app, db
+    from app.models import Booking, Customer, Room, Studio, Tenant
+    from app.rooms.conflicts import BookingConflictIndex
+
+    rng = random.Random(args.seed)
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.execute(sa.text('CREATE INDEX ix_bench_room_start ON bookings (room_id, start_time, end_time)'))
+        tenant = Tenant(name='Bench', subdomain='bench')
+        db.session.add(tenant)
+        db.session.flush()
+        studio = Studio(tenant_id=tenant.id, name='Bench Studio')
+        db.session.add(studio)
+        db.session.flush()
+        customer = Customer(tenant_id=tenant.id, studio_id=studio.id, name='Bench', email='bench@example.com')
+        db.session.add(customer)
+        db.session.flush()
+        db.session.execute(sa.insert(Room), [
+            {'tenant_id': tenant.id, 'studio_id': studio.id, 'name': f'Room {i}', 'capacity': 10, 'is_active': True}
+            for i in range(args.rooms)
+        ])
+        room_ids = [r for (r,) in db.session.query(Room.id)]
+
+        # Back-to-back hour-long bookings with random gaps, spread evenly across rooms
+        epoch = datetime(2024, 1, 1)
+        per_room = max(1, args.bookings // len(room_ids))
+        horizon_hours = per_room * 2
+        t0 = time.perf_counter()
+        chunk = []
+        now = datetime.utcnow()
+        for room_id in room_ids:
+            cursor = epoch
+            for _ in range(per_room):
+                cursor += timedelta(hours=rng.choice((0, 0, 1, 2)))
+                end = cursor + timedelta(hours=1)
+                chunk.append({'tenant_id': tenant.id, 'room_id': room_id, 'customer_id': customer.id,
+                              'start_time': cursor, 'end_time': end, 'status': 'confirmed', 'created_at': now})
+                cursor = end
+            if len(chunk) >= 50_000:
+                db.session.execute(sa.insert(Booking), chunk)
+                chunk = []
+        if chunk:
+            db.session.execute(sa.insert(Booking), chunk)
+        db.session.commit()
+        total = db.session.query(sa.func.count(Booking.id)).scalar()
+        print(f'seeded {total:,} bookings over {len(room_ids):,} rooms in {time.perf_counter() - t0:.1f}s')
+
+        probes = []
+        for _ in range(args.probes):
+            start = epoch + timedelta(minutes=30 * rng.randrange(horizon_hours * 2))
+            probes.append({'room_id': rng.choice(room_ids), 'start_time': start,
+                           'end_time': start + timedelta(minutes=rng.choice((30, 60, 90)))})
+
+        # Typed binds so datetimes are compared in the column's storage format
+        naive_sql = sa.select(Booking.id).where(
+            Booking.room_id == sa.bindparam('room_id'),
+            Booking.status == 'confirmed',
+            Booking.start_time < sa.bindparam('end_time', type_=sa.DateTime),
+            Booking.end_time > sa.bindparam('start_time', type_=sa.DateTime),
+        )
+        t0 = time.perf_counter()
+        naive_hits = 0
+        for p in probes:
+            rows = db.session.execute(naive_sql, p).fetchall()
+            naive_hits += bool(rows)
+        naive = time.perf_counter() - t0
+        print(f'naive SQL:       {naive:.3f}s  ({args.probes / naive:,.0f} probes/s), {naive_hits} conflicting')
+
+        t0 = time.perf_counter()
+        window_start = min(p['start_time'] for p in probes)
+        window_end = max(p['end_time'] for p in probes)
+        index = BookingConflictIndex.load(room_ids, window_start, window_end, tenant_id=tenant.id)
+        build = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        index_hits = sum(index.has_overlap(p['room_id'], p['start_time'], p['end_time']) for p in probes)
+        probe = time.perf_counter() - t0
+        print(f'interval index:  build {build:.3f}s, probe {probe:.3f}s '
+              f'({args.probes / probe:,.0f} probes/s), {index_hits} conflicting')
+        assert naive_hits == index_hits, 'index and SQL disagree'
+
+        t0 = time.perf_counter()
+        index.find_conflicts(probes)
+        print(f'batch validate:  {time.perf_counter() - t0:.3f}s for {args.probes:,} slots')
+
+
+if __name__ == '__main__':
+    main()
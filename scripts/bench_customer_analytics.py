@@ -0,0 +1,86 @@
+# Customer analytics benchmark
+"""
+Seed one large tenant, then time the customer analytics path: the full
+grouped stats query, scoring, a listing request with the stats cached, and
+the incremental refresh after a booking is committed.
+
+Usage:
+    python scripts/bench_customer_analytics.py --customers 100k --bookings 1M
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--customers', default='100k')
+    parser.add_argument('--bookings', default='1M')
+    parser.add_argument('--requests', type=int, default=20)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from app import create_app, db
+    from app.customers import analytics
+    from app.models import Booking, Customer, Room, User
+    from app.seeding import generate, parse_count
+
+    app = create_app()
+    app.config.update(RATE_LIMIT_ENABLED=False, SESSION_COOKIE_SECURE=False)
+    with app.app_context():
+        db.create_all()
+        t0 = time.perf_counter()
+        counts = generate(tenants=1, studios_per_tenant=5, rooms_per_studio=10,
+                          customers_per_tenant=parse_count(args.customers), bookings=parse_count(args.bookings))
+        print('seeded ' + ', '.join(f'{n:,} {table}' for table, n in counts.items())
+              + f' in {time.perf_counter() - t0:.1f}s')
+        manager = User.query.filter(User.role == 'Studio Manager').first()
+        tenant_id = manager.tenant_id
+
+        t0 = time.perf_counter()
+        stats = analytics.load_stats(tenant_id)
+        t1 = time.perf_counter()
+        analytics.score(stats)
+        t2 = time.perf_counter()
+        print(f'grouped stats query: {(t1 - t0) * 1e3:.0f} ms for {len(stats):,} customers, '
+              f'scoring: {(t2 - t1) * 1e3:.0f} ms')
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = manager.id
+        t0 = time.perf_counter()
+        client.get('/api/customers/analytics')
+        print(f'first request (loads the stats): {(time.perf_counter() - t0) * 1e3:.0f} ms')
+
+        def timed_requests(params):
+            t0 = time.perf_counter()
+            for _ in range(args.requests):
+                assert client.get('/api/customers/analytics', query_string=params).status_code == 200
+            return (time.perf_counter() - t0) / args.requests * 1e3
+
+        print(f'cached request, sort=rfm: {timed_requests({}):.0f} ms')
+        print(f'cached request, churn_risk=true sort=lifetime_value: '
+              f'{timed_requests({"churn_risk": "true", "sort": "lifetime_value"}):.0f} ms')
+
+        customer = Customer.query.filter_by(tenant_id=tenant_id).first()
+        room = Room.query.filter_by(tenant_id=tenant_id).first()
+        start = datetime.utcnow().replace(microsecond=0) + timedelta(days=400)
+        db.session.add(Booking(tenant_id=tenant_id, room_id=room.id, customer_id=customer.id,
+                               start_time=start, end_time=start + timedelta(hours=1)))
+        db.session.commit()
+        t0 = time.perf_counter()
+        client.get('/api/customers/analytics')
+        print(f'request after a new booking (refreshes 1 customer): {(time.perf_counter() - t0) * 1e3:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
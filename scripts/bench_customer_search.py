@@ -0,0 +1,92 @@
+# Customer search benchmark
+"""
+Seed a tenant with many customers and time each search backend.
+
+Usage:
+    python scripts/bench_customer_search.py --customers 500000 --queries 50
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--customers', type=int, default=500_000)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--backends', default='ilike,fts5,ngram')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    import sqlalchemy as sa
+    from faker import Faker
+    from app import create_app, db
+    from app.models import Customer, Studio, Tenant
+    from app.customers.search import _create_backend
+
+    Faker.seed(args.seed)
+    fake = Faker()
+    rng = random.Random(args.seed)
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        tenant = Tenant(name='Bench', subdomain='bench')
+        db.session.add(tenant)
+        db.session.flush()
+        studio = Studio(tenant_id=tenant.id, name='Bench Studio')
+        db.session.add(studio)
+        db.session.flush()
+
+        # A pool of generated names keeps seeding fast while still giving realistic n-grams
+        first = [fake.first_name() for _ in range(2000)]
+        last = [fake.last_name() for _ in range(2000)]
+        t0 = time.perf_counter()
+        chunk = []
+        for i in range(args.customers):
+            name = f'{rng.choice(first)} {rng.choice(last)}'
+            chunk.append({'tenant_id': tenant.id, 'studio_id': studio.id, 'name': name,
+                          'email': f"{name.replace(' ', '.').lower()}.{i}@example.com"})
+            if len(chunk) == 50_000:
+                db.session.execute(sa.insert(Customer), chunk)
+                chunk = []
+        if chunk:
+            db.session.execute(sa.insert(Customer), chunk)
+        db.session.commit()
+        print(f'seeded {args.customers:,} customers in {time.perf_counter() - t0:.1f}s')
+
+        terms = [rng.choice(last)[:rng.randint(3, 6)].lower() for _ in range(args.queries)]
+        for name in args.backends.split(','):
+            app.config['CUSTOMER_SEARCH_BACKEND'] = name
+            backend = _create_backend(app)
+            t0 = time.perf_counter()
+            backend.rebuild()
+            db.session.commit()
+            # The n-gram index builds lazily; warm it outside the timed loop
+            backend.search(Customer.query, 'warm', tenant_id=tenant.id).limit(1).all()
+            build = time.perf_counter() - t0
+
+            timings = []
+            hits = 0
+            for term in terms:
+                q = backend.search(Customer.query.filter(Customer.tenant_id == tenant.id), term, tenant_id=tenant.id)
+                t0 = time.perf_counter()
+                hits += len(q.limit(25).all())
+                timings.append(time.perf_counter() - t0)
+            timings.sort()
+            p50 = timings[len(timings) // 2] * 1000
+            p95 = timings[int(len(timings) * 0.95) - 1] * 1000
+            print(f'{name:>6}: build {build:6.2f}s  p50 {p50:8.2f}ms  p95 {p95:8.2f}ms  ({hits} rows returned)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# Customer list sort benchmark
+"""
+Seed one large tenant, then time GET /api/customers sorted by name against
+the maintained booking stats (booking_count, total_spend, last_booking_at),
+plus the full `flask customer-stats` backfill and the cost of a booking commit.
+
+Usage:
+    python scripts/bench_customer_sort.py --customers 100k --bookings 1M
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--customers', default='100k')
+    parser.add_argument('--bookings', default='1M')
+    parser.add_argument('--requests', type=int, default=20)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from app import create_app, db
+    from app.customers import stats
+    from app.models import Booking, Customer, Room, User
+    from app.seeding import generate, parse_count
+
+    app = create_app()
+    app.config.update(RATE_LIMIT_ENABLED=False, SESSION_COOKIE_SECURE=False)
+    with app.app_context():
+        db.create_all()
+        t0 = time.perf_counter()
+        counts = generate(tenants=1, studios_per_tenant=5, rooms_per_studio=10,
+                          customers_per_tenant=parse_count(args.customers), bookings=parse_count(args.bookings))
+        print('seeded ' + ', '.join(f'{n:,} {table}' for table, n in counts.items())
+              + f' in {time.perf_counter() - t0:.1f}s')
+        manager = User.query.filter(User.role == 'Studio Manager').first()
+        tenant_id = manager.tenant_id
+
+        db.session.execute(Customer.__table__.update().values(booking_count=0, total_spend=0, last_booking_at=None))
+        t0 = time.perf_counter()
+        corrected = stats.rebuild()
+        db.session.commit()
+        print(f'backfill: {corrected:,} customers in {time.perf_counter() - t0:.1f}s')
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = manager.id
+
+        def timed_requests(query):
+            t0 = time.perf_counter()
+            for _ in range(args.requests):
+                assert client.get('/api/customers?' + query).status_code == 200
+            return (time.perf_counter() - t0) / args.requests * 1e3
+
+        for sort in ('name', 'booking_count', 'total_spend', 'last_booking_at'):
+            page = timed_requests(f'sort={sort}&order=desc&per_page=50')
+            deep = timed_requests(f'sort={sort}&order=desc&per_page=50&page=200')
+            line = f'sort={sort}: first page {page:.1f} ms, page 200 {deep:.1f} ms'
+            if sort != 'last_booking_at':
+                line += f', cursor {timed_requests(f"sort={sort}&order=desc&per_page=50&cursor="):.1f} ms'
+            print(line)
+        print(f'min_bookings=20&sort=total_spend: {timed_requests("min_bookings=20&sort=total_spend&order=desc"):.1f} ms')
+
+        customer = Customer.query.filter_by(tenant_id=tenant_id).first()
+        room = Room.query.filter_by(tenant_id=tenant_id).first()
+        start = datetime.utcnow().replace(microsecond=0) + timedelta(days=400)
+        t0 = time.perf_counter()
+        for n in range(args.requests):
+            booking = Booking(tenant_id=tenant_id, room_id=room.id, customer_id=customer.id,
+                              start_time=start + timedelta(hours=n), end_time=start + timedelta(hours=n, minutes=30))
+            db.session.add(booking)
+            db.session.commit()
+            booking.status = 'cancelled'
+            db.session.commit()
+        print(f'booking insert + cancel commit: {(time.perf_counter() - t0) / args.requests * 1e3:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
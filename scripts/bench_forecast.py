@@ -0,0 +1,85 @@
+# Demand forecast benchmark
+"""
+Forecast thousands of rooms from their daily rollups and report the time spent
+loading the history, fitting and building the response.
+
+Each room gets a weekly booking pattern with noise. The rollup rows are
+written directly, one per room and day with bookings.
+
+Usage:
+    python scripts/bench_forecast.py --rooms 5000 --history 182 --horizon 28
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, default=5000)
+    parser.add_argument('--studios', type=int, default=50)
+    parser.add_argument('--history', type=int, default=182, help='days of history fitted')
+    parser.add_argument('--horizon', type=int, default=28)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    import numpy as np
+
+    from app import create_app, db
+    from app.models import BookingDailyRollup, Room, Studio, Tenant
+    from app.reports import forecast
+    from app.reports.rollups import today
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        tenant = Tenant(name='Bench', subdomain='bench')
+        db.session.add(tenant)
+        db.session.flush()
+        studios = [Studio(tenant_id=tenant.id, name=f'S{i}') for i in range(args.studios)]
+        db.session.add_all(studios)
+        db.session.flush()
+        db.session.execute(Room.__table__.insert(), [
+            {'tenant_id': tenant.id, 'studio_id': studios[i % args.studios].id, 'name': f'R{i}', 'capacity': 4,
+             'is_active': True} for i in range(args.rooms)])
+        room_ids = [r.id for r in db.session.query(Room.id).order_by(Room.id)]
+
+        rng = np.random.default_rng(1)
+        weekly = rng.uniform(0, 10, (args.rooms, 7))
+        first = today() - timedelta(days=args.history)
+        hours = np.clip(np.tile(weekly, args.history // 7 + 1)[:, :args.history]
+                        + rng.normal(0, 1.5, (args.rooms, args.history)), 0, None).round(1)
+        rows = [{'tenant_id': tenant.id, 'room_id': room_ids[r], 'day': (first + timedelta(days=int(d))).date(),
+                 'bookings': 1, 'booked_minutes': float(hours[r, d] * 60), 'amount': 0, 'unpriced_minutes': 0.0,
+                 'cancellations': 0, 'max_minutes': float(hours[r, d] * 60)}
+                for r, d in zip(*np.nonzero(hours))]
+        db.session.execute(BookingDailyRollup.__table__.insert(), rows)
+        db.session.commit()
+        print(f'{args.rooms:,} rooms, {len(rows):,} rollup rows over {args.history} days')
+
+        t0 = time.perf_counter()
+        history = forecast.history_matrix(tenant.id, room_ids, first, today())
+        t1 = time.perf_counter()
+        model = forecast.fit(history, args.horizon)
+        t2 = time.perf_counter()
+        print(f'history query + pivot: {(t1 - t0) * 1e3:.0f} ms, fit: {(t2 - t1) * 1e3:.0f} ms')
+        error = np.abs(model['forecast'][:, :7] - np.roll(weekly, -(args.history % 7), axis=1)).mean()
+        print(f'mean absolute error against the true weekly pattern: {error:.2f} h')
+
+        for group_by in ('room', 'studio'):
+            t0 = time.perf_counter()
+            forecast.forecast_report(tenant.id, history_days=args.history, horizon=args.horizon, group_by=group_by)
+            print(f'forecast_report(group_by={group_by}): {(time.perf_counter() - t0) * 1e3:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# Live event fan-out benchmark
+"""
+Fan events out to thousands of concurrent subscribers of the in-process bus.
+
+1. publish cost: time to queue each event for every subscriber
+   (no consumers running).
+2. end to end: one thread per subscriber (--consumers), as SSE streams
+   run under sync/gthread workers, blocked in sub.get(). Reports
+   publish-to-receive latency percentiles and checks that nothing was lost.
+   Thousands of OS threads in one process are limited by thread wake-ups,
+   not by the bus; serve large audiences from several workers on the redis
+   backend.
+3. slow consumers: subscribers that never read keep at most
+   LIVE_QUEUE_SIZE events.
+
+Usage:
+    python scripts/bench_live.py --subscribers 5000 --events 200 --consumers 1000
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subscribers', type=int, default=5000)
+    parser.add_argument('--consumers', type=int, default=1000, help='subscriber threads for the end-to-end run')
+    parser.add_argument('--tenants', type=int, default=1, help='subscribers are spread over this many tenants')
+    parser.add_argument('--events', type=int, default=200)
+    parser.add_argument('--queue-size', type=int, default=256)
+    parser.add_argument('--interval', type=float, default=0.002, help='seconds between published events')
+    parser.add_argument('--timeout', type=float, default=120.0, help='give up on delivery after this long')
+    args = parser.parse_args()
+
+    from app.live import Event, MemoryBus
+
+    payload = b'{"id":%d,"tenant_id":0,"room_id":1,"status":"confirmed","start_time":"2025-01-01T10:00:00Z"}'
+    events = [Event.build(0, 'booking.created', payload % i) for i in range(args.events)]
+
+    # 1. publish cost
+    bus = MemoryBus(maxsize=args.queue_size)
+    subs = [bus.subscribe(n % args.tenants) for n in range(args.subscribers)]
+    per_tenant = sum(1 for s in subs if s.tenant_id == 0)
+    t0 = time.perf_counter()
+    for item in events[:args.queue_size]:
+        bus.publish([item])
+    elapsed = time.perf_counter() - t0
+    published = min(args.events, args.queue_size)
+    print(f'publish: {published} events x {per_tenant} subscribers: {elapsed / published * 1e3:.2f} ms/event, '
+          f'{published * per_tenant / elapsed:,.0f} deliveries/s')
+
+    # 3. slow consumers: nobody has read, queues stay bounded
+    for item in events:
+        bus.publish([item])
+    longest = max(len(s._queue) for s in subs)
+    print(f'slow consumers: longest queue {longest} (limit {args.queue_size}), dropped {subs[0].dropped} each')
+    for sub in subs:
+        sub.close()
+
+    # 2. end to end with a thread per subscriber
+    bus = MemoryBus(maxsize=args.queue_size)
+    subs = [bus.subscribe(0) for _ in range(args.consumers)]
+    latencies = [[] for _ in subs]
+    received = [0] * len(subs)
+    sent_at = {}
+    done = threading.Event()
+
+    def consume(n, sub):
+        while not done.is_set():
+            batch, _ = sub.get(timeout=0.5)
+            now = time.perf_counter()
+            for item in batch:
+                latencies[n].append(now - sent_at[item.frame])
+            received[n] += len(batch)
+            if received[n] >= args.events:
+                return
+
+    threading.stack_size(256 * 1024)
+    threads = [threading.Thread(target=consume, args=(n, sub), daemon=True) for n, sub in enumerate(subs)]
+    for t in threads:
+        t.start()
+    time.sleep(0.5)
+    t0 = time.perf_counter()
+    for item in events:
+        sent_at[item.frame] = time.perf_counter()
+        bus.publish([item])
+        time.sleep(args.interval)
+    deadline = time.monotonic() + args.timeout
+    for t in threads:
+        t.join(timeout=max(0.0, deadline - time.monotonic()))
+    elapsed = time.perf_counter() - t0
+    done.set()
+    ordered = sorted(x for per_sub in latencies for x in per_sub)
+    total = sum(received)
+    print(f'end to end: {args.consumers} subscriber threads, {args.events} events, '
+          f'{total:,}/{args.consumers * args.events:,} delivered in {elapsed:.2f}s')
+    print('latency ms: ' + ', '.join(f'p{p} {percentile(ordered, p) * 1e3:.1f}' for p in (50, 95, 99)))
+
+
+if __name__ == '__main__':
+    main()
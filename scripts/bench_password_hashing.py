@@ -0,0 +1,59 @@
+# Password hashing throughput benchmark
+"""
+Measure password verifications per second (the cost of a login) for a hashing
+profile, inline and through the worker pool, and report logins/sec per core.
+
+Usage:
+    python scripts/bench_password_hashing.py --method pbkdf2:sha256 --iterations 260000
+    python scripts/bench_password_hashing.py --method bcrypt --rounds 12 --workers 4 --threads 16
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def _throughput(hasher, stored, logins, threads):
+    # Request threads calling verify() concurrently, as gunicorn gthread workers would
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(lambda _: hasher.verify(stored, 'password'), range(logins)))
+    elapsed = time.perf_counter() - start
+    assert all(results)
+    return logins / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--method', default='pbkdf2:sha256', help="'pbkdf2:sha256' or 'bcrypt'")
+    parser.add_argument('--iterations', type=int, default=260000)
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--logins', type=int, default=64)
+    args = parser.parse_args()
+
+    from app.passwords import PasswordHasher
+
+    profile = dict(method=args.method, pbkdf2_iterations=args.iterations, bcrypt_rounds=args.rounds)
+    inline = PasswordHasher(**profile)
+    pooled = PasswordHasher(workers=args.workers, max_pending=args.logins, **profile)
+    stored = inline.hash('password')
+    pooled.verify(stored, 'password')  # warm up the pool
+
+    print(f'{args.method} ({args.iterations if args.method != "bcrypt" else args.rounds} '
+          f'{"iterations" if args.method != "bcrypt" else "rounds"}), {args.logins} logins, {args.threads} threads')
+    rate = _throughput(inline, stored, args.logins, args.threads)
+    print(f'  inline            {rate:8.1f} logins/s  {rate:8.1f} /core')
+    rate = _throughput(pooled, stored, args.logins, args.threads)
+    print(f'  pool ({args.workers} workers)  {rate:8.1f} logins/s  {rate / args.workers:8.1f} /core')
+    pooled.shutdown()
+
+
+if __name__ == '__main__':
+    main()
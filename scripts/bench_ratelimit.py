@@ -0,0 +1,61 @@
+# Rate limiter overhead benchmark
+"""
+Time raw limiter hits and POST /api/validate/email with the limiter off and on.
+
+Usage:
+    python scripts/bench_ratelimit.py --hits 200000 --requests 5000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hits', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--keys', type=int, default=1000)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from app import create_app, db, ratelimit
+    from app.ratelimit import Limit, MemoryBackend, RateLimiter
+
+    limiter = RateLimiter(MemoryBackend())
+    limit = Limit(10**9, 60)
+    t0 = time.perf_counter()
+    for i in range(args.hits):
+        limiter.hit('bench', i % args.keys, limit)
+    elapsed = time.perf_counter() - t0
+    print(f'memory hit: {args.hits / elapsed:,.0f} ops/s, {elapsed / args.hits * 1e6:.2f} us/hit')
+
+    for enabled in (False, True):
+        app = create_app()
+        app.config.update(RATE_LIMIT_ENABLED=enabled, RATE_LIMIT_VALIDATE_IP=f'{10**9}/60',
+                          SESSION_COOKIE_SECURE=False)
+        ratelimit.init_app(app)
+        with app.app_context():
+            db.create_all()
+        client = app.test_client()
+        for _ in range(100):  # warm up
+            client.post('/api/validate/email', json={'email': 'bench@example.com'})
+
+        t0 = time.perf_counter()
+        for i in range(args.requests):
+            resp = client.post('/api/validate/email', json={'email': 'bench@example.com'},
+                               environ_base={'REMOTE_ADDR': f'10.0.{i % 250}.{i % args.keys % 250}'})
+            assert resp.status_code == 200
+        elapsed = time.perf_counter() - t0
+        print(f"limiter {'on ' if enabled else 'off'}: {args.requests / elapsed:,.0f} req/s, "
+              f'{elapsed / args.requests * 1e6:.0f} us/request')
+
+if __name__ == '__main__':
+    main()
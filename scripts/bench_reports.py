@@ -0,0 +1,122 @@
+# Reporting engine benchmark
+"""
+Seed one tenant with many bookings and time each report over a range.
+
+Usage:
+    python scripts/bench_reports.py --bookings 2000000 --rooms 40 --days 365
+    python scripts/bench_reports.py --db /tmp/reports.db   # seed once, then reuse
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+FIRST_DAY = datetime(2024, 1, 1)
+
+
+def _seed(args, rng):
+    import sqlalchemy as sa
+    from app import db
+    from app.models import Booking, Customer, Room, Studio, Tenant
+    from app.reports import rollups
+
+    db.create_all()
+    tenant = Tenant(name='Bench', subdomain='bench')
+    db.session.add(tenant)
+    db.session.flush()
+    studios = [Studio(tenant_id=tenant.id, name=f'Studio {i}') for i in range(4)]
+    db.session.add_all(studios)
+    db.session.flush()
+    rooms = [Room(tenant_id=tenant.id, studio_id=studios[i % 4].id, name=f'Room {i}', capacity=6,
+                  hourly_rate=rng.choice([15, 25, 40])) for i in range(args.rooms)]
+    customer = Customer(tenant_id=tenant.id, studio_id=studios[0].id, name='C', email='c@example.com')
+    db.session.add_all(rooms + [customer])
+    db.session.commit()
+
+    t0 = time.perf_counter()
+    batch = []
+    for _ in range(args.bookings):
+        start = FIRST_DAY + timedelta(days=rng.randrange(args.days), hours=rng.randrange(8, 22),
+                                      minutes=rng.choice((0, 30)))
+        batch.append({
+            'tenant_id': tenant.id, 'room_id': rng.choice(rooms).id, 'customer_id': customer.id,
+            'start_time': start, 'end_time': start + timedelta(minutes=rng.choice((60, 90, 120, 180))),
+            'status': 'confirmed' if rng.random() < 0.9 else 'cancelled',
+            'total_amount': rng.choice((None, 30, 45, 60)), 'created_at': start,
+        })
+        if len(batch) == 50_000:
+            db.session.execute(sa.insert(Booking), batch)
+            batch.clear()
+    if batch:
+        db.session.execute(sa.insert(Booking), batch)
+    db.session.commit()
+    print(f'Seeded {args.bookings:,} bookings in {time.perf_counter() - t0:.1f}s')
+
+    # Bulk inserts skip the rollup listeners
+    t0 = time.perf_counter()
+    rows = rollups.rebuild(tenant.id)
+    db.session.commit()
+    db.session.execute(sa.text('ANALYZE'))
+    print(f'Built {rows:,} rollup rows in {time.perf_counter() - t0:.1f}s')
+    return tenant, studios
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bookings', type=int, default=2_000_000)
+    parser.add_argument('--rooms', type=int, default=40)
+    parser.add_argument('--days', type=int, default=365, help='history covered by the seeded bookings')
+    parser.add_argument('--range-days', type=int, default=365, help='length of the reported range')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--db', help='sqlite file to seed on first use and reuse afterwards')
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), 'bench.db')
+    reuse = os.path.exists(db_path)
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from app import create_app
+    from app.models import Studio, Tenant
+    from app.reports import engine
+
+    app = create_app()
+    with app.app_context():
+        if reuse:
+            tenant = Tenant.query.filter_by(subdomain='bench').one()
+            studios = Studio.query.filter_by(tenant_id=tenant.id).order_by(Studio.id).all()
+            print(f'Reusing {db_path}')
+        else:
+            tenant, studios = _seed(args, random.Random(args.seed))
+
+        window = engine.ReportRange(FIRST_DAY, FIRST_DAY + timedelta(days=args.range_days))
+        reports = {
+            'occupancy': lambda: engine.occupancy_report(tenant.id, window),
+            'revenue/day': lambda: engine.revenue_report(tenant.id, window),
+            'revenue/month': lambda: engine.revenue_report(tenant.id, window, bucket='month'),
+            'revenue/studio': lambda: engine.revenue_report(tenant.id, window, group_by='studio'),
+            'heatmap': lambda: engine.heatmap_report(tenant.id, window),
+            'occupancy (studio)': lambda: engine.occupancy_report(tenant.id, window, studio_id=studios[0].id),
+        }
+        print(f'{args.range_days}-day range:{"raw":>17}{"rollups":>12}')
+        for name, report in reports.items():
+            timings = []
+            for use_rollups in (False, True):
+                app.config['REPORTS_USE_ROLLUPS'] = use_rollups
+                best = float('inf')
+                for _ in range(3):
+                    start = time.perf_counter()
+                    report()
+                    best = min(best, time.perf_counter() - start)
+                timings.append(best)
+            print(f'  {name:<20}' + ''.join(f'{t * 1000:9.1f} ms' for t in timings))
+
+
+if __name__ == '__main__':
+    main()
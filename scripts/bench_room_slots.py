@@ -0,0 +1,111 @@
+# Free-slot finder benchmark
+"""
+Time the streaming free-slot sweep over many rooms against one query per room.
+
+Usage:
+    python scripts/bench_room_slots.py --rooms 1000 --days 365 --per-day 4
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+OPENING_HOURS = {day: [['08:00', '22:00']] for day in
+                 ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, default=1000)
+    parser.add_argument('--studios', type=int, default=20)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--per-day', type=int, default=4, help='bookings per room per day')
+    parser.add_argument('--min-minutes', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    import sqlalchemy as sa
+    from app import create_app, db
+    from app.models import Booking, Customer, Room, Studio, Tenant
+    from app.rooms.slots import OpeningHours, find_free_slots, free_slots
+
+    rng = random.Random(args.seed)
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        tenant = Tenant(name='Bench', subdomain='bench')
+        db.session.add(tenant)
+        db.session.flush()
+        studios = [Studio(tenant_id=tenant.id, name=f'Studio {i}', settings={'opening_hours': OPENING_HOURS})
+                   for i in range(args.studios)]
+        db.session.add_all(studios)
+        db.session.flush()
+        customer = Customer(tenant_id=tenant.id, studio_id=studios[0].id, name='Bench', email='bench@example.com')
+        db.session.add(customer)
+        db.session.execute(sa.insert(Room), [
+            {'tenant_id': tenant.id, 'studio_id': studios[i % args.studios].id, 'name': f'Room {i}',
+             'capacity': 10, 'is_active': True}
+            for i in range(args.rooms)
+        ])
+        db.session.flush()
+        room_ids = [r for (r,) in db.session.query(Room.id).order_by(Room.id)]
+
+        epoch = datetime(2025, 1, 1)
+        t0 = time.perf_counter()
+        chunk = []
+        for room_id in room_ids:
+            for day in range(args.days):
+                for _ in range(args.per_day):
+                    start = epoch + timedelta(days=day, hours=rng.randrange(8, 21), minutes=rng.choice((0, 30)))
+                    chunk.append({'tenant_id': tenant.id, 'room_id': room_id, 'customer_id': customer.id,
+                                  'start_time': start, 'end_time': start + timedelta(minutes=rng.choice((60, 90, 120))),
+                                  'status': 'confirmed', 'created_at': start})
+            if len(chunk) >= 50_000:
+                db.session.execute(sa.insert(Booking), chunk)
+                chunk = []
+        if chunk:
+            db.session.execute(sa.insert(Booking), chunk)
+        db.session.commit()
+        db.session.execute(sa.text('ANALYZE'))
+        total = db.session.query(sa.func.count(Booking.id)).scalar()
+        print(f'seeded {total:,} bookings over {len(room_ids):,} rooms in {time.perf_counter() - t0:.1f}s')
+
+        start, end = epoch, epoch + timedelta(days=args.days)
+
+        t0 = time.perf_counter()
+        slots = find_free_slots(tenant.id, start, end, min_minutes=args.min_minutes)
+        next(slots)
+        first = time.perf_counter() - t0
+        found = 1 + sum(1 for _ in slots)
+        sweep = time.perf_counter() - t0
+        print(f'streaming sweep: {sweep:.2f}s, first slot after {first * 1000:.0f} ms, {found:,} slots')
+
+        # Baseline: load each room's bookings separately, as a client would
+        t0 = time.perf_counter()
+        windows = list(OpeningHours.from_settings({'opening_hours': OPENING_HOURS}).windows(start, end))
+        per_room_sql = sa.select(Booking.start_time, Booking.end_time).where(
+            Booking.room_id == sa.bindparam('room_id'),
+            Booking.status == 'confirmed',
+            Booking.start_time < end,
+            Booking.end_time > start,
+        ).order_by(Booking.start_time)
+        baseline = 0
+        for room_id in room_ids:
+            busy = db.session.execute(per_room_sql, {'room_id': room_id}).all()
+            baseline += sum(1 for _ in free_slots(busy, windows, start, end, timedelta(minutes=args.min_minutes)))
+        print(f'query per room:  {time.perf_counter() - t0:.2f}s, {baseline:,} slots')
+        assert baseline == found, 'sweep and baseline disagree'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# JSON serialization microbenchmarks
+"""
+Time serialization of 10k Customer and Booking rows through:
+  - to_dict() + Flask's stdlib JSON provider (the original path)
+  - to_dict() + the orjson provider
+  - the compiled column serializer (no intermediate dicts)
+
+Usage:
+    python scripts/bench_serialization.py --rows 10000 --repeat 5
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    from flask.json.provider import DefaultJSONProvider
+    from app import create_app
+    from app.models import Booking, Customer
+    from app.serialization import OrjsonProvider, orjson, serializer_for
+
+    now = datetime(2025, 1, 1, 9)
+    customers = [
+        Customer(id=i, tenant_id=1, studio_id=1, name=f'Customer {i}', email=f'c{i}@example.com',
+                 phone='555-0100', notes=None, created_at=now, updated_at=now)
+        for i in range(args.rows)
+    ]
+    bookings = [
+        Booking(id=i, tenant_id=1, room_id=i % 50, customer_id=i, start_time=now + timedelta(hours=i),
+                end_time=now + timedelta(hours=i + 1), status='confirmed', notes=None,
+                total_amount=Decimal('42.50'), created_at=now)
+        for i in range(args.rows)
+    ]
+
+    app = create_app()
+    providers = {'stdlib': DefaultJSONProvider(app)}
+    if orjson is not None:
+        providers['orjson'] = OrjsonProvider(app)
+
+    with app.app_context():
+        for label, rows in (('Customer', customers), ('Booking', bookings)):
+            model = type(rows[0])
+            print(f'{args.rows:,} {label} rows (best of {args.repeat}):')
+            for name, provider in providers.items():
+                best = min(timeit.repeat(lambda: provider.dumps({'data': [r.to_dict() for r in rows]}),
+                                         number=1, repeat=args.repeat))
+                print(f'  to_dict + {name:<8} {best * 1000:8.1f} ms')
+            serializer = serializer_for(model)
+            best = min(timeit.repeat(lambda: serializer.dumps_many(rows), number=1, repeat=args.repeat))
+            print(f'  compiled serializer {best * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
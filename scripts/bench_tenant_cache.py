@@ -0,0 +1,75 @@
+# Tenant row-cache benchmark
+"""
+Time GET /api/tenants/<id> with the row cache off and on.
+
+Usage:
+    python scripts/bench_tenant_cache.py --requests 5000
+    python scripts/bench_tenant_cache.py --redis-url redis://localhost:6379/15
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--tenants', type=int, default=200)
+    parser.add_argument('--redis-url', default=None, help='also measure the redis backend')
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from app import create_app, db, rowcache
+    from app.models import Studio, Tenant, User
+
+    backends = ['none', 'memory'] + (['redis'] if args.redis_url else [])
+    tenant_ids = None
+    for backend in backends:
+        app = create_app()
+        app.config.update(ROW_CACHE_BACKEND=backend, ROW_CACHE_REDIS_URL=args.redis_url,
+                          SESSION_COOKIE_SECURE=False, CURRENT_USER_CACHE_TTL=60)
+        rowcache.init_app(app)
+        with app.app_context():
+            if tenant_ids is None:
+                db.create_all()
+                tenants = [Tenant(name=f'Tenant {i}', subdomain=f'bench-{i}', settings={'theme': 'dark', 'i': i})
+                           for i in range(args.tenants)]
+                db.session.add_all(tenants)
+                db.session.flush()
+                studio = Studio(tenant_id=tenants[0].id, name='S')
+                db.session.add(studio)
+                db.session.flush()
+                admin = User(name='Admin', email='admin@example.com', password_hash='x', role='Admin', permissions=[])
+                db.session.add(admin)
+                db.session.commit()
+                tenant_ids, admin_id = [t.id for t in tenants], admin.id
+
+        # Requests run outside the setup context so each gets a fresh session, as in production
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = admin_id
+        for tenant_id in tenant_ids:  # warm up (and fill the cache)
+            client.get(f'/api/tenants/{tenant_id}')
+
+        t0 = time.perf_counter()
+        for i in range(args.requests):
+            resp = client.get(f'/api/tenants/{tenant_ids[i % len(tenant_ids)]}')
+            assert resp.status_code == 200
+        elapsed = time.perf_counter() - t0
+        cache = app.extensions.get('row_cache')
+        stats = ''
+        if cache is not None:
+            stats = f", hits {cache.stats[('Tenant', 'hit')]:,} / misses {cache.stats[('Tenant', 'miss')]:,}"
+        print(f'{backend:>6}: {args.requests / elapsed:,.0f} req/s, '
+              f'{elapsed / args.requests * 1e6:.0f} us/request{stats}')
+
+if __name__ == '__main__':
+    main()
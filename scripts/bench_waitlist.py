@@ -0,0 +1,92 @@
+# Waitlist promotion benchmark
+"""
+Cancel bookings one commit at a time against a large waitlist and report
+cancellations per second, with and without waiting entries on the freed slots.
+
+Usage:
+    python scripts/bench_waitlist.py --rooms 200 --bookings-per-room 100 --waiting-per-slot 5 --cancel 2000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, default=200)
+    parser.add_argument('--bookings-per-room', type=int, default=100)
+    parser.add_argument('--waiting-per-slot', type=int, default=5)
+    parser.add_argument('--cancel', type=int, default=2000)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from app import create_app, db
+    from app.models import Booking, Customer, Room, Studio, Tenant, WaitlistEntry
+    from app.rooms import waitlist
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        tenant = Tenant(name='Bench', subdomain='bench')
+        db.session.add(tenant)
+        db.session.flush()
+        studio = Studio(tenant_id=tenant.id, name='S')
+        db.session.add(studio)
+        db.session.flush()
+        customer = Customer(tenant_id=tenant.id, studio_id=studio.id, name='C', email='c@example.com')
+        rooms = [Room(tenant_id=tenant.id, studio_id=studio.id, name=f'R{i}', capacity=4) for i in range(args.rooms)]
+        db.session.add_all([customer, *rooms])
+        db.session.flush()
+
+        first = (datetime.utcnow() + timedelta(days=1)).replace(hour=8, minute=0, second=0, microsecond=0)
+        bookings, entries = [], []
+        for room in rooms:
+            for n in range(args.bookings_per_room):
+                start = first + timedelta(days=n // 12, hours=n % 12)
+                bookings.append({'tenant_id': tenant.id, 'room_id': room.id, 'customer_id': customer.id,
+                                 'start_time': start, 'end_time': start + timedelta(hours=1),
+                                 'status': 'confirmed', 'created_at': first})
+                # Only even slots have a waitlist
+                if n % 2 == 0:
+                    entries.extend({'tenant_id': tenant.id, 'room_id': room.id, 'customer_id': customer.id,
+                                    'start_time': start, 'end_time': start + timedelta(hours=1), 'priority': p,
+                                    'status': 'waiting', 'created_at': first}
+                                   for p in range(args.waiting_per_slot))
+        db.session.execute(Booking.__table__.insert(), bookings)
+        db.session.execute(WaitlistEntry.__table__.insert(), entries)
+        db.session.commit()
+
+        index = app.extensions['waitlist']
+        t0 = time.perf_counter()
+        index.rebuild(db.session)
+        print(f'{len(bookings):,} bookings, {len(entries):,} waiting entries; '
+              f'index rebuilt in {(time.perf_counter() - t0) * 1e3:.0f} ms')
+
+        ids = [row.id for row in db.session.query(Booking.id, Booking.start_time, Booking.room_id)
+               .filter(Booking.status == 'confirmed', Booking.notes.is_(None))]
+        random.Random(1).shuffle(ids)
+        ids = ids[:args.cancel]
+
+        promoted = 0
+        t0 = time.perf_counter()
+        for booking_id in ids:
+            db.session.get(Booking, booking_id).status = 'cancelled'
+            promoted += len(waitlist.promote_pending())
+            db.session.commit()
+        elapsed = time.perf_counter() - t0
+        print(f'{len(ids):,} cancellations in {elapsed:.2f}s: {len(ids) / elapsed * 60:,.0f}/min, '
+              f'{promoted:,} promoted, {elapsed / len(ids) * 1e3:.2f} ms each')
+
+
+if __name__ == '__main__':
+    main()
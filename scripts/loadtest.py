@@ -0,0 +1,264 @@
+# Load-test harness (auth, customer and tenant traffic)
+"""
+Replay a weighted mix of API calls from concurrent virtual users and report
+throughput and p50/p95/p99 latency per operation.
+
+Each virtual user logs in as a generated studio manager of a random tenant
+(see app/seeding.py) and then loops over operations picked by weight.
+
+In-process (default): a temporary SQLite database is seeded, and requests go
+through Flask's test client with the rate limiter off. That measures the app
+without a network or a WSGI server.
+
+    python scripts/loadtest.py --seed-tenants 20 --customers-per-tenant 500 --bookings 100k --users 8
+
+Against a running server seeded with `flask seed`. Raise its RATE_LIMIT_*
+settings first, or logins will answer 429:
+
+    python scripts/loadtest.py --url http://localhost:5000 --tenants 1000 --users 32 --duration 60
+
+Mix weights can be overridden, e.g. --mix list_customers=50,get_customer=30,login=0
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+MIX = {
+    'login': 3,
+    'session': 10,
+    'list_customers': 25,
+    'search_customers': 12,
+    'get_customer': 20,
+    'create_customer': 5,
+    'update_customer': 5,
+    'validate_email': 5,
+    'get_tenant': 10,
+}
+
+
+class TestClientTransport:
+    """Requests through an app's test client (one per virtual user, so cookies are separate)."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, params=None):
+        response = self.client.open(path, method=method, json=body, query_string=params)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpTransport:
+    """Requests over HTTP with a per-user cookie jar."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, method, path, body=None, params=None):
+        url = self.base_url + path + ('?' + urllib.parse.urlencode(params) if params else '')
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(url, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'} if data else {})
+        try:
+            with self.opener.open(req, timeout=30) as resp:
+                return resp.status, _json(resp.read())
+        except urllib.error.HTTPError as e:
+            return e.code, _json(e.read())
+
+
+def _json(raw):
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
+
+
+class VirtualUser:
+    def __init__(self, transport, tenant_index, rng):
+        self.transport = transport
+        self.rng = rng
+        self.email = f'manager1@tenant-{tenant_index:05d}.example.com'
+        self.tenant_id = None
+        self.customer_ids = []
+        self.created = 0
+
+    def login(self):
+        status, body = self.transport.request('POST', '/api/login', {'email': self.email, 'password': 'password'})
+        if status == 200:
+            self.tenant_id = body['data']['user']['tenant_id']
+        return status
+
+    def session(self):
+        return self.transport.request('GET', '/api/session')[0]
+
+    def list_customers(self):
+        status, body = self.transport.request('GET', '/api/customers',
+                                              params={'page': self.rng.randint(1, 5), 'per_page': 25})
+        if status == 200 and body['data']:
+            self.customer_ids = [c['id'] for c in body['data']]
+        return status
+
+    def search_customers(self):
+        term = self.rng.choice(('ada', 'chen', 'nora', 'pat', 'rossi', 'sam', 'weber', 'lopez'))
+        return self.transport.request('GET', '/api/customers', params={'search': term, 'per_page': 25})[0]
+
+    def get_customer(self):
+        if not self.customer_ids:
+            return self.list_customers()
+        return self.transport.request('GET', f'/api/customers/{self.rng.choice(self.customer_ids)}')[0]
+
+    def create_customer(self):
+        self.created += 1
+        tag = f'{threading.get_ident()}.{self.created}.{self.rng.randrange(10 ** 9)}'
+        return self.transport.request('POST', '/api/customers',
+                                      {'name': f'Load Test {tag}', 'email': f'load.{tag}@example.com'})[0]
+
+    def update_customer(self):
+        if not self.customer_ids:
+            return self.list_customers()
+        return self.transport.request('PUT', f'/api/customers/{self.rng.choice(self.customer_ids)}',
+                                      {'notes': f'updated {time.time():.0f}'})[0]
+
+    def validate_email(self):
+        return self.transport.request('POST', '/api/validate/email',
+                                      {'email': f'free.{self.rng.randrange(10 ** 9)}@example.com'})[0]
+
+    def get_tenant(self):
+        return self.transport.request('GET', f'/api/tenants/{self.tenant_id}')[0]
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an ascending list."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+
+def run(make_transport, tenants, users, duration, max_requests, mix, seed):
+    operations, weights = zip(*[(op, w) for op, w in mix.items() if w > 0])
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    stop = time.monotonic() + duration
+    budget = [max_requests or float('inf')]
+    failed_logins = []
+
+    def worker(n):
+        rng = random.Random(seed * 1000 + n)
+        user = VirtualUser(make_transport(), rng.randrange(tenants), rng)
+        if user.login() != 200:
+            # SystemExit would only end this thread; stop the others and abort from the main thread
+            with lock:
+                failed_logins.append(f'virtual user {n} could not log in as {user.email}')
+                budget[0] = 0
+            return
+        local = defaultdict(list)
+        local_errors = defaultdict(int)
+        while time.monotonic() < stop:
+            with lock:
+                if budget[0] <= 0:
+                    break
+                budget[0] -= 1
+            op = rng.choices(operations, weights)[0]
+            t0 = time.perf_counter()
+            status = getattr(user, op)()
+            local[op].append(time.perf_counter() - t0)
+            if status >= 400:
+                local_errors[op] += 1
+        with lock:
+            for op, values in local.items():
+                samples[op].extend(values)
+            for op, count in local_errors.items():
+                errors[op] += count
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(users)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if failed_logins:
+        raise SystemExit('\n'.join(failed_logins))
+    return samples, errors, time.perf_counter() - t0
+
+
+def report(samples, errors, elapsed):
+    print(f"{'operation':<18}{'count':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    everything = []
+    for op in sorted(samples):
+        ordered = sorted(samples[op])
+        everything.extend(ordered)
+        print(f'{op:<18}{len(ordered):>9,}{errors[op]:>8,}{len(ordered) / elapsed:>9,.1f}'
+              + ''.join(f'{percentile(ordered, p) * 1000:>9.1f}' for p in (50, 95, 99)))
+    everything.sort()
+    print(f"{'total':<18}{len(everything):>9,}{sum(errors.values()):>8,}{len(everything) / elapsed:>9,.1f}"
+          + ''.join(f'{percentile(everything, p) * 1000:>9.1f}' for p in (50, 95, 99)))
+
+
+def parse_mix(spec):
+    mix = dict(MIX)
+    for item in filter(None, (spec or '').split(',')):
+        op, _, weight = item.partition('=')
+        if op.strip() not in MIX or not hasattr(VirtualUser, op.strip()):
+            raise SystemExit(f'unknown operation {op!r}; choose from {", ".join(MIX)}')
+        mix[op.strip()] = float(weight)
+    return {op: w for op, w in mix.items() if hasattr(VirtualUser, op)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=None, help='base URL of a running server (default: in-process)')
+    parser.add_argument('--tenants', type=int, default=None, help='generated tenants to spread users over')
+    parser.add_argument('--users', type=int, default=8, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=15.0, help='seconds to run')
+    parser.add_argument('--requests', type=int, default=0, help='stop after this many requests (0: no limit)')
+    parser.add_argument('--mix', default='', help='operation=weight overrides')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--seed-tenants', type=int, default=10, help='in-process: tenants to generate')
+    parser.add_argument('--customers-per-tenant', default='500', help='in-process: customers per tenant')
+    parser.add_argument('--bookings', default='50k', help='in-process: bookings to generate')
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    if args.url:
+        tenants = args.tenants or 1
+        make_transport = lambda: HttpTransport(args.url)  # noqa: E731
+    else:
+        db_path = os.path.join(tempfile.mkdtemp(), 'loadtest.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+        from app import create_app, db, ratelimit
+        from app.seeding import generate, parse_count
+        app = create_app()
+        app.config.update(RATE_LIMIT_ENABLED=False, SESSION_COOKIE_SECURE=False)
+        ratelimit.init_app(app)
+        with app.app_context():
+            db.create_all()
+            t0 = time.perf_counter()
+            counts = generate(tenants=args.seed_tenants, customers_per_tenant=parse_count(args.customers_per_tenant),
+                              bookings=parse_count(args.bookings), seed=args.seed)
+            print('seeded ' + ', '.join(f'{n:,} {table}' for table, n in counts.items())
+                  + f' in {time.perf_counter() - t0:.1f}s')
+        tenants = min(args.tenants or args.seed_tenants, args.seed_tenants)
+        make_transport = lambda: TestClientTransport(app)  # noqa: E731
+
+    samples, errors, elapsed = run(make_transport, tenants, args.users, args.duration, args.requests, mix, args.seed)
+    print(f'{args.users} users, {elapsed:.1f}s')
+    report(samples, errors, elapsed)
+
+
+if __name__ == '__main__':
+    main()
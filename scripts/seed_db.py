@@ -1 +1,52 @@
 ﻿# Database seeding script
+"""
+Generate synthetic data outside the Flask CLI (same options as `flask seed`).
+
+Usage:
+    python scripts/seed_db.py --tenants 1000 --customers-per-tenant 5000 --bookings 10M
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def main():
+    from app.seeding import parse_count
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tenants', type=parse_count, default=1)
+    parser.add_argument('--studios-per-tenant', type=int, default=2)
+    parser.add_argument('--rooms-per-studio', type=int, default=3)
+    parser.add_argument('--customers-per-tenant', type=parse_count, default=50)
+    parser.add_argument('--bookings', type=parse_count, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--start', type=lambda s: datetime.strptime(s, '%Y-%m-%d'), default=None)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--create-tables', action='store_true', help='db.create_all() first (no migrations)')
+    args = parser.parse_args()
+
+    from app import create_app, db
+    from app.seeding import generate
+
+    app = create_app()
+    with app.app_context():
+        if args.create_tables:
+            db.create_all()
+        t0 = time.perf_counter()
+        counts = generate(tenants=args.tenants, studios_per_tenant=args.studios_per_tenant,
+                          rooms_per_studio=args.rooms_per_studio, customers_per_tenant=args.customers_per_tenant,
+                          bookings=args.bookings, seed=args.seed, start=args.start, batch_size=args.batch_size,
+                          echo=print)
+        elapsed = time.perf_counter() - t0
+    print(', '.join(f'{n:,} {table}' for table, n in counts.items()) + f' in {elapsed:.1f}s '
+          f'({counts["bookings"] / elapsed:,.0f} bookings/s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -79,3 +79,125 @@ def test_validate_email(client):
     })
     r3 = client.post("/api/validate/email", json={"email":"a@b.com"})
     assert r3.status_code == 400
+
+def test_current_user_cache(client):
+    from flask import current_app
+    from sqlalchemy import event
+    from app.identity import invalidate_user
+
+    current_app.config["CURRENT_USER_CACHE_TTL"] = 60
+    invalidate_user()
+    res = client.post("/api/register", json={
+        "name":"Cache","email":"cache@example.com","password":"password"
+    })
+    assert res.status_code == 201
+
+    statements = []
+    def _record(conn, cursor, statement, params, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", _record)
+    try:
+        # First request loads user + tenant + studio in one joined query
+        assert client.get("/api/session").status_code == 200
+        assert len([s for s in statements if "FROM users" in s]) == 1
+        assert not any("FROM tenants" in s and "FROM users" not in s for s in statements)
+
+        # Subsequent requests are served from the cross-request cache
+        db.session.remove()
+        statements.clear()
+        res = client.get("/api/session")
+        assert res.status_code == 200
+        assert res.get_json()["data"]["user"]["email"] == "cache@example.com"
+        assert statements == []
+
+        # Updating the user evicts the cached identity
+        user = User.query.filter_by(email="cache@example.com").first()
+        user.name = "Renamed"
+        db.session.commit()
+        db.session.remove()
+        res = client.get("/api/session")
+        assert res.get_json()["data"]["user"]["name"] == "Renamed"
+    finally:
+        event.remove(db.engine, "before_cursor_execute", _record)
+        invalidate_user()
+
+def test_login_upgrades_password_hash(client):
+    from flask import current_app
+    from app.passwords import needs_rehash
+
+    # Legacy low-cost hash, then switch the profile to bcrypt
+    user = User(name="Old", email="old@example.com",
+                password_hash=generate_password_hash("password", method="pbkdf2:sha256:1000"),
+                role="Receptionist", permissions=[], studio_id=None)
+    db.session.add(user)
+    db.session.commit()
+    current_app.config.update(PASSWORD_HASH_METHOD="bcrypt", PASSWORD_BCRYPT_ROUNDS=4)
+    current_app.extensions.pop("password_hasher", None)
+    try:
+        assert needs_rehash(user.password_hash)
+        res = client.post("/api/login", json={"email":"old@example.com","password":"password"})
+        assert res.status_code == 200
+        db.session.refresh(user)
+        assert user.password_hash.startswith("$2b$04$")
+        assert not needs_rehash(user.password_hash)
+
+        # The upgraded hash keeps working
+        client.post("/api/logout")
+        res = client.post("/api/login", json={"email":"old@example.com","password":"password"})
+        assert res.status_code == 200
+    finally:
+        current_app.extensions.pop("password_hasher", None)
+
+def test_busy_hasher_skips_the_rehash_but_logs_in(client, monkeypatch):
+    from app.auth import routes
+    from app.passwords import HashingBusy
+
+    legacy = generate_password_hash("password", method="pbkdf2:sha256:1000")
+    user = User(name="Old", email="old@example.com", password_hash=legacy,
+                role="Receptionist", permissions=[], studio_id=None)
+    db.session.add(user)
+    db.session.commit()
+
+    def busy(password):
+        raise HashingBusy("Password hashing queue is full")
+    monkeypatch.setattr(routes, "hash_password", busy)
+    res = client.post("/api/login", json={"email":"old@example.com","password":"password"})
+    assert res.status_code == 200
+    db.session.refresh(user)
+    assert user.password_hash == legacy
+
+def test_hashing_busy_returns_503(client):
+    from flask import current_app
+    from app.passwords import PasswordHasher
+
+    hasher = PasswordHasher(workers=1, max_pending=1)
+    hasher._slots.acquire()  # the only slot is taken by an in-flight hash
+    current_app.extensions["password_hasher"] = hasher
+    try:
+        res = client.post("/api/register", json={
+            "name":"Busy","email":"busy@example.com","password":"password"
+        })
+        assert res.status_code == 503
+        assert res.headers["Retry-After"]
+        assert res.get_json()["success"] is False
+    finally:
+        current_app.extensions.pop("password_hasher", None)
+
+def test_timed_out_hash_keeps_its_slot_until_done():
+    import time
+    from app.passwords import HashingBusy, PasswordHasher
+
+    hasher = PasswordHasher(method="bcrypt", bcrypt_rounds=12, workers=1, max_pending=1, timeout=0.01)
+    try:
+        with pytest.raises(HashingBusy, match="timed out"):
+            hasher.hash("password")
+        # The job still runs in the pool, so the queue is still full
+        with pytest.raises(HashingBusy, match="queue is full"):
+            hasher.hash("password")
+        deadline = time.monotonic() + 30
+        while not hasher._slots.acquire(blocking=False):
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        hasher._slots.release()
+    finally:
+        hasher.shutdown()
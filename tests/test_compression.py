@@ -0,0 +1,115 @@
+﻿# Response compression and static asset tests
+import gzip
+import shutil
+import zlib
+
+import pytest
+from flask import render_template_string
+from app import assets, create_app, db
+from app.compression import brotli
+from app.models import Tenant, Studio, Customer, User
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config.update({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "SESSION_COOKIE_SECURE": False,
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    tenant = Tenant(name="T", subdomain="t-gzip")
+    db.session.add(tenant)
+    db.session.flush()
+    studio = Studio(tenant_id=tenant.id, name="S")
+    db.session.add(studio)
+    db.session.flush()
+    user = User(tenant_id=tenant.id, studio_id=studio.id, name="M", email="m@example.com",
+                password_hash="x", role="Studio Manager", permissions=[])
+    db.session.add(user)
+    db.session.add_all([Customer(tenant_id=tenant.id, studio_id=studio.id, name=f"Customer {i:03d}",
+                                 email=f"c{i}@example.com") for i in range(60)])
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user.id
+    return client
+
+def test_json_gzip_negotiated(client):
+    plain = client.get('/api/customers?per_page=50')
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+
+    packed = client.get('/api/customers?per_page=50', headers={'Accept-Encoding': 'gzip'})
+    assert packed.headers['Content-Encoding'] == 'gzip'
+    assert int(packed.headers['Content-Length']) == len(packed.data) < len(plain.data)
+    assert gzip.decompress(packed.data) == plain.data
+    # Security headers survive compression
+    assert packed.headers['Content-Security-Policy'] == plain.headers['Content-Security-Policy']
+    assert packed.headers['X-Frame-Options'] == 'DENY'
+
+    # The compressed variant carries a weak ETag that still revalidates
+    assert packed.headers['ETag'] == 'W/' + plain.headers['ETag']
+    again = client.get('/api/customers?per_page=50',
+                       headers={'Accept-Encoding': 'gzip', 'If-None-Match': packed.headers['ETag']})
+    assert again.status_code == 304
+
+def test_small_and_refused_bodies_not_compressed(client):
+    small = client.get('/api/health', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers
+    refused = client.get('/api/customers?per_page=50', headers={'Accept-Encoding': 'gzip;q=0, identity'})
+    assert 'Content-Encoding' not in refused.headers
+
+@pytest.mark.skipif(brotli is None, reason="brotli not installed")
+def test_brotli_preferred(client):
+    plain = client.get('/api/customers?per_page=50')
+    packed = client.get('/api/customers?per_page=50', headers={'Accept-Encoding': 'gzip, br'})
+    assert packed.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(packed.data) == plain.data
+
+def test_streamed_export_compressed_incrementally(client):
+    plain = client.get('/api/customers/export?format=ndjson')
+    packed = client.get('/api/customers/export?format=ndjson', headers={'Accept-Encoding': 'gzip'})
+    assert packed.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in packed.headers
+    chunks = list(packed.response)
+    assert len(chunks) > 1
+    # Every chunk but the trailer ends on a sync flush, so it decodes on its own
+    decoder = zlib.decompressobj(31)
+    first = decoder.decompress(chunks[0])
+    assert first and first.endswith(b'\n')
+    assert gzip.decompress(b''.join(chunks)) == plain.data
+
+def test_fingerprinted_assets(app, tmp_path):
+    static = tmp_path / 'static'
+    shutil.copytree(app.static_folder, static)
+    manifest = assets.build(str(static))
+    main_css = manifest["files"]["css/main.css"]
+    assert main_css.startswith('dist/css/main.') and main_css.endswith('.css')
+    assert 'gzip' in manifest["encodings"][main_css]
+
+    app.static_folder = str(static)
+    assets.init_app(app)
+    client = app.test_client()
+    with app.test_request_context():
+        url = render_template_string("{{ url_for('static', filename='css/main.css') }}")
+    assert url == '/static/' + main_css
+
+    original = (static / 'css' / 'main.css').read_bytes()
+    resp = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert resp.status_code == 200
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert resp.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+    assert resp.mimetype == 'text/css'
+    assert gzip.decompress(resp.data) == original
+    assert client.get(url).data == original
+
+    # Files outside the manifest still go through the regular static view
+    (static / 'late.txt').write_text('added after the build')
+    assert client.get('/static/late.txt').data == b'added after the build'
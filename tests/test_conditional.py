@@ -0,0 +1,101 @@
+﻿# Conditional GET (ETag / Last-Modified) tests
+from datetime import datetime, timedelta
+
+import pytest
+from app import create_app, db
+from app.models import Tenant, Studio, Customer, User
+from app.querybudget import count_queries
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config.update({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "SESSION_COOKIE_SECURE": False,
+    })
+    with app.app_context():
+        db.create_all()
+        yield app.test_client()
+        db.drop_all()
+
+@pytest.fixture
+def manager(client):
+    tenant = Tenant(name="T", subdomain="t-etag")
+    db.session.add(tenant)
+    db.session.flush()
+    studio = Studio(tenant_id=tenant.id, name="S")
+    db.session.add(studio)
+    db.session.flush()
+    user = User(tenant_id=tenant.id, studio_id=studio.id, name="M", email="m@example.com",
+                password_hash="x", role="Studio Manager", permissions=[])
+    db.session.add(user)
+    db.session.add_all([Customer(tenant_id=tenant.id, studio_id=studio.id, name=f"C{i}", email=f"c{i}@example.com")
+                        for i in range(3)])
+    db.session.commit()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user.id
+    return user
+
+def test_customer_list_etag(client, manager):
+    first = client.get('/api/customers?per_page=2')
+    etag = first.headers['ETag']
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    assert 'Last-Modified' not in first.headers
+
+    # Unchanged: 304 from the aggregate alone, no rows loaded
+    with count_queries() as counter:
+        again = client.get('/api/customers?per_page=2', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+    assert again.headers['ETag'] == etag
+    assert not any(s.lstrip().startswith('SELECT customers.id') for s in counter.statements)
+
+    # Other query parameters are a different representation
+    assert client.get('/api/customers?per_page=1', headers={'If-None-Match': etag}).status_code == 200
+    assert client.get('/api/customers?cursor=&per_page=2', headers={'If-None-Match': etag}).status_code == 200
+
+    # Updates move max(updated_at), deletes the count
+    customer = Customer.query.filter_by(name="C2").first()
+    customer.phone = "123"
+    db.session.commit()
+    updated = client.get('/api/customers?per_page=2', headers={'If-None-Match': etag})
+    assert updated.status_code == 200
+    db.session.delete(Customer.query.filter_by(name="C0").first())
+    db.session.commit()
+    deleted = client.get('/api/customers?per_page=2', headers={'If-None-Match': updated.headers['ETag']})
+    assert deleted.status_code == 200
+    assert deleted.get_json()["meta"]["total_count"] == 2
+
+def test_customer_etag_and_last_modified(client, manager):
+    customer = Customer.query.filter_by(name="C1").first()
+    first = client.get(f'/api/customers/{customer.id}')
+    assert first.status_code == 200
+    etag, last_modified = first.headers['ETag'], first.headers['Last-Modified']
+
+    assert client.get(f'/api/customers/{customer.id}', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get(f'/api/customers/{customer.id}',
+                      headers={'If-Modified-Since': last_modified}).status_code == 304
+    # If-None-Match wins over If-Modified-Since
+    assert client.get(f'/api/customers/{customer.id}',
+                      headers={'If-None-Match': '"stale"', 'If-Modified-Since': last_modified}).status_code == 200
+
+    customer.name = "Renamed"
+    customer.updated_at = datetime.utcnow() + timedelta(seconds=2)
+    db.session.commit()
+    changed = client.get(f'/api/customers/{customer.id}',
+                         headers={'If-None-Match': etag, 'If-Modified-Since': last_modified})
+    assert changed.status_code == 200
+    assert changed.get_json()["data"]["name"] == "Renamed"
+    assert changed.headers['ETag'] != etag
+
+def test_tenant_etag(client, manager):
+    first = client.get(f'/api/tenants/{manager.tenant_id}')
+    etag = first.headers['ETag']
+    assert client.get(f'/api/tenants/{manager.tenant_id}', headers={'If-None-Match': etag}).status_code == 304
+
+    assert client.put(f'/api/tenants/{manager.tenant_id}', json={"settings": {"theme": "dark"}}).status_code == 200
+    changed = client.get(f'/api/tenants/{manager.tenant_id}', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.get_json()["data"]["settings"] == {"theme": "dark"}
@@ -0,0 +1,160 @@
+﻿# Customer analytics (RFM, lifetime value, churn risk) tests
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+from app import create_app, db
+from app.customers import analytics
+from app.models import Booking, Customer, Room, Studio, Tenant, User
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config.update({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "SESSION_COOKIE_SECURE": False,
+    })
+    with app.app_context():
+        db.create_all()
+        analytics.init_app(app)
+        yield app
+        db.drop_all()
+
+@pytest.fixture
+def setup(app, client):
+    tenant = Tenant(name="T", subdomain="t-analytics")
+    db.session.add(tenant)
+    db.session.flush()
+    studio = Studio(tenant_id=tenant.id, name="S")
+    db.session.add(studio)
+    db.session.flush()
+    room = Room(tenant_id=tenant.id, studio_id=studio.id, name="R", capacity=4, hourly_rate=Decimal("10.00"))
+    customers = [Customer(tenant_id=tenant.id, studio_id=studio.id, name=f"C{i}", email=f"c{i}@example.com")
+                 for i in range(4)]
+    user = User(tenant_id=tenant.id, studio_id=studio.id, name="M", email="m@example.com",
+                password_hash="x", role="Studio Manager", permissions=[])
+    db.session.add_all([room, user, *customers])
+    db.session.flush()
+    now = datetime.utcnow().replace(microsecond=0)
+
+    def book(customer, days_ago, hours=1, amount=None, status="confirmed"):
+        start = now - timedelta(days=days_ago)
+        db.session.add(Booking(tenant_id=tenant.id, room_id=room.id, customer_id=customer.id, start_time=start,
+                               end_time=start + timedelta(hours=hours), status=status, total_amount=amount))
+
+    # C0: regular and recent, C1: two old bookings, C2: one unpriced booking, C3: none
+    for days_ago in (2, 9, 16, 23, 30):
+        book(customers[0], days_ago, amount=Decimal("50.00"))
+    book(customers[1], 200, amount=Decimal("80.00"))
+    book(customers[1], 180, amount=Decimal("80.00"))
+    book(customers[1], 5, amount=Decimal("999.00"), status="cancelled")
+    book(customers[2], 40, hours=3)
+    db.session.commit()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user.id
+    return {"tenant": tenant.id, "room": room.id, "customers": [c.id for c in customers], "now": now}
+
+def test_score_buckets_and_flags():
+    now = pd.Timestamp("2025-06-01")
+    stats = pd.DataFrame({
+        "customer_id": [1, 2, 3, 4, 5, 6],
+        "studio_id": [1] * 6,
+        "bookings": [20, 10, 5, 2, 1, 0],
+        "first_booking": pd.to_datetime(["2024-06-01", "2024-06-01", "2025-01-01", "2024-01-01", "2025-05-30", None]),
+        "last_booking": pd.to_datetime(["2025-05-31", "2025-05-20", "2025-05-01", "2024-03-01", "2025-05-30", None]),
+        "spend": [2000.0, 1000.0, 500.0, 200.0, 100.0, 0.0],
+    }).set_index("customer_id")
+    scored = analytics.score(stats, now=now, churn_days=90, churn_gap_factor=3, horizon_days=365)
+    assert scored["r"].tolist() == [5, 3, 2, 1, 4, 0]
+    assert scored["f"].tolist() == [5, 4, 3, 2, 1, 0]
+    assert scored.loc[1, "rfm"] == 555 and scored.loc[1, "segment"] == "champions"
+    assert scored.loc[4, "segment"] == "hibernating" and bool(scored.loc[4, "churn_risk"])
+    assert scored.loc[5, "segment"] == "new" and not scored.loc[5, "churn_risk"]
+    assert scored.loc[6, "segment"] == analytics.NO_BOOKINGS and scored.loc[6, "lifetime_value"] == 0
+    # Churned customers project nothing; short tenures are stretched to MIN_TENURE_DAYS
+    assert scored.loc[4, "predicted_value"] == 0
+    assert scored.loc[5, "predicted_value"] == pytest.approx(100 / analytics.MIN_TENURE_DAYS * 365)
+    assert scored.loc[1, "lifetime_value"] == pytest.approx(4000)
+
+def test_analytics_listing(client, setup):
+    c0, c1, c2, c3 = setup["customers"]
+    res = client.get("/api/customers/analytics", query_string={"sort": "spend"})
+    assert res.status_code == 200
+    body = res.get_json()
+    rows = {r["customer_id"]: r for r in body["data"]}
+    assert [r["customer_id"] for r in body["data"]] == [c0, c1, c2, c3]
+    assert rows[c0]["bookings"] == 5 and rows[c0]["spend"] == 250.0 and rows[c0]["name"] == "C0"
+    # Cancelled bookings do not count; unpriced ones are valued at the room rate
+    assert rows[c1]["bookings"] == 2 and rows[c1]["spend"] == 160.0
+    assert rows[c2]["spend"] == 30.0
+    assert rows[c1]["churn_risk"] and not rows[c0]["churn_risk"]
+    assert rows[c3]["segment"] == "no_bookings" and rows[c3]["last_booking"] is None
+    assert body["meta"]["total_count"] == 4 and body["meta"]["segments"]["no_bookings"] == 1
+
+    res = client.get("/api/customers/analytics", query_string={"churn_risk": "true"})
+    assert [r["customer_id"] for r in res.get_json()["data"]] == [c1]
+    res = client.get("/api/customers/analytics", query_string={"sort": "recency_days", "order": "asc",
+                                                               "min_bookings": 1, "per_page": 2, "page": 2})
+    page = res.get_json()
+    assert [r["customer_id"] for r in page["data"]] == [c1]
+    assert page["meta"]["has_prev"] and not page["meta"]["has_next"]
+    res = client.get("/api/customers/analytics", query_string={"segment": "no_bookings,champions"})
+    assert c3 in [r["customer_id"] for r in res.get_json()["data"]]
+
+    for bad in ({"sort": "name"}, {"segment": "vip"}, {"churn_risk": "maybe"}, {"page": "x"}):
+        assert client.get("/api/customers/analytics", query_string=bad).status_code == 400
+
+    # Below Studio Manager only the user's studio is visible, and nothing without one
+    staff = User(tenant_id=setup["tenant"], studio_id=None, name="Rec", email="rec@example.com",
+                 password_hash="x", role="Receptionist", permissions=[])
+    db.session.add(staff)
+    db.session.commit()
+    with client.session_transaction() as sess:
+        sess['user_id'] = staff.id
+    body = client.get("/api/customers/analytics").get_json()
+    assert body["data"] == [] and body["meta"]["total_count"] == 0
+
+def test_stats_refresh_only_changed_customers(app, client, setup, monkeypatch):
+    c0, c1, c2, c3 = setup["customers"]
+    calls = []
+    load_stats = analytics.load_stats
+    monkeypatch.setattr(analytics, "load_stats", lambda tenant_id, customer_ids=None: (
+        calls.append(customer_ids), load_stats(tenant_id, customer_ids))[1])
+
+    def rows():
+        data = client.get("/api/customers/analytics", query_string={"sort": "customer_id", "order": "asc"})
+        return {r["customer_id"]: r for r in data.get_json()["data"]}
+
+    assert rows()[c3]["bookings"] == 0
+    assert rows()[c3]["bookings"] == 0
+    assert calls == [None]
+
+    start = setup["now"] - timedelta(days=1)
+    booking = Booking(tenant_id=setup["tenant"], room_id=setup["room"], customer_id=c3, start_time=start,
+                      end_time=start + timedelta(hours=2), total_amount=Decimal("40.00"))
+    db.session.add(booking)
+    db.session.commit()
+    assert rows()[c3]["spend"] == 40.0
+    assert calls == [None, [c3]]
+
+    # Moving the booking to another customer refreshes both
+    booking.customer_id = c2
+    db.session.commit()
+    current = rows()
+    assert current[c3]["bookings"] == 0 and current[c2]["bookings"] == 2
+    assert sorted(calls[-1]) == sorted([c2, c3])
+
+    # Rolled-back changes mark nothing
+    booking.status = "cancelled"
+    db.session.flush()
+    db.session.rollback()
+    rows()
+    assert len(calls) == 3
+
+    # A room rate change reloads the tenant
+    db.session.get(Room, setup["room"]).hourly_rate = Decimal("20.00")
+    db.session.commit()
+    assert rows()[c2]["spend"] == 100.0
+    assert calls[-1] is None
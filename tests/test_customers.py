@@ -1 +1,308 @@
 ﻿# Customer management tests
+import pytest
+from app import create_app, db
+from app.models import Tenant, Studio, Customer, User
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config.update({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "SESSION_COOKIE_SECURE": False,
+    })
+    with app.app_context():
+        db.create_all()
+        yield app.test_client()
+        db.drop_all()
+
+@pytest.fixture
+def manager(client):
+    tenant = Tenant(name="T", subdomain="t-customers")
+    db.session.add(tenant)
+    db.session.flush()
+    studio = Studio(tenant_id=tenant.id, name="S")
+    db.session.add(studio)
+    db.session.flush()
+    user = User(tenant_id=tenant.id, studio_id=studio.id, name="M", email="m@example.com",
+                password_hash="x", role="Studio Manager", permissions=[])
+    db.session.add(user)
+    db.session.commit()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user.id
+    return user
+
+def _seed(user, n):
+    for i in range(n):
+        # Duplicate names exercise the id tiebreaker
+        db.session.add(Customer(tenant_id=user.tenant_id, studio_id=user.studio_id,
+                                name=f"Customer {i // 2:03d}", email=f"c{i}@example.com"))
+    db.session.commit()
+
+def test_list_customers_offset_mode(client, manager):
+    _seed(manager, 5)
+    res = client.get("/api/customers?per_page=2&page=2")
+    assert res.status_code == 200
+    body = res.get_json()
+    assert body["meta"]["total_count"] == 5
+    assert body["meta"]["page"] == 2
+    assert len(body["data"]) == 2
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_list_customers_cursor_mode(client, manager, order):
+    _seed(manager, 7)
+    expected = [c["id"] for c in client.get(f"/api/customers?per_page=100&order={order}").get_json()["data"]]
+
+    seen, cursor, pages = [], "", 0
+    while cursor is not None:
+        res = client.get(f"/api/customers?per_page=3&order={order}&cursor={cursor}")
+        assert res.status_code == 200
+        body = res.get_json()
+        assert body["meta"]["total_count"] is None
+        seen.extend(c["id"] for c in body["data"])
+        cursor = body["meta"]["next_cursor"]
+        pages += 1
+    assert seen == expected
+    assert pages == 3
+
+def test_list_customers_cursor_validation(client, manager):
+    _seed(manager, 3)
+    body = client.get("/api/customers?per_page=1&cursor=&include_total=true").get_json()
+    assert body["meta"]["total_count"] == 3
+    cursor = body["meta"]["next_cursor"]
+
+    # Cursor issued for another sort order is rejected
+    res = client.get(f"/api/customers?per_page=1&sort=email&cursor={cursor}")
+    assert res.status_code == 400
+    res = client.get("/api/customers?cursor=not-a-cursor")
+    assert res.status_code == 400
+
+@pytest.mark.parametrize("backend", ["fts5", "ngram", "ilike"])
+def test_search_backends_stay_in_sync(client, manager, backend):
+    from flask import current_app
+    current_app.config["CUSTOMER_SEARCH_BACKEND"] = backend
+
+    for name, email in [("Annabel Lee", "al@example.com"), ("Anna", "anna@example.com"),
+                        ("Joanna Smith", "jo@example.com"), ("Bob", "bob@example.com")]:
+        res = client.post("/api/customers", json={"name": name, "email": email})
+        assert res.status_code == 201
+
+    names = [c["name"] for c in client.get("/api/customers?search=anna").get_json()["data"]]
+    assert sorted(names) == ["Anna", "Annabel Lee", "Joanna Smith"]
+    if backend != "ilike":
+        # Exact/prefix matches rank ahead of mid-word matches
+        assert names[-1] == "Joanna Smith"
+
+    bob = Customer.query.filter_by(email="bob@example.com").first()
+    manager.role = "Admin"
+    db.session.commit()
+    assert client.put(f"/api/customers/{bob.id}", json={"name": "Bobanna"}).status_code == 200
+    names = [c["name"] for c in client.get("/api/customers?search=anna&sort=name").get_json()["data"]]
+    assert names == ["Anna", "Annabel Lee", "Bobanna", "Joanna Smith"]
+
+    anna = Customer.query.filter_by(email="anna@example.com").first()
+    assert client.delete(f"/api/customers/{anna.id}").status_code == 200
+    names = [c["name"] for c in client.get("/api/customers?search=anna&sort=name").get_json()["data"]]
+    assert names == ["Annabel Lee", "Bobanna", "Joanna Smith"]
+
+def test_bulk_import_csv_reports_row_errors(client, manager):
+    from flask import current_app
+    current_app.config["BULK_IMPORT_CHUNK_SIZE"] = 2
+    db.session.add(Customer(tenant_id=manager.tenant_id, studio_id=manager.studio_id,
+                            name="Existing", email="existing@example.com"))
+    db.session.commit()
+
+    body = (
+        "name,email,phone\n"
+        "Ann,ann@example.com,123\n"
+        ",missing-name@example.com,\n"
+        "Dup,existing@example.com,\n"
+        "Ann Again,ann@example.com,\n"
+        "Ben,ben@example.com,\n"
+    )
+    res = client.post("/api/customers/import", data=body, content_type="text/csv")
+    assert res.status_code == 200
+    data = res.get_json()["data"]
+    assert data["created"] == 2
+    assert data["failed"] == 3
+    assert {e["row"]: list(e["errors"]) for e in data["errors"]} == {3: ["name"], 4: ["email"], 5: ["email"]}
+    assert Customer.query.filter_by(tenant_id=manager.tenant_id).count() == 3
+
+    # Imported rows are searchable straight away
+    names = [c["name"] for c in client.get("/api/customers?search=ben").get_json()["data"]]
+    assert names == ["Ben"]
+
+def test_bulk_import_requires_a_studio_for_users_without_one(client, manager):
+    admin = User(tenant_id=manager.tenant_id, studio_id=None, name="A", email="a@example.com",
+                 password_hash="x", role="Admin", permissions=[])
+    db.session.add(admin)
+    db.session.commit()
+    with client.session_transaction() as sess:
+        sess['user_id'] = admin.id
+    lines = "\n".join([
+        '{"name": "Cara", "email": "cara@example.com"}',
+        '{"name": "Dan", "email": "dan@example.com", "studio_id": %d}' % manager.studio_id,
+    ])
+    data = client.post("/api/customers/import", data=lines, content_type="application/x-ndjson").get_json()["data"]
+    assert data["created"] == 1
+    assert data["errors"] == [{"row": 1, "errors": {"studio_id": ["Studio is required"]}}]
+
+def test_bulk_import_ndjson_and_export_round_trip(client, manager):
+    lines = "\n".join([
+        '{"name": "Cara", "email": "cara@example.com", "notes": "vip"}',
+        'not json',
+        '{"name": "Dan", "email": "dan@example.com"}',
+    ])
+    res = client.post("/api/customers/import", data=lines, content_type="application/x-ndjson")
+    data = res.get_json()["data"]
+    assert data["created"] == 2
+    assert data["errors"] == [{"row": 2, "errors": {"record": ["Invalid JSON"]}}]
+
+    assert client.post("/api/customers/import", data="x", content_type="text/plain").status_code == 415
+
+    res = client.get("/api/customers/export?format=ndjson")
+    assert res.status_code == 200
+    import json
+    rows = [json.loads(line) for line in res.get_data(as_text=True).splitlines()]
+    assert [r["email"] for r in rows] == ["cara@example.com", "dan@example.com"]
+
+    res = client.get("/api/customers/export")
+    assert res.mimetype == "text/csv"
+    lines = res.get_data(as_text=True).splitlines()
+    assert lines[0].startswith("id,tenant_id,studio_id,name,email")
+    assert len(lines) == 3
+
+def _stats(customer_id):
+    c = db.session.get(Customer, customer_id)
+    db.session.refresh(c)
+    return c.booking_count, c.last_booking_at, c.total_spend
+
+def test_booking_stats_maintained_on_booking_changes(client, manager):
+    from datetime import datetime, timedelta
+    from decimal import Decimal
+    from app.customers import stats
+    from app.models import Booking, Room
+    room = Room(tenant_id=manager.tenant_id, studio_id=manager.studio_id, name="R", capacity=2,
+                hourly_rate=Decimal("12.00"))
+    a = Customer(tenant_id=manager.tenant_id, studio_id=manager.studio_id, name="A", email="a@example.com")
+    b = Customer(tenant_id=manager.tenant_id, studio_id=manager.studio_id, name="B", email="b@example.com")
+    db.session.add_all([room, a, b])
+    db.session.commit()
+    assert _stats(a.id) == (0, None, Decimal("0"))
+
+    start = datetime(2025, 3, 1, 10)
+
+    def book(customer, days, amount=None):
+        booking = Booking(tenant_id=manager.tenant_id, room_id=room.id, customer_id=customer.id,
+                          start_time=start + timedelta(days=days), end_time=start + timedelta(days=days, hours=1),
+                          total_amount=amount)
+        db.session.add(booking)
+        db.session.commit()
+        return booking
+
+    first = book(a, 0, Decimal("40.00"))
+    latest = book(a, 10, Decimal("25.50"))
+    unpriced = book(a, 5)  # valued at the room rate, earlier than the latest
+    assert _stats(a.id) == (3, start + timedelta(days=10), Decimal("77.50"))
+
+    first.total_amount = Decimal("30.00")
+    db.session.commit()
+    assert _stats(a.id)[2] == Decimal("67.50")
+
+    # Cancelling the latest booking falls back to the next one
+    latest.status = "cancelled"
+    db.session.commit()
+    assert _stats(a.id) == (2, start + timedelta(days=5), Decimal("42.00"))
+    latest.status = "confirmed"
+    db.session.commit()
+    assert _stats(a.id) == (3, start + timedelta(days=10), Decimal("67.50"))
+
+    # Moving a booking to another customer moves its stats
+    latest.customer_id = b.id
+    db.session.commit()
+    assert _stats(a.id) == (2, start + timedelta(days=5), Decimal("42.00"))
+    assert _stats(b.id) == (1, start + timedelta(days=10), Decimal("25.50"))
+
+    db.session.delete(first)
+    db.session.commit()
+    assert _stats(a.id) == (1, start + timedelta(days=5), Decimal("12.00"))
+
+    # Unpriced bookings follow their length and the room's rate
+    unpriced.end_time = unpriced.start_time + timedelta(minutes=90)
+    db.session.commit()
+    assert _stats(a.id)[2] == Decimal("18.00")
+    room.hourly_rate = Decimal("20.00")
+    db.session.commit()
+    assert _stats(a.id)[2] == Decimal("30.00")
+    assert stats.rebuild() == 0
+
+    # Rolled back changes leave the stats alone; the backfill finds nothing to fix
+    book(a, 20, Decimal("10.00"))
+    db.session.rollback()
+    assert stats.rebuild() == 0
+    db.session.commit()
+
+def test_booking_stats_backfill_and_bulk_series(client, manager):
+    from datetime import datetime, timedelta
+    from decimal import Decimal
+    import sqlalchemy as sa
+    from app.customers import stats
+    from app.models import Booking, Room
+    from app.rooms.recurrence import create_series
+    room = Room(tenant_id=manager.tenant_id, studio_id=manager.studio_id, name="R", capacity=2)
+    a = Customer(tenant_id=manager.tenant_id, studio_id=manager.studio_id, name="A", email="a@example.com")
+    db.session.add_all([room, a])
+    db.session.commit()
+
+    start = datetime(2030, 1, 7, 9)
+    create_series(manager.tenant_id, room.id, a.id, start, 60, "FREQ=WEEKLY;COUNT=4",
+                  total_amount=Decimal("20.00"), now=start)
+    db.session.commit()
+    assert _stats(a.id) == (4, start + timedelta(weeks=3), Decimal("80.00"))
+
+    # Bulk statements bypass the mapper events; the backfill corrects them
+    db.session.execute(sa.update(Booking).where(Booking.customer_id == a.id).values(status="cancelled"))
+    db.session.commit()
+    assert _stats(a.id)[0] == 4
+    assert stats.rebuild(manager.tenant_id) == 1
+    db.session.commit()
+    assert _stats(a.id) == (0, None, Decimal("0"))
+    assert stats.rebuild() == 0
+    db.session.commit()
+
+def test_list_customers_sort_and_filter_by_booking_stats(client, manager):
+    from datetime import datetime
+    from decimal import Decimal
+    _seed(manager, 7)
+    customers = Customer.query.order_by(Customer.id).all()
+    for n, c in enumerate(customers):
+        # Ties on spend exercise the id tiebreaker; the first customer has no bookings
+        c.booking_count, c.total_spend = n, Decimal(n // 2 * 15)
+        c.last_booking_at = datetime(2025, 1, n + 1) if n else None
+    db.session.commit()
+
+    body = client.get("/api/customers?sort=total_spend&order=desc&per_page=100").get_json()
+    expected = [c["id"] for c in body["data"]]
+    assert expected == [c.id for c in sorted(customers, key=lambda c: (c.total_spend, c.id), reverse=True)]
+    assert body["data"][0]["total_spend"] == 45.0 and body["data"][-1]["total_spend"] == 0.0
+
+    seen, cursor = [], ""
+    while cursor is not None:
+        res = client.get(f"/api/customers?sort=total_spend&order=desc&per_page=3&cursor={cursor}")
+        assert res.status_code == 200
+        seen.extend(c["id"] for c in res.get_json()["data"])
+        cursor = res.get_json()["meta"]["next_cursor"]
+    assert seen == expected
+
+    counts = [c["booking_count"] for c in client.get("/api/customers?sort=booking_count&cursor=").get_json()["data"]]
+    assert counts == list(range(7))
+
+    body = client.get("/api/customers?min_bookings=2&min_spend=15&last_booking_before=2025-01-06T00:00:00Z"
+                      "&sort=last_booking_at&order=desc").get_json()
+    assert [c["booking_count"] for c in body["data"]] == [4, 3, 2]
+    assert body["data"][0]["last_booking_at"] == "2025-01-05T00:00:00Z"
+    assert body["meta"]["total_count"] == 3
+    assert client.get("/api/customers?last_booking_after=2025-01-07").get_json()["meta"]["total_count"] == 1
+
+    for bad in ("min_bookings=x", "min_spend=NaN", "last_booking_after=yesterday"):
+        assert client.get(f"/api/customers?{bad}").status_code == 400
@@ -0,0 +1,163 @@
+﻿# Background job tests
+import io
+import json
+import os
+import time
+import zipfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from app import create_app, db, jobs
+from app.models import Booking, Customer, Job, Room, Studio, Tenant, User
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app()
+    app.config.update({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "SESSION_COOKIE_SECURE": False,
+        "JOBS_EXECUTOR": "eager",
+        "JOBS_RESULT_DIR": str(tmp_path),
+    })
+    jobs.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+@pytest.fixture
+def seeded(app):
+    tenant = Tenant(name="T", subdomain="t-jobs")
+    db.session.add(tenant)
+    db.session.flush()
+    studio = Studio(tenant_id=tenant.id, name="S")
+    db.session.add(studio)
+    db.session.flush()
+    room = Room(tenant_id=tenant.id, studio_id=studio.id, name="R", capacity=4, hourly_rate=Decimal("20.00"))
+    customer = Customer(tenant_id=tenant.id, studio_id=studio.id, name="C", email="c@example.com")
+    manager = User(tenant_id=tenant.id, studio_id=studio.id, name="M", email="m@example.com",
+                   password_hash="x", role="Studio Manager", permissions=[])
+    admin = User(tenant_id=tenant.id, studio_id=studio.id, name="A", email="a@example.com",
+                 password_hash="x", role="Admin", permissions=[])
+    db.session.add_all([room, customer, manager, admin])
+    db.session.flush()
+    start = datetime(2025, 3, 3, 9)
+    db.session.add(Booking(tenant_id=tenant.id, room_id=room.id, customer_id=customer.id, start_time=start,
+                           end_time=start + timedelta(hours=2), total_amount=Decimal("50.00")))
+    db.session.commit()
+    return {"tenant": tenant.id, "manager": manager.id, "admin": admin.id}
+
+def _client(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+    return client
+
+RANGE = {"start": "2025-03-03T00:00:00Z", "end": "2025-03-10T00:00:00Z"}
+
+def test_report_job_matches_synchronous_report(app, seeded):
+    client = _client(app, seeded["manager"])
+    query = {**RANGE, "group_by": "room"}
+    res = client.post("/api/reports/revenue/jobs", query_string=query)
+    assert res.status_code == 202
+    job = res.get_json()["data"]
+    assert res.headers["Location"] == job["status_url"] == f"/api/jobs/{job['id']}"
+
+    status = client.get(job["status_url"]).get_json()["data"]
+    assert status["status"] == "succeeded" and status["progress"] == 1.0
+    result = client.get(status["result_url"]).get_json()["data"]
+    sync = client.get("/api/reports/revenue", query_string=query).get_json()
+    assert result["data"] == sync["data"]
+    assert result["meta"] == sync["meta"]
+
+    assert client.post("/api/reports/revenue/jobs", query_string={**RANGE, "bucket": "year"}).status_code == 400
+
+def test_async_import(app, seeded):
+    client = _client(app, seeded["manager"])
+    body = "name,email\n" + "".join(f"I{i},i{i}@example.com\n" for i in range(30)) + "Bad,c@example.com\n"
+    res = client.post("/api/customers/import?async=true", data=body, content_type="text/csv")
+    assert res.status_code == 202
+    job = db.session.get(Job, res.get_json()["data"]["id"])
+    assert job.status == "succeeded"
+    assert job.result["created"] == 30 and job.result["failed"] == 1
+    assert Customer.query.filter_by(tenant_id=seeded["tenant"]).count() == 31
+    # The spooled upload is removed once imported
+    assert os.listdir(app.config["JOBS_RESULT_DIR"]) == []
+
+def test_tenant_export(app, seeded):
+    # The tenant's Studio Manager (its admin) may export it, but no other tenant
+    manager = _client(app, seeded["manager"])
+    assert manager.post(f"/api/tenants/{seeded['tenant'] + 1}/export").status_code == 403
+    assert manager.post(f"/api/tenants/{seeded['tenant']}/export").status_code == 202
+
+    client = _client(app, seeded["admin"])
+    res = client.post(f"/api/tenants/{seeded['tenant']}/export")
+    assert res.status_code == 202
+    status = client.get(res.headers["Location"]).get_json()["data"]
+    assert status["result"]["tables"]["customers"] == 1
+    assert status["has_file"]
+
+    download = client.get(status["result_url"])
+    assert download.status_code == 200
+    assert download.mimetype == "application/zip"
+    assert f"tenant-{seeded['tenant']}.zip" in download.headers["Content-Disposition"]
+    with zipfile.ZipFile(io.BytesIO(download.data)) as archive:
+        assert json.loads(archive.read("tenant.json"))["subdomain"] == "t-jobs"
+        users = [json.loads(line) for line in archive.read("users.ndjson").splitlines()]
+        assert {u["email"] for u in users} == {"m@example.com", "a@example.com"}
+        assert "password_hash" not in users[0]
+        assert len(archive.read("bookings.ndjson").splitlines()) == 1
+
+def test_failed_job_and_visibility(app, seeded):
+    @jobs.job("tests.fail")
+    def fail(ctx, reason):
+        ctx.progress(1, 4, message="started")
+        raise RuntimeError(reason)
+
+    client = _client(app, seeded["manager"])
+    with app.test_request_context():
+        job_id = jobs.submit("tests.fail", {"reason": "boom"}, user=db.session.get(User, seeded["manager"])).id
+    status = client.get(f"/api/jobs/{job_id}").get_json()["data"]
+    assert status["status"] == "failed"
+    assert status["error"] == "RuntimeError: boom"
+    assert status["progress"] == 0.25 and status["message"] == "started"
+    assert client.get(f"/api/jobs/{job_id}/result").status_code == 409
+    assert [j["id"] for j in client.get("/api/jobs").get_json()["data"]] == [job_id]
+
+    # Admins of the tenant see it; a stranger does not
+    assert _client(app, seeded["admin"]).get(f"/api/jobs/{job_id}").status_code == 200
+    other = User(tenant_id=seeded["tenant"], name="O", email="o@example.com", password_hash="x",
+                 role="Receptionist", permissions=[])
+    db.session.add(other)
+    db.session.commit()
+    assert _client(app, other.id).get(f"/api/jobs/{job_id}").status_code == 404
+
+def test_thread_executor_runs_in_background(app, seeded):
+    app.config["JOBS_EXECUTOR"] = "thread"
+    jobs.init_app(app)
+    client = _client(app, seeded["manager"])
+    res = client.post("/api/reports/heatmap/jobs", query_string=RANGE)
+    assert res.status_code == 202
+    deadline = time.monotonic() + 10
+    while True:
+        status = client.get(res.headers["Location"]).get_json()["data"]
+        if status["status"] in jobs.FINISHED or time.monotonic() > deadline:
+            break
+        time.sleep(0.05)
+    assert status["status"] == "succeeded"
+    assert status["result"]["data"]["peak"]["weekday"] == "Monday"
+
+def test_purge_expired(app, seeded, tmp_path):
+    client = _client(app, seeded["admin"])
+    job_id = client.post(f"/api/tenants/{seeded['tenant']}/export").get_json()["data"]["id"]
+    job = db.session.get(Job, job_id)
+    path = tmp_path / job.result_file
+    assert path.exists()
+    assert jobs.purge_expired(3600) == 0
+    job.finished_at -= timedelta(hours=2)
+    db.session.commit()
+    assert jobs.purge_expired(3600) == 1
+    assert not path.exists()
+    assert db.session.get(Job, job_id) is None
@@ -0,0 +1,224 @@
+﻿# Live events (pub/sub bus and SSE stream) tests
+import json
+import queue
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from app import create_app, db, live
+from app.live import Event, MemoryBus, RedisBus
+from app.models import Booking, Customer, Room, Studio, Tenant, User
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config.update({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "SESSION_COOKIE_SECURE": False,
+        "LIVE_BACKEND": "memory",
+        "LIVE_QUEUE_SIZE": 4,
+    })
+    live.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+@pytest.fixture
+def seeded(app):
+    ids = {}
+    for name in ("a", "b"):
+        tenant = Tenant(name=name.upper(), subdomain=f"live-{name}")
+        db.session.add(tenant)
+        db.session.flush()
+        studio = Studio(tenant_id=tenant.id, name="S")
+        db.session.add(studio)
+        db.session.flush()
+        room = Room(tenant_id=tenant.id, studio_id=studio.id, name="R", capacity=4, hourly_rate=Decimal("20.00"))
+        customer = Customer(tenant_id=tenant.id, studio_id=studio.id, name="C", email=f"c@{name}.example.com")
+        user = User(tenant_id=tenant.id, studio_id=studio.id, name="M", email=f"m@{name}.example.com",
+                    password_hash="x", role="Studio Manager", permissions=[])
+        db.session.add_all([room, customer, user])
+        db.session.flush()
+        ids[name] = {"tenant": tenant.id, "studio": studio.id, "room": room.id, "customer": customer.id, "user": user.id}
+    admin = User(name="G", email="g@example.com", password_hash="x", role="Admin", permissions=[])
+    db.session.add(admin)
+    db.session.commit()
+    ids["admin"] = admin.id
+    return ids
+
+def _booking(ids, hours_from_now=1):
+    start = datetime.utcnow() + timedelta(hours=hours_from_now)
+    return Booking(tenant_id=ids["tenant"], room_id=ids["room"], customer_id=ids["customer"],
+                   start_time=start, end_time=start + timedelta(hours=1))
+
+def _parse(frames):
+    """[(event, data)] from an SSE body."""
+    out = []
+    for block in frames.decode().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line and not line.startswith(":"))
+        if "event" in fields:
+            out.append((fields["event"], json.loads(fields["data"])))
+    return out
+
+def _drain(sub):
+    events, dropped = sub.get(timeout=0)
+    return [(e.type, json.loads(e.frame.split(b"data: ", 1)[1])) for e in events], dropped
+
+def test_commits_publish_to_tenant_and_global_subscribers(app, seeded):
+    bus = app.extensions["live"]
+    sub_a, sub_b, sub_all = bus.subscribe(seeded["a"]["tenant"]), bus.subscribe(seeded["b"]["tenant"]), bus.subscribe()
+
+    booking = _booking(seeded["a"])
+    db.session.add(booking)
+    db.session.commit()
+    booking.status = "cancelled"
+    db.session.commit()
+
+    events, dropped = _drain(sub_a)
+    assert dropped == 0
+    assert [kind for kind, _ in events] == ["booking.created", "booking.updated"]
+    assert events[0][1]["id"] == booking.id and events[1][1]["status"] == "cancelled"
+    assert _drain(sub_b) == ([], 0)
+    assert [kind for kind, _ in _drain(sub_all)[0]] == ["booking.created", "booking.updated"]
+
+    # Rolled-back changes are never published
+    db.session.add(Customer(tenant_id=seeded["a"]["tenant"], studio_id=seeded["a"]["studio"], name="X", email="x@a.example.com"))
+    db.session.flush()
+    db.session.rollback()
+    assert _drain(sub_a) == ([], 0)
+
+    for sub in (sub_a, sub_b, sub_all):
+        sub.close()
+    assert bus.subscriber_count() == 0
+
+def test_nothing_is_collected_without_subscribers(app, seeded):
+    db.session.add(_booking(seeded["a"]))
+    db.session.flush()
+    assert live._EVENTS_KEY not in db.session.info
+    db.session.commit()
+
+    assert not RedisBus(RedisStandIn(), "live-test", publishing=False).wants_events()
+    assert RedisBus(RedisStandIn(), "live-test").wants_events()
+
+def test_slow_consumer_keeps_newest_events():
+    bus = MemoryBus(maxsize=3)
+    sub = bus.subscribe(1)
+    bus.publish([Event.build(1, "booking.created", json.dumps({"id": i}).encode()) for i in range(10)])
+    events, dropped = _drain(sub)
+    assert [data["id"] for _, data in events] == [7, 8, 9]
+    assert dropped == 7
+
+    stream = live.stream(sub, heartbeat=0.01, max_seconds=5)
+    assert next(stream) == b"retry: 3000\n\n"
+    bus.publish([Event.build(1, "booking.created", b'{"id":%d}' % i) for i in range(5)])
+    assert _parse(next(stream)) == [("resync", {"dropped": 2})] + [("booking.created", {"id": i}) for i in (2, 3, 4)]
+    assert next(stream) == b": keep-alive\n\n"
+    stream.close()
+    assert bus.subscriber_count() == 0
+
+def test_event_stream_is_scoped_to_the_tenant(app, seeded, client):
+    app.config.update(LIVE_HEARTBEAT=0.05, LIVE_STREAM_MAX_SECONDS=0.3)
+    assert client.get("/api/tenants/events").status_code == 401
+
+    with client.session_transaction() as sess:
+        sess["user_id"] = seeded["a"]["user"]
+    resp = client.get("/api/tenants/events?types=booking")
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/event-stream"
+    assert resp.headers["Cache-Control"] == "no-cache"
+
+    db.session.add_all([_booking(seeded["a"]), _booking(seeded["b"]),
+                        Customer(tenant_id=seeded["a"]["tenant"], studio_id=seeded["a"]["studio"], name="N",
+                                 email="n@a.example.com")])
+    db.session.commit()
+
+    events = _parse(resp.get_data())
+    assert [(kind, data["tenant_id"]) for kind, data in events] == [("booking.created", seeded["a"]["tenant"])]
+    assert app.extensions["live"].subscriber_count() == 0
+
+def test_event_stream_is_scoped_to_the_studio_below_manager(app, seeded, client):
+    app.config.update(LIVE_HEARTBEAT=0.05, LIVE_STREAM_MAX_SECONDS=0.3)
+    tenant_id = seeded["a"]["tenant"]
+    other = Studio(tenant_id=tenant_id, name="Other")
+    db.session.add(other)
+    db.session.flush()
+    other_room = Room(tenant_id=tenant_id, studio_id=other.id, name="R2", capacity=2)
+    receptionist = User(tenant_id=tenant_id, studio_id=seeded["a"]["studio"], name="Rec", email="rec@a.example.com",
+                        password_hash="x", role="Receptionist", permissions=[])
+    db.session.add_all([other_room, receptionist])
+    db.session.commit()
+
+    with client.session_transaction() as sess:
+        sess["user_id"] = receptionist.id
+    resp = client.get("/api/tenants/events")
+    assert resp.status_code == 200
+
+    elsewhere = _booking(seeded["a"])
+    elsewhere.room_id = other_room.id
+    db.session.add_all([
+        Customer(tenant_id=tenant_id, studio_id=other.id, name="Hidden", email="hidden@a.example.com"),
+        Customer(tenant_id=tenant_id, studio_id=seeded["a"]["studio"], name="Shown", email="shown@a.example.com"),
+        elsewhere, _booking(seeded["a"]),
+    ])
+    db.session.commit()
+
+    events = _parse(resp.get_data())
+    assert sorted(kind for kind, _ in events) == ["booking.created", "customer.created"]
+    assert [data["name"] for kind, data in events if kind == "customer.created"] == ["Shown"]
+    assert [data["room_id"] for kind, data in events if kind == "booking.created"] == [seeded["a"]["room"]]
+
+    # A studio-scoped user without a studio gets nothing rather than the whole tenant
+    receptionist.studio_id = None
+    db.session.commit()
+    assert client.get("/api/tenants/events").status_code == 403
+
+def test_live_bookings_counts_bookings_in_progress(app, seeded, client):
+    current = _booking(seeded["a"], hours_from_now=-0.5)
+    later = _booking(seeded["a"], hours_from_now=3)
+    other = _booking(seeded["b"], hours_from_now=-0.5)
+    db.session.add_all([current, later, other])
+    db.session.commit()
+
+    with client.session_transaction() as sess:
+        sess["user_id"] = seeded["a"]["user"]
+    assert client.get("/api/tenants/live-bookings").get_json()["data"] == [
+        {"tenant_id": seeded["a"]["tenant"], "cnt": 1}]
+
+    with client.session_transaction() as sess:
+        sess["user_id"] = seeded["admin"]
+    data = client.get("/api/tenants/live-bookings").get_json()["data"]
+    assert sorted(row["tenant_id"] for row in data) == sorted([seeded["a"]["tenant"], seeded["b"]["tenant"]])
+
+class RedisStandIn:
+    """publish() and a blocking pubsub().listen() over an in-memory queue."""
+
+    def __init__(self):
+        self.messages = queue.Queue()
+
+    def publish(self, channel, payload):
+        self.messages.put({"type": "message", "channel": channel, "data": payload})
+
+    def pubsub(self, **kwargs):
+        return self
+
+    def subscribe(self, channel):
+        pass
+
+    def listen(self):
+        while True:
+            yield self.messages.get()
+
+def test_redis_bus_delivers_through_the_channel():
+    bus = RedisBus(RedisStandIn(), "live-test", maxsize=8)
+    sub = bus.subscribe(2)
+    bus.publish([Event.build(2, "customer.updated", b'{"id":1}'), Event.build(3, "customer.updated", b'{"id":2}')])
+    events, _ = sub.get(timeout=2)
+    deadline = time.monotonic() + 2
+    while not events and time.monotonic() < deadline:
+        events, _ = sub.get(timeout=0.1)
+    assert [(e.tenant_id, e.type) for e in events] == [(2, "customer.updated")]
+    assert events[0].frame == b'event: customer.updated\ndata: {"id":1}\n\n'
+    sub.close()
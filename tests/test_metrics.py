@@ -0,0 +1,110 @@
+﻿# Request metrics tests
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+from app import create_app, db
+from app.metrics import REGISTRY
+from app.models import Tenant, Studio, Customer, User
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config.update({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "SESSION_COOKIE_SECURE": False,
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+def _sample(name, endpoint, method='GET', status='200'):
+    return REGISTRY.get_sample_value(name, {'endpoint': endpoint, 'method': method, 'status': status}) or 0
+
+def test_request_metrics_recorded_per_endpoint(app):
+    client = app.test_client()
+    tenant = Tenant(name="T", subdomain="t-metrics")
+    db.session.add(tenant)
+    db.session.flush()
+    studio = Studio(tenant_id=tenant.id, name="S")
+    db.session.add(studio)
+    db.session.flush()
+    user = User(tenant_id=tenant.id, studio_id=studio.id, name="M", email="m@example.com",
+                password_hash="x", role="Studio Manager", permissions=[])
+    db.session.add_all([user, Customer(tenant_id=tenant.id, studio_id=studio.id, name="C", email="c@example.com")])
+    db.session.commit()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user.id
+
+    count_before = _sample('http_request_duration_seconds_count', 'customers_bp.list_customers')
+    queries_before = _sample('http_request_sql_queries_sum', 'customers_bp.list_customers')
+    size_before = _sample('http_response_size_bytes_sum', 'customers_bp.list_customers')
+    health_queries = _sample('http_request_sql_queries_sum', 'health_check')
+
+    resp = client.get('/api/customers')
+    assert resp.status_code == 200
+    assert client.get('/api/health').status_code == 200
+    assert client.get('/api/no-such-route').status_code == 404
+
+    assert _sample('http_request_duration_seconds_count', 'customers_bp.list_customers') == count_before + 1
+    assert _sample('http_request_sql_queries_sum', 'customers_bp.list_customers') > queries_before
+    assert _sample('http_request_sql_duration_seconds_count', 'customers_bp.list_customers') >= 1
+    assert _sample('http_response_size_bytes_sum', 'customers_bp.list_customers') == size_before + len(resp.data)
+    assert _sample('http_request_sql_queries_sum', 'health_check') == health_queries
+    assert _sample('http_request_duration_seconds_count', 'unmatched', status='404') >= 1
+
+    scrape = client.get('/api/metrics')
+    assert scrape.status_code == 200
+    assert scrape.mimetype == 'text/plain'
+    body = scrape.get_data(as_text=True)
+    assert '# TYPE http_request_duration_seconds histogram' in body
+    assert 'endpoint="customers_bp.list_customers"' in body
+    # The scrape itself is not recorded
+    assert 'endpoint="metrics"' not in body
+
+def test_failed_statements_leave_no_timing_state(app):
+    @app.route('/api/_failing_sql')
+    def failing_sql():
+        for _ in range(3):
+            try:
+                db.session.execute(db.text('SELECT * FROM no_such_table'))
+            except Exception:
+                db.session.rollback()
+        db.session.execute(db.text('SELECT 1'))
+        # Nothing is left on the pooled connection
+        return {"info": sorted(db.session.connection().info)}
+
+    queries_before = _sample('http_request_sql_queries_sum', 'failing_sql')
+    resp = app.test_client().get('/api/_failing_sql')
+    assert resp.get_json() == {"info": []}
+    assert _sample('http_request_sql_queries_sum', 'failing_sql') == queries_before + 1
+
+def test_metrics_token(app):
+    app.config['METRICS_TOKEN'] = 's3cret'
+    client = app.test_client()
+    assert client.get('/api/metrics').status_code == 401
+    assert client.get('/api/metrics', headers={'Authorization': 'Bearer s3cret'}).status_code == 200
+
+def test_metrics_aggregate_across_processes(tmp_path):
+    # Each process stands in for a gunicorn worker sharing PROMETHEUS_MULTIPROC_DIR
+    worker = textwrap.dedent("""
+        from app import create_app
+        app = create_app()
+        app.config['TESTING'] = True
+        client = app.test_client()
+        for _ in range(3):
+            assert client.get('/api/health').status_code == 200
+        print(client.get('/api/metrics').get_data(as_text=True))
+    """)
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path), DATABASE_URL='sqlite:///:memory:')
+    outputs = [subprocess.run([sys.executable, '-c', worker], cwd=REPO_ROOT, env=env,
+                              capture_output=True, text=True, check=True).stdout for _ in range(2)]
+    line = ('http_request_duration_seconds_count{endpoint="health_check",method="GET",status="200"} ')
+    counts = [float(next(l for l in out.splitlines() if l.startswith(line)).split()[-1]) for out in outputs]
+    assert counts == [3.0, 6.0]
@@ -0,0 +1,141 @@
+﻿# SQL statement budgets for the auth, customers and tenants routes
+import logging
+
+import pytest
+from app import create_app, db
+from app.models import Tenant, Studio, Room, Customer, User
+from app.querybudget import QueryBudgetExceeded, count_queries, query_budget, statement_shape
+from werkzeug.security import generate_password_hash
+
+class QueueOnly:
+    """Job executor that leaves jobs queued: budgets cover the request, not the job it submits."""
+
+    def submit(self, app, job_id):
+        pass
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config.update({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "SESSION_COOKIE_SECURE": False,
+        # Event streams end straight away, so their bodies can be read
+        "LIVE_STREAM_MAX_SECONDS": 0.01,
+    })
+    app.extensions["jobs"] = QueueOnly()
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+@pytest.fixture
+def seeded(app):
+    tenant = Tenant(name="T", subdomain="t-budget")
+    db.session.add(tenant)
+    db.session.flush()
+    studio = Studio(tenant_id=tenant.id, name="S")
+    db.session.add(studio)
+    db.session.flush()
+    manager = User(tenant_id=tenant.id, studio_id=studio.id, name="M", email="m@example.com",
+                   password_hash=generate_password_hash("password"), role="Studio Manager", permissions=[])
+    admin = User(tenant_id=None, studio_id=None, name="A", email="a@example.com",
+                 password_hash="x", role="Admin", permissions=[])
+    room = Room(tenant_id=tenant.id, studio_id=studio.id, name="R", capacity=2)
+    # Enough rows that a per-row query would blow every budget below
+    customers = [Customer(tenant_id=tenant.id, studio_id=studio.id, name=f"C{i:02d}", email=f"c{i}@example.com")
+                 for i in range(25)]
+    others = [Tenant(name=f"X{i}", subdomain=f"x-budget-{i}") for i in range(10)]
+    db.session.add_all([manager, admin, room, *customers, *others])
+    db.session.commit()
+    return {"tenant": tenant.id, "room": room.id, "customer": customers[0].id, "spare": customers[1].id,
+            "manager": manager.id, "admin": admin.id}
+
+SLOTS = [{"start_time": f"2025-01-0{day}T09:00:00Z", "end_time": f"2025-01-0{day}T10:00:00Z"} for day in range(1, 6)]
+
+# (route, user, method, path, request kwargs, statement budget)
+ROUTES = [
+    ("register", None, "post", "/api/register",
+     lambda ids: {"json": {"name": "N", "email": "n@example.com", "password": "password"}}, 5),
+    ("login", None, "post", "/api/login",
+     lambda ids: {"json": {"email": "m@example.com", "password": "password"}}, 1),
+    ("session", "manager", "get", "/api/session", lambda ids: {}, 1),
+    ("logout", "manager", "post", "/api/logout", lambda ids: {}, 0),
+    ("validate email", "manager", "post", "/api/validate/email",
+     lambda ids: {"json": {"email": "free@example.com"}}, 2),
+    ("validate booking", "manager", "post", "/api/validate/booking",
+     lambda ids: {"json": {"slots": [{"room_id": ids["room"], **slot} for slot in SLOTS]}}, 4),
+    ("list customers", "manager", "get", "/api/customers", lambda ids: {}, 3),
+    ("list customers (cursor)", "manager", "get", "/api/customers?cursor=", lambda ids: {}, 3),
+    ("customer analytics", "manager", "get", "/api/customers/analytics", lambda ids: {}, 3),
+    ("customer analytics (warm)", "manager", "get", "/api/customers/analytics", lambda ids: {}, 2),
+    ("get customer", "manager", "get", "/api/customers/{customer}", lambda ids: {}, 2),
+    ("create customer", "manager", "post", "/api/customers",
+     lambda ids: {"json": {"name": "New", "email": "new@example.com"}}, 7),
+    ("update customer", "admin", "put", "/api/customers/{customer}",
+     lambda ids: {"json": {"name": "Renamed"}}, 7),
+    ("delete customer", "manager", "delete", "/api/customers/{spare}", lambda ids: {}, 5),
+    ("import customers", "manager", "post", "/api/customers/import",
+     lambda ids: {"data": "name,email\n" + "".join(f"I{i},i{i}@example.com\n" for i in range(50)),
+                  "content_type": "text/csv"}, 7),
+    ("export customers", "manager", "get", "/api/customers/export", lambda ids: {}, 2),
+    ("create tenant", None, "post", "/api/tenants",
+     lambda ids: {"json": {"tenant_name": "New Co", "admin_name": "B", "admin_email": "b@example.com",
+                           "admin_password": "password"}}, 8),
+    ("list tenants", "admin", "get", "/api/tenants", lambda ids: {}, 2),
+    ("get tenant", "manager", "get", "/api/tenants/{tenant}", lambda ids: {}, 1),
+    ("update tenant", "manager", "put", "/api/tenants/{tenant}",
+     lambda ids: {"json": {"name": "T2", "settings": {"theme": "dark"}}}, 3),
+    ("export tenant", "admin", "post", "/api/tenants/{tenant}/export", lambda ids: {}, 4),
+    ("live bookings", "manager", "get", "/api/tenants/live-bookings", lambda ids: {}, 2),
+    ("live events", "manager", "get", "/api/tenants/events", lambda ids: {}, 1),
+]
+# Routes requested once before measuring, so their caches are warm
+WARMED = {"customer analytics (warm)"}
+
+@pytest.mark.parametrize("name,who,method,path,kwargs,budget", ROUTES, ids=[r[0] for r in ROUTES])
+def test_route_query_budget(app, seeded, name, who, method, path, kwargs, budget):
+    client = app.test_client()
+    if who:
+        with client.session_transaction() as sess:
+            sess['user_id'] = seeded[who]
+    if name in WARMED:
+        getattr(client, method)(path.format(**seeded), **kwargs(seeded)).get_data()
+    with query_budget(budget):
+        resp = getattr(client, method)(path.format(**seeded), **kwargs(seeded))
+        resp.get_data()  # streamed bodies run their queries while being read
+    assert resp.status_code < 300, resp.get_data(as_text=True)
+
+def test_budget_exceeded_lists_statements(app, seeded):
+    with pytest.raises(QueryBudgetExceeded) as info:
+        with query_budget(2):
+            for customer_id in range(1, 6):
+                db.session.get(Customer, customer_id)
+    assert '5 SQL statements issued, budget is 2' in str(info.value)
+    assert '5x SELECT customers' in str(info.value)
+
+    @query_budget(1)
+    def one_query():
+        return Customer.query.count()
+    assert one_query() == 25
+
+def test_statement_shape_collapses_in_lists():
+    assert statement_shape("SELECT a\n FROM t WHERE id IN (?, ?,?)") == "SELECT a FROM t WHERE id IN (...)"
+    assert statement_shape("WHERE id IN (%(id_1)s, %(id_2)s)") == "WHERE id IN (...)"
+
+def test_repeated_statements_logged_in_dev_mode(app, seeded, caplog):
+    app.config['QUERY_REPEAT_LOG_THRESHOLD'] = 3
+
+    @app.route('/api/_n_plus_one')
+    def n_plus_one():
+        names = [Customer.query.filter_by(id=i).first().name for i in range(1, 6)]
+        return {"names": names}
+
+    with caplog.at_level(logging.WARNING, logger=app.logger.name):
+        with count_queries() as counter:
+            assert app.test_client().get('/api/_n_plus_one').status_code == 200
+    assert counter.count == 5
+    logged = [r.getMessage() for r in caplog.records if 'possible N+1' in r.getMessage()]
+    assert len(logged) == 1
+    assert 'issued 5 times in GET /api/_n_plus_one' in logged[0]
+    assert 'in n_plus_one' in logged[0]
@@ -0,0 +1,183 @@
+﻿# Rate limiting tests
+import pytest
+import redis
+from werkzeug.security import generate_password_hash
+from app import create_app, db, ratelimit
+from app.models import Tenant, User
+from app.ratelimit import Limit, MemoryBackend, RateLimiter, RedisBackend
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class RedisStandIn:
+    """The slice of the redis client API RedisBackend uses, kept in a dict."""
+
+    def __init__(self):
+        self.data = {}
+        self.down = False
+
+    def _check(self):
+        if self.down:
+            raise redis.ConnectionError('stand-in is down')
+
+    def get(self, key):
+        self._check()
+        return self.data.get(key)
+
+    def incr(self, key, amount=1):
+        self._check()
+        self.data[key] = str(int(self.data.get(key, 0)) + amount).encode()
+        return int(self.data[key])
+
+    def decr(self, key):
+        return self.incr(key, -1)
+
+    def pipeline(self, transaction=True):
+        client, calls = self, []
+
+        class Pipeline:
+            def incr(self, key):
+                calls.append(lambda: client.incr(key))
+
+            def expire(self, key, seconds):
+                calls.append(lambda: True)
+
+            def get(self, key):
+                calls.append(lambda: client.get(key))
+
+            def execute(self):
+                return [call() for call in calls]
+        return Pipeline()
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config.update({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "SESSION_COOKIE_SECURE": False,
+        "RATE_LIMIT_LOGIN_IP": "5/60",
+        "RATE_LIMIT_LOGIN_EMAIL": "3/60",
+        "RATE_LIMIT_TENANT": "2/60",
+    })
+    clock = Clock()
+    app.extensions['rate_limiter'] = RateLimiter(MemoryBackend(), clock=clock)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+def _seed(plan="free"):
+    tenant = Tenant(name="T", subdomain="t-ratelimit", plan=plan)
+    db.session.add(tenant)
+    db.session.flush()
+    for email in ("a@example.com", "b@example.com", "c@example.com", "d@example.com"):
+        db.session.add(User(tenant_id=tenant.id, name="U", email=email, role="Admin", permissions=[],
+                            password_hash=generate_password_hash("password")))
+    db.session.commit()
+    return tenant
+
+def _login(client, email, ip="10.0.0.1", password="wrong"):
+    return client.post('/api/login', json={"email": email, "password": password},
+                       environ_base={"REMOTE_ADDR": ip})
+
+@pytest.mark.parametrize("backend", ["memory", "redis"])
+def test_sliding_window(backend):
+    clock = Clock(600.0)  # start of a 60s window
+    limiter = RateLimiter(MemoryBackend() if backend == "memory" else RedisBackend(RedisStandIn()), clock=clock)
+    limit = Limit(4, 60)
+    assert all(limiter.hit("r", "k", limit)[0] for _ in range(4))
+    allowed, wait = limiter.hit("r", "k", limit)
+    assert not allowed and wait == pytest.approx(60 + 15)
+
+    # 30s into the next window half of the previous count still applies
+    clock.now += 90
+    assert limiter.hit("r", "k", limit) == (True, 0.0)
+    assert limiter.hit("r", "k", limit) == (True, 0.0)
+    allowed, wait = limiter.hit("r", "k", limit)
+    assert not allowed and wait == pytest.approx(15)
+    clock.now += wait
+    assert limiter.hit("r", "k", limit)[0]
+
+def test_memory_prune_keeps_live_windows_of_longer_rules():
+    clock = Clock()
+    limiter = RateLimiter(MemoryBackend(max_keys=3), clock=clock)
+    hourly = Limit(2, 3600)
+    assert limiter.hit("register:ip", "1.2.3.4", hourly)[0]
+    assert limiter.hit("register:ip", "1.2.3.4", hourly)[0]
+    assert not limiter.hit("register:ip", "1.2.3.4", hourly)[0]
+    for n in range(2):
+        limiter.hit("login:ip", f"10.0.0.{n}", Limit(5, 60))
+
+    # Minutes later a 60 s rule overflows the table; only its stale login windows go
+    clock.now += 300
+    limiter.hit("login:ip", "10.0.0.2", Limit(5, 60))
+    assert len(limiter.backend._windows) == 2
+    assert not limiter.hit("register:ip", "1.2.3.4", hourly)[0]
+
+def test_redis_outage_fails_open():
+    client = RedisStandIn()
+    limiter = RateLimiter(RedisBackend(client), clock=Clock())
+    client.down = True
+    assert limiter.hit("r", "k", Limit(1, 60)) == (True, 0.0)
+
+def test_login_limited_per_email(app):
+    clock = app.extensions['rate_limiter'].clock
+    _seed("enterprise")  # keep the tenant quota out of the way
+    client = app.test_client()
+    for i in range(3):
+        assert _login(client, "a@example.com", ip=f"10.0.0.{i}").status_code == 401
+    resp = _login(client, "a@example.com", ip="10.0.0.9")
+    assert resp.status_code == 429
+    assert resp.get_json()["success"] is False
+    assert 1 <= int(resp.headers["Retry-After"]) <= 120
+
+    clock.now += 240
+    assert _login(client, "a@example.com").status_code == 401
+
+def test_login_limited_per_ip(app):
+    client = app.test_client()
+    for i in range(5):
+        assert _login(client, f"nobody{i}@example.com").status_code == 401
+    assert _login(client, "nobody9@example.com").status_code == 429
+    assert _login(client, "nobody9@example.com", ip="10.0.0.2").status_code == 401
+
+@pytest.mark.parametrize("backend", ["memory", "redis"])
+def test_rejected_requests_count_against_no_rule(app, backend):
+    clock = app.extensions['rate_limiter'].clock
+    if backend == "redis":
+        app.extensions['rate_limiter'] = RateLimiter(RedisBackend(RedisStandIn()), clock=clock)
+    _seed("enterprise")
+    client = app.test_client()
+    codes = [_login(client, "a@example.com").status_code for _ in range(6)]
+    assert codes == [401] * 3 + [429] * 3
+    # Logins rejected per email left the IP's budget (5) alone
+    assert [_login(client, f"nobody{i}@example.com").status_code for i in range(3)] == [401, 401, 429]
+
+def test_register_limited_per_email_by_its_own_setting(app):
+    app.config["RATE_LIMIT_REGISTER_EMAIL"] = "1/60"
+    client = app.test_client()
+    body = {"name": "N", "email": "new@example.com", "password": "password1", "tenant_name": "New"}
+    assert client.post('/api/register', json=body).status_code != 429
+    assert client.post('/api/register', json=body, environ_base={"REMOTE_ADDR": "10.9.9.9"}).status_code == 429
+
+@pytest.mark.parametrize("plan,allowed", [("free", 2), ("premium", 10)])
+def test_tenant_quota_scales_with_plan(app, plan, allowed):
+    _seed(plan)
+    client = app.test_client()
+    emails = ["a@example.com", "b@example.com", "c@example.com", "d@example.com"]
+    app.config["RATE_LIMIT_LOGIN_EMAIL"] = "100/60"
+    # Failed logins do not use up the tenant's quota
+    assert all(_login(client, emails[i % 4], ip=f"10.1.{i}.1").status_code == 401 for i in range(12))
+    codes = [_login(client, emails[i % 4], ip=f"10.0.{i}.1", password="password").status_code for i in range(12)]
+    assert codes == [200] * allowed + [429] * (12 - allowed)
+
+def test_disabled(app):
+    app.config["RATE_LIMIT_ENABLED"] = False
+    ratelimit.init_app(app)
+    client = app.test_client()
+    assert all(_login(client, "x@example.com").status_code == 401 for _ in range(10))
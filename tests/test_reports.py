@@ -1 +1,319 @@
 ﻿# Reporting tests
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+import textwrap
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from app import create_app, db
+from app.models import Tenant, Studio, Room, Customer, User, Booking
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config.update({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "SESSION_COOKIE_SECURE": False,
+    })
+    with app.app_context():
+        db.create_all()
+        yield app.test_client()
+        db.drop_all()
+
+@pytest.fixture
+def setup(client):
+    tenant = Tenant(name="T", subdomain="t-reports")
+    db.session.add(tenant)
+    db.session.flush()
+    studio = Studio(tenant_id=tenant.id, name="S")
+    db.session.add(studio)
+    db.session.flush()
+    rooms = [Room(tenant_id=tenant.id, studio_id=studio.id, name=f"R{i}", capacity=4,
+                  hourly_rate=Decimal("20.00")) for i in range(2)]
+    customer = Customer(tenant_id=tenant.id, studio_id=studio.id, name="C", email="c@example.com")
+    user = User(tenant_id=tenant.id, studio_id=studio.id, name="M", email="m@example.com",
+                password_hash="x", role="Studio Manager", permissions=[])
+    db.session.add_all(rooms + [customer, user])
+    db.session.flush()
+
+    def book(room, start, hours, amount=None, status="confirmed"):
+        db.session.add(Booking(tenant_id=tenant.id, room_id=room.id, customer_id=customer.id,
+                               start_time=start, end_time=start + timedelta(hours=hours),
+                               status=status, total_amount=amount))
+
+    monday = datetime(2025, 3, 3)
+    book(rooms[0], monday + timedelta(hours=9), 2, Decimal("50.00"))
+    book(rooms[0], monday + timedelta(days=1, hours=22), 4)            # runs past midnight, priced at the rate
+    book(rooms[1], monday + timedelta(hours=9, minutes=30), 1, Decimal("25.00"))
+    book(rooms[1], monday + timedelta(hours=12), 3, Decimal("99.00"), status="cancelled")
+    book(rooms[1], monday - timedelta(hours=1), 2, Decimal("40.00"))   # starts before the range
+    db.session.commit()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user.id
+    return {"rooms": rooms, "studio": studio, "monday": monday}
+
+RANGE = {"start": "2025-03-03T00:00:00Z", "end": "2025-03-10T00:00:00Z"}
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def test_occupancy_report(client, setup):
+    res = client.get("/api/reports/occupancy", query_string=RANGE)
+    assert res.status_code == 200
+    data = res.get_json()["data"]
+    rooms = {r["name"]: r for r in data["rooms"]}
+    assert rooms["R0"]["booked_hours"] == 6
+    assert rooms["R0"]["revenue"] == 50 + 4 * 20
+    # Clipped to the range: only the hour after midnight counts
+    assert rooms["R1"]["booked_hours"] == 2
+    assert rooms["R1"]["revenue"] == 65
+    assert rooms["R0"]["available_hours"] == 7 * 24
+    assert data["totals"]["occupancy_pct"] == round(8 / (2 * 7 * 24) * 100, 2)
+
+    # With opening hours only booked time inside them counts towards occupancy
+    client.application.config.update(REPORTS_OPEN_HOUR=9, REPORTS_CLOSE_HOUR=17)
+    data = client.get("/api/reports/occupancy", query_string=RANGE).get_json()["data"]
+    rooms = {r["name"]: r for r in data["rooms"]}
+    assert rooms["R0"]["booked_hours"] == 6 and rooms["R0"]["available_hours"] == 7 * 8
+    assert rooms["R0"]["occupancy_pct"] == round(2 / (7 * 8) * 100, 2)
+    assert rooms["R1"]["occupancy_pct"] == round(1 / (7 * 8) * 100, 2)
+    assert data["totals"]["occupancy_pct"] == round(3 / (2 * 7 * 8) * 100, 2)
+
+def test_revenue_report_buckets(client, setup):
+    res = client.get("/api/reports/revenue", query_string=RANGE)
+    days = res.get_json()["data"]
+    assert len(days) == 7
+    assert days[0] == {"period": "2025-03-03", "bookings": 3, "booked_hours": 4.0, "revenue": 115.0}
+    # Attributed to the start day
+    assert days[1]["booked_hours"] == 4.0 and days[1]["revenue"] == 80.0
+    assert all(d["revenue"] == 0 for d in days[2:])
+
+    res = client.get("/api/reports/revenue", query_string={**RANGE, "bucket": "month"})
+    assert res.get_json()["data"] == [{"period": "2025-03-01", "bookings": 4, "booked_hours": 8.0, "revenue": 195.0}]
+
+    res = client.get("/api/reports/revenue", query_string={**RANGE, "group_by": "studio"})
+    assert res.get_json()["data"] == [{"studio_id": setup["studio"].id, "bookings": 4, "booked_hours": 8.0, "revenue": 195.0}]
+
+    assert client.get("/api/reports/revenue", query_string={**RANGE, "bucket": "year"}).status_code == 400
+
+def test_heatmap_report(client, setup):
+    res = client.get("/api/reports/heatmap", query_string=RANGE)
+    data = res.get_json()["data"]
+    booked = data["booked_hours"]
+    assert booked[0][0] == 1.0                    # Monday 00:00 from the clipped booking
+    assert booked[0][9] == 1.5 and booked[0][10] == 1.5
+    assert booked[1][23] == 1.0 and booked[2][0] == 1.0 and booked[2][1] == 1.0
+    assert sum(map(sum, booked)) == 8.0
+    assert booked[0][11] == 0
+    # One Monday 09:00 in the range, two rooms
+    assert data["occupancy_pct"][0][9] == 75.0
+    assert data["peak"] == {"weekday": "Monday", "hour": 9, "occupancy_pct": 75.0}
+
+def test_report_validation(client, setup):
+    assert client.get("/api/reports/occupancy", query_string={"start": "nope"}).status_code == 400
+    res = client.get("/api/reports/occupancy", query_string={"start": RANGE["end"], "end": RANGE["start"]})
+    assert res.status_code == 400
+    with client.session_transaction() as sess:
+        sess.pop('user_id')
+    assert client.get("/api/reports/occupancy").status_code == 401
+
+def _rollups():
+    from app.models import BookingDailyRollup
+    return {(r.room_id, r.day.isoformat()): (r.bookings, r.booked_minutes, float(r.amount),
+                                            r.unpriced_minutes, r.cancellations)
+            for r in BookingDailyRollup.query.all()}
+
+def test_rollups_follow_booking_writes(client, setup):
+    from app.reports import rollups
+    r0, r1 = setup["rooms"]
+    assert _rollups()[(r0.id, "2025-03-03")] == (1, 120.0, 50.0, 0.0, 0)
+    assert _rollups()[(r1.id, "2025-03-03")] == (1, 60.0, 25.0, 0.0, 1)
+
+    booking = Booking.query.filter_by(room_id=r0.id, total_amount=Decimal("50.00")).one()
+    booking.status = "cancelled"
+    db.session.commit()
+    assert _rollups()[(r0.id, "2025-03-03")] == (0, 0.0, 0.0, 0.0, 1)
+
+    booking.status = "confirmed"
+    booking.room_id = r1.id
+    db.session.commit()
+    assert _rollups()[(r0.id, "2025-03-03")] == (0, 0.0, 0.0, 0.0, 0)
+    assert _rollups()[(r1.id, "2025-03-03")] == (2, 180.0, 75.0, 0.0, 1)
+
+    db.session.delete(booking)
+    db.session.commit()
+    incremental = {k: v for k, v in _rollups().items() if any(v)}
+    rollups.rebuild()
+    db.session.commit()
+    assert _rollups() == incremental
+
+@pytest.mark.parametrize("start,end", [
+    ("2025-03-03T00:00:00Z", "2025-03-10T00:00:00Z"),
+    ("2025-03-02T23:30:00Z", "2025-03-04T23:00:00Z"),   # partial days at both edges
+    ("2025-03-03T10:00:00Z", "2025-03-05T00:00:00Z"),
+    ("2025-03-04T00:00:00Z", "2025-03-05T00:30:00Z"),   # cuts the booking running past midnight
+])
+def test_rollup_reports_match_raw(client, setup, start, end):
+    from app.reports import engine
+    rng = engine.ReportRange(datetime.fromisoformat(start[:-1]), datetime.fromisoformat(end[:-1]))
+    tenant_id = setup["studio"].tenant_id
+    for report in (engine.occupancy_report, engine.revenue_report):
+        client.application.config["REPORTS_USE_ROLLUPS"] = False
+        raw = report(tenant_id, rng)
+        client.application.config["REPORTS_USE_ROLLUPS"] = True
+        assert report(tenant_id, rng) == raw
+
+def test_bookings_export(client, setup):
+    r0, r1 = setup["rooms"]
+    res = client.get("/api/reports/bookings.csv", query_string=RANGE)
+    assert res.status_code == 200
+    assert res.is_streamed and res.mimetype == "text/csv"
+    assert "bookings.csv" in res.headers["Content-Disposition"]
+    rows = list(csv.DictReader(io.StringIO(res.get_data(as_text=True))))
+    # The booking starting on Sunday is outside the range
+    assert [(r["room_name"], r["start_time"], r["status"], r["total_amount"]) for r in rows] == [
+        ("R0", "2025-03-03T09:00:00Z", "confirmed", "50.00"),
+        ("R1", "2025-03-03T09:30:00Z", "confirmed", "25.00"),
+        ("R1", "2025-03-03T12:00:00Z", "cancelled", "99.00"),
+        ("R0", "2025-03-04T22:00:00Z", "confirmed", ""),
+    ]
+
+    res = client.get("/api/reports/bookings.ndjson", query_string={**RANGE, "status": "cancelled"})
+    lines = [json.loads(line) for line in res.get_data(as_text=True).splitlines()]
+    assert len(lines) == 1
+    assert lines[0]["room_id"] == r1.id and lines[0]["total_amount"] == 99.0
+    assert lines[0]["studio_id"] == setup["studio"].id
+
+    other = client.get("/api/reports/bookings.csv", query_string={**RANGE, "studio_id": setup["studio"].id + 1})
+    assert other.status_code == 400
+
+def test_revenue_export(client, setup):
+    r0, r1 = setup["rooms"]
+    res = client.get("/api/reports/revenue.csv", query_string=RANGE)
+    rows = list(csv.DictReader(io.StringIO(res.get_data(as_text=True))))
+    assert [(r["date"], int(r["room_id"]), r["bookings"], r["booked_hours"], r["revenue"]) for r in rows] == [
+        ("2025-03-03", r0.id, "1", "2.0", "50.0"),
+        ("2025-03-03", r1.id, "1", "1.0", "25.0"),
+        ("2025-03-04", r0.id, "1", "4.0", "80.0"),
+    ]
+    empty = client.get("/api/reports/revenue.csv", query_string={"start": "2024-01-01T00:00:00Z",
+                                                                 "end": "2024-01-02T00:00:00Z"})
+    assert empty.get_data(as_text=True).strip() == ",".join(
+        ["date", "room_id", "room_name", "studio_id", "bookings", "booked_hours", "revenue"])
+
+def test_forecast_fit_recovers_weekly_pattern():
+    import numpy as np
+    from app.reports import forecast
+    pattern = np.array([8.0, 6.0, 6.0, 4.0, 10.0, 2.0, 0.0])
+    flat = np.full(7 * 12, 5.0)
+    history = np.vstack([np.tile(pattern, 12), flat])
+    model = forecast.fit(history, horizon=14)
+    # The history ends on the last day of a week: the forecast starts the pattern over
+    assert np.allclose(model["forecast"][0], np.tile(pattern, 2))
+    assert np.allclose(model["forecast"][1], 5.0)
+    assert np.allclose(model["rmse"], 0.0)
+    noisy = history + np.random.default_rng(1).normal(0, 1, history.shape)
+    variance = forecast.fit(noisy, horizon=14)["variance"]
+    assert (np.diff(variance, axis=1) >= 0).all() and (variance > 0).all()
+    with pytest.raises(ValueError):
+        forecast.fit(history[:, :10], horizon=7)
+
+def test_forecast_endpoint(client, setup):
+    from app.reports.rollups import today
+    r0, r1 = setup["rooms"]
+    customer = Customer.query.first()
+    first = today() - timedelta(days=56)
+    for n in range(56):
+        day = first + timedelta(days=n)
+        if day.weekday() == 0:   # R0: three hours every Monday
+            db.session.add(Booking(tenant_id=r0.tenant_id, room_id=r0.id, customer_id=customer.id,
+                                   start_time=day + timedelta(hours=10), end_time=day + timedelta(hours=13),
+                                   status="confirmed"))
+    db.session.commit()
+
+    res = client.get("/api/reports/forecast", query_string={"history": 56, "horizon": 14})
+    assert res.status_code == 200
+    data = res.get_json()["data"]
+    assert data["days"][0] == today().date().isoformat() and len(data["days"]) == 14
+    rooms = {r["name"]: r for r in data["rooms"]}
+    assert rooms["R0"]["history_hours"] == 24.0
+    mondays = [n for n, day in enumerate(data["days"]) if datetime.fromisoformat(day).weekday() == 0]
+    for n, hours in enumerate(rooms["R0"]["forecast"]):
+        assert hours == pytest.approx(3.0 if n in mondays else 0.0, abs=0.3)
+        assert rooms["R0"]["lower"][n] <= hours <= rooms["R0"]["upper"][n]
+    assert rooms["R1"]["forecast"] == [0.0] * 14
+    assert data["totals"]["forecast"] == [
+        round(a + b, 2) for a, b in zip(rooms["R0"]["forecast"], rooms["R1"]["forecast"])]
+
+    client.application.config["REPORTS_USE_ROLLUPS"] = False
+    raw = client.get("/api/reports/forecast", query_string={"history": 56, "horizon": 14}).get_json()["data"]
+    assert raw == data
+
+    res = client.get("/api/reports/forecast", query_string={"group_by": "studio", "history": 56, "level": 80})
+    studios = res.get_json()["data"]["studios"]
+    assert [(s["studio_id"], s["rooms"]) for s in studios] == [(setup["studio"].id, 2)]
+    assert studios[0]["forecast"] == data["totals"]["forecast"] + studios[0]["forecast"][14:]
+
+    for bad in ({"horizon": 0}, {"history": 7}, {"level": 50}, {"group_by": "day"}):
+        assert client.get("/api/reports/forecast", query_string=bad).status_code == 400
+
+# 50k rows already show whether the export buffers; set EXPORT_TEST_ROWS=2000000 for the full-size run
+EXPORT_ROWS = int(os.environ.get("EXPORT_TEST_ROWS", 50_000))
+
+def test_bookings_export_memory_is_flat(tmp_path):
+    # Separate processes: one fills a database file, a fresh one exports it and
+    # compares its peak RSS before and after streaming every row
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'export.db'}", ROWS=str(EXPORT_ROWS))
+    fill = textwrap.dedent("""
+        import os, sqlite3
+        from datetime import datetime, timedelta
+        from app import create_app, db
+        from app.models import Tenant, Studio, Room, Customer, User
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+            tenant = Tenant(name="T", subdomain="t-export")
+            db.session.add(tenant); db.session.flush()
+            studio = Studio(tenant_id=tenant.id, name="S"); db.session.add(studio); db.session.flush()
+            db.session.add_all([Room(tenant_id=tenant.id, studio_id=studio.id, name="R", capacity=1),
+                                Customer(tenant_id=tenant.id, studio_id=studio.id, name="C", email="c@x.com"),
+                                User(tenant_id=tenant.id, studio_id=studio.id, name="M", email="m@x.com",
+                                     password_hash="x", role="Studio Manager", permissions=[])])
+            db.session.commit()
+            path = db.engine.url.database
+        base = datetime(2025, 1, 1)
+        stamp = lambda seconds: f"{base + timedelta(seconds=seconds):%Y-%m-%d %H:%M:%S.%f}"
+        rows = ((1, 1, 1, stamp(10 * i), stamp(10 * i + 3600), "confirmed", "10.00", stamp(0))
+                for i in range(int(os.environ["ROWS"])))
+        con = sqlite3.connect(path)
+        con.executemany("INSERT INTO bookings (tenant_id, room_id, customer_id, start_time, end_time, status, "
+                        "total_amount, created_at) VALUES (?,?,?,?,?,?,?,?)", rows)
+        con.commit()
+    """)
+    export = textwrap.dedent("""
+        import resource
+        from app import create_app
+        app = create_app()
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["user_id"] = 1
+        query = {"start": "2025-01-01T00:00:00Z", "end": "2025-12-31T00:00:00Z"}
+        client.get("/api/reports/bookings.csv", query_string={"start": query["start"],
+                   "end": "2025-01-01T01:00:00Z"}).get_data()  # warm up
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        lines = 0
+        for chunk in client.get("/api/reports/bookings.csv", query_string=query).iter_encoded():
+            lines += chunk.count(b"\\n")
+        after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print(lines, after - before)
+    """)
+    for script in (fill, export):
+        out = subprocess.run([sys.executable, "-c", script], cwd=REPO_ROOT, env=env,
+                             capture_output=True, text=True, check=True).stdout
+    lines, growth_kb = map(int, out.split())
+    assert lines == EXPORT_ROWS + 1
+    assert growth_kb < 64 * 1024, f"peak RSS grew by {growth_kb} kB while exporting {EXPORT_ROWS} rows"
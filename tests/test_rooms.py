@@ -1 +1,251 @@
 ﻿# Room and booking tests
+from datetime import datetime, timedelta
+
+import pytest
+from app import create_app, db
+from app.models import Tenant, Studio, Room, Customer, User, Booking
+from app.rooms.conflicts import RoomIntervalIndex
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config.update({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "SESSION_COOKIE_SECURE": False,
+    })
+    with app.app_context():
+        db.create_all()
+        yield app.test_client()
+        db.drop_all()
+
+@pytest.fixture
+def studio_setup(client):
+    tenant = Tenant(name="T", subdomain="t-rooms")
+    db.session.add(tenant)
+    db.session.flush()
+    studio = Studio(tenant_id=tenant.id, name="S")
+    db.session.add(studio)
+    db.session.flush()
+    room = Room(tenant_id=tenant.id, studio_id=studio.id, name="R1", capacity=4)
+    customer = Customer(tenant_id=tenant.id, studio_id=studio.id, name="C", email="c@example.com")
+    user = User(tenant_id=tenant.id, studio_id=studio.id, name="M", email="m@example.com",
+                password_hash="x", role="Studio Manager", permissions=[])
+    db.session.add_all([room, customer, user])
+    db.session.commit()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user.id
+    return {"tenant": tenant, "studio": studio, "room": room, "customer": customer, "user": user}
+
+def _book(setup, start, hours=1, status='confirmed'):
+    b = Booking(tenant_id=setup["tenant"].id, room_id=setup["room"].id, customer_id=setup["customer"].id,
+                start_time=start, end_time=start + timedelta(hours=hours), status=status)
+    db.session.add(b)
+    db.session.commit()
+    return b
+
+def test_interval_index_overlaps():
+    base = datetime(2025, 1, 1, 9)
+    index = RoomIntervalIndex([
+        (base, base + timedelta(hours=1), 1),
+        (base + timedelta(hours=2), base + timedelta(hours=6), 2),
+        (base + timedelta(hours=3), base + timedelta(hours=4), 3),
+    ])
+    # Touching intervals do not overlap
+    assert not index.has_overlap(base + timedelta(hours=1), base + timedelta(hours=2))
+    assert [r[0] for r in index.overlapping(base + timedelta(hours=3, minutes=30), base + timedelta(hours=5))] == [2, 3]
+    assert index.has_overlap(base + timedelta(hours=5), base + timedelta(hours=7))
+    assert not index.has_overlap(base + timedelta(hours=6), base + timedelta(hours=7))
+    assert not RoomIntervalIndex().has_overlap(base, base + timedelta(hours=1))
+
+def test_validate_booking_requires_login(client):
+    res = client.post("/api/validate/booking", json={})
+    assert res.status_code == 401
+
+def test_validate_booking_conflicts(client, studio_setup):
+    start = datetime(2025, 3, 3, 10)
+    existing = _book(studio_setup, start)
+    _book(studio_setup, start + timedelta(hours=3), status='cancelled')
+    room_id = studio_setup["room"].id
+
+    # Overlaps the confirmed booking
+    res = client.post("/api/validate/booking", json={
+        "room_id": room_id, "start_time": "2025-03-03T10:30:00Z", "end_time": "2025-03-03T11:30:00Z"
+    })
+    assert res.status_code == 409
+    body = res.get_json()
+    assert body["success"] is False
+    assert body["conflicts"][0]["booking_id"] == existing.id
+
+    # Cancelled bookings and adjacent slots are free
+    res = client.post("/api/validate/booking", json={
+        "room_id": room_id, "start_time": "2025-03-03T11:00:00Z", "end_time": "2025-03-03T14:00:00Z"
+    })
+    assert res.status_code == 200
+    assert res.get_json()["conflicts"] == []
+
+    # Editing the existing booking ignores itself
+    res = client.post("/api/validate/booking", json={
+        "room_id": room_id, "booking_id": existing.id,
+        "start_time": "2025-03-03T10:15:00Z", "end_time": "2025-03-03T10:45:00Z"
+    })
+    assert res.status_code == 200
+
+def test_validate_booking_batch(client, studio_setup):
+    room_id = studio_setup["room"].id
+    res = client.post("/api/validate/booking", json={"slots": [
+        {"room_id": room_id, "start_time": "2025-03-04T09:00:00Z", "end_time": "2025-03-04T10:00:00Z"},
+        {"room_id": room_id, "start_time": "2025-03-04T09:30:00Z", "end_time": "2025-03-04T10:30:00Z"},
+        {"room_id": room_id, "start_time": "2025-03-04T11:00:00Z", "end_time": "2025-03-04T12:00:00Z"},
+    ]})
+    assert res.status_code == 409
+    conflicts = res.get_json()["conflicts"]
+    assert len(conflicts) == 1
+    assert conflicts[0]["slot_index"] == 1
+    assert conflicts[0]["conflicting_slot_index"] == 0
+
+    res = client.post("/api/validate/booking", json={"slots": [
+        {"room_id": 9999, "start_time": "2025-03-04T09:00:00Z", "end_time": "2025-03-04T08:00:00Z"},
+    ]})
+    assert res.status_code == 400
+    errors = res.get_json()["errors"]
+    assert "slots[0].end_time" in errors
+
+def test_free_slots_sweep():
+    from app.rooms.slots import OpeningHours, free_slots
+    day = datetime(2025, 3, 3)  # Monday
+    hours = OpeningHours.from_settings({"opening_hours": {"monday": [["09:00", "12:00"], ["13:00", "18:00"]]}})
+    windows = list(hours.windows(day, day + timedelta(days=7)))
+    assert windows == [(day + timedelta(hours=9), day + timedelta(hours=12)),
+                       (day + timedelta(hours=13), day + timedelta(hours=18))]
+    busy = [
+        (day + timedelta(hours=8), day + timedelta(hours=10)),
+        (day + timedelta(hours=9, minutes=30), day + timedelta(hours=10, minutes=30)),  # overlaps the first
+        (day + timedelta(hours=11, minutes=45), day + timedelta(hours=14)),
+        (day + timedelta(hours=15), day + timedelta(hours=15, minutes=20)),
+    ]
+    slots = list(free_slots(busy, windows, day, day + timedelta(days=7), timedelta(minutes=30)))
+    assert slots == [
+        (day + timedelta(hours=10, minutes=30), day + timedelta(hours=11, minutes=45)),
+        (day + timedelta(hours=14), day + timedelta(hours=15)),
+        (day + timedelta(hours=15, minutes=20), day + timedelta(hours=18)),
+    ]
+    # Always-open studios join across midnight
+    assert list(OpeningHours().windows(day, day + timedelta(days=2))) == [(day, day + timedelta(days=2))]
+    overnight = OpeningHours.from_settings({"opening_hours": {"monday": [["20:00", "24:00"]], "tuesday": [["00:00", "02:00"]]}})
+    assert list(overnight.windows(day, day + timedelta(days=7))) == [
+        (day + timedelta(hours=20), day + timedelta(days=1, hours=2))]
+
+def test_available_slots_endpoint(client, studio_setup):
+    studio, room = studio_setup["studio"], studio_setup["room"]
+    studio.settings = {"opening_hours": {"monday": [["09:00", "17:00"]]}}
+    other = Room(tenant_id=studio_setup["tenant"].id, studio_id=studio.id, name="R2", capacity=2)
+    db.session.add(other)
+    db.session.commit()
+    monday = datetime(2025, 3, 3)
+    _book(studio_setup, monday + timedelta(hours=10), hours=2)
+    _book(studio_setup, monday + timedelta(hours=13), hours=3, status='cancelled')
+
+    query = {"studio_id": studio.id, "start": "2025-03-03T00:00:00Z", "end": "2025-03-10T00:00:00Z",
+             "min_minutes": 90}
+    res = client.get("/api/rooms/slots", query_string=query)
+    assert res.status_code == 200
+    data = res.get_json()["data"]
+    assert [(s["room_id"], s["start_time"], s["end_time"]) for s in data] == [
+        (room.id, "2025-03-03T12:00:00Z", "2025-03-03T17:00:00Z"),
+        (other.id, "2025-03-03T09:00:00Z", "2025-03-03T17:00:00Z"),
+    ]
+    assert data[0]["minutes"] == 300
+
+    res = client.get("/api/rooms/slots", query_string={**query, "min_minutes": 60, "format": "ndjson",
+                                                       "room_id": room.id})
+    assert res.mimetype == "application/x-ndjson"
+    lines = res.get_data(as_text=True).splitlines()
+    assert len(lines) == 2 and '"start_time":"2025-03-03T09:00:00Z"' in lines[0].replace(' ', '')
+
+    assert client.get("/api/rooms/slots", query_string={**query, "end": "2025-03-01T00:00:00Z"}).status_code == 400
+    assert client.get("/api/rooms/slots", query_string={**query, "room_id": 999}).status_code == 400
+    studio.settings = {"opening_hours": {"funday": []}}
+    db.session.commit()
+    res = client.get("/api/rooms/slots", query_string=query)
+    assert res.status_code == 400 and "opening_hours" in res.get_json()["errors"]
+
+def test_recurrence_expansion():
+    import types
+    from app.rooms.recurrence import Recurrence, RecurrenceError
+    start = datetime(2025, 3, 5, 18)  # Wednesday
+    weekly = Recurrence.parse("RRULE:FREQ=WEEKLY;BYDAY=MO,WE,FR;COUNT=5")
+    assert list(weekly.starts(start)) == [start + timedelta(days=d) for d in (0, 2, 5, 7, 9)]
+    assert list(weekly.starts(start, after=start + timedelta(days=3), before=start + timedelta(days=8))) == \
+        [start + timedelta(days=5), start + timedelta(days=7)]
+
+    # A five-year daily series expands lazily and seeks straight into a window
+    daily = Recurrence.parse("FREQ=DAILY;INTERVAL=2;UNTIL=20300304")
+    assert isinstance(daily.starts(start), types.GeneratorType)
+    window = list(daily.starts(start, after=datetime(2029, 6, 1), before=datetime(2029, 6, 8)))
+    assert window == [s for s in daily.starts(start) if datetime(2029, 6, 1) <= s < datetime(2029, 6, 8)]
+    assert window and all((s - start).days % 2 == 0 for s in window)
+    assert daily.last_start(start) == datetime(2030, 3, 3, 18)
+
+    # Months without a 31st are skipped but do not use up COUNT
+    monthly = Recurrence.parse("FREQ=MONTHLY;COUNT=3")
+    assert list(monthly.starts(datetime(2025, 1, 31, 9))) == [
+        datetime(2025, 1, 31, 9), datetime(2025, 3, 31, 9), datetime(2025, 5, 31, 9)]
+
+    for bad in ("FREQ=HOURLY;COUNT=2", "FREQ=DAILY", "FREQ=DAILY;COUNT=2;UNTIL=20250101",
+                "FREQ=DAILY;BYDAY=MO;COUNT=2", "FREQ=WEEKLY;BYDAY=XX;COUNT=1"):
+        with pytest.raises(RecurrenceError):
+            Recurrence.parse(bad)
+
+def test_recurring_series_api(client, studio_setup):
+    from app.models import BookingDailyRollup, BookingSeries
+    room = studio_setup["room"]
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    first = today + timedelta(days=7 - today.weekday(), hours=10)  # next Monday 10:00
+    clash = _book(studio_setup, first + timedelta(weeks=3, minutes=30))
+    payload = {"room_id": room.id, "customer_id": studio_setup["customer"].id,
+               "start_time": first.isoformat() + "Z", "duration_minutes": 60,
+               "rrule": "FREQ=WEEKLY;COUNT=52", "total_amount": 25}
+
+    res = client.post("/api/rooms/series", json=payload)
+    assert res.status_code == 409
+    conflicts = res.get_json()["conflicts"]
+    assert [c["booking_id"] for c in conflicts] == [clash.id]
+    assert BookingSeries.query.count() == 0
+
+    db.session.delete(clash)
+    db.session.commit()
+    res = client.post("/api/rooms/series", json=payload)
+    assert res.status_code == 201
+    series = res.get_json()["data"]
+    assert series["ends_at"] == (first + timedelta(weeks=51, hours=1)).isoformat() + "Z"
+    # Only the default 90-day horizon is materialized
+    rows = Booking.query.filter_by(series_id=series["id"]).order_by(Booking.start_time).all()
+    assert len(rows) == 13 and rows[0].start_time == first
+    assert db.session.query(db.func.sum(BookingDailyRollup.bookings)).scalar() == 13
+
+    # Single bookings see occurrences that have no row yet
+    far = first + timedelta(weeks=40)
+    res = client.post("/api/validate/booking", json={
+        "room_id": room.id, "start_time": far.isoformat() + "Z",
+        "end_time": (far + timedelta(minutes=30)).isoformat() + "Z"})
+    assert res.status_code == 409
+    assert res.get_json()["conflicts"][0]["series_id"] == series["id"]
+
+    res = client.get(f"/api/rooms/series/{series['id']}/occurrences", query_string={
+        "start": (first + timedelta(weeks=50)).isoformat() + "Z"})
+    assert [o["start_time"] for o in res.get_json()["data"]] == [
+        (first + timedelta(weeks=w)).isoformat() + "Z" for w in (50, 51)]
+
+    # Moving the series to 14:00 replaces the future rows
+    res = client.put(f"/api/rooms/series/{series['id']}", json={
+        "start_time": (first + timedelta(hours=4)).isoformat() + "Z"})
+    assert res.status_code == 200
+    rows = Booking.query.filter_by(series_id=series["id"]).all()
+    assert len(rows) == 13 and all(r.start_time.hour == 14 for r in rows)
+    assert db.session.query(db.func.sum(BookingDailyRollup.bookings)).scalar() == 13
+
+    res = client.post("/api/rooms/series", json={**payload, "rrule": "FREQ=DAILY;COUNT=5000"})
+    assert res.status_code == 400
+    res = client.post("/api/rooms/series", json={**payload, "duration_minutes": 60 * 24 * 8})
+    assert res.status_code == 400
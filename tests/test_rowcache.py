@@ -0,0 +1,167 @@
+﻿# Row cache (tenants, studios, rooms) tests
+import fnmatch
+
+import pytest
+import redis
+from werkzeug.security import generate_password_hash
+from app import create_app, db, rowcache
+from app.models import Tenant, Studio, User
+from app.querybudget import count_queries, query_budget
+
+class RedisStandIn:
+    """The slice of the redis client API RedisBackend uses, kept in a dict."""
+
+    def __init__(self):
+        self.data = {}
+        self.down = False
+
+    def _check(self):
+        if self.down:
+            raise redis.ConnectionError('stand-in is down')
+
+    def get(self, key):
+        self._check()
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self._check()
+        self.data[key] = value.encode() if isinstance(value, str) else value
+
+    def incr(self, key):
+        self._check()
+        self.data[key] = str(int(self.data.get(key, 0)) + 1).encode()
+        return int(self.data[key])
+
+    def keys(self, pattern):
+        return [k for k in self.data if fnmatch.fnmatch(k, pattern)]
+
+    def pipeline(self, transaction=True):
+        client, calls = self, []
+
+        class Pipeline:
+            def incr(self, key):
+                calls.append(key)
+
+            def execute(self):
+                return [client.incr(key) for key in calls]
+        return Pipeline()
+
+def _make_app(backend, client=None):
+    app = create_app()
+    app.config.update({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "SESSION_COOKIE_SECURE": False,
+        "ROW_CACHE_BACKEND": backend,
+    })
+    rowcache.init_app(app)
+    if client is not None:
+        app.extensions['row_cache'] = rowcache.RowCache(rowcache.RedisBackend(client))
+    return app
+
+@pytest.fixture
+def app():
+    app = _make_app('memory')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+def _seed():
+    tenant = Tenant(name="T", subdomain="t-rowcache", settings={"theme": "light"})
+    db.session.add(tenant)
+    db.session.flush()
+    studio = Studio(tenant_id=tenant.id, name="S")
+    db.session.add(studio)
+    db.session.flush()
+    user = User(tenant_id=tenant.id, studio_id=studio.id, name="M", email="m@example.com",
+                password_hash=generate_password_hash("password"), role="Studio Manager", permissions=[])
+    db.session.add(user)
+    db.session.commit()
+    return tenant.id, user.id
+
+def _login(client, user_id):
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+
+def test_tenant_reads_hit_cache_and_commits_invalidate(app):
+    tenant_id, user_id = _seed()
+    cache = app.extensions['row_cache']
+    client = app.test_client()
+    _login(client, user_id)
+
+    assert client.get(f'/api/tenants/{tenant_id}').status_code == 200
+    assert cache.stats[('Tenant', 'miss')] == 1
+    with count_queries() as counter:
+        warm = client.get(f'/api/tenants/{tenant_id}')
+    assert cache.stats[('Tenant', 'hit')] == 1
+    assert not any('FROM tenants' in statement for statement in counter.statements)
+    assert warm.get_json()["data"]["settings"] == {"theme": "light"}
+
+    # A commit through the ORM bumps the row version, so the next read misses
+    assert client.put(f'/api/tenants/{tenant_id}', json={"settings": {"theme": "dark"}}).status_code == 200
+    fresh = client.get(f'/api/tenants/{tenant_id}')
+    assert fresh.get_json()["data"]["settings"] == {"theme": "dark"}
+    assert cache.stats[('Tenant', 'miss')] == 2
+
+def test_login_uses_cached_tenant(app):
+    tenant_id, _ = _seed()
+    client = app.test_client()
+    body = {"email": "m@example.com", "password": "password"}
+    assert client.post('/api/login', json=body).status_code == 200
+    with query_budget(1):
+        assert client.post('/api/login', json=body).status_code == 200
+
+    tenant = db.session.get(Tenant, tenant_id)
+    tenant.is_active = False
+    db.session.commit()
+    assert client.post('/api/login', json=body).status_code == 401
+
+def test_uncommitted_changes_are_not_cached(app):
+    tenant_id, _ = _seed()
+    db.session.get(Tenant, tenant_id).name = "Pending"
+    db.session.flush()
+    assert rowcache.get_cached(Tenant, tenant_id).name == "Pending"
+    db.session.rollback()
+    assert rowcache.get_cached(Tenant, tenant_id).name == "T"
+    assert rowcache.get_cached(Tenant, tenant_id).name == "T"
+    assert app.extensions['row_cache'].stats[('Tenant', 'hit')] == 1
+
+def test_first_cached_follows_table_version(app):
+    tenant_id, _ = _seed()
+    first = rowcache.first_cached(Studio, tenant_id=tenant_id)
+    assert rowcache.first_cached(Studio, tenant_id=tenant_id).id == first.id
+    db.session.delete(db.session.get(Studio, first.id))
+    db.session.add(Studio(tenant_id=tenant_id, name="Second"))
+    User.query.update({User.studio_id: None})
+    db.session.commit()
+    assert rowcache.first_cached(Studio, tenant_id=tenant_id).name == "Second"
+
+@pytest.mark.parametrize("backend,coherent", [("redis", True), ("memory", False)])
+def test_workers_coherence(backend, coherent):
+    # Two apps (own engines and sessions, one database file) stand in for two gunicorn workers
+    shared = RedisStandIn() if backend == "redis" else None
+    worker_a, worker_b = _make_app(backend, shared), _make_app(backend, shared)
+    with worker_a.app_context():
+        db.create_all()
+        tenant_id, _ = _seed()
+        assert rowcache.get_cached(Tenant, tenant_id).name == "T"
+
+    with worker_b.app_context():
+        db.session.get(Tenant, tenant_id).name = "Renamed"
+        db.session.commit()
+
+    with worker_a.app_context():
+        # Redis versions are shared, so worker A misses; its own memory LRU cannot know
+        assert rowcache.get_cached(Tenant, tenant_id).name == ("Renamed" if coherent else "T")
+        db.drop_all()
+
+def test_redis_outage_falls_back_to_database():
+    shared = RedisStandIn()
+    app = _make_app('none', shared)
+    with app.app_context():
+        db.create_all()
+        tenant_id, _ = _seed()
+        shared.down = True
+        assert rowcache.get_cached(Tenant, tenant_id).name == "T"
+        db.drop_all()
@@ -0,0 +1,90 @@
+﻿# Synthetic data generator tests
+from datetime import datetime
+
+import pytest
+import sqlalchemy as sa
+from app import create_app, db
+from app.models import Booking, Customer, Room, Studio, Tenant, User
+from app.seeding import Generator, generate, parse_count
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config.update({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "SESSION_COOKIE_SECURE": False,
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+OPTIONS = dict(tenants=3, studios_per_tenant=2, rooms_per_studio=2, customers_per_tenant=40, bookings=600,
+               seed=7, start=datetime(2025, 1, 6), batch_size=100)
+
+def _snapshot():
+    customers = db.session.execute(sa.select(Customer.tenant_id, Customer.name, Customer.email)
+                                   .order_by(Customer.id)).all()
+    bookings = db.session.execute(sa.select(Booking.room_id, Booking.customer_id, Booking.start_time,
+                                            Booking.end_time, Booking.status, Booking.total_amount)
+                                  .order_by(Booking.id)).all()
+    return customers, bookings
+
+def test_parse_count():
+    assert parse_count("5000") == 5000
+    assert parse_count("250k") == 250_000
+    assert parse_count("10M") == 10_000_000
+    with pytest.raises(ValueError):
+        parse_count("lots")
+
+def test_generate_counts_and_layout(app):
+    counts = generate(**OPTIONS)
+    assert counts == {"tenants": 3, "studios": 6, "rooms": 12, "users": 1 + 3 * (1 + 2 * 3),
+                      "customers": 120, "bookings": 600}
+    assert Tenant.query.count() == 3
+    assert Studio.query.count() == 6
+    assert Room.query.count() == 12
+    assert User.query.count() == counts["users"]
+    assert Booking.query.count() == 600
+
+    # Bookings never overlap within a room and stay inside opening hours
+    rows = db.session.execute(sa.select(Booking.room_id, Booking.start_time, Booking.end_time)
+                              .order_by(Booking.room_id, Booking.start_time)).all()
+    for prev, cur in zip(rows, rows[1:]):
+        if prev.room_id == cur.room_id:
+            assert cur.start_time >= prev.end_time
+    assert all(8 <= r.start_time.hour and r.end_time.hour <= 22 for r in rows)
+
+    # Customers and bookings stay within their tenant
+    mismatched = db.session.execute(
+        sa.select(sa.func.count()).select_from(Booking).join(Customer, Customer.id == Booking.customer_id)
+        .where(Customer.tenant_id != Booking.tenant_id)).scalar()
+    assert mismatched == 0
+
+def test_same_seed_same_data(app):
+    generate(**OPTIONS)
+    first = _snapshot()
+    db.drop_all()
+    db.create_all()
+    generate(**OPTIONS)
+    assert _snapshot() == first
+    db.drop_all()
+    db.create_all()
+    generate(**dict(OPTIONS, seed=8))
+    assert _snapshot() != first
+
+def test_refuses_to_seed_twice(app):
+    generate(**dict(OPTIONS, bookings=10))
+    with pytest.raises(RuntimeError):
+        Generator(**OPTIONS).run()
+
+def test_generated_users_can_log_in(app, client):
+    generate(**dict(OPTIONS, bookings=10))
+    resp = client.post("/api/login", json={"email": "manager1@tenant-00001.example.com", "password": "password"})
+    assert resp.status_code == 200
+    tenant = Tenant.query.filter_by(subdomain="tenant-00001").one()
+    assert resp.get_json()["data"]["user"]["tenant_id"] == tenant.id
+    resp = client.get("/api/customers")
+    assert resp.status_code == 200
+    assert resp.get_json()["data"]
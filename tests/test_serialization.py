@@ -0,0 +1,61 @@
+# JSON serialization tests
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from app import create_app, db
+from app.models import Tenant, Studio, Room, Customer, User, Booking
+from app.serialization import serializer_for, RawJSON
+from app.utils import make_response_payload
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config.update({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "SESSION_COOKIE_SECURE": False,
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+def _rows():
+    tenant = Tenant(name="T", subdomain="t-json", settings=None)
+    db.session.add(tenant)
+    db.session.flush()
+    studio = Studio(tenant_id=tenant.id, name="S")
+    db.session.add(studio)
+    db.session.flush()
+    room = Room(tenant_id=tenant.id, studio_id=studio.id, name="R", capacity=3, hourly_rate=Decimal("12.50"))
+    customer = Customer(tenant_id=tenant.id, studio_id=studio.id, name='Zoë "Q"', email="z@example.com")
+    user = User(tenant_id=tenant.id, studio_id=studio.id, name="U", email="u@example.com",
+                password_hash="secret", role="Staff/Instructor", permissions=None)
+    db.session.add_all([room, customer, user])
+    db.session.flush()
+    paid = Booking(tenant_id=tenant.id, room_id=room.id, customer_id=customer.id, total_amount=Decimal("30.00"),
+                   start_time=datetime(2025, 1, 2, 9, 30), end_time=datetime(2025, 1, 2, 10, 30))
+    free = Booking(tenant_id=tenant.id, room_id=room.id, customer_id=customer.id, total_amount=Decimal("0"),
+                   start_time=datetime(2025, 1, 3, 9), end_time=datetime(2025, 1, 3, 10), notes="n")
+    db.session.add_all([paid, free])
+    db.session.commit()
+    return [tenant, studio, room, customer, user, paid, free]
+
+def test_compiled_serializers_match_to_dict(app):
+    for obj in _rows():
+        encoded = serializer_for(type(obj)).encode(obj)
+        assert json.loads(encoded) == obj.to_dict(), type(obj).__name__
+
+    users = User.query.all()
+    assert "password_hash" not in serializer_for(User).dumps_many(users).decode()
+
+def test_make_response_payload_embeds_raw_json(app):
+    _rows()
+    customers = Customer.query.all()
+    with app.test_request_context():
+        res = make_response_payload(True, data=serializer_for(Customer).dumps_many(customers), meta={"page": 1})
+        body = json.loads(res.get_data())
+    assert body == {"success": True, "data": [c.to_dict() for c in customers], "meta": {"page": 1}}
+    assert isinstance(serializer_for(Customer).dumps(customers[0]), RawJSON)
@@ -0,0 +1,225 @@
+﻿# Waitlist auto-promotion tests
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from app import create_app, db
+from app.models import Booking, Customer, Room, Studio, Tenant, User, WaitlistEntry
+from app.rooms import waitlist
+from app.rooms.waitlist import WaitlistIndex
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config.update({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "SESSION_COOKIE_SECURE": False,
+    })
+    with app.app_context():
+        db.create_all()
+        waitlist.init_app(app)
+        yield app
+        db.drop_all()
+
+@pytest.fixture
+def setup(app, client):
+    tenant = Tenant(name="T", subdomain="t-waitlist")
+    db.session.add(tenant)
+    db.session.flush()
+    studio = Studio(tenant_id=tenant.id, name="S")
+    db.session.add(studio)
+    db.session.flush()
+    room = Room(tenant_id=tenant.id, studio_id=studio.id, name="R1", capacity=4)
+    customers = [Customer(tenant_id=tenant.id, studio_id=studio.id, name=f"C{i}", email=f"c{i}@example.com")
+                 for i in range(4)]
+    user = User(tenant_id=tenant.id, studio_id=studio.id, name="M", email="m@example.com",
+                password_hash="x", role="Studio Manager", permissions=[])
+    db.session.add_all([room, user, *customers])
+    db.session.commit()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user.id
+    day = (datetime.utcnow() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+    return {"tenant": tenant.id, "room": room.id, "customers": [c.id for c in customers], "day": day}
+
+def _book(setup, start, hours=1, customer=0):
+    booking = Booking(tenant_id=setup["tenant"], room_id=setup["room"], customer_id=setup["customers"][customer],
+                      start_time=start, end_time=start + timedelta(hours=hours))
+    db.session.add(booking)
+    db.session.commit()
+    return booking.id
+
+def _wait(setup, start, hours=1, customer=1, priority=0):
+    entry = WaitlistEntry(tenant_id=setup["tenant"], room_id=setup["room"], customer_id=setup["customers"][customer],
+                          start_time=start, end_time=start + timedelta(hours=hours), priority=priority)
+    db.session.add(entry)
+    db.session.commit()
+    return entry.id
+
+def _statuses(*entry_ids):
+    db.session.expire_all()
+    return [db.session.get(WaitlistEntry, i).status for i in entry_ids]
+
+def _confirmed(setup):
+    db.session.expire_all()
+    return [(b.start_time, b.end_time, b.customer_id) for b in Booking.query.filter_by(
+        room_id=setup["room"], status="confirmed").order_by(Booking.start_time)]
+
+def test_startup_load_leaves_no_pooled_connection():
+    # Workers forked from a preloaded app must not share a socket opened by create_app()
+    app = create_app()
+    with app.app_context():
+        assert db.engine.pool.checkedin() == 0
+
+def test_index_orders_by_priority_then_arrival():
+    index = WaitlistIndex()
+    t = datetime(2030, 1, 1, 10)
+    hour = timedelta(hours=1)
+    index.add([(1, 1, 7, 100, t, t + hour, 0), (2, 1, 7, 101, t, t + hour, 5), (3, 1, 7, 102, t, t + hour, 5),
+               (4, 1, 7, 103, t + 2 * hour, t + 3 * hour, 9), (5, 1, 7, 104, t - hour, t + 2 * hour, 1)])
+    key = (t, t + hour)
+    # Best head first: priority 5 beats priority 1
+    assert index.candidates(7, t, t + hour) == [key, (t - hour, t + 2 * hour)]
+    assert [index.pop(7, key)[1] for _ in range(3)] == [2, 3, 1]
+    assert index.pop(7, key) is None
+    # Touching slots do not overlap
+    assert index.candidates(7, t + hour, t + 2 * hour) == [(t - hour, t + 2 * hour)]
+    assert index.candidates(8, t, t + hour) == []
+
+def test_join_requires_a_booked_slot(setup, client):
+    start = setup["day"]
+    body = {"room_id": setup["room"], "customer_id": setup["customers"][1],
+            "start_time": start.isoformat() + "Z", "end_time": (start + timedelta(hours=1)).isoformat() + "Z"}
+    assert client.post("/api/rooms/waitlist", json=body).status_code == 409
+
+    _book(setup, start)
+    resp = client.post("/api/rooms/waitlist", json=body)
+    assert resp.status_code == 201
+    assert resp.get_json()["data"]["position"] == 1
+    resp = client.post("/api/rooms/waitlist", json={**body, "customer_id": setup["customers"][2], "priority": 3})
+    assert resp.get_json()["data"]["position"] == 1
+    listed = client.get(f"/api/rooms/waitlist?room_id={setup['room']}").get_json()["data"]
+    assert [e["customer_id"] for e in listed] == [setup["customers"][2], setup["customers"][1]]
+
+def test_cancellation_promotes_the_best_entry(setup, client):
+    start = setup["day"]
+    booking_id = _book(setup, start)
+    low = _wait(setup, start, customer=1, priority=0)
+    high = _wait(setup, start, customer=2, priority=5)
+
+    resp = client.post(f"/api/rooms/bookings/{booking_id}/cancel")
+    assert resp.status_code == 200
+    promoted = resp.get_json()["data"]["promoted"]
+    assert [p["waitlist_entry_id"] for p in promoted] == [high]
+    assert promoted[0]["booking"]["customer_id"] == setup["customers"][2]
+    assert _statuses(high, low) == ["promoted", "waiting"]
+    assert db.session.get(WaitlistEntry, high).booking_id == promoted[0]["booking"]["id"]
+    assert _confirmed(setup) == [(start, start + timedelta(hours=1), setup["customers"][2])]
+    assert client.post(f"/api/rooms/bookings/{booking_id}/cancel").status_code == 409
+
+def test_slot_is_only_promoted_once_it_is_entirely_free(setup):
+    start = setup["day"]
+    first = _book(setup, start)
+    second = _book(setup, start + timedelta(hours=1), customer=3)
+    entry = _wait(setup, start, hours=2, customer=1)
+
+    # Moving a booking frees its old interval; the two-hour slot is still half taken
+    booking = db.session.get(Booking, first)
+    booking.start_time, booking.end_time = start + timedelta(hours=4), start + timedelta(hours=5)
+    db.session.commit()
+    assert _statuses(entry) == ["waiting"]
+
+    db.session.delete(db.session.get(Booking, second))
+    db.session.commit()
+    assert _statuses(entry) == ["promoted"]
+    assert (start, start + timedelta(hours=2), setup["customers"][1]) in _confirmed(setup)
+
+def test_rollback_keeps_the_entry_waiting(app, setup):
+    start = setup["day"]
+    booking_id = _book(setup, start)
+    entry = _wait(setup, start)
+
+    db.session.get(Booking, booking_id).status = "cancelled"
+    assert [entry_id for entry_id, _ in waitlist.promote_pending()] == [entry]
+    db.session.rollback()
+    assert _statuses(entry) == ["waiting"]
+    assert len(app.extensions["waitlist"]) == 1
+
+    db.session.get(Booking, booking_id).status = "cancelled"
+    db.session.commit()
+    assert _statuses(entry) == ["promoted"]
+
+def test_entries_joined_elsewhere_and_started_slots(app, setup):
+    start = setup["day"]
+    booking_id = _book(setup, start)
+    entry = _wait(setup, start)
+    # Another worker's index has never seen the entry
+    app.extensions["waitlist"] = WaitlistIndex()
+    app.extensions["waitlist"].loaded = True
+    db.session.get(Booking, booking_id).status = "cancelled"
+    db.session.commit()
+    assert _statuses(entry) == ["promoted"]
+
+    past = datetime.utcnow() - timedelta(minutes=30)
+    old_booking = _book(setup, past)
+    stale = WaitlistEntry(tenant_id=setup["tenant"], room_id=setup["room"], customer_id=setup["customers"][1],
+                          start_time=past, end_time=past + timedelta(hours=1))
+    db.session.add(stale)
+    db.session.commit()
+    app.extensions["waitlist"].rebuild(db.session)
+    db.session.get(Booking, old_booking).status = "cancelled"
+    db.session.commit()
+    assert _statuses(stale.id) == ["expired"]
+
+def _cancel_concurrently(app, booking_ids):
+    """Cancel each booking from its own thread and session, committing as close together as possible."""
+    barrier = threading.Barrier(len(booking_ids))
+    errors = []
+
+    def cancel(booking_id):
+        with app.app_context():
+            try:
+                booking = db.session.get(Booking, booking_id)
+                barrier.wait(timeout=5)
+                booking.status = "cancelled"
+                db.session.commit()
+            except Exception as e:  # surfaced by the assertion below
+                errors.append(e)
+                db.session.rollback()
+            finally:
+                db.session.remove()
+
+    db.session.commit()
+    db.session.close()
+    threads = [threading.Thread(target=cancel, args=(booking_id,)) for booking_id in booking_ids]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=30)
+    assert errors == []
+
+def test_racing_cancellations_of_the_same_booking_promote_once(app, setup):
+    start = setup["day"]
+    booking_id = _book(setup, start)
+    first = _wait(setup, start, customer=1, priority=2)
+    second = _wait(setup, start, customer=2, priority=1)
+
+    _cancel_concurrently(app, [booking_id, booking_id])
+    assert _statuses(first, second) == ["promoted", "waiting"]
+    assert _confirmed(setup) == [(start, start + timedelta(hours=1), setup["customers"][1])]
+
+def test_racing_cancellations_never_double_book_a_slot(app, setup):
+    start = setup["day"]
+    hour = timedelta(hours=1)
+    bookings = [_book(setup, start), _book(setup, start + hour)]
+    early = _wait(setup, start, customer=1)
+    late = _wait(setup, start + hour, customer=2)
+    spanning = _wait(setup, start, hours=2, customer=3, priority=10)
+
+    _cancel_concurrently(app, bookings)
+    confirmed = _confirmed(setup)
+    for (s1, e1, _), (s2, e2, _) in zip(confirmed, confirmed[1:]):
+        assert e1 <= s2
+    statuses = _statuses(early, late, spanning)
+    assert statuses.count("promoted") == len(confirmed) >= 1
+    assert statuses in (["promoted", "promoted", "waiting"], ["waiting", "waiting", "promoted"])